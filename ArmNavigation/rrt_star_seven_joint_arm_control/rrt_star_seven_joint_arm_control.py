@@ -9,8 +9,10 @@ import matplotlib.pyplot as plt
 import sys
 import pathlib
 sys.path.append(str(pathlib.Path(__file__).parent.parent))
+sys.path.append(str(pathlib.Path(__file__).parent.parent.parent))
 
 from n_joint_arm_3d.NLinkArm3d import NLinkArm
+from utils.nearest_neighbor import NodeListIndex
 
 show_animation = True
 verbose = False
@@ -79,6 +81,7 @@ class RRTStar:
         self.connect_circle_dist = connect_circle_dist
         self.goal_node = self.Node(goal)
         self.node_list = []
+        self.node_index = NodeListIndex(lambda node: node.x)
         if show_animation:
             self.ax = plt.axes(projection='3d')
 
@@ -181,10 +184,7 @@ class RRTStar:
         # a range no more than expand_dist
         if hasattr(self, 'expand_dis'):
             r = min(r, self.expand_dis)
-        dist_list = [np.sum((np.array(node.x) - np.array(new_node.x)) ** 2)
-                     for node in self.node_list]
-        near_inds = [dist_list.index(i) for i in dist_list if i <= r ** 2]
-        return near_inds
+        return self.node_index.within(self.node_list, new_node, r)
 
     def rewire(self, new_node, near_inds):
         for i in near_inds:
@@ -284,13 +284,8 @@ class RRTStar:
         plt.pause(0.01)
         return self.ax
 
-    @staticmethod
-    def get_nearest_node_index(node_list, rnd_node):
-        dlist = [np.sum((np.array(node.x) - np.array(rnd_node.x))**2)
-                 for node in node_list]
-        minind = dlist.index(min(dlist))
-
-        return minind
+    def get_nearest_node_index(self, node_list, rnd_node):
+        return self.node_index.nearest(node_list, rnd_node)
 
     @staticmethod
     def plot_sphere(ax, x, y, z, size=1, color="k"):
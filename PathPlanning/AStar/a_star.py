@@ -9,14 +9,25 @@ See Wikipedia article (https://en.wikipedia.org/wiki/A*_search_algorithm)
 
 """
 
+import heapq
 import math
+import pathlib
+import sys
 
 import matplotlib.pyplot as plt
 
+sys.path.append(str(pathlib.Path(__file__).parent.parent.parent))
+from utils import batch_planning, node_storage, occupancy_grid
+from utils.planning_stats import PlanningStats
+from PathPlanning.AStar.jump_point_search import JumpPointSearch
+
 
 class AStarPlanner:
 
-    def __init__(self, ox, oy, resolution, rr):
+    SEARCH_MODES = ("a_star", "jps", "jps_plus")
+
+    def __init__(self, ox, oy, resolution, rr, obstacle_map_cache=None,
+                 search_mode="a_star"):
         """
         Initialize grid map for a star planning
 
@@ -24,10 +35,23 @@ class AStarPlanner:
         oy: y position list of Obstacles [m]
         resolution: grid resolution [m]
         rr: robot radius[m]
+        obstacle_map_cache: optional occupancy_grid.ObstacleMapCache to
+            reuse the obstacle map built for the same map parameters
+        search_mode: node expansion of the search
+            "a_star": all neighbors of the motion model
+            "jps": jump point search
+            "jps_plus": jump point search with precomputed jump distances
         """
+        if search_mode not in self.SEARCH_MODES:
+            raise ValueError(f"unknown search mode: {search_mode}, "
+                             f"expected one of {self.SEARCH_MODES}")
 
         self.resolution = resolution
         self.rr = rr
+        self.obstacle_map_cache = obstacle_map_cache
+        self.search_mode = search_mode
+        self.jump_point_search = None
+        self.node_storage = None
         self.min_x, self.min_y = 0, 0
         self.max_x, self.max_y = 0, 0
         self.obstacle_map = None
@@ -35,6 +59,15 @@ class AStarPlanner:
         self.motion = self.get_motion_model()
         self.calc_obstacle_map(ox, oy)
 
+        # search instrumentation: statistics of the last planning call,
+        # prints during planning on or off, a callback(x, y, cost) called
+        # with the position [m] and g-cost of every expanded node, and
+        # profiling of the time split and peak memory
+        self.stats = None
+        self.verbose = True
+        self.expansion_callback = None
+        self.profile = False
+
     class Node:
         def __init__(self, x, y, cost, parent_index):
             self.x = x  # index of grid
@@ -46,6 +79,18 @@ class AStarPlanner:
             return str(self.x) + "," + str(self.y) + "," + str(
                 self.cost) + "," + str(self.parent_index)
 
+    def __getstate__(self):
+        """
+        Pickled state: the configuration and the obstacle map, without the
+        search caches, the shared obstacle map cache and the expansion
+        callback. A copy rebuilds its caches on first use.
+        """
+        state = self.__dict__.copy()
+        state.update(obstacle_map_cache=None, node_storage=None,
+                     jump_point_search=None, stats=None,
+                     expansion_callback=None)
+        return state
+
     def planning(self, sx, sy, gx, gy):
         """
         A star path search
@@ -59,78 +104,215 @@ class AStarPlanner:
         output:
             rx: x position list of the final path
             ry: y position list of the final path
+
+        The search statistics are kept in self.stats.
         """
+        self.stats = PlanningStats()
+        with self.stats.measure(self.profile):
+            return self.search(sx, sy, gx, gy)
 
+    def search(self, sx, sy, gx, gy):
         start_node = self.Node(self.calc_xy_index(sx, self.min_x),
                                self.calc_xy_index(sy, self.min_y), 0.0, -1)
         goal_node = self.Node(self.calc_xy_index(gx, self.min_x),
                               self.calc_xy_index(gy, self.min_y), 0.0, -1)
 
-        open_set, closed_set = dict(), dict()
-        open_set[self.calc_grid_index(start_node)] = start_node
-
+        stats, verbose = self.stats, self.verbose
+        callback = self.expansion_callback
+        # the counters are kept in locals during the search
+        n_expanded, n_generated, n_open, peak_open = 0, 1, 1, 1
+        n_checks = 0
+        heappush, heappop, hypot = heapq.heappush, heapq.heappop, math.hypot
+        is_free_cell = None
+        if self.profile:
+            heappush = stats.timed("queue_time", heappush)
+            heappop = stats.timed("queue_time", heappop)
+            hypot = stats.timed("heuristic_time", hypot)
+            is_free_cell = stats.timed("collision_check_time",
+                                       self.is_free_cell)
+
+        # g-cost, parent index and open/closed state of the visited nodes
+        # in arrays indexed by grid index, used as the closed set
+        closed_set = self.get_node_storage()
+        cost, parent_index, state = closed_set.scalar_views()
+        # priority queue of (f-cost, push order, grid index). Entries are
+        # never removed from the heap when a node gets a cheaper cost; the
+        # outdated ones are skipped when popped (lazy deletion).
+        open_heap = []
+        push_count = 0
+
+        jump_point_search = None
+        if self.search_mode != "a_star":
+            jump_point_search = self.get_jump_point_search()
+
+        start_id = closed_set.calc_index(start_node.x, start_node.y)
+        cost[start_id] = 0.0
+        state[start_id] = node_storage.OPEN
+        heappush(open_heap, (
+            hypot(goal_node.x - start_node.x, goal_node.y - start_node.y),
+            push_count, start_id))
+
+        goal_x, goal_y = goal_node.x, goal_node.y
+        x_width, y_width = self.x_width, self.y_width
+        obstacle_map = self.obstacle_map
         while True:
-            if len(open_set) == 0:
-                print("Open set is empty..")
+            if len(open_heap) == 0:
+                if verbose:
+                    print("Open set is empty..")
                 break
 
-            c_id = min(
-                open_set,
-                key=lambda o: open_set[o].cost + self.calc_heuristic(goal_node,
-                                                                     open_set[
-                                                                         o]))
-            current = open_set[c_id]
-
-            if current.x == goal_node.x and current.y == goal_node.y:
-                print("Find goal")
-                goal_node.parent_index = current.parent_index
-                goal_node.cost = current.cost
+            _, _, c_id = heappop(open_heap)
+            if state[c_id] == node_storage.CLOSED:
+                continue  # outdated entry of an already closed node
+            c_x, c_y = closed_set.calc_xy(c_id)
+            c_cost = cost[c_id]
+            n_expanded += 1
+            if callback is not None:
+                callback(self.calc_grid_position(c_x, self.min_x),
+                         self.calc_grid_position(c_y, self.min_y), c_cost)
+
+            if c_x == goal_x and c_y == goal_y:
+                if verbose:
+                    print("Find goal")
+                goal_node.parent_index = parent_index[c_id]
+                goal_node.cost = c_cost
                 break
 
-            # Remove the item from the open set
-            del open_set[c_id]
+            # Move the item from the open set to the closed set
+            state[c_id] = node_storage.CLOSED
+            n_open -= 1
 
-            # Add it to the closed set
-            closed_set[c_id] = current
+            # expand_grid search grid based on motion model, or only to
+            # the jump points in jump point search
+            if jump_point_search is None:
+                moves = self.motion
+            else:
+                moves = self.calc_jump_point_moves(
+                    jump_point_search, c_x, c_y, parent_index[c_id],
+                    closed_set, goal_node)
 
-            # expand_grid search grid based on motion model
-            for i, _ in enumerate(self.motion):
-                node = self.Node(current.x + self.motion[i][0],
-                                 current.y + self.motion[i][1],
-                                 current.cost + self.motion[i][2], c_id)
-                n_id = self.calc_grid_index(node)
+            for move_x, move_y, move_cost in moves:
+                n_x, n_y = c_x + move_x, c_y + move_y
 
                 # If the node is not safe, do nothing
-                if not self.verify_node(node):
+                n_checks += 1
+                if is_free_cell is None:
+                    if not (0 <= n_x < x_width and 0 <= n_y < y_width) or \
+                            obstacle_map[n_x][n_y]:
+                        continue
+                elif not is_free_cell(n_x, n_y):
                     continue
 
-                if n_id in closed_set:
+                n_id = n_y * x_width + n_x
+                n_cost = c_cost + move_cost
+                if state[n_id] == node_storage.CLOSED or \
+                        n_cost >= cost[n_id]:
                     continue
 
-                if n_id not in open_set:
-                    open_set[n_id] = node  # discovered a new node
-                else:
-                    if open_set[n_id].cost > node.cost:
-                        # This path is the best until now. record it
-                        open_set[n_id] = node
+                # discovered a new node, or this path is the best until now.
+                # record it
+                if state[n_id] == node_storage.UNVISITED:
+                    n_open += 1
+                    if n_open > peak_open:
+                        peak_open = n_open
+                cost[n_id] = n_cost
+                parent_index[n_id] = c_id
+                state[n_id] = node_storage.OPEN
+                push_count += 1
+                n_generated += 1
+                # f-cost with the heuristic of calc_heuristic
+                heappush(open_heap, (
+                    n_cost + hypot(goal_x - n_x, goal_y - n_y),
+                    push_count, n_id))
+
+        stats.nodes_expanded, stats.nodes_generated = n_expanded, n_generated
+        stats.peak_open_set_size = peak_open
+        stats.collision_checks = n_checks
 
         rx, ry = self.calc_final_path(goal_node, closed_set)
+        if jump_point_search is not None:
+            rx, ry = self.fill_jump_point_path(rx, ry)
 
         return rx, ry
 
-    def calc_final_path(self, goal_node, closed_set):
-        # generate final course
-        rx, ry = [self.calc_grid_position(goal_node.x, self.min_x)], [
-            self.calc_grid_position(goal_node.y, self.min_y)]
-        parent_index = goal_node.parent_index
-        while parent_index != -1:
-            n = closed_set[parent_index]
-            rx.append(self.calc_grid_position(n.x, self.min_x))
-            ry.append(self.calc_grid_position(n.y, self.min_y))
-            parent_index = n.parent_index
+    def plan_many(self, starts, goals, workers=None, timeout=None):
+        """
+        Plan paths for many start/goal pairs in a process pool
+
+        The obstacle map is shared with the worker processes through shared
+        memory instead of being rebuilt or copied for every query.
+
+        input:
+            starts: (N, 2) start positions [m]
+            goals: (N, 2) goal positions [m]
+            workers: number of worker processes, default is the CPU count
+            timeout: time limit of a single query [s]
+
+        output:
+            list of batch_planning.PlanningResult in input order
+        """
+        return batch_planning.plan_many(self, starts, goals, workers, timeout)
 
+    def calc_final_path(self, goal_node, closed_set):
+        # generate final course by walking the parent indices of the
+        # closed nodes back to the start
+        if goal_node.parent_index != -1 and \
+                goal_node.parent_index not in closed_set:
+            raise KeyError(goal_node.parent_index)
+        ix, iy = closed_set.calc_path(goal_node.parent_index,
+                                      (goal_node.x, goal_node.y))
+        rx = self.calc_grid_position(ix, self.min_x).tolist()
+        ry = self.calc_grid_position(iy, self.min_y).tolist()
         return rx, ry
 
+    def get_node_storage(self):
+        """Node arrays of a new search, see GridNodeStorage.for_grid"""
+        self.node_storage = node_storage.GridNodeStorage.for_grid(
+            self.node_storage, self.x_width, self.y_width)
+        return self.node_storage
+
+    def get_jump_point_search(self):
+        """
+        Jump point search on the current obstacle map
+
+        It is built on first use and rebuilt when the obstacle map object is
+        replaced. The JPS+ jump distance table is built in the same way.
+        """
+        jps = self.jump_point_search
+        if jps is None or jps.obstacle_map is not self.obstacle_map:
+            jps = JumpPointSearch(
+                self.obstacle_map,
+                use_jump_distances=self.search_mode == "jps_plus")
+            self.jump_point_search = jps
+        return jps
+
+    def calc_jump_point_moves(self, jump_point_search, x, y, parent_index,
+                              closed_set, goal_node):
+        # moves from the current node to its successor jump points
+        parent_x, parent_y = None, None
+        if parent_index != -1:
+            parent_x, parent_y = closed_set.calc_xy(parent_index)
+        return [(jx - x, jy - y, cost)
+                for jx, jy, cost in jump_point_search.successors(
+                    x, y, parent_x, parent_y, goal_node.x, goal_node.y)]
+
+    def fill_jump_point_path(self, rx, ry):
+        # add the grid cells on the straight or diagonal lines between
+        # consecutive jump points
+        ix = [self.calc_xy_index(x, self.min_x) for x in rx]
+        iy = [self.calc_xy_index(y, self.min_y) for y in ry]
+        frx, fry = rx[:1], ry[:1]
+        for i in range(1, len(ix)):
+            dx = (ix[i] > ix[i - 1]) - (ix[i] < ix[i - 1])
+            dy = (iy[i] > iy[i - 1]) - (iy[i] < iy[i - 1])
+            n_steps = max(abs(ix[i] - ix[i - 1]), abs(iy[i] - iy[i - 1]))
+            for step in range(1, n_steps + 1):
+                frx.append(self.calc_grid_position(ix[i - 1] + step * dx,
+                                                   self.min_x))
+                fry.append(self.calc_grid_position(iy[i - 1] + step * dy,
+                                                   self.min_y))
+        return frx, fry
+
     @staticmethod
     def calc_heuristic(n1, n2):
         w = 1.0  # weight of heuristic
@@ -152,7 +334,7 @@ class AStarPlanner:
         return round((position - min_pos) / self.resolution)
 
     def calc_grid_index(self, node):
-        return (node.y - self.min_y) * self.x_width + (node.x - self.min_x)
+        return node.y * self.x_width + node.x
 
     def verify_node(self, node):
         px = self.calc_grid_position(node.x, self.min_x)
@@ -173,35 +355,28 @@ class AStarPlanner:
 
         return True
 
+    def is_free_cell(self, x, y):
+        # collision check of the search by grid index
+        return 0 <= x < self.x_width and 0 <= y < self.y_width and \
+            not self.obstacle_map[x][y]
+
     def calc_obstacle_map(self, ox, oy):
 
-        self.min_x = round(min(ox))
-        self.min_y = round(min(oy))
-        self.max_x = round(max(ox))
-        self.max_y = round(max(oy))
+        build_obstacle_map = occupancy_grid.calc_obstacle_map
+        if self.obstacle_map_cache is not None:
+            build_obstacle_map = self.obstacle_map_cache.calc_obstacle_map
+        (self.min_x, self.min_y, self.max_x, self.max_y,
+         self.obstacle_map) = build_obstacle_map(
+            ox, oy, self.resolution, self.rr)
         print("min_x:", self.min_x)
         print("min_y:", self.min_y)
         print("max_x:", self.max_x)
         print("max_y:", self.max_y)
 
-        self.x_width = round((self.max_x - self.min_x) / self.resolution)
-        self.y_width = round((self.max_y - self.min_y) / self.resolution)
+        self.x_width, self.y_width = self.obstacle_map.shape
         print("x_width:", self.x_width)
         print("y_width:", self.y_width)
 
-        # obstacle map generation
-        self.obstacle_map = [[False for _ in range(self.y_width)]
-                             for _ in range(self.x_width)]
-        for ix in range(self.x_width):
-            x = self.calc_grid_position(ix, self.min_x)
-            for iy in range(self.y_width):
-                y = self.calc_grid_position(iy, self.min_y)
-                for iox, ioy in zip(ox, oy):
-                    d = math.hypot(iox - x, ioy - y)
-                    if d <= self.rr:
-                        self.obstacle_map[ix][iy] = True
-                        break
-
     @staticmethod
     def get_motion_model():
         # dx, dy, cost
@@ -0,0 +1,80 @@
+"""
+
+A* grid planning benchmark
+
+Measures how AStarPlanner.planning scales with the grid size on a square
+map with a single wall, which forces a detour around it. Every search mode
+of the planner is measured.
+
+"""
+
+import time
+
+from PathPlanning.AStar.a_star import AStarPlanner
+
+# side lengths [m] of the square benchmark maps
+GRID_SIZES = [25, 50, 100, 200]
+
+
+def make_obstacles(size):
+    """
+    Obstacles of a square map with a wall covering 3/4 of its height
+
+    The two corner points fix the map bounds, so the grid width only depends
+    on the map size and not on the number of obstacle points.
+    """
+    ox, oy = [0.0, float(size)], [0.0, float(size)]
+    for i in range(0, size * 3 // 4):
+        ox.append(size / 2.0)
+        oy.append(float(i))
+    return ox, oy
+
+
+def benchmark(size, grid_size=1.0, robot_radius=1.0, n_trials=3,
+              search_mode="a_star"):
+    """
+    Best-of-n planning time on a map with the given side length
+
+    output:
+        planning time [s] and the number of points of the found path
+    """
+    ox, oy = make_obstacles(size)
+    a_star = AStarPlanner(ox, oy, grid_size, robot_radius,
+                          search_mode=search_mode)
+
+    sx, sy = 2.0, 2.0
+    gx, gy = size - 2.0, 2.0
+
+    best_time = float("inf")
+    rx = []
+    for _ in range(n_trials):
+        start_time = time.perf_counter()
+        rx, _ = a_star.planning(sx, sy, gx, gy)
+        best_time = min(best_time, time.perf_counter() - start_time)
+
+    return best_time, len(rx)
+
+
+def main(sizes=None, search_modes=AStarPlanner.SEARCH_MODES):
+    print(__file__ + " start!!")
+
+    if sizes is None:
+        sizes = GRID_SIZES
+
+    results = []
+    for search_mode in search_modes:
+        for size in sizes:
+            planning_time, n_path = benchmark(size, search_mode=search_mode)
+            results.append((search_mode, size, planning_time, n_path))
+
+    print("mode, size, cells, time [s], time per cell [us], path points")
+    for search_mode, size, planning_time, n_path in results:
+        n_cells = size * size
+        print(f"{search_mode}, {size}, {n_cells}, {planning_time:.4f}, "
+              f"{planning_time / n_cells * 1e6:.3f}, {n_path}")
+
+    return results
+
+
+if __name__ == '__main__':
+    main()
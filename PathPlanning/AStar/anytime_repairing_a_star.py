@@ -0,0 +1,288 @@
+"""
+
+Anytime repairing A* (ARA*) grid planning
+
+The first search uses a heuristic inflated by a weight, which finds a
+suboptimal path quickly. The weight is then decreased step by step and each
+search reuses the costs of the previous ones, so only the states whose cost
+can still improve are expanded again. Every solution is published with its
+suboptimality bound, and the search stops at a time limit with the best
+path found so far.
+
+Ref:
+
+- [ARA*: Anytime A* with Provable Bounds on Sub-Optimality]
+(https://papers.nips.cc/paper/2382-ara-anytime-a-with-provable-bounds-on-sub-optimality)
+
+"""
+
+import heapq
+import math
+import pathlib
+import sys
+import time
+
+import matplotlib.pyplot as plt
+
+sys.path.append(str(pathlib.Path(__file__).parent.parent.parent))
+from PathPlanning.AStar.a_star import AStarPlanner
+from utils.planning_stats import PlanningStats
+
+show_animation = True
+
+
+class AnytimeRepairingAStarPlanner(AStarPlanner):
+
+    def __init__(self, ox, oy, resolution, rr, obstacle_map_cache=None,
+                 initial_weight=3.0, weight_step=0.5):
+        """
+        Initialize grid map for ARA* planning
+
+        ox: x position list of Obstacles [m]
+        oy: y position list of Obstacles [m]
+        resolution: grid resolution [m]
+        rr: robot radius[m]
+        obstacle_map_cache: optional occupancy_grid.ObstacleMapCache to
+            reuse the obstacle map built for the same map parameters
+        initial_weight: heuristic weight of the first search, >= 1.0
+        weight_step: decrease of the weight after each solution
+        """
+        if initial_weight < 1.0:
+            raise ValueError("initial_weight must be at least 1.0")
+        if weight_step <= 0.0:
+            raise ValueError("weight_step must be positive")
+
+        super().__init__(ox, oy, resolution, rr, obstacle_map_cache)
+        self.initial_weight = initial_weight
+        self.weight_step = weight_step
+
+    def planning(self, sx, sy, gx, gy, time_limit=None):
+        """
+        ARA* path search
+
+        input:
+            s_x: start x position [m]
+            s_y: start y position [m]
+            gx: goal x position [m]
+            gy: goal y position [m]
+            time_limit: planning time limit [s], None to search until the
+                path is optimal
+
+        output:
+            rx: x position list of the best path found, empty if none was
+                found within the time limit
+            ry: y position list of the best path found
+
+        The search statistics of all weights are kept in self.stats.
+        """
+        rx, ry = [], []
+        self.stats = PlanningStats()
+        with self.stats.measure(self.profile):
+            for rx, ry, _ in self.search_iter(sx, sy, gx, gy, time_limit):
+                pass
+        return rx, ry
+
+    def planning_iter(self, sx, sy, gx, gy, time_limit=None):
+        """
+        Generator of improving ARA* solutions
+
+        input:
+            s_x: start x position [m]
+            s_y: start y position [m]
+            gx: goal x position [m]
+            gy: goal y position [m]
+            time_limit: planning time limit [s], None to search until the
+                path is optimal
+
+        output:
+            yields (rx, ry, bound) after the search of every weight, with
+            the path goal first. The path cost is at most bound times the
+            optimal path cost.
+
+        The node counters of the searches so far are kept in self.stats.
+        """
+        self.stats = PlanningStats()
+        yield from self.search_iter(sx, sy, gx, gy, time_limit)
+
+    def search_iter(self, sx, sy, gx, gy, time_limit):
+        deadline = math.inf
+        if time_limit is not None:
+            deadline = time.perf_counter() + time_limit
+
+        start_x = self.calc_xy_index(sx, self.min_x)
+        start_y = self.calc_xy_index(sy, self.min_y)
+        self.goal_x = self.calc_xy_index(gx, self.min_x)
+        self.goal_y = self.calc_xy_index(gy, self.min_y)
+        start = start_x * self.y_width + start_y
+        goal = self.goal_x * self.y_width + self.goal_y
+
+        # g-costs and parents by index x * y_width + y, kept across the
+        # searches of all weights
+        self.costs, self.parents = {start: 0.0}, {start: -1}
+        weight = self.initial_weight
+        open_heap = [(weight * self.calc_cell_heuristic(start), start)]
+        self.stats.nodes_generated += 1
+        # closed states whose cost improved after their expansion
+        inconsistent = set()
+
+        while True:
+            closed_set = set()
+            if not self.improve_path(goal, weight, open_heap, closed_set,
+                                     inconsistent, deadline):
+                return  # deadline
+
+            goal_cost = self.costs.get(goal, math.inf)
+            if goal_cost == math.inf:
+                if self.verbose:
+                    print("Open set is empty..")
+                return
+
+            # bound of the solution: the optimal cost is at least the
+            # minimum of g + h over the states that can still improve
+            states = self.calc_open_states(open_heap, closed_set,
+                                           inconsistent)
+            min_cost = min((self.costs[n] + self.calc_cell_heuristic(n)
+                            for n in states), default=math.inf)
+            bound = 1.0
+            if goal_cost > 0.0:
+                bound = max(1.0, min(weight, goal_cost / min_cost))
+            rx, ry = self.calc_cell_path(goal)
+            yield rx, ry, bound
+            if bound <= 1.0:
+                return
+
+            # move the inconsistent states back to the open list and
+            # reorder it for the smaller weight
+            weight = max(1.0, weight - self.weight_step)
+            inconsistent.clear()
+            open_heap[:] = [(self.costs[n] + weight *
+                             self.calc_cell_heuristic(n), n) for n in states]
+            heapq.heapify(open_heap)
+
+    def improve_path(self, goal, weight, open_heap, closed_set,
+                     inconsistent, deadline):
+        """
+        Expand states until the goal cost is minimal for the weight
+
+        output:
+            False if the deadline has passed
+        """
+        costs, parents = self.costs, self.parents
+        # the counters are kept in locals during the search
+        n_expanded, n_generated, n_checks = 0, 0, 0
+        peak_open = len(open_heap)
+        while open_heap and open_heap[0][0] < costs.get(goal, math.inf):
+            if time.perf_counter() > deadline:
+                self.add_stats(n_expanded, n_generated, n_checks, peak_open)
+                return False
+
+            _, current = heapq.heappop(open_heap)
+            if current in closed_set:
+                continue  # outdated entry
+            cost = costs[current]
+            closed_set.add(current)
+            n_expanded += 1
+
+            x, y = divmod(current, self.y_width)
+            for move_x, move_y, move_cost in self.motion:
+                nx, ny = x + move_x, y + move_y
+                n_checks += 1
+                if not (0 <= nx < self.x_width and 0 <= ny < self.y_width) \
+                        or self.obstacle_map[nx][ny]:
+                    continue
+                node = nx * self.y_width + ny
+                new_cost = cost + move_cost
+                if new_cost >= costs.get(node, math.inf):
+                    continue
+                costs[node], parents[node] = new_cost, current
+                n_generated += 1
+                if node in closed_set:
+                    inconsistent.add(node)
+                else:
+                    heapq.heappush(open_heap, (
+                        new_cost + weight * self.calc_cell_heuristic(node),
+                        node))
+                    if len(open_heap) > peak_open:
+                        peak_open = len(open_heap)
+        self.add_stats(n_expanded, n_generated, n_checks, peak_open)
+        return True
+
+    def add_stats(self, n_expanded, n_generated, n_checks, peak_open):
+        """Add the counters of one search to self.stats"""
+        stats = self.stats
+        stats.nodes_expanded += n_expanded
+        stats.nodes_generated += n_generated
+        stats.collision_checks += n_checks
+        stats.peak_open_set_size = max(stats.peak_open_set_size, peak_open)
+
+    @staticmethod
+    def calc_open_states(open_heap, closed_set, inconsistent):
+        """States of the open list and the inconsistent states"""
+        return {n for _, n in open_heap if n not in closed_set} | \
+            inconsistent
+
+    def calc_cell_heuristic(self, node):
+        x, y = divmod(node, self.y_width)
+        return math.hypot(x - self.goal_x, y - self.goal_y)
+
+    def calc_cell_path(self, goal):
+        rx, ry = [], []
+        node = goal
+        while node != -1:
+            x, y = divmod(node, self.y_width)
+            rx.append(self.calc_grid_position(x, self.min_x))
+            ry.append(self.calc_grid_position(y, self.min_y))
+            node = self.parents[node]
+        return rx, ry
+
+
+def main():
+    print(__file__ + " start!!")
+
+    # start and goal position
+    sx = 10.0  # [m]
+    sy = 10.0  # [m]
+    gx = 50.0  # [m]
+    gy = 50.0  # [m]
+    grid_size = 2.0  # [m]
+    robot_radius = 1.0  # [m]
+
+    # set obstacle positions
+    ox, oy = [], []
+    for i in range(-10, 60):
+        ox.append(i)
+        oy.append(-10.0)
+    for i in range(-10, 60):
+        ox.append(60.0)
+        oy.append(i)
+    for i in range(-10, 61):
+        ox.append(i)
+        oy.append(60.0)
+    for i in range(-10, 61):
+        ox.append(-10.0)
+        oy.append(i)
+    for i in range(-10, 40):
+        ox.append(20.0)
+        oy.append(i)
+    for i in range(0, 40):
+        ox.append(40.0)
+        oy.append(60.0 - i)
+
+    ara_star = AnytimeRepairingAStarPlanner(ox, oy, grid_size, robot_radius)
+    for rx, ry, bound in ara_star.planning_iter(sx, sy, gx, gy,
+                                                time_limit=0.05):
+        print(f"path with {len(rx)} points, suboptimality bound {bound:.2f}")
+        if show_animation:  # pragma: no cover
+            plt.plot(rx, ry, "-")
+
+    if show_animation:  # pragma: no cover
+        plt.plot(ox, oy, ".k")
+        plt.plot(sx, sy, "og")
+        plt.plot(gx, gy, "xb")
+        plt.grid(True)
+        plt.axis("equal")
+        plt.show()
+
+
+if __name__ == '__main__':
+    main()
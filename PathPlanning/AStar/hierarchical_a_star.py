@@ -0,0 +1,485 @@
+"""
+
+Hierarchical path-finding A* (HPA*) on the grid of AStarPlanner
+
+The grid is partitioned into square clusters. Transitions on the entrances
+between adjacent clusters, and diagonal transitions where only a diagonal
+move crosses a border or a cluster corner, are the nodes of an abstract
+graph, connected by the shortest path costs inside each cluster. A query
+only searches this small graph and refines the segments of the found
+abstract path into grid cells, so it never explores or stores the whole
+grid. The path is near-optimal: it can be slightly longer than the one of a
+flat A* search.
+
+Ref:
+
+- [Near Optimal Hierarchical Path-Finding]
+(https://webdocs.cs.ualberta.ca/~mmueller/ps/hpastar.pdf)
+
+"""
+
+import heapq
+import math
+import pathlib
+import sys
+
+import matplotlib.pyplot as plt
+import numpy as np
+from scipy.sparse.csgraph import dijkstra as csgraph_dijkstra
+
+sys.path.append(str(pathlib.Path(__file__).parent.parent.parent))
+from utils import occupancy_grid
+from PathPlanning.AStar.a_star import AStarPlanner
+
+show_animation = True
+
+
+class HierarchicalAStarPlanner:
+
+    # entrances at least this wide get a transition at both ends instead of
+    # a single one in the middle
+    WIDE_ENTRANCE = 6
+
+    def __init__(self, planner, cluster_size=10):
+        """
+        Build the abstract graph of the grid of a planner
+
+        planner: AStarPlanner whose grid, obstacle map and motion model are
+            used. The obstacle map is copied; edit it with update_cells.
+        cluster_size: side length of a cluster [cells]
+        """
+        if cluster_size < 1:
+            raise ValueError("cluster_size must be positive")
+
+        self.planner = planner
+        self.cluster_size = cluster_size
+        self.motion = planner.motion
+        self.move_costs = {(dx, dy): cost for dx, dy, cost in self.motion}
+        self.diagonal_moves = all(
+            (dx, dy) in self.move_costs for dx in (-1, 1) for dy in (-1, 1))
+        self.obstacle_map = np.array(planner.obstacle_map, dtype=bool)
+        self.x_width, self.y_width = self.obstacle_map.shape
+        self.n_clusters_x = -(-self.x_width // cluster_size)
+        self.n_clusters_y = -(-self.y_width // cluster_size)
+
+        # transitions (a, b) of the border between cluster (cx, cy) and
+        # cluster (cx + dx, cy + dy), keyed by (cx, cy, dx, dy), where the
+        # borders at cluster corners have dx = 1 and dy = +-1. Nodes of the
+        # abstract graph are grid indices ix * y_width + iy.
+        self.transitions = {}
+        # abstract graph edges {node: {other node: cost}} between clusters,
+        # and inside each cluster keyed by (cx, cy)
+        self.inter_edges = {}
+        self.intra_edges = {}
+
+        # prints during planning on or off
+        self.verbose = True
+
+        for cx in range(self.n_clusters_x):
+            for cy in range(self.n_clusters_y):
+                for border in self.calc_cluster_borders(cx, cy):
+                    if border not in self.transitions:
+                        self.update_border(border)
+        for cx in range(self.n_clusters_x):
+            for cy in range(self.n_clusters_y):
+                self.update_cluster(cx, cy)
+
+    def planning(self, sx, sy, gx, gy):
+        """
+        Hierarchical path search
+
+        input:
+            s_x: start x position [m]
+            s_y: start y position [m]
+            gx: goal x position [m]
+            gy: goal y position [m]
+
+        output:
+            rx: x position list of the final path, empty if no path is found
+            ry: y position list of the final path
+        """
+        p = self.planner
+        start = self.calc_node(p.calc_xy_index(sx, p.min_x),
+                               p.calc_xy_index(sy, p.min_y))
+        goal = self.calc_node(p.calc_xy_index(gx, p.min_x),
+                              p.calc_xy_index(gy, p.min_y))
+        if start is None or goal is None or \
+                self.obstacle_map[divmod(goal, self.y_width)]:
+            if self.verbose:
+                print("Start or goal is not valid..")
+            return [], []
+
+        # temporary edges from the start and to the goal inside their
+        # clusters, and between them if their clusters are the same or
+        # adjacent, which avoids detours over the entrances on short queries
+        start_cluster = self.calc_cluster(start)
+        goal_cluster = self.calc_cluster(goal)
+        start_costs = self.calc_cluster_costs(start_cluster, start)
+        start_edges = {n: start_costs[n] for n in
+                       self.calc_cluster_nodes(*start_cluster)
+                       if n != start and n in start_costs}
+        if max(abs(start_cluster[0] - goal_cluster[0]),
+               abs(start_cluster[1] - goal_cluster[1])) <= 1:
+            costs = self.calc_cluster_costs(start_cluster, start,
+                                            other_cluster=goal_cluster)
+            if goal in costs:
+                start_edges[goal] = costs[goal]
+        goal_costs = self.calc_cluster_costs(goal_cluster, goal,
+                                             reverse=True)
+        goal_edges = {n: goal_costs[n] for n in
+                      self.calc_cluster_nodes(*goal_cluster)
+                      if n != goal and n in goal_costs}
+
+        abstract_path = self.search_abstract_graph(
+            start, goal, start_edges, goal_edges)
+        if abstract_path is None:
+            if self.verbose:
+                print("Open set is empty..")
+            return [], []
+        if self.verbose:
+            print("Find goal")
+
+        rx, ry = [], []
+        for node in self.refine_path(abstract_path):
+            ix, iy = divmod(node, self.y_width)
+            rx.append(float(p.calc_grid_position(ix, p.min_x)))
+            ry.append(float(p.calc_grid_position(iy, p.min_y)))
+
+        # goal first, the same order as AStarPlanner.planning
+        rx.reverse()
+        ry.reverse()
+        return rx, ry
+
+    def update_cells(self, x_indices, y_indices, occupied=True):
+        """
+        Edit cells of the obstacle map and rebuild the affected clusters
+
+        Only the borders of the clusters of the edited cells, the corners
+        between their neighbors, and the clusters on both sides of these
+        borders are rebuilt.
+
+        input:
+            x_indices: x grid indices of the edited cells
+            y_indices: y grid indices of the edited cells
+            occupied: new state of the cells
+
+        output:
+            sorted list of the (cx, cy) indices of the rebuilt clusters
+        """
+        x_indices = np.atleast_1d(x_indices)
+        y_indices = np.atleast_1d(y_indices)
+        self.obstacle_map[x_indices, y_indices] = occupied
+
+        edited = set(zip((x_indices // self.cluster_size).tolist(),
+                         (y_indices // self.cluster_size).tolist()))
+        borders = set()
+        for cx, cy in edited:
+            borders.update(self.calc_cluster_borders(cx, cy))
+            if self.diagonal_moves:
+                # a corner transition between two neighbors is blocked or
+                # not by the cells of this cluster next to the corner
+                borders.update(
+                    (bx, by, 1, dy) for bx, by, dy in
+                    [(cx - 1, cy, 1), (cx - 1, cy, -1),
+                     (cx, cy - 1, 1), (cx, cy + 1, -1)]
+                    if 0 <= bx and bx + 1 < self.n_clusters_x and
+                    0 <= by < self.n_clusters_y and
+                    0 <= by + dy < self.n_clusters_y)
+        rebuilt = set(edited)
+        for border in borders:
+            self.update_border(border)
+            bx, by, dx, dy = border
+            rebuilt.update([(bx, by), (bx + dx, by + dy)])
+        for cx, cy in rebuilt:
+            self.update_cluster(cx, cy)
+
+        return sorted(rebuilt)
+
+    def search_abstract_graph(self, start, goal, start_edges, goal_edges):
+        """A* search on the abstract graph, returns the list of nodes"""
+        open_heap = [(self.calc_heuristic(start, goal), 0.0, start)]
+        costs, parents = {start: 0.0}, {start: None}
+        closed_set = set()
+        while open_heap:
+            _, cost, current = heapq.heappop(open_heap)
+            if current in closed_set:
+                continue  # outdated entry
+            if current == goal:
+                path = [goal]
+                while parents[path[-1]] is not None:
+                    path.append(parents[path[-1]])
+                return path[::-1]
+            closed_set.add(current)
+
+            edges = [self.inter_edges.get(current, {}).items(),
+                     self.intra_edges[self.calc_cluster(current)].get(
+                         current, {}).items()]
+            if current == start:
+                edges.append(start_edges.items())
+            if current in goal_edges:
+                edges.append([(goal, goal_edges[current])])
+            for items in edges:
+                for node, edge_cost in items:
+                    new_cost = cost + edge_cost
+                    if node in closed_set or new_cost >= costs.get(
+                            node, math.inf):
+                        continue
+                    costs[node], parents[node] = new_cost, current
+                    heapq.heappush(open_heap, (
+                        new_cost + self.calc_heuristic(node, goal),
+                        new_cost, node))
+        return None
+
+    def refine_path(self, abstract_path):
+        """Grid cells of an abstract path, from start to goal"""
+        path = [abstract_path[0]]
+        for a, b in zip(abstract_path[:-1], abstract_path[1:]):
+            a_cluster, b_cluster = self.calc_cluster(a), self.calc_cluster(b)
+            if b in self.inter_edges.get(a, {}):
+                path.append(b)  # transition to the adjacent cell
+                continue
+
+            x0, y0, x1, y1 = self.calc_cluster_bounds(a_cluster, b_cluster)
+            graph = occupancy_grid.calc_motion_graph(
+                self.obstacle_map[x0:x1, y0:y1], self.motion)
+            _, predecessors = csgraph_dijkstra(
+                graph, indices=self.to_local(a, x0, y0, y1 - y0),
+                return_predecessors=True)
+            segment = []
+            local = self.to_local(b, x0, y0, y1 - y0)
+            while local >= 0:
+                segment.append(self.to_global(local, x0, y0, y1 - y0))
+                local = predecessors[local]
+            path.extend(segment[-2::-1])
+        return path
+
+    def update_border(self, border):
+        """Recompute the transitions of a border between two clusters"""
+        for a, b in self.transitions.pop(border, ()):
+            del self.inter_edges[a][b], self.inter_edges[b][a]
+
+        cx, cy, dx, dy = border
+        if not (cx + dx < self.n_clusters_x and
+                0 <= cy + dy < self.n_clusters_y):
+            return
+        x0, y0, x1, y1 = self.calc_cluster_bounds((cx, cy))
+        if dx and dy:
+            cells = self.calc_corner_transition(x0, y0, x1, y1, dy)
+        elif dx:
+            # cells on both sides of the border line x = x1 - 1 | x1
+            cells = [((x1 - 1, y0 + i), (x1, y0 + j))
+                     for i, j in self.calc_entrance_offsets(
+                         ~self.obstacle_map[x1 - 1, y0:y1],
+                         ~self.obstacle_map[x1, y0:y1])]
+        else:
+            cells = [((x0 + i, y1 - 1), (x0 + j, y1))
+                     for i, j in self.calc_entrance_offsets(
+                         ~self.obstacle_map[x0:x1, y1 - 1],
+                         ~self.obstacle_map[x0:x1, y1])]
+
+        transitions = []
+        for (ax, ay), (bx, by) in cells:
+            a, b = self.calc_node(ax, ay), self.calc_node(bx, by)
+            transitions.append((a, b))
+            self.inter_edges.setdefault(a, {})[b] = \
+                self.move_costs[(bx - ax, by - ay)]
+            self.inter_edges.setdefault(b, {})[a] = \
+                self.move_costs[(ax - bx, ay - by)]
+        self.transitions[border] = transitions
+
+    def calc_entrance_offsets(self, a_free, b_free):
+        """
+        Transitions of a border from the free cells on both sides of it
+
+        output:
+            list of (i, j): the cell at offset i on the first side is
+            connected to the cell at offset j on the other side
+        """
+        # runs of free cell pairs are the entrances
+        free = a_free & b_free
+        steps = np.diff(np.concatenate(([0], free.astype(np.int8), [0])))
+        offsets = []
+        for first, end in zip(np.flatnonzero(steps == 1).tolist(),
+                              np.flatnonzero(steps == -1).tolist()):
+            if end - first >= self.WIDE_ENTRANCE:
+                offsets.extend([(first, first), (end - 1, end - 1)])
+            else:
+                offsets.append(((first + end - 1) // 2,) * 2)
+
+        if self.diagonal_moves:
+            # a diagonal move across the border is only needed when no free
+            # cell pair next to it is an entrance
+            no_entrance = ~(free[:-1] | free[1:])
+            offsets.extend((int(i), int(i) + 1) for i in np.flatnonzero(
+                no_entrance & a_free[:-1] & b_free[1:]))
+            offsets.extend((int(i) + 1, int(i)) for i in np.flatnonzero(
+                no_entrance & a_free[1:] & b_free[:-1]))
+        return offsets
+
+    def calc_corner_transition(self, x0, y0, x1, y1, dy):
+        """
+        Diagonal transition at the corner between a cluster and the cluster
+        (1, dy) next to it, if the path around the corner is blocked
+        """
+        if dy > 0:
+            a, b = (x1 - 1, y1 - 1), (x1, y1)
+        else:
+            a, b = (x1 - 1, y0), (x1, y0 - 1)
+        if self.obstacle_map[a] or self.obstacle_map[b] or not (
+                self.obstacle_map[b[0], a[1]] and
+                self.obstacle_map[a[0], b[1]]):
+            return []
+        return [(a, b)]
+
+    def update_cluster(self, cx, cy):
+        """Recompute the abstract graph edges inside a cluster"""
+        nodes = self.calc_cluster_nodes(cx, cy)
+        edges = {n: {} for n in nodes}
+        if len(nodes) > 1:
+            x0, y0, x1, y1 = self.calc_cluster_bounds((cx, cy))
+            graph = occupancy_grid.calc_motion_graph(
+                self.obstacle_map[x0:x1, y0:y1], self.motion)
+            local = [self.to_local(n, x0, y0, y1 - y0) for n in nodes]
+            costs = csgraph_dijkstra(graph, indices=local)[:, local]
+            for a, row in zip(nodes, costs.tolist()):
+                edges[a] = {b: cost for b, cost in zip(nodes, row)
+                            if b != a and cost != math.inf}
+        self.intra_edges[(cx, cy)] = edges
+
+    def calc_cluster_costs(self, cluster, source, reverse=False,
+                           other_cluster=None):
+        """
+        Path costs from a cell to the cells of its cluster, or from the
+        cells to it with reverse=True
+
+        other_cluster: search the bounding box of both clusters instead
+
+        output:
+            dict {node: cost} of the reachable cells
+        """
+        x0, y0, x1, y1 = self.calc_cluster_bounds(
+            cluster, other_cluster or cluster)
+        graph = occupancy_grid.calc_motion_graph(
+            self.obstacle_map[x0:x1, y0:y1], self.motion)
+        if reverse:
+            graph = graph.T.tocsr()
+        costs = csgraph_dijkstra(
+            graph, indices=self.to_local(source, x0, y0, y1 - y0))
+        return {self.to_global(int(i), x0, y0, y1 - y0): float(costs[i])
+                for i in np.flatnonzero(np.isfinite(costs))}
+
+    def calc_cluster_nodes(self, cx, cy):
+        """Abstract graph nodes of a cluster"""
+        nodes = set()
+        for border in self.calc_cluster_borders(cx, cy):
+            # the first cell of a transition is in cluster border[:2]
+            side = 0 if border[:2] == (cx, cy) else 1
+            nodes.update(t[side] for t in self.transitions.get(border, ()))
+        return sorted(nodes)
+
+    def calc_cluster_borders(self, cx, cy):
+        """Keys of the borders of a cluster to its existing neighbors"""
+        borders = []
+        if cx + 1 < self.n_clusters_x:
+            borders.append((cx, cy, 1, 0))
+        if cy + 1 < self.n_clusters_y:
+            borders.append((cx, cy, 0, 1))
+        if cx > 0:
+            borders.append((cx - 1, cy, 1, 0))
+        if cy > 0:
+            borders.append((cx, cy - 1, 0, 1))
+        if self.diagonal_moves:
+            # corners to the diagonal neighbors, keyed by the left cluster
+            if cx + 1 < self.n_clusters_x and cy + 1 < self.n_clusters_y:
+                borders.append((cx, cy, 1, 1))
+            if cx + 1 < self.n_clusters_x and cy > 0:
+                borders.append((cx, cy, 1, -1))
+            if cx > 0 and cy > 0:
+                borders.append((cx - 1, cy - 1, 1, 1))
+            if cx > 0 and cy + 1 < self.n_clusters_y:
+                borders.append((cx - 1, cy + 1, 1, -1))
+        return borders
+
+    def calc_cluster_bounds(self, *clusters):
+        """Grid index range [x0, x1) x [y0, y1) covering clusters"""
+        cs = self.cluster_size
+        cxs, cys = [c[0] for c in clusters], [c[1] for c in clusters]
+        return (min(cxs) * cs, min(cys) * cs,
+                min((max(cxs) + 1) * cs, self.x_width),
+                min((max(cys) + 1) * cs, self.y_width))
+
+    def calc_cluster(self, node):
+        ix, iy = divmod(node, self.y_width)
+        return ix // self.cluster_size, iy // self.cluster_size
+
+    def calc_node(self, ix, iy):
+        if 0 <= ix < self.x_width and 0 <= iy < self.y_width:
+            return ix * self.y_width + iy
+        return None
+
+    def to_local(self, node, x0, y0, height):
+        ix, iy = divmod(node, self.y_width)
+        return (ix - x0) * height + iy - y0
+
+    def to_global(self, local, x0, y0, height):
+        ix, iy = divmod(local, height)
+        return (ix + x0) * self.y_width + iy + y0
+
+    def calc_heuristic(self, a, b):
+        ax, ay = divmod(a, self.y_width)
+        bx, by = divmod(b, self.y_width)
+        return math.hypot(ax - bx, ay - by)
+
+
+def main():
+    print(__file__ + " start!!")
+
+    # start and goal position
+    sx = 10.0  # [m]
+    sy = 10.0  # [m]
+    gx = 50.0  # [m]
+    gy = 50.0  # [m]
+    grid_size = 2.0  # [m]
+    robot_radius = 1.0  # [m]
+
+    # set obstacle positions
+    ox, oy = [], []
+    for i in range(-10, 60):
+        ox.append(i)
+        oy.append(-10.0)
+    for i in range(-10, 60):
+        ox.append(60.0)
+        oy.append(i)
+    for i in range(-10, 61):
+        ox.append(i)
+        oy.append(60.0)
+    for i in range(-10, 61):
+        ox.append(-10.0)
+        oy.append(i)
+    for i in range(-10, 40):
+        ox.append(20.0)
+        oy.append(i)
+    for i in range(0, 40):
+        ox.append(40.0)
+        oy.append(60.0 - i)
+
+    a_star = AStarPlanner(ox, oy, grid_size, robot_radius)
+    hpa_star = HierarchicalAStarPlanner(a_star, cluster_size=8)
+    rx, ry = hpa_star.planning(sx, sy, gx, gy)
+
+    if show_animation:  # pragma: no cover
+        plt.plot(ox, oy, ".k")
+        plt.plot(sx, sy, "og")
+        plt.plot(gx, gy, "xb")
+        for node in hpa_star.inter_edges:
+            ix, iy = divmod(node, hpa_star.y_width)
+            plt.plot(a_star.calc_grid_position(ix, a_star.min_x),
+                     a_star.calc_grid_position(iy, a_star.min_y), ".c")
+        plt.plot(rx, ry, "-r")
+        plt.grid(True)
+        plt.axis("equal")
+        plt.show()
+
+
+if __name__ == '__main__':
+    main()
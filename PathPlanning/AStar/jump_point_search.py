@@ -0,0 +1,244 @@
+"""
+
+Jump point search (JPS) and JPS+ successor generation on an occupancy grid
+
+The grid is 8-connected and diagonal moves may cut corners, the same as the
+motion model of AStarPlanner, so jump point search finds paths of the same
+cost as a plain A* search while expanding far fewer nodes on open areas.
+
+Ref:
+
+- [Online Graph Pruning for Pathfinding on Grid Maps]
+(https://users.cecs.anu.edu.au/~dharabor/data/papers/harabor-grastien-aaai11.pdf)
+- [JPS+: An Extreme A* Speed Optimization for Static Uniform Cost Grids]
+(Steve Rabin, Game AI Pro 2, 2015)
+
+"""
+
+import math
+
+import numpy as np
+
+# dx, dy of the 8 search directions
+DIRECTIONS = [(1, 0), (0, 1), (-1, 0), (0, -1),
+              (1, 1), (-1, 1), (1, -1), (-1, -1)]
+
+
+class JumpPointSearch:
+
+    def __init__(self, obstacle_map, use_jump_distances=False):
+        """
+        Prepare jump point search on an obstacle map
+
+        obstacle_map: (x_width, y_width) boolean array, True for obstacles
+        use_jump_distances: precompute the JPS+ jump distance table, so a
+            jump is a table lookup instead of a scan over the grid
+        """
+        self.obstacle_map = obstacle_map
+        obstacle_map = np.asarray(obstacle_map, dtype=bool)
+        self.x_width, self.y_width = obstacle_map.shape
+
+        # flat grid with a border of obstacles, indexed by
+        # (ix + 1) * stride + (iy + 1). The border removes bounds checks.
+        self.stride = self.y_width + 2
+        padded = np.pad(obstacle_map, 1, constant_values=True)
+        self.blocked = padded.astype(np.uint8).tobytes()
+
+        self.jump_distances = None
+        if use_jump_distances:
+            self.jump_distances = {
+                d: calc_jump_distances(obstacle_map, d).tolist()
+                for d in DIRECTIONS}
+
+    def successors(self, x, y, parent_x, parent_y, goal_x, goal_y):
+        """
+        Jump points reachable from a node
+
+        input:
+            x, y: grid index of the node
+            parent_x, parent_y: grid index of its parent, None for the start
+            goal_x, goal_y: grid index of the goal
+
+        output:
+            list of (x, y, cost) of the jump points
+        """
+        if not (0 <= x < self.x_width and 0 <= y < self.y_width):
+            # a start outside of the grid can only step into the grid
+            return [(x + dx, y + dy, math.hypot(dx, dy))
+                    for dx, dy in DIRECTIONS
+                    if 0 <= x + dx < self.x_width and
+                    0 <= y + dy < self.y_width and
+                    not self.blocked[self.index(x + dx, y + dy)]]
+
+        result = []
+        for dx, dy in self.pruned_directions(x, y, parent_x, parent_y):
+            if self.jump_distances is None:
+                jump = self.jump(x, y, dx, dy, goal_x, goal_y)
+            else:
+                jump = self.jump_by_table(x, y, dx, dy, goal_x, goal_y)
+            if jump is None:
+                continue
+            jx, jy = jump
+            n_straight = abs(abs(jx - x) - abs(jy - y))
+            n_diagonal = min(abs(jx - x), abs(jy - y))
+            result.append((jx, jy, n_straight + n_diagonal * math.sqrt(2)))
+        return result
+
+    def pruned_directions(self, x, y, parent_x, parent_y):
+        """Natural and forced neighbor directions of a node"""
+        if parent_x is None:
+            return DIRECTIONS
+
+        dx = (x > parent_x) - (x < parent_x)
+        dy = (y > parent_y) - (y < parent_y)
+        b, idx = self.blocked, self.index(x, y)
+        s = self.stride
+        if dx != 0 and dy != 0:
+            directions = [(dx, 0), (0, dy), (dx, dy)]
+            if b[idx - dx * s]:
+                directions.append((-dx, dy))
+            if b[idx - dy]:
+                directions.append((dx, -dy))
+        elif dx != 0:
+            directions = [(dx, 0)]
+            if b[idx + 1]:
+                directions.append((dx, 1))
+            if b[idx - 1]:
+                directions.append((dx, -1))
+        else:
+            directions = [(0, dy)]
+            if b[idx + s]:
+                directions.append((1, dy))
+            if b[idx - s]:
+                directions.append((-1, dy))
+        return directions
+
+    def index(self, x, y):
+        return (x + 1) * self.stride + (y + 1)
+
+    def jump(self, x, y, dx, dy, goal_x, goal_y):
+        """Scan from (x, y) in direction (dx, dy) for the next jump point"""
+        idx = self.index(x, y)
+        goal = self.index(goal_x, goal_y)
+        if dx != 0 and dy != 0:
+            idx = self.jump_diagonal(idx, dx * self.stride, dy, goal)
+        elif dx != 0:
+            idx = self.jump_straight(idx, dx * self.stride, 1, goal)
+        else:
+            idx = self.jump_straight(idx, dy, self.stride, goal)
+
+        if idx < 0:
+            return None
+        return idx // self.stride - 1, idx % self.stride - 1
+
+    def jump_straight(self, idx, step, side, goal):
+        b = self.blocked
+        while True:
+            idx += step
+            if b[idx]:
+                return -1
+            if idx == goal:
+                return idx
+            # a forced neighbor is next to an obstacle beside the line
+            if (b[idx + side] and not b[idx + side + step]) or \
+                    (b[idx - side] and not b[idx - side + step]):
+                return idx
+
+    def jump_diagonal(self, idx, step_x, step_y, goal):
+        b, s = self.blocked, self.stride
+        while True:
+            idx += step_x + step_y
+            if b[idx]:
+                return -1
+            if idx == goal:
+                return idx
+            if (b[idx - step_x] and not b[idx - step_x + step_y]) or \
+                    (b[idx - step_y] and not b[idx + step_x - step_y]):
+                return idx
+            if self.jump_straight(idx, step_x, 1, goal) >= 0 or \
+                    self.jump_straight(idx, step_y, s, goal) >= 0:
+                return idx
+
+    def jump_by_table(self, x, y, dx, dy, goal_x, goal_y):
+        """JPS+ jump with the precomputed jump distances and the goal"""
+        dist = self.jump_distances[(dx, dy)][x][y]
+        to_goal_x, to_goal_y = (goal_x - x) * dx, (goal_y - y) * dy
+        if dx != 0 and dy != 0:
+            # stop on the row or column of a goal in this quadrant
+            n_goal = min(to_goal_x, to_goal_y)
+            if n_goal > 0 and n_goal <= abs(dist):
+                return x + n_goal * dx, y + n_goal * dy
+        elif dx != 0:
+            if goal_y == y and 0 < to_goal_x <= abs(dist):
+                return goal_x, goal_y
+        elif goal_x == x and 0 < to_goal_y <= abs(dist):
+            return goal_x, goal_y
+
+        if dist <= 0:
+            return None
+        return x + dist * dx, y + dist * dy
+
+
+def calc_jump_distances(obstacle_map, direction):
+    """
+    JPS+ jump distance table of one direction
+
+    A positive value k means that the next jump point is k cells away,
+    otherwise an obstacle or the map border follows after -k free cells.
+
+    input:
+        obstacle_map: (x_width, y_width) boolean array, True for obstacles
+        direction: (dx, dy) of the direction
+
+    output:
+        (x_width, y_width) integer array of the jump distances
+    """
+    dx, dy = direction
+    # mirror the map, so the direction becomes (1, 0), (0, 1) or (1, 1)
+    flip_x = -1 if dx < 0 else 1
+    flip_y = -1 if dy < 0 else 1
+    grid = obstacle_map[::flip_x, ::flip_y]
+    if dx != 0 and dy != 0:
+        dist = _diagonal_jump_distances(
+            grid, _straight_jump_distances(grid),
+            _straight_jump_distances(grid.T).T)
+    elif dx != 0:
+        dist = _straight_jump_distances(grid)
+    else:
+        dist = _straight_jump_distances(grid.T).T
+    return dist[::flip_x, ::flip_y]
+
+
+def _straight_jump_distances(obstacle_map):
+    # jump distances towards +x, computed column by column from the far end
+    x_width, y_width = obstacle_map.shape
+    b = np.pad(obstacle_map, 2, constant_values=True)
+    dist = np.zeros((x_width + 1, y_width), dtype=np.int32)
+    ys = slice(2, y_width + 2)
+    for x in range(x_width - 1, -1, -1):
+        n = x + 3  # padded x index of the next cell
+        forced = (b[n, 3:y_width + 3] & ~b[n + 1, 3:y_width + 3]) | \
+                 (b[n, 1:y_width + 1] & ~b[n + 1, 1:y_width + 1])
+        d_next = dist[x + 1]
+        dist[x] = np.where(b[n, ys], 0, np.where(
+            forced, 1, np.where(d_next > 0, d_next + 1, d_next - 1)))
+    return dist[:x_width]
+
+
+def _diagonal_jump_distances(obstacle_map, dist_x, dist_y):
+    # jump distances towards (+x, +y), computed column by column from the
+    # far end. dist_x and dist_y are the straight jump distances.
+    x_width, y_width = obstacle_map.shape
+    b = np.pad(obstacle_map, 2, constant_values=True)
+    dist = np.zeros((x_width + 1, y_width + 1), dtype=np.int32)
+    straight = np.zeros((x_width + 1, y_width + 1), dtype=bool)
+    straight[:x_width, :y_width] = (dist_x > 0) | (dist_y > 0)
+    for x in range(x_width - 1, -1, -1):
+        n = x + 3  # padded x index of the next cell (x + 1, y + 1)
+        forced = (b[n - 1, 3:y_width + 3] & ~b[n - 1, 4:y_width + 4]) | \
+                 (b[n, 2:y_width + 2] & ~b[n + 1, 2:y_width + 2])
+        d_next = dist[x + 1, 1:]
+        dist[x, :y_width] = np.where(b[n, 3:y_width + 3], 0, np.where(
+            forced | straight[x + 1, 1:], 1,
+            np.where(d_next > 0, d_next + 1, d_next - 1)))
+    return dist[:x_width, :y_width]
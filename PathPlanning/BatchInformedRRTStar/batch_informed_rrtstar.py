@@ -8,17 +8,25 @@ methods.
 Uses lazy connecting by combining sampling based methods and A*
 like incremental graph search algorithms.
 
+The vertex and edge queues are binary heaps with lazy invalidation:
+removed entries and entries with an outdated cost stay in the heap and are
+skipped when they reach the top. The samples of a batch are drawn in one
+vectorized call and kept in a KD-tree, so batches of 10k samples are
+practical.
+
 author: Karan Chawla(@karanchawla)
         Atsushi Sakai(@Atsushi_twi)
 
 Reference: https://arxiv.org/abs/1405.5848
 """
 
+import heapq
 import math
 import random
 
 import matplotlib.pyplot as plt
 import numpy as np
+from scipy.spatial import cKDTree
 
 show_animation = True
 
@@ -131,32 +139,67 @@ class RTree:
         return self.grid_coord_to_real_world_coord(
             self.node_id_to_grid_coord(nid))
 
+    def real_world_to_node_ids(self, real_coords):
+        # vectorized real_world_to_node_id of an array with one
+        # configuration per row
+        coords = np.around((np.asarray(real_coords) - self.lowerLimit)
+                           / self.resolution).astype(int)
+        node_ids = np.zeros(len(coords))
+        for i in range(self.dimension - 1, -1, -1):
+            node_ids = node_ids + coords[:, i] * np.prod(self.num_cells[:i])
+        return node_ids
+
+    def node_ids_to_real_world_coords(self, node_ids):
+        # vectorized node_id_to_real_world_coord, returns one configuration
+        # per row
+        node_ids = np.array(node_ids, dtype=float)
+        coords = np.empty((len(node_ids), self.dimension))
+        for i in range(self.dimension - 1, -1, -1):
+            prod = np.prod(self.num_cells[:i])
+            coords[:, i] = np.floor(node_ids / prod)
+            node_ids = node_ids - coords[:, i] * prod
+        return np.asarray(self.lowerLimit) + self.resolution * coords
+
 
 class BITStar:
 
     def __init__(self, start, goal,
                  obstacleList, randArea, eta=2.0,
-                 maxIter=80):
+                 maxIter=80, batchSize=200):
         self.start = start
         self.goal = goal
 
         self.min_rand = randArea[0]
         self.max_rand = randArea[1]
         self.max_iIter = maxIter
+        # number of samples of a batch, half of it while no path is found
+        self.batch_size = batchSize
         self.obstacleList = obstacleList
         self.startId = None
         self.goalId = None
 
+        # heaps of (g + h, vertex id) and (g + c + h, vertex id, sample id)
+        # entries, the queued vertices and edges are the keys of the value
+        # dicts and the heap entries with another value are stale
         self.vertex_queue = []
+        self.vertex_queue_values = dict()
         self.edge_queue = []
+        self.edge_queue_values = dict()
         self.samples = dict()
+        # KD-tree of the samples, rebuilt after new samples are added
+        self.sample_index = None
+        self.sample_ids = []
+        self.sample_coords = None
+        # node coordinates by node id, see get_coord
+        self.coords = dict()
         self.g_scores = dict()
         self.f_scores = dict()
         self.nodes = dict()
+        # connection radius of a batch, see calc_radius
         self.r = float('inf')
         self.eta = eta  # tunable parameter
-        self.unit_ball_measure = 1
-        self.old_vertices = []
+        self.unit_ball_measure = math.pi
+        self.old_vertices = set()
 
         # initialize tree
         lowerLimit = [randArea[0], randArea[0]]
@@ -199,57 +242,81 @@ class BITStar:
                    Vh)
 
         self.samples.update(self.informed_sample(
-            200, cBest, cMin, xCenter, C))
+            self.batch_size, cBest, cMin, xCenter, C))
+        self.sample_index = None
 
         return eTheta, cMin, xCenter, C, cBest
 
     def setup_sample(self, iterations, foundGoal, cMin, xCenter, C, cBest):
 
-        if len(self.vertex_queue) == 0 and len(self.edge_queue) == 0:
+        if not self.vertex_queue_values and not self.edge_queue_values:
             print("Batch: ", iterations)
             # Using informed rrt star way of computing the samples
-            self.r = 2.0
             if iterations != 0:
                 if foundGoal:
                     # a better way to do this would be to make number of samples
                     # a function of cMin
-                    m = 200
+                    m = self.batch_size
                     self.samples = dict()
                     self.samples[self.goalId] = self.goal
                 else:
-                    m = 100
+                    m = self.batch_size // 2
                 cBest = self.g_scores[self.goalId]
                 self.samples.update(self.informed_sample(
                     m, cBest, cMin, xCenter, C))
+                self.sample_index = None
+            self.r = self.calc_radius(cBest, cMin)
 
             # make the old vertices the new vertices
-            self.old_vertices += self.tree.vertices.keys()
+            self.old_vertices.update(self.tree.vertices.keys())
             # add the vertices to the vertex queue
             for nid in self.tree.vertices.keys():
-                if nid not in self.vertex_queue:
-                    self.vertex_queue.append(nid)
+                if nid not in self.vertex_queue_values:
+                    self.push_vertex(nid)
         return cBest
 
+    def calc_radius(self, cBest, cMin):
+        # radius of BIT*, which shrinks with the number of samples and
+        # vertices q like 2 eta ((1 + 1/d) lambda / zeta log(q) / q)^(1/d),
+        # where lambda is the measure of the informed set
+        q = len(self.samples) + len(self.tree.vertices)
+        measure = (self.max_rand - self.min_rand) ** 2
+        if cBest < float('inf'):
+            measure = min(measure, math.pi * cBest * math.sqrt(
+                max(cBest ** 2 - cMin ** 2, 0.0)) / 4.0)
+        return 2.0 * self.eta * math.sqrt(
+            1.5 * measure / self.unit_ball_measure * math.log(q) / q)
+
     def plan(self, animation=True):
 
         eTheta, cMin, xCenter, C, cBest = self.setup_planning()
         iterations = 0
 
         foundGoal = False
-        # run until done
-        while iterations < self.max_iIter:
+        # run until done, but let a batch that is still looking for the
+        # first path finish, as its number of edges grows with the batch size
+        while iterations < self.max_iIter or not foundGoal and (
+                self.vertex_queue_values or self.edge_queue_values):
             cBest = self.setup_sample(iterations,
                                       foundGoal, cMin, xCenter, C, cBest)
             # expand the best vertices until an edge is better than the vertex
             # this is done because the vertex cost represents the lower bound
             # on the edge cost
-            while self.best_vertex_queue_value() <= \
+            while self.vertex_queue_values and \
+                    self.best_vertex_queue_value() <= \
                     self.best_edge_queue_value():
                 self.expand_vertex(self.best_in_vertex_queue())
 
             # add the best edge to the tree
             bestEdge = self.best_in_edge_queue()
-            self.edge_queue.remove(bestEdge)
+            if bestEdge is None:
+                # no sample in reach of the tree, start a new batch
+                iterations += 1
+                continue
+            self.remove_edge(bestEdge)
+            if bestEdge[1] in self.tree.vertices:
+                # the sample was connected by another edge
+                continue
 
             # Check if this can improve the current solution
             estimatedCostOfVertex = self.g_scores[bestEdge[
@@ -270,43 +337,32 @@ class BITStar:
 
             if f1 and f2 and f3:
                 # connect this edge
-                firstCoord = self.tree.node_id_to_real_world_coord(
-                    bestEdge[0])
-                secondCoord = self.tree.node_id_to_real_world_coord(
-                    bestEdge[1])
+                firstCoord = self.get_coord(bestEdge[0])
+                secondCoord = self.get_coord(bestEdge[1])
                 path = self.connect(firstCoord, secondCoord)
-                lastEdge = self.tree.real_world_to_node_id(secondCoord)
-                if path is None or len(path) == 0:
+                if path is None or len(path) < 2:
                     continue
                 nextCoord = path[len(path) - 1, :]
                 nextCoordPathId = self.tree.real_world_to_node_id(
                     nextCoord)
-                bestEdge = (bestEdge[0], nextCoordPathId)
-                if bestEdge[1] in self.tree.vertices.keys():
+                if nextCoordPathId != bestEdge[1]:
+                    # the edge collides, its sample stays a sample instead
+                    # of adding a vertex in front of the obstacle
                     continue
-                else:
-                    try:
-                        del self.samples[bestEdge[1]]
-                    except KeyError:
-                        # invalid sample key
-                        pass
-                    eid = self.tree.add_vertex(nextCoord)
-                    self.vertex_queue.append(eid)
+                try:
+                    del self.samples[bestEdge[1]]
+                except KeyError:
+                    # invalid sample key
+                    pass
+                eid = self.tree.add_vertex(nextCoord)
                 if eid == self.goalId or bestEdge[0] == self.goalId or \
                         bestEdge[1] == self.goalId:
                     print("Goal found")
                     foundGoal = True
 
                 self.tree.add_edge(bestEdge[0], bestEdge[1])
-
-                g_score = self.compute_distance_cost(
-                    bestEdge[0], bestEdge[1])
-                self.g_scores[bestEdge[1]] = g_score + self.g_scores[
-                    bestEdge[0]]
-                self.f_scores[
-                    bestEdge[1]] = g_score + self.compute_heuristic_cost(
-                    bestEdge[1], self.goalId)
-                self.update_graph()
+                self.update_graph(bestEdge[0], bestEdge[1])
+                self.push_vertex(eid)
 
                 # visualize new edge
                 if animation:
@@ -315,12 +371,9 @@ class BITStar:
                                     samples=self.samples.values(),
                                     start=firstCoord, end=secondCoord)
 
-                self.remove_queue(lastEdge, bestEdge)
-
             else:
                 print("Nothing good")
-                self.edge_queue = []
-                self.vertex_queue = []
+                self.clear_queues()
 
             iterations += 1
 
@@ -343,89 +396,82 @@ class BITStar:
 
         return plan
 
-    def remove_queue(self, lastEdge, bestEdge):
-        for edge in self.edge_queue:
-            if edge[1] == bestEdge[1]:
-                dist_cost = self.compute_distance_cost(edge[1], bestEdge[1])
-                if self.g_scores[edge[1]] + dist_cost >= \
-                        self.g_scores[self.goalId]:
-                    if (lastEdge, bestEdge[1]) in self.edge_queue:
-                        self.edge_queue.remove(
-                            (lastEdge, bestEdge[1]))
-
     def connect(self, start, end):
         # A function which attempts to extend from a start coordinates
         # to goal coordinates
-        steps = int(self.compute_distance_cost(
-            self.tree.real_world_to_node_id(start),
-            self.tree.real_world_to_node_id(end)) * 10)
+        # at least both ends, so that short edges can connect
+        steps = max(int(math.dist(start, end) * 10), 2)
         x = np.linspace(start[0], end[0], num=steps)
         y = np.linspace(start[1], end[1], num=steps)
-        for i in range(len(x)):
-            if self._collision_check(x[i], y[i]):
-                if i == 0:
-                    return None
-                # if collision, send path until collision
-                return np.vstack((x[0:i], y[0:i])).transpose()
+        collisions = np.flatnonzero(self._collision_check(x, y))
+        if len(collisions) > 0:
+            i = collisions[0]
+            if i == 0:
+                return None
+            # if collision, send path until collision
+            return np.vstack((x[0:i], y[0:i])).transpose()
 
         return np.vstack((x, y)).transpose()
 
     def _collision_check(self, x, y):
-        for (ox, oy, size) in self.obstacleList:
-            dx = ox - x
-            dy = oy - y
-            d = dx * dx + dy * dy
-            if d <= size ** 2:
-                return True  # collision
-        return False
+        # True for the points x, y inside an obstacle
+        obstacles = np.array(self.obstacleList, dtype=float).reshape(-1, 3)
+        dx = np.subtract.outer(x, obstacles[:, 0])
+        dy = np.subtract.outer(y, obstacles[:, 1])
+        return (dx * dx + dy * dy <= obstacles[:, 2] ** 2).any(axis=-1)
+
+    def get_coord(self, nid):
+        # grid coordinates of a node id, cached as the conversion is slow
+        coord = self.coords.get(nid)
+        if coord is None:
+            coord = tuple(self.tree.node_id_to_real_world_coord(nid))
+            self.coords[nid] = coord
+        return coord
 
     def compute_heuristic_cost(self, start_id, goal_id):
-        # Using Manhattan distance as heuristic
-        start = np.array(self.tree.node_id_to_real_world_coord(start_id))
-        goal = np.array(self.tree.node_id_to_real_world_coord(goal_id))
+        # Using Euclidean distance as heuristic
+        start = self.get_coord(start_id)
+        goal = self.get_coord(goal_id)
 
-        return np.linalg.norm(start - goal, 2)
+        return math.dist(start, goal)
 
     def compute_distance_cost(self, vid, xid):
         # L2 norm distance
-        start = np.array(self.tree.node_id_to_real_world_coord(vid))
-        stop = np.array(self.tree.node_id_to_real_world_coord(xid))
+        start = self.get_coord(vid)
+        stop = self.get_coord(xid)
 
-        return np.linalg.norm(stop - start, 2)
+        return math.dist(start, stop)
 
     # Sample free space confined in the radius of ball R
     def informed_sample(self, m, cMax, cMin, xCenter, C):
-        samples = dict()
         print("g_Score goal id: ", self.g_scores[self.goalId])
-        for i in range(m + 1):
-            if cMax < float('inf'):
-                r = [cMax / 2.0,
-                     math.sqrt(cMax ** 2 - cMin ** 2) / 2.0,
-                     math.sqrt(cMax ** 2 - cMin ** 2) / 2.0]
-                L = np.diag(r)
-                xBall = self.sample_unit_ball()
-                rnd = np.dot(np.dot(C, L), xBall) + xCenter
-                rnd = [rnd[(0, 0)], rnd[(1, 0)]]
-                random_id = self.tree.real_world_to_node_id(rnd)
-                samples[random_id] = rnd
-            else:
-                rnd = self.sample_free_space()
-                random_id = self.tree.real_world_to_node_id(rnd)
-                samples[random_id] = rnd
-        return samples
-
-    # Sample point in a unit ball
+        # a numpy generator seeded from random, so that random.seed still
+        # makes the batches reproducible
+        rng = np.random.default_rng(random.getrandbits(64))
+        if cMax < float('inf'):
+            r = [cMax / 2.0,
+                 math.sqrt(cMax ** 2 - cMin ** 2) / 2.0,
+                 math.sqrt(cMax ** 2 - cMin ** 2) / 2.0]
+            L = np.diag(r)
+            xBall = self.sample_unit_ball(m + 1, rng)
+            rnd = (np.dot(np.dot(C, L), xBall) + xCenter)[:2].T
+        else:
+            rnd = rng.uniform(self.min_rand, self.max_rand, (m + 1, 2))
+
+        random_ids = self.tree.real_world_to_node_ids(rnd).tolist()
+        self.coords.update(zip(random_ids, map(
+            tuple, self.tree.node_ids_to_real_world_coords(
+                random_ids).tolist())))
+        return dict(zip(random_ids, rnd.tolist()))
+
+    # Sample n points in a unit ball, one per column
     @staticmethod
-    def sample_unit_ball():
-        a = random.random()
-        b = random.random()
-
-        if b < a:
-            a, b = b, a
+    def sample_unit_ball(n, rng):
+        a, b = np.sort(rng.random((2, n)), axis=0)
 
-        sample = (b * math.cos(2 * math.pi * a / b),
-                  b * math.sin(2 * math.pi * a / b))
-        return np.array([[sample[0]], [sample[1]], [0]])
+        return np.array([b * np.cos(2 * math.pi * a / b),
+                         b * np.sin(2 * math.pi * a / b),
+                         np.zeros(n)])
 
     def sample_free_space(self):
         rnd = [random.uniform(self.min_rand, self.max_rand),
@@ -433,134 +479,118 @@ class BITStar:
 
         return rnd
 
+    def push_vertex(self, vid):
+        value = self.g_scores[vid] + self.compute_heuristic_cost(
+            vid, self.goalId)
+        self.vertex_queue_values[vid] = value
+        heapq.heappush(self.vertex_queue, (value, vid))
+
+    def push_edge(self, vid, xid, value=None):
+        if value is None:
+            value = self.g_scores[vid] + self.compute_distance_cost(
+                vid, xid) + self.compute_heuristic_cost(xid, self.goalId)
+        self.edge_queue_values[(vid, xid)] = value
+        heapq.heappush(self.edge_queue, (value, vid, xid))
+
+    def remove_edge(self, edge):
+        # the heap entry of the edge turns stale
+        del self.edge_queue_values[edge]
+
+    def clear_queues(self):
+        self.vertex_queue = []
+        self.vertex_queue_values = dict()
+        self.edge_queue = []
+        self.edge_queue_values = dict()
+
+    def prune_vertex_queue(self):
+        # drop the stale entries on top of the vertex queue
+        while self.vertex_queue and self.vertex_queue_values.get(
+                self.vertex_queue[0][1]) != self.vertex_queue[0][0]:
+            heapq.heappop(self.vertex_queue)
+
+    def prune_edge_queue(self):
+        # drop the stale entries on top of the edge queue
+        while self.edge_queue:
+            value, vid, xid = self.edge_queue[0]
+            if self.edge_queue_values.get((vid, xid)) == value:
+                return
+            heapq.heappop(self.edge_queue)
+
     def best_vertex_queue_value(self):
+        self.prune_vertex_queue()
         if len(self.vertex_queue) == 0:
             return float('inf')
-        values = [self.g_scores[v]
-                  + self.compute_heuristic_cost(v, self.goalId) for v in
-                  self.vertex_queue]
-        values.sort()
-        return values[0]
+        return self.vertex_queue[0][0]
 
     def best_edge_queue_value(self):
+        # return the best value in the queue by score g_tau[v] + c(v,x) + h(x)
+        self.prune_edge_queue()
         if len(self.edge_queue) == 0:
             return float('inf')
-        # return the best value in the queue by score g_tau[v] + c(v,x) + h(x)
-        values = [self.g_scores[e[0]] + self.compute_distance_cost(e[0], e[1])
-                  + self.compute_heuristic_cost(e[1], self.goalId) for e in
-                  self.edge_queue]
-        values.sort(reverse=True)
-        return values[0]
+        return self.edge_queue[0][0]
 
     def best_in_vertex_queue(self):
         # return the best value in the vertex queue
-        v_plus_values = [(v, self.g_scores[v] +
-                          self.compute_heuristic_cost(v, self.goalId))
-                         for v in self.vertex_queue]
-        v_plus_values = sorted(v_plus_values, key=lambda x: x[1])
-        # print(v_plus_values)
-        return v_plus_values[0][0]
+        self.prune_vertex_queue()
+        return self.vertex_queue[0][1]
 
     def best_in_edge_queue(self):
-        e_and_values = [
-            (e[0], e[1], self.g_scores[e[0]] + self.compute_distance_cost(
-                e[0], e[1]) + self.compute_heuristic_cost(e[1], self.goalId))
-            for e in self.edge_queue]
-        e_and_values = sorted(e_and_values, key=lambda x: x[2])
-
-        return e_and_values[0][0], e_and_values[0][1]
+        # return the best edge of the edge queue, None if it is empty
+        self.prune_edge_queue()
+        if len(self.edge_queue) == 0:
+            return None
+        _, vid, xid = self.edge_queue[0]
+        return vid, xid
+
+    def update_sample_index(self):
+        if self.sample_index is not None:
+            return
+        self.sample_ids = list(self.samples.keys())
+        self.sample_index = cKDTree(
+            np.array(list(self.samples.values()), dtype=float).reshape(-1, 2))
+        self.sample_coords = np.array(
+            [self.get_coord(sid) for sid in self.sample_ids]).reshape(-1, 2)
 
     def expand_vertex(self, vid):
-        self.vertex_queue.remove(vid)
+        del self.vertex_queue_values[vid]
 
         # get the coordinates for given vid
-        currCoord = np.array(self.tree.node_id_to_real_world_coord(vid))
+        currCoord = np.array(self.get_coord(vid))
 
-        # get the nearest value in vertex for every one in samples where difference is
-        # less than the radius
-        neighbors = []
-        for sid, s_coord in self.samples.items():
-            s_coord = np.array(s_coord)
-            if np.linalg.norm(s_coord - currCoord, 2) <= self.r and sid != vid:
-                neighbors.append((sid, s_coord))
+        # get the samples whose sampled coordinates are within the radius,
+        # the samples connected since the index was built are skipped
+        self.update_sample_index()
+        inds = [i for i in sorted(self.sample_index.query_ball_point(
+                    currCoord, self.r))
+                if self.sample_ids[i] != vid and
+                self.sample_ids[i] in self.samples]
 
         # add an edge to the edge queue is the path might improve the solution
-        for neighbor in neighbors:
-            sid = neighbor[0]
-            h_cost = self.compute_heuristic_cost(sid, self.goalId)
-            estimated_f_score = self.compute_distance_cost(
-                self.startId, vid) + h_cost + self.compute_distance_cost(vid,
-                                                                         sid)
-            if estimated_f_score < self.g_scores[self.goalId]:
-                self.edge_queue.append((vid, sid))
-
-        # add the vertex to the edge queue
-        self.add_vertex_to_edge_queue(vid, currCoord)
-
-    def add_vertex_to_edge_queue(self, vid, currCoord):
-        if vid not in self.old_vertices:
-            neighbors = []
-            for v, edges in self.tree.vertices.items():
-                if v != vid and (v, vid) not in self.edge_queue and \
-                        (vid, v) not in self.edge_queue:
-                    v_coord = self.tree.node_id_to_real_world_coord(v)
-                    if np.linalg.norm(currCoord - v_coord, 2) <= self.r:
-                        neighbors.append((vid, v_coord))
-
-            for neighbor in neighbors:
-                sid = neighbor[0]
-                estimated_f_score = self.compute_distance_cost(
-                    self.startId, vid) + self.compute_distance_cost(
-                    vid, sid) + self.compute_heuristic_cost(sid, self.goalId)
-                if estimated_f_score < self.g_scores[self.goalId] and (
-                        self.g_scores[vid] +
-                        self.compute_distance_cost(vid, sid)) < \
-                        self.g_scores[sid]:
-                    self.edge_queue.append((vid, sid))
-
-    def update_graph(self):
-        closedSet = []
-        openSet = []
-        currId = self.startId
-        openSet.append(currId)
-
-        while len(openSet) != 0:
-            # get the element with lowest f_score
-            currId = min(openSet, key=lambda x: self.f_scores[x])
-
-            # remove element from open set
-            openSet.remove(currId)
-
-            # Check if we're at the goal
-            if currId == self.goalId:
-                break
-
-            if currId not in closedSet:
-                closedSet.append(currId)
-
-            # find a non visited successor to the current node
-            successors = self.tree.vertices[currId]
-            for successor in successors:
-                if successor in closedSet:
-                    continue
-                else:
-                    # calculate tentative g score
-                    g_score = self.g_scores[currId] + \
-                              self.compute_distance_cost(currId, successor)
-                    if successor not in openSet:
-                        # add the successor to open set
-                        openSet.append(successor)
-                    elif g_score >= self.g_scores[successor]:
-                        continue
-
-                    # update g and f scores
-                    self.g_scores[successor] = g_score
-                    self.f_scores[
-                        successor] = g_score + self.compute_heuristic_cost(
-                        successor, self.goalId)
-
-                    # store the parent and child
-                    self.nodes[successor] = currId
+        if inds:
+            coords = self.sample_coords[inds]
+            d_costs = np.hypot(*(coords - currCoord).T)
+            h_costs = np.hypot(*(coords - self.get_coord(self.goalId)).T)
+            estimated_f_scores = self.compute_distance_cost(
+                self.startId, vid) + h_costs + d_costs
+            edge_values = self.g_scores[vid] + d_costs + h_costs
+            for i in np.flatnonzero(
+                    estimated_f_scores < self.g_scores[self.goalId]):
+                self.push_edge(vid, self.sample_ids[inds[i]],
+                               float(edge_values[i]))
+
+        # edges to other tree vertices are not queued: the tree only grows by
+        # leaves, so plan would drop them
+
+    def update_graph(self, vid, xid):
+        # the tree only grows by leaves, as edges to vertices of the tree
+        # are skipped, so only the new vertex xid gets a parent and scores
+        self.g_scores[xid] = self.g_scores[vid] + \
+            self.compute_distance_cost(vid, xid)
+        self.f_scores[xid] = self.g_scores[xid] + \
+            self.compute_heuristic_cost(xid, self.goalId)
+
+        # store the parent and child
+        self.nodes[xid] = vid
 
     def draw_graph(self, xCenter=None, cBest=None, cMin=None, eTheta=None,
                    samples=None, start=None, end=None):
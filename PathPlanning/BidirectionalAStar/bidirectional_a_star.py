@@ -9,9 +9,15 @@ See Wikipedia article (https://en.wikipedia.org/wiki/Bidirectional_search)
 """
 
 import math
+import pathlib
+import sys
 
 import matplotlib.pyplot as plt
 
+sys.path.append(str(pathlib.Path(__file__).parent.parent.parent))
+from utils import batch_planning, occupancy_grid
+from utils.planning_stats import PlanningStats
+
 show_animation = True
 
 
@@ -35,6 +41,11 @@ class BidirectionalAStarPlanner:
         self.calc_obstacle_map(ox, oy)
         self.motion = self.get_motion_model()
 
+        # search statistics of the last planning call and prints during
+        # planning on or off
+        self.stats = None
+        self.verbose = True
+
     class Node:
         def __init__(self, x, y, cost, parent_index):
             self.x = x  # index of grid
@@ -46,6 +57,15 @@ class BidirectionalAStarPlanner:
             return str(self.x) + "," + str(self.y) + "," + str(
                 self.cost) + "," + str(self.parent_index)
 
+    def __getstate__(self):
+        """
+        Pickled state: the configuration and the obstacle map, without the
+        statistics of the last planning call
+        """
+        state = self.__dict__.copy()
+        state.update(stats=None)
+        return state
+
     def planning(self, sx, sy, gx, gy):
         """
         Bidirectional A star path search
@@ -59,8 +79,14 @@ class BidirectionalAStarPlanner:
         output:
             rx: x position list of the final path
             ry: y position list of the final path
+
+        The search statistics are kept in self.stats.
         """
+        self.stats = PlanningStats()
+        with self.stats.measure():
+            return self.search(sx, sy, gx, gy)
 
+    def search(self, sx, sy, gx, gy):
         start_node = self.Node(self.calc_xy_index(sx, self.min_x),
                                self.calc_xy_index(sy, self.min_y), 0.0, -1)
         goal_node = self.Node(self.calc_xy_index(gx, self.min_x),
@@ -74,14 +100,18 @@ class BidirectionalAStarPlanner:
         current_A = start_node
         current_B = goal_node
         meet_point_A, meet_point_B = None, None
+        stats = self.stats
+        stats.nodes_generated = stats.peak_open_set_size = 2
 
         while True:
             if len(open_set_A) == 0:
-                print("Open set A is empty..")
+                if self.verbose:
+                    print("Open set A is empty..")
                 break
 
             if len(open_set_B) == 0:
-                print("Open set B is empty..")
+                if self.verbose:
+                    print("Open set B is empty..")
                 break
 
             c_id_A = min(
@@ -112,7 +142,8 @@ class BidirectionalAStarPlanner:
                     plt.pause(0.001)
 
             if current_A.x == current_B.x and current_A.y == current_B.y:
-                print("Found goal")
+                if self.verbose:
+                    print("Found goal")
                 meet_point_A = current_A
                 meet_point_B = current_B
                 break
@@ -124,6 +155,7 @@ class BidirectionalAStarPlanner:
             # Add it to the closed set
             closed_set_A[c_id_A] = current_A
             closed_set_B[c_id_B] = current_B
+            stats.nodes_expanded += 2
 
             # expand_grid search grid based on motion model
             for i, _ in enumerate(self.motion):
@@ -141,6 +173,7 @@ class BidirectionalAStarPlanner:
                          self.calc_grid_index(c_nodes[1])]
 
                 # If the node is not safe, do nothing
+                stats.collision_checks += 2
                 continue_ = self.check_nodes_and_sets(c_nodes, closed_set_A,
                                                       closed_set_B, n_ids)
 
@@ -148,6 +181,7 @@ class BidirectionalAStarPlanner:
                     if n_ids[0] not in open_set_A:
                         # discovered a new node
                         open_set_A[n_ids[0]] = c_nodes[0]
+                        stats.nodes_generated += 1
                     else:
                         if open_set_A[n_ids[0]].cost > c_nodes[0].cost:
                             # This path is the best until now. record it
@@ -157,16 +191,38 @@ class BidirectionalAStarPlanner:
                     if n_ids[1] not in open_set_B:
                         # discovered a new node
                         open_set_B[n_ids[1]] = c_nodes[1]
+                        stats.nodes_generated += 1
                     else:
                         if open_set_B[n_ids[1]].cost > c_nodes[1].cost:
                             # This path is the best until now. record it
                             open_set_B[n_ids[1]] = c_nodes[1]
 
+            stats.peak_open_set_size = max(stats.peak_open_set_size,
+                                           len(open_set_A) + len(open_set_B))
+
         rx, ry = self.calc_final_bidirectional_path(
             meet_point_A, meet_point_B, closed_set_A, closed_set_B)
 
         return rx, ry
 
+    def plan_many(self, starts, goals, workers=None, timeout=None):
+        """
+        Plan paths for many start/goal pairs in a process pool
+
+        The obstacle map is shared with the worker processes through shared
+        memory instead of being rebuilt or copied for every query.
+
+        input:
+            starts: (N, 2) start positions [m]
+            goals: (N, 2) goal positions [m]
+            workers: number of worker processes, default is the CPU count
+            timeout: time limit of a single query [s]
+
+        output:
+            list of batch_planning.PlanningResult in input order
+        """
+        return batch_planning.plan_many(self, starts, goals, workers, timeout)
+
     # takes two sets and two meeting nodes and return the optimal path
     def calc_final_bidirectional_path(self, n1, n2, setA, setB):
         rx_A, ry_A = self.calc_final_path(n1, setA)
@@ -253,33 +309,18 @@ class BidirectionalAStarPlanner:
 
     def calc_obstacle_map(self, ox, oy):
 
-        self.min_x = round(min(ox))
-        self.min_y = round(min(oy))
-        self.max_x = round(max(ox))
-        self.max_y = round(max(oy))
+        (self.min_x, self.min_y, self.max_x, self.max_y,
+         self.obstacle_map) = occupancy_grid.calc_obstacle_map(
+            ox, oy, self.resolution, self.rr)
         print("min_x:", self.min_x)
         print("min_y:", self.min_y)
         print("max_x:", self.max_x)
         print("max_y:", self.max_y)
 
-        self.x_width = round((self.max_x - self.min_x) / self.resolution)
-        self.y_width = round((self.max_y - self.min_y) / self.resolution)
+        self.x_width, self.y_width = self.obstacle_map.shape
         print("x_width:", self.x_width)
         print("y_width:", self.y_width)
 
-        # obstacle map generation
-        self.obstacle_map = [[False for _ in range(self.y_width)]
-                             for _ in range(self.x_width)]
-        for ix in range(self.x_width):
-            x = self.calc_grid_position(ix, self.min_x)
-            for iy in range(self.y_width):
-                y = self.calc_grid_position(iy, self.min_y)
-                for iox, ioy in zip(ox, oy):
-                    d = math.hypot(iox - x, ioy - y)
-                    if d <= self.rr:
-                        self.obstacle_map[ix][iy] = True
-                        break
-
     @staticmethod
     def get_motion_model():
         # dx, dy, cost
@@ -9,9 +9,14 @@ See Wikipedia article (https://en.wikipedia.org/wiki/Breadth-first_search)
 """
 
 import math
+import pathlib
+import sys
 
 import matplotlib.pyplot as plt
 
+sys.path.append(str(pathlib.Path(__file__).parent.parent.parent))
+from utils import occupancy_grid
+
 show_animation = True
 
 
@@ -222,33 +227,18 @@ class BidirectionalBreadthFirstSearchPlanner:
 
     def calc_obstacle_map(self, ox, oy):
 
-        self.min_x = round(min(ox))
-        self.min_y = round(min(oy))
-        self.max_x = round(max(ox))
-        self.max_y = round(max(oy))
+        (self.min_x, self.min_y, self.max_x, self.max_y,
+         self.obstacle_map) = occupancy_grid.calc_obstacle_map(
+            ox, oy, self.resolution, self.rr)
         print("min_x:", self.min_x)
         print("min_y:", self.min_y)
         print("max_x:", self.max_x)
         print("max_y:", self.max_y)
 
-        self.x_width = round((self.max_x - self.min_x) / self.resolution)
-        self.y_width = round((self.max_y - self.min_y) / self.resolution)
+        self.x_width, self.y_width = self.obstacle_map.shape
         print("x_width:", self.x_width)
         print("y_width:", self.y_width)
 
-        # obstacle map generation
-        self.obstacle_map = [[False for _ in range(self.y_width)]
-                             for _ in range(self.x_width)]
-        for ix in range(self.x_width):
-            x = self.calc_grid_position(ix, self.min_x)
-            for iy in range(self.y_width):
-                y = self.calc_grid_position(iy, self.min_y)
-                for iox, ioy in zip(ox, oy):
-                    d = math.hypot(iox - x, ioy - y)
-                    if d <= self.rr:
-                        self.obstacle_map[ix][iy] = True
-                        break
-
     @staticmethod
     def get_motion_model():
         # dx, dy, cost
@@ -9,9 +9,16 @@ See Wikipedia article (https://en.wikipedia.org/wiki/Breadth-first_search)
 """
 
 import math
+import pathlib
+import sys
+from collections import deque
 
 import matplotlib.pyplot as plt
 
+sys.path.append(str(pathlib.Path(__file__).parent.parent.parent))
+from utils import node_storage, occupancy_grid
+from utils.planning_stats import PlanningStats
+
 show_animation = True
 
 
@@ -29,8 +36,13 @@ class BreadthFirstSearchPlanner:
 
         self.reso = reso
         self.rr = rr
+        self.node_storage = None
         self.calc_obstacle_map(ox, oy)
         self.motion = self.get_motion_model()
+        # search statistics of the last planning call and prints during
+        # planning on or off
+        self.stats = None
+        self.verbose = True
 
     class Node:
         def __init__(self, x, y, cost, parent_index, parent):
@@ -57,75 +69,103 @@ class BreadthFirstSearchPlanner:
         output:
             rx: x position list of the final path
             ry: y position list of the final path
+
+        The search statistics are kept in self.stats.
         """
+        self.stats = PlanningStats()
+        with self.stats.measure():
+            return self.search(sx, sy, gx, gy)
 
+    def search(self, sx, sy, gx, gy):
         nstart = self.Node(self.calc_xyindex(sx, self.minx),
                            self.calc_xyindex(sy, self.miny), 0.0, -1, None)
         ngoal = self.Node(self.calc_xyindex(gx, self.minx),
                           self.calc_xyindex(gy, self.miny), 0.0, -1, None)
 
-        open_set, closed_set = dict(), dict()
-        open_set[self.calc_grid_index(nstart)] = nstart
+        # cost, parent index and open/closed state of the visited nodes in
+        # arrays indexed by grid index, used as the closed set, and a FIFO
+        # queue of the open grid indices
+        closed_set = self.get_node_storage()
+        cost, parent_index, state = closed_set.scalar_views()
+        start_id = closed_set.calc_index(nstart.x, nstart.y)
+        cost[start_id] = 0.0
+        state[start_id] = node_storage.OPEN
+        open_set = deque([start_id])
+        n_closed, n_generated, peak_open, n_checks = 0, 1, 1, 0
 
         while True:
             if len(open_set) == 0:
-                print("Open set is empty..")
+                if self.verbose:
+                    print("Open set is empty..")
                 break
 
-            current = open_set.pop(list(open_set.keys())[0])
+            c_id = open_set.popleft()
+            c_x, c_y = closed_set.calc_xy(c_id)
 
-            c_id = self.calc_grid_index(current)
-
-            closed_set[c_id] = current
+            state[c_id] = node_storage.CLOSED
+            n_closed += 1
 
             # show graph
             if show_animation:  # pragma: no cover
-                plt.plot(self.calc_grid_position(current.x, self.minx),
-                         self.calc_grid_position(current.y, self.miny), "xc")
+                plt.plot(self.calc_grid_position(c_x, self.minx),
+                         self.calc_grid_position(c_y, self.miny), "xc")
                 # for stopping simulation with the esc key.
                 plt.gcf().canvas.mpl_connect('key_release_event',
                                              lambda event:
                                              [exit(0) if event.key == 'escape'
                                               else None])
-                if len(closed_set.keys()) % 10 == 0:
+                if n_closed % 10 == 0:
                     plt.pause(0.001)
 
-            if current.x == ngoal.x and current.y == ngoal.y:
-                print("Find goal")
-                ngoal.parent_index = current.parent_index
-                ngoal.cost = current.cost
+            if c_x == ngoal.x and c_y == ngoal.y:
+                if self.verbose:
+                    print("Find goal")
+                ngoal.parent_index = parent_index[c_id]
+                ngoal.cost = cost[c_id]
                 break
 
             # expand_grid search grid based on motion model
-            for i, _ in enumerate(self.motion):
-                node = self.Node(current.x + self.motion[i][0],
-                                 current.y + self.motion[i][1],
-                                 current.cost + self.motion[i][2], c_id, None)
-                n_id = self.calc_grid_index(node)
+            for move_x, move_y, move_cost in self.motion:
+                n_x, n_y = c_x + move_x, c_y + move_y
 
                 # If the node is not safe, do nothing
-                if not self.verify_node(node):
+                n_checks += 1
+                if not (0 <= n_x < self.xwidth and 0 <= n_y < self.ywidth) \
+                        or self.obmap[n_x][n_y]:
                     continue
 
-                if (n_id not in closed_set) and (n_id not in open_set):
-                    node.parent = current
-                    open_set[n_id] = node
+                n_id = n_y * self.xwidth + n_x
+                if state[n_id] == node_storage.UNVISITED:
+                    cost[n_id] = cost[c_id] + move_cost
+                    parent_index[n_id] = c_id
+                    state[n_id] = node_storage.OPEN
+                    open_set.append(n_id)
+                    n_generated += 1
+                    peak_open = max(peak_open, len(open_set))
+
+        self.stats.nodes_expanded, self.stats.nodes_generated = \
+            n_closed, n_generated
+        self.stats.peak_open_set_size = peak_open
+        self.stats.collision_checks = n_checks
 
         rx, ry = self.calc_final_path(ngoal, closed_set)
         return rx, ry
 
     def calc_final_path(self, ngoal, closedset):
-        # generate final course
-        rx, ry = [self.calc_grid_position(ngoal.x, self.minx)], [
-            self.calc_grid_position(ngoal.y, self.miny)]
-        n = closedset[ngoal.parent_index]
-        while n is not None:
-            rx.append(self.calc_grid_position(n.x, self.minx))
-            ry.append(self.calc_grid_position(n.y, self.miny))
-            n = n.parent
-
+        # generate final course by walking the parent indices of the
+        # visited nodes back to the start
+        ix, iy = closedset.calc_path(ngoal.parent_index,
+                                     (ngoal.x, ngoal.y))
+        rx = self.calc_grid_position(ix, self.minx).tolist()
+        ry = self.calc_grid_position(iy, self.miny).tolist()
         return rx, ry
 
+    def get_node_storage(self):
+        """Node arrays of a new search, see GridNodeStorage.for_grid"""
+        self.node_storage = node_storage.GridNodeStorage.for_grid(
+            self.node_storage, self.xwidth, self.ywidth)
+        return self.node_storage
+
     def calc_grid_position(self, index, minp):
         """
         calc grid position
@@ -141,7 +181,7 @@ class BreadthFirstSearchPlanner:
         return round((position - min_pos) / self.reso)
 
     def calc_grid_index(self, node):
-        return (node.y - self.miny) * self.xwidth + (node.x - self.minx)
+        return node.y * self.xwidth + node.x
 
     def verify_node(self, node):
         px = self.calc_grid_position(node.x, self.minx)
@@ -164,33 +204,18 @@ class BreadthFirstSearchPlanner:
 
     def calc_obstacle_map(self, ox, oy):
 
-        self.minx = round(min(ox))
-        self.miny = round(min(oy))
-        self.maxx = round(max(ox))
-        self.maxy = round(max(oy))
+        (self.minx, self.miny, self.maxx, self.maxy,
+         self.obmap) = occupancy_grid.calc_obstacle_map(
+            ox, oy, self.reso, self.rr)
         print("min_x:", self.minx)
         print("min_y:", self.miny)
         print("max_x:", self.maxx)
         print("max_y:", self.maxy)
 
-        self.xwidth = round((self.maxx - self.minx) / self.reso)
-        self.ywidth = round((self.maxy - self.miny) / self.reso)
+        self.xwidth, self.ywidth = self.obmap.shape
         print("x_width:", self.xwidth)
         print("y_width:", self.ywidth)
 
-        # obstacle map generation
-        self.obmap = [[False for _ in range(self.ywidth)]
-                      for _ in range(self.xwidth)]
-        for ix in range(self.xwidth):
-            x = self.calc_grid_position(ix, self.minx)
-            for iy in range(self.ywidth):
-                y = self.calc_grid_position(iy, self.miny)
-                for iox, ioy in zip(ox, oy):
-                    d = math.hypot(iox - x, ioy - y)
-                    if d <= self.rr:
-                        self.obmap[ix][iy] = True
-                        break
-
     @staticmethod
     def get_motion_model():
         # dx, dy, cost
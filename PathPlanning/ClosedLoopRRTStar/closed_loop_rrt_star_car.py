@@ -122,8 +122,7 @@ class ClosedLoopRRTStar(RRTStarReedsShepp):
         tmp_node = self.Node(x, y, 0)
         tmp_node.path_x = x
         tmp_node.path_y = y
-        if not self.check_collision(
-                tmp_node, self.obstacle_list, self.robot_radius):
+        if not self.check_node_collision(tmp_node):
             print("This path is collision")
             find_goal = False
 
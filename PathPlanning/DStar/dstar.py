@@ -6,34 +6,120 @@ author: Nirnay Roy
 
 See Wikipedia article (https://en.wikipedia.org/wiki/D*)
 
+The map keeps h, k, the tag and the parent of every state in NumPy arrays
+indexed by x * col + y, and the open list is a priority queue keyed by k,
+so a state costs about 20 bytes and process_state takes O(log n) instead of
+scanning the open list. The search works on these indices; the methods
+taking State views are wrappers over the index versions.
+
 """
 import math
-
+import pathlib
+import sys
 
 from sys import maxsize
 
 import matplotlib.pyplot as plt
+import numpy as np
+
+sys.path.append(str(pathlib.Path(__file__).parent.parent.parent))
+from utils.priority_queue import IndexedPriorityQueue
 
 show_animation = True
 
+# tags of the states
+NEW = 0
+OPEN = 1
+CLOSE = 2
+TAG_NAMES = ["new", "open", "close"]
+
+OBSTACLE = ord("#")
+
 
 class State:
+    """
+    State of the grid
 
-    def __init__(self, x, y):
+    A state of a Map is a view of the arrays of the map, so views of the
+    same position are equal and share their values. State(x, y) without a
+    map is a state with its own values.
+    """
+
+    __slots__ = ("map", "x", "y", "index", "own_values", "_parent")
+
+    def __init__(self, x, y, maps=None):
         self.x = x
         self.y = y
-        self.parent = None
-        self.state = "."
-        self.t = "new"  # tag for state
-        self.h = 0
-        self.k = 0
+        self.own_values = maps is None
+        if self.own_values:
+            # the values are kept in a map of this state only
+            self.map = Map(1, 1)
+            self.index = 0
+        else:
+            self.map = maps
+            self.index = x * maps.col + y
+        self._parent = None
+
+    def __eq__(self, other):
+        return isinstance(other, State) and self.map is other.map and \
+            self.index == other.index
+
+    def __hash__(self):
+        return self.index
+
+    @property
+    def parent(self):
+        if self.own_values:
+            return self._parent
+        parent = self.map.parent[self.index]
+        return None if parent < 0 else self.map.get_state_by_index(parent)
+
+    @parent.setter
+    def parent(self, state):
+        if self.own_values:
+            self._parent = state
+        else:
+            self.map.parent[self.index] = -1 if state is None else \
+                state.index
+
+    @property
+    def state(self):
+        return chr(self.map.state[self.index])
+
+    @state.setter
+    def state(self, value):
+        self.map.state[self.index] = ord(value)
+
+    @property
+    def t(self):
+        return TAG_NAMES[self.map.tag[self.index]]
+
+    @t.setter
+    def t(self, value):
+        self.map.tag[self.index] = TAG_NAMES.index(value)
+
+    @property
+    def h(self):
+        return float(self.map.h[self.index])
+
+    @h.setter
+    def h(self, value):
+        self.map.h[self.index] = value
+
+    @property
+    def k(self):
+        return float(self.map.k[self.index])
+
+    @k.setter
+    def k(self, value):
+        self.map.k[self.index] = value
 
     def cost(self, state):
+        if self.map is state.map:
+            return self.map.cost(self.index, state.index)
         if self.state == "#" or state.state == "#":
             return maxsize
-
-        return math.sqrt(math.pow((self.x - state.x), 2) +
-                         math.pow((self.y - state.y), 2))
+        return math.hypot(self.x - state.x, self.y - state.y)
 
     def set_state(self, state):
         """
@@ -45,7 +131,7 @@ class State:
         """
         if state not in ["s", ".", "#", "e", "*"]:
             return
-        self.state = state
+        self.map.state[self.index] = ord(state)
 
 
 class Map:
@@ -53,108 +139,175 @@ class Map:
     def __init__(self, row, col):
         self.row = row
         self.col = col
-        self.map = self.init_map()
+        self.init_map()
+        # rows of state views, map[x][y] is get_state(x, y)
+        self.map = StateRows(self)
 
     def init_map(self):
-        map_list = []
-        for i in range(self.row):
-            tmp = []
-            for j in range(self.col):
-                tmp.append(State(i, j))
-            map_list.append(tmp)
-        return map_list
+        n = self.row * self.col
+        self.h = np.zeros(n)
+        self.k = np.zeros(n)
+        self.tag = np.full(n, NEW, dtype=np.int8)
+        self.parent = np.full(n, -1, dtype=np.int32)
+        self.state = np.full(n, ord("."), dtype=np.uint8)
+
+    @property
+    def nbytes(self):
+        return self.h.nbytes + self.k.nbytes + self.tag.nbytes + \
+            self.parent.nbytes + self.state.nbytes
+
+    def get_state(self, x, y):
+        return State(x, y, self)
+
+    def get_state_by_index(self, index):
+        return State(*divmod(int(index), self.col), self)
+
+    def cost(self, i, j):
+        if self.state[i] == OBSTACLE or self.state[j] == OBSTACLE:
+            return maxsize
+        (xi, yi), (xj, yj) = divmod(i, self.col), divmod(j, self.col)
+        return math.hypot(xi - xj, yi - yj)
 
     def get_neighbors(self, state):
-        state_list = []
+        """Neighbours of a state"""
+        return [self.get_state_by_index(neighbor) for neighbor, _ in
+                self.get_neighbor_indices(state.index)]
+
+    def get_neighbor_indices(self, index):
+        """Indices of the neighbours of a state and the costs to them"""
+        x, y = divmod(index, self.col)
+        blocked = self.state[index] == OBSTACLE
+        neighbors = []
         for i in [-1, 0, 1]:
             for j in [-1, 0, 1]:
                 if i == 0 and j == 0:
                     continue
-                if state.x + i < 0 or state.x + i >= self.row:
+                if x + i < 0 or x + i >= self.row:
                     continue
-                if state.y + j < 0 or state.y + j >= self.col:
+                if y + j < 0 or y + j >= self.col:
                     continue
-                state_list.append(self.map[state.x + i][state.y + j])
-        return state_list
+                neighbor = index + i * self.col + j
+                if blocked or self.state[neighbor] == OBSTACLE:
+                    neighbors.append((neighbor, maxsize))
+                else:
+                    neighbors.append((neighbor, math.sqrt(2) if i and j
+                                      else 1.0))
+        return neighbors
 
     def set_obstacle(self, point_list):
         for x, y in point_list:
             if x < 0 or x >= self.row or y < 0 or y >= self.col:
                 continue
 
-            self.map[x][y].set_state("#")
+            self.state[x * self.col + y] = OBSTACLE
+
+
+class StateRows:
+    """Sequence of the rows of state views of a Map"""
+
+    def __init__(self, maps):
+        self.maps = maps
+
+    def __len__(self):
+        return self.maps.row
+
+    def __getitem__(self, x):
+        return StateRow(self.maps, range(self.maps.row)[x])
+
+
+class StateRow:
+    """Sequence of the state views of a row of a Map"""
+
+    def __init__(self, maps, x):
+        self.maps = maps
+        self.x = x
+
+    def __len__(self):
+        return self.maps.col
+
+    def __getitem__(self, y):
+        return self.maps.get_state(self.x, range(self.maps.col)[y])
 
 
 class Dstar:
     def __init__(self, maps):
         self.map = maps
-        self.open_list = set()
+        self.open_list = IndexedPriorityQueue()
 
     def process_state(self):
-        x = self.min_state()
-
-        if x is None:
+        if not self.open_list:
             return -1
 
-        k_old = self.get_kmin()
-        self.remove(x)
-
-        if k_old < x.h:
-            for y in self.map.get_neighbors(x):
-                if y.h <= k_old and x.h > y.h + x.cost(y):
-                    x.parent = y
-                    x.h = y.h + x.cost(y)
-        if k_old == x.h:
-            for y in self.map.get_neighbors(x):
-                if y.t == "new" or y.parent == x and y.h != x.h + x.cost(y) \
-                        or y.parent != x and y.h > x.h + x.cost(y):
-                    y.parent = x
-                    self.insert(y, x.h + x.cost(y))
+        x, k_old = self.open_list.top()
+        self.remove_index(x)
+
+        h, parent, tag = self.map.h, self.map.parent, self.map.tag
+        neighbors = self.map.get_neighbor_indices(x)
+        if k_old < h[x]:
+            for y, cost in neighbors:
+                if h[y] <= k_old and h[x] > h[y] + cost:
+                    parent[x] = y
+                    h[x] = h[y] + cost
+        if k_old == h[x]:
+            for y, cost in neighbors:
+                if tag[y] == NEW or parent[y] == x and h[y] != h[x] + cost \
+                        or parent[y] != x and h[y] > h[x] + cost:
+                    parent[y] = x
+                    self.insert_index(y, h[x] + cost)
         else:
-            for y in self.map.get_neighbors(x):
-                if y.t == "new" or y.parent == x and y.h != x.h + x.cost(y):
-                    y.parent = x
-                    self.insert(y, x.h + x.cost(y))
+            for y, cost in neighbors:
+                if tag[y] == NEW or parent[y] == x and h[y] != h[x] + cost:
+                    parent[y] = x
+                    self.insert_index(y, h[x] + cost)
                 else:
-                    if y.parent != x and y.h > x.h + x.cost(y):
-                        self.insert(x, x.h)
+                    if parent[y] != x and h[y] > h[x] + cost:
+                        self.insert_index(x, h[x])
                     else:
-                        if y.parent != x and x.h > y.h + x.cost(y) \
-                                and y.t == "close" and y.h > k_old:
-                            self.insert(y, y.h)
+                        if parent[y] != x and h[x] > h[y] + cost \
+                                and tag[y] == CLOSE and h[y] > k_old:
+                            self.insert_index(y, h[y])
         return self.get_kmin()
 
     def min_state(self):
         if not self.open_list:
             return None
-        min_state = min(self.open_list, key=lambda x: x.k)
-        return min_state
+        return self.map.get_state_by_index(self.open_list.top()[0])
 
     def get_kmin(self):
-        if not self.open_list:
-            return -1
-        k_min = min([x.k for x in self.open_list])
-        return k_min
+        return self.open_list.top_key(default=-1)
 
     def insert(self, state, h_new):
-        if state.t == "new":
-            state.k = h_new
-        elif state.t == "open":
-            state.k = min(state.k, h_new)
-        elif state.t == "close":
-            state.k = min(state.h, h_new)
-        state.h = h_new
-        state.t = "open"
-        self.open_list.add(state)
+        self.insert_index(state.index, h_new)
+
+    def insert_index(self, index, h_new):
+        m = self.map
+        if m.tag[index] == NEW:
+            k = h_new
+        elif m.tag[index] == OPEN:
+            k = min(m.k[index], h_new)
+        else:
+            k = min(m.h[index], h_new)
+        m.k[index] = k
+        m.h[index] = h_new
+        m.tag[index] = OPEN
+        self.open_list.push(index, float(k))
 
     def remove(self, state):
-        if state.t == "open":
-            state.t = "close"
-        self.open_list.remove(state)
+        self.remove_index(state.index)
+
+    def remove_index(self, index):
+        if self.map.tag[index] == OPEN:
+            self.map.tag[index] = CLOSE
+        self.open_list.remove(index)
+
+    def modify_cost(self, state):
+        self.modify_cost_index(state.index)
 
-    def modify_cost(self, x):
-        if x.t == "close":
-            self.insert(x, x.parent.h + x.cost(x.parent))
+    def modify_cost_index(self, index):
+        m = self.map
+        if m.tag[index] == CLOSE:
+            parent = m.parent[index]
+            self.insert_index(index, m.h[parent] + m.cost(index, parent))
 
     def run(self, start, end):
 
@@ -164,7 +317,8 @@ class Dstar:
         self.insert(end, 0.0)
 
         while True:
-            self.process_state()
+            if self.process_state() == -1 and start.t != "close":
+                return rx, ry  # the start is not reachable
             if start.t == "close":
                 break
 
@@ -5,18 +5,27 @@ Link to papers:
 D* Lite (Link: http://idm-lab.org/bib/abstracts/papers/aaai02b.pdf)
 Improved Fast Replanning for Robot Navigation in Unknown Terrain
 (Link: http://www.cs.cmu.edu/~maxim/files/dlite_icra02.pdf)
-Implemented maintaining similarity with the pseudocode for understanding.
-Code can be significantly optimized by using a priority queue for U, etc.
-Avoiding additional imports based on repository philosophy.
+Implements the optimized version of D* Lite (Figure 4 of the first paper):
+U is an indexed priority queue, g and rhs are flat lists indexed by
+x * y_max + y, and an obstacle change only updates the rhs values of the
+neighbours of the changed cells.
 """
 import math
 import matplotlib.pyplot as plt
+import pathlib
 import random
+import sys
 import numpy as np
 
+sys.path.append(str(pathlib.Path(__file__).parent.parent.parent))
+from utils.planning_stats import PlanningStats
+from utils.priority_queue import IndexedPriorityQueue
+
 show_animation = True
 pause_time = 0.001
 p_create_random_obstacle = 0
+# scale of the heuristic, see DStarLite.h
+H_SCALE = 1.0 - 1e-9
 
 
 class Node:
@@ -61,46 +70,55 @@ class DStarLite:
         self.y_min_world = int(min(oy))
         self.x_max = int(abs(max(ox) - self.x_min_world))
         self.y_max = int(abs(max(oy) - self.y_min_world))
-        self.obstacles = [Node(x - self.x_min_world, y - self.y_min_world)
+        self.obstacles = [Node(round(x) - self.x_min_world,
+                               round(y) - self.y_min_world)
                           for x, y in zip(ox, oy)]
         self.obstacles_xy = np.array(
             [[obstacle.x, obstacle.y] for obstacle in self.obstacles]
         )
+        # blocked cells by index x * y_max + y, 1 for obstacles
+        self.blocked = bytearray(self.x_max * self.y_max)
+        for obstacle in self.obstacles:
+            if self.is_valid(obstacle):
+                self.blocked[self.calc_index(obstacle)] = 1
+        # (dx, dy, index offset, cost) of the motions
+        self.motion_offsets = [(m.x, m.y, m.x * self.y_max + m.y, m.cost)
+                               for m in self.motions]
         self.start = Node(0, 0)
         self.goal = Node(0, 0)
-        self.U = list()  # type: ignore
+        self.last = Node(0, 0)
+        self.U = IndexedPriorityQueue()
         self.km = 0.0
-        self.kold = 0.0
-        self.rhs = self.create_grid(float("inf"))
-        self.g = self.create_grid(float("inf"))
+        self.rhs = [math.inf] * (self.x_max * self.y_max)
+        self.g = [math.inf] * (self.x_max * self.y_max)
         self.detected_obstacles_xy = np.empty((0, 2))
         self.xy = np.empty((0, 2))
         if show_animation:
             self.detected_obstacles_for_plotting_x = list()  # type: ignore
             self.detected_obstacles_for_plotting_y = list()  # type: ignore
         self.initialized = False
-
-    def create_grid(self, val: float):
-        return np.full((self.x_max, self.y_max), val)
+        # search instrumentation: statistics of the last main() call,
+        # prints on or off, a callback(x, y, cost) called with the position
+        # and g-cost of every expanded vertex, and profiling of the time
+        # split and peak memory
+        self.stats = PlanningStats()
+        self.verbose = True
+        self.expansion_callback = None
+        self.profile = False
+
+    def calc_index(self, node: Node):
+        return node.x * self.y_max + node.y
+
+    def calc_node(self, index: int):
+        x, y = divmod(index, self.y_max)
+        return Node(x, y)
 
     def is_obstacle(self, node: Node):
-        x = np.array([node.x])
-        y = np.array([node.y])
-        obstacle_x_equal = self.obstacles_xy[:, 0] == x
-        obstacle_y_equal = self.obstacles_xy[:, 1] == y
-        is_in_obstacles = (obstacle_x_equal & obstacle_y_equal).any()
-
-        is_in_detected_obstacles = False
-        if self.detected_obstacles_xy.shape[0] > 0:
-            is_x_equal = self.detected_obstacles_xy[:, 0] == x
-            is_y_equal = self.detected_obstacles_xy[:, 1] == y
-            is_in_detected_obstacles = (is_x_equal & is_y_equal).any()
-
-        return is_in_obstacles or is_in_detected_obstacles
+        return self.blocked[self.calc_index(node)] == 1
 
     def c(self, node1: Node, node2: Node):
         if self.is_obstacle(node2):
-            # Attempting to move from or to an obstacle
+            # Attempting to move to an obstacle
             return math.inf
         new_node = Node(node1.x-node2.x, node1.y-node2.y)
         detected_motion = list(filter(lambda motion:
@@ -109,22 +127,28 @@ class DStarLite:
         return detected_motion[0].cost
 
     def h(self, s: Node):
-        # Cannot use the 2nd euclidean norm as this might sometimes generate
-        # heuristics that overestimate the cost, making them inadmissible,
-        # due to rounding errors etc (when combined with calculate_key)
-        # To be admissible heuristic should
-        # never overestimate the cost of a move
-        # hence not using the line below
-        # return math.hypot(self.start.x - s.x, self.start.y - s.y)
-
-        # Below is the same as 1; modify if you modify the cost of each move in
-        # motion
-        # return max(abs(self.start.x - s.x), abs(self.start.y - s.y))
-        return 1
+        # Octile distance from the start, the exact cost of the motions on
+        # a grid without obstacles, so it never overestimates the cost.
+        # It is scaled down slightly so that the rounding errors of the
+        # path costs cannot make the key of a vertex on the shortest path
+        # larger than the key of the start, which would end the search
+        # before the start is consistent.
+        dx, dy = abs(self.start.x - s.x), abs(self.start.y - s.y)
+        return (max(dx, dy) + (math.sqrt(2) - 1) * min(dx, dy)) * H_SCALE
+
+    def calc_heuristic(self, index: int):
+        x, y = divmod(index, self.y_max)
+        dx, dy = abs(self.start.x - x), abs(self.start.y - y)
+        if dx < dy:
+            dx, dy = dy, dx
+        return (dx + (math.sqrt(2) - 1) * dy) * H_SCALE
 
     def calculate_key(self, s: Node):
-        return (min(self.g[s.x][s.y], self.rhs[s.x][s.y]) + self.h(s)
-                + self.km, min(self.g[s.x][s.y], self.rhs[s.x][s.y]))
+        return self.calc_key(self.calc_index(s))
+
+    def calc_key(self, index: int):
+        min_g = min(self.g[index], self.rhs[index])
+        return min_g + self.calc_heuristic(index) + self.km, min_g
 
     def is_valid(self, node: Node):
         if 0 <= node.x < self.x_max and 0 <= node.y < self.y_max:
@@ -143,69 +167,165 @@ class DStarLite:
         # Grid, so each vertex is connected to the ones around it
         return self.get_neighbours(u)
 
+    def neighbour_indices(self, index: int):
+        x, y = divmod(index, self.y_max)
+        return [index + offset for dx, dy, offset, _ in self.motion_offsets
+                if 0 <= x + dx < self.x_max and 0 <= y + dy < self.y_max]
+
     def initialize(self, start: Node, goal: Node):
         self.start.x = start.x - self.x_min_world
         self.start.y = start.y - self.y_min_world
         self.goal.x = goal.x - self.x_min_world
         self.goal.y = goal.y - self.y_min_world
+        self.last = Node(self.start.x, self.start.y)
         if not self.initialized:
             self.initialized = True
-            print('Initializing')
-            self.U = list()  # Would normally be a priority queue
+            if self.verbose:
+                print('Initializing')
+            self.U = IndexedPriorityQueue()
             self.km = 0.0
-            self.rhs = self.create_grid(math.inf)
-            self.g = self.create_grid(math.inf)
-            self.rhs[self.goal.x][self.goal.y] = 0
-            self.U.append((self.goal, self.calculate_key(self.goal)))
+            self.rhs = [math.inf] * (self.x_max * self.y_max)
+            self.g = [math.inf] * (self.x_max * self.y_max)
+            goal_index = self.calc_index(self.goal)
+            self.rhs[goal_index] = 0
+            self.U.push(goal_index, self.calc_key(goal_index))
             self.detected_obstacles_xy = np.empty((0, 2))
 
+    def calc_rhs(self, index: int):
+        # one step lookahead: the cheapest move to a successor plus its g
+        g, blocked, y_max = self.g, self.blocked, self.y_max
+        x, y = divmod(index, y_max)
+        self.stats.collision_checks += 8
+        rhs = math.inf
+        for dx, dy, offset, cost in self.motion_offsets:
+            if 0 <= x + dx < self.x_max and 0 <= y + dy < y_max:
+                s = index + offset
+                if not blocked[s] and cost + g[s] < rhs:
+                    rhs = cost + g[s]
+        return rhs
+
     def update_vertex(self, u: Node):
+        index = self.calc_index(u)
         if not compare_coordinates(u, self.goal):
-            self.rhs[u.x][u.y] = min([self.c(u, sprime) +
-                                      self.g[sprime.x][sprime.y]
-                                      for sprime in self.succ(u)])
-        if any([compare_coordinates(u, node) for node, key in self.U]):
-            self.U = [(node, key) for node, key in self.U
-                      if not compare_coordinates(node, u)]
-            self.U.sort(key=lambda x: x[1])
-        if self.g[u.x][u.y] != self.rhs[u.x][u.y]:
-            self.U.append((u, self.calculate_key(u)))
-            self.U.sort(key=lambda x: x[1])
-
-    def compare_keys(self, key_pair1: tuple[float, float],
-                     key_pair2: tuple[float, float]):
-        return key_pair1[0] < key_pair2[0] or \
-               (key_pair1[0] == key_pair2[0] and key_pair1[1] < key_pair2[1])
+            self.rhs[index] = self.calc_rhs(index)
+        self.update_queue(index)
+
+    def update_queue(self, index: int):
+        # a vertex is in U if and only if it is locally inconsistent
+        if self.g[index] != self.rhs[index]:
+            if index not in self.U:
+                self.stats.nodes_generated += 1
+            self.U.push(index, self.calc_key(index))
+            if len(self.U) > self.stats.peak_open_set_size:
+                self.stats.peak_open_set_size = len(self.U)
+        else:
+            self.U.remove(index)
 
     def compute_shortest_path(self):
-        self.U.sort(key=lambda x: x[1])
-        has_elements = len(self.U) > 0
-        start_key_not_updated = self.compare_keys(
-            self.U[0][1], self.calculate_key(self.start)
-        )
-        rhs_not_equal_to_g = self.rhs[self.start.x][self.start.y] != \
-            self.g[self.start.x][self.start.y]
-        while has_elements and start_key_not_updated or rhs_not_equal_to_g:
-            self.kold = self.U[0][1]
-            u = self.U[0][0]
-            self.U.pop(0)
-            if self.compare_keys(self.kold, self.calculate_key(u)):
-                self.U.append((u, self.calculate_key(u)))
-                self.U.sort(key=lambda x: x[1])
-            elif (self.g[u.x, u.y] > self.rhs[u.x, u.y]).any():
-                self.g[u.x, u.y] = self.rhs[u.x, u.y]
-                for s in self.pred(u):
-                    self.update_vertex(s)
+        g, rhs, blocked = self.g, self.rhs, self.blocked
+        x_max, y_max = self.x_max, self.y_max
+        start = self.calc_index(self.start)
+        goal = self.calc_index(self.goal)
+        queue, stats = self.U, self.stats
+        top, calc_key, calc_rhs = queue.top, self.calc_key, self.calc_rhs
+        update_queue = self.update_queue
+        if self.profile:
+            top = stats.timed("queue_time", top)
+            update_queue = stats.timed("queue_time", update_queue)
+            calc_key = stats.timed("heuristic_time", calc_key)
+            # the collision checks are the edge costs of the rhs updates
+            calc_rhs = stats.timed("collision_check_time", calc_rhs)
+        callback = self.expansion_callback
+
+        while queue and (top()[1] < calc_key(start) or
+                         rhs[start] != g[start]):
+            u, k_old = top()
+            stats.nodes_expanded += 1
+            if callback is not None:
+                x, y = divmod(u, y_max)
+                callback(x + self.x_min_world, y + self.y_min_world, g[u])
+
+            k_new = calc_key(u)
+            if k_old < k_new:
+                # the key is outdated by a change of km
+                queue.push(u, k_new)
+                continue
+
+            x, y = divmod(u, y_max)
+            if g[u] > rhs[u]:
+                # overconsistent: lower g and relax the moves into u
+                g[u] = rhs[u]
+                queue.remove(u)
+                if blocked[u]:
+                    continue
+                stats.collision_checks += 8
+                for dx, dy, offset, cost in self.motion_offsets:
+                    if 0 <= x + dx < x_max and 0 <= y + dy < y_max:
+                        s = u + offset
+                        if s != goal and cost + g[u] < rhs[s]:
+                            rhs[s] = cost + g[u]
+                            update_queue(s)
             else:
-                self.g[u.x, u.y] = math.inf
-                for s in self.pred(u) + [u]:
-                    self.update_vertex(s)
-            self.U.sort(key=lambda x: x[1])
-            start_key_not_updated = self.compare_keys(
-                self.U[0][1], self.calculate_key(self.start)
-            )
-            rhs_not_equal_to_g = self.rhs[self.start.x][self.start.y] != \
-                self.g[self.start.x][self.start.y]
+                # underconsistent: raise g and recompute the vertices whose
+                # rhs came from u
+                g_old = g[u]
+                g[u] = math.inf
+                if not blocked[u]:
+                    stats.collision_checks += 8
+                    for dx, dy, offset, cost in self.motion_offsets:
+                        if 0 <= x + dx < x_max and 0 <= y + dy < y_max:
+                            s = u + offset
+                            if s != goal and rhs[s] == cost + g_old:
+                                rhs[s] = calc_rhs(s)
+                                update_queue(s)
+                update_queue(u)
+
+    def update_obstacles(self, added, removed=()):
+        """
+        Replan after obstacles appeared or disappeared
+
+        Only the rhs values of the neighbours of the changed cells are
+        updated, and the following search repairs the g values from there,
+        so a replan costs much less than a search from scratch.
+
+        added: (x, y) world positions of new obstacles
+        removed: (x, y) world positions of cleared obstacles
+
+        output:
+            True if there is a path from the current start to the goal
+        """
+        self.km += self.h(self.last)
+        self.last = Node(self.start.x, self.start.y)
+
+        changed = []
+        for positions, value in ((added, 1), (removed, 0)):
+            for x, y in positions:
+                cell = Node(round(x) - self.x_min_world,
+                            round(y) - self.y_min_world)
+                if not self.is_valid(cell):
+                    continue
+                index = self.calc_index(cell)
+                if self.blocked[index] != value:
+                    self.blocked[index] = value
+                    changed.append(index)
+
+        # the costs of the moves into a changed cell have changed
+        goal = self.calc_index(self.goal)
+        affected = {s for index in changed
+                    for s in self.neighbour_indices(index)}
+        for s in affected:
+            if s != goal:
+                self.rhs[s] = self.calc_rhs(s)
+            self.update_queue(s)
+
+        self.compute_shortest_path()
+        return self.g[self.calc_index(self.start)] != math.inf
+
+    def calc_next_vertex(self, u: Node):
+        # successor on the shortest path to the goal
+        return min(self.succ(u),
+                   key=lambda sprime: self.c(u, sprime) +
+                   self.g[self.calc_index(sprime)])
 
     def detect_changes(self):
         changed_vertices = list()
@@ -260,12 +380,11 @@ class DStarLite:
     def compute_current_path(self):
         path = list()
         current_point = Node(self.start.x, self.start.y)
+        if self.g[self.calc_index(current_point)] == math.inf:
+            return [current_point]
         while not compare_coordinates(current_point, self.goal):
             path.append(current_point)
-            current_point = min(self.succ(current_point),
-                                key=lambda sprime:
-                                self.c(current_point, sprime) +
-                                self.g[sprime.x][sprime.y])
+            current_point = self.calc_next_vertex(current_point)
         path.append(self.goal)
         return path
 
@@ -286,6 +405,17 @@ class DStarLite:
 
     def main(self, start: Node, goal: Node,
              spoofed_ox: list, spoofed_oy: list):
+        """
+        Move from start to goal, replanning when obstacles are detected
+
+        The search statistics are kept in self.stats.
+        """
+        self.stats = PlanningStats()
+        with self.stats.measure(self.profile):
+            return self.move_to_goal(start, goal, spoofed_ox, spoofed_oy)
+
+    def move_to_goal(self, start: Node, goal: Node,
+                     spoofed_ox: list, spoofed_oy: list):
         self.spoofed_obstacles = [[Node(x - self.x_min_world,
                                         y - self.y_min_world)
                                    for x, y in zip(rowx, rowy)]
@@ -294,7 +424,6 @@ class DStarLite:
         pathx = []
         pathy = []
         self.initialize(start, goal)
-        last = self.start
         self.compute_shortest_path()
         pathx.append(self.start.x + self.x_min_world)
         pathy.append(self.start.y + self.y_min_world)
@@ -307,13 +436,11 @@ class DStarLite:
             current_path_image = self.display_path(current_path, ".c")
 
         while not compare_coordinates(self.goal, self.start):
-            if self.g[self.start.x][self.start.y] == math.inf:
-                print("No path possible")
+            if self.g[self.calc_index(self.start)] == math.inf:
+                if self.verbose:
+                    print("No path possible")
                 return False, pathx, pathy
-            self.start = min(self.succ(self.start),
-                             key=lambda sprime:
-                             self.c(self.start, sprime) +
-                             self.g[sprime.x][sprime.y])
+            self.start = self.calc_next_vertex(self.start)
             pathx.append(self.start.x + self.x_min_world)
             pathy.append(self.start.y + self.y_min_world)
             if show_animation:
@@ -322,16 +449,11 @@ class DStarLite:
                 plt.pause(pause_time)
             changed_vertices = self.detect_changes()
             if len(changed_vertices) != 0:
-                print("New obstacle detected")
-                self.km += self.h(last)
-                last = self.start
-                for u in changed_vertices:
-                    if compare_coordinates(u, self.start):
-                        continue
-                    self.rhs[u.x][u.y] = math.inf
-                    self.g[u.x][u.y] = math.inf
-                    self.update_vertex(u)
-                self.compute_shortest_path()
+                if self.verbose:
+                    print("New obstacle detected")
+                self.update_obstacles(
+                    [(u.x + self.x_min_world, u.y + self.y_min_world)
+                     for u in changed_vertices])
 
                 if show_animation:
                     new_path = self.compute_current_path()
@@ -346,7 +468,8 @@ class DStarLite:
                         current_path_image = self.display_path(current_path,
                                                                ".c")
                         plt.pause(pause_time)
-        print("Path found")
+        if self.verbose:
+            print("Path found")
         return True, pathx, pathy
 
 
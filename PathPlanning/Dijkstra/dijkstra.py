@@ -6,15 +6,27 @@ author: Atsushi Sakai(@Atsushi_twi)
 
 """
 
+import heapq
 import matplotlib.pyplot as plt
 import math
+import pathlib
+import sys
+from collections import OrderedDict
+
+import numpy as np
+from scipy.sparse.csgraph import dijkstra as csgraph_dijkstra
+
+sys.path.append(str(pathlib.Path(__file__).parent.parent.parent))
+from utils import batch_planning, node_storage, occupancy_grid
+from utils.planning_stats import PlanningStats
 
 show_animation = True
 
 
 class Dijkstra:
 
-    def __init__(self, ox, oy, resolution, robot_radius):
+    def __init__(self, ox, oy, resolution, robot_radius,
+                 obstacle_map_cache=None, cost_to_go_cache_size=8):
         """
         Initialize map for a star planning
 
@@ -22,6 +34,10 @@ class Dijkstra:
         oy: y position list of Obstacles [m]
         resolution: grid resolution [m]
         rr: robot radius[m]
+        obstacle_map_cache: optional occupancy_grid.ObstacleMapCache to
+            reuse the obstacle map built for the same map parameters
+        cost_to_go_cache_size: number of goals whose cost-to-go field is
+            kept for planning_with_cost_to_go
         """
 
         self.min_x = None
@@ -31,12 +47,31 @@ class Dijkstra:
         self.x_width = None
         self.y_width = None
         self.obstacle_map = None
+        self.node_storage = None
 
         self.resolution = resolution
         self.robot_radius = robot_radius
+        self.obstacle_map_cache = obstacle_map_cache
         self.calc_obstacle_map(ox, oy)
         self.motion = self.get_motion_model()
 
+        # cost-to-go fields keyed by goal grid index, least recently used
+        # first, the search graph they are computed on and the fingerprint
+        # of the obstacle map of the graph
+        self.cost_to_go_cache_size = cost_to_go_cache_size
+        self.cost_to_go_cache = OrderedDict()
+        self.cost_to_go_graph = None
+        self.cost_to_go_map_key = None
+
+        # search instrumentation: statistics of the last planning call,
+        # prints during planning on or off, a callback(x, y, cost) called
+        # with the position [m] and cost of every expanded node, and
+        # profiling of the time split and peak memory
+        self.stats = None
+        self.verbose = True
+        self.expansion_callback = None
+        self.profile = False
+
     class Node:
         def __init__(self, x, y, cost, parent_index):
             self.x = x  # index of grid
@@ -48,6 +83,19 @@ class Dijkstra:
             return str(self.x) + "," + str(self.y) + "," + str(
                 self.cost) + "," + str(self.parent_index)
 
+    def __getstate__(self):
+        """
+        Pickled state: the configuration and the obstacle map, without the
+        search caches, the shared obstacle map cache and the expansion
+        callback. A copy rebuilds its caches on first use.
+        """
+        state = self.__dict__.copy()
+        state.update(obstacle_map_cache=None, node_storage=None,
+                     cost_to_go_cache=OrderedDict(), cost_to_go_graph=None,
+                     cost_to_go_map_key=None, stats=None,
+                     expansion_callback=None)
+        return state
+
     def planning(self, sx, sy, gx, gy):
         """
         dijkstra path search
@@ -61,80 +109,259 @@ class Dijkstra:
         output:
             rx: x position list of the final path
             ry: y position list of the final path
+
+        The search statistics are kept in self.stats.
         """
+        self.stats = PlanningStats()
+        with self.stats.measure(self.profile):
+            return self.search(sx, sy, gx, gy)
 
+    def search(self, sx, sy, gx, gy):
         start_node = self.Node(self.calc_xy_index(sx, self.min_x),
                                self.calc_xy_index(sy, self.min_y), 0.0, -1)
         goal_node = self.Node(self.calc_xy_index(gx, self.min_x),
                               self.calc_xy_index(gy, self.min_y), 0.0, -1)
 
-        open_set, closed_set = dict(), dict()
-        open_set[self.calc_index(start_node)] = start_node
-
+        stats, verbose = self.stats, self.verbose
+        callback = self.expansion_callback
+        # the counters are kept in locals during the search
+        n_expanded, n_generated, n_open, peak_open = 0, 1, 1, 1
+        n_checks = 0
+        heappush, heappop = heapq.heappush, heapq.heappop
+        is_free_cell = None
+        if self.profile:
+            heappush = stats.timed("queue_time", heappush)
+            heappop = stats.timed("queue_time", heappop)
+            is_free_cell = stats.timed("collision_check_time",
+                                       self.is_free_cell)
+
+        # cost, parent index and open/closed state of the visited nodes in
+        # arrays indexed by grid index, used as the closed set
+        closed_set = self.get_node_storage()
+        cost, parent_index, state = closed_set.scalar_views()
+        # priority queue of (cost, grid index) with lazy deletion of the
+        # entries of nodes that got a cheaper cost
+        open_heap = []
+        n_closed = 0
+
+        start_id = closed_set.calc_index(start_node.x, start_node.y)
+        cost[start_id] = 0.0
+        state[start_id] = node_storage.OPEN
+        heappush(open_heap, (0.0, start_id))
+
+        x_width, y_width = self.x_width, self.y_width
         while True:
-            c_id = min(open_set, key=lambda o: open_set[o].cost)
-            current = open_set[c_id]
+            if len(open_heap) == 0:
+                if verbose:
+                    print("Open set is empty..")
+                break
+
+            c_cost, c_id = heappop(open_heap)
+            if state[c_id] == node_storage.CLOSED:
+                continue  # outdated entry of an already closed node
+            c_x, c_y = closed_set.calc_xy(c_id)
+            n_expanded += 1
+            if callback is not None:
+                callback(self.calc_position(c_x, self.min_x),
+                         self.calc_position(c_y, self.min_y), c_cost)
 
             # show graph
             if show_animation:  # pragma: no cover
-                plt.plot(self.calc_position(current.x, self.min_x),
-                         self.calc_position(current.y, self.min_y), "xc")
+                plt.plot(self.calc_position(c_x, self.min_x),
+                         self.calc_position(c_y, self.min_y), "xc")
                 # for stopping simulation with the esc key.
                 plt.gcf().canvas.mpl_connect(
                     'key_release_event',
                     lambda event: [exit(0) if event.key == 'escape' else None])
-                if len(closed_set.keys()) % 10 == 0:
+                if n_closed % 10 == 0:
                     plt.pause(0.001)
 
-            if current.x == goal_node.x and current.y == goal_node.y:
-                print("Find goal")
-                goal_node.parent_index = current.parent_index
-                goal_node.cost = current.cost
+            if c_x == goal_node.x and c_y == goal_node.y:
+                if verbose:
+                    print("Find goal")
+                goal_node.parent_index = parent_index[c_id]
+                goal_node.cost = c_cost
                 break
 
-            # Remove the item from the open set
-            del open_set[c_id]
-
-            # Add it to the closed set
-            closed_set[c_id] = current
+            # Move the item from the open set to the closed set
+            state[c_id] = node_storage.CLOSED
+            n_closed += 1
+            n_open -= 1
 
             # expand search grid based on motion model
             for move_x, move_y, move_cost in self.motion:
-                node = self.Node(current.x + move_x,
-                                 current.y + move_y,
-                                 current.cost + move_cost, c_id)
-                n_id = self.calc_index(node)
-
-                if n_id in closed_set:
+                n_x, n_y = c_x + move_x, c_y + move_y
+                n_checks += 1
+                if is_free_cell is None:
+                    if not (0 <= n_x < x_width and 0 <= n_y < y_width) or \
+                            self.obstacle_map[n_x][n_y]:
+                        continue
+                elif not is_free_cell(n_x, n_y):
                     continue
 
-                if not self.verify_node(node):
+                n_id = n_y * x_width + n_x
+                n_cost = c_cost + move_cost
+                if state[n_id] == node_storage.CLOSED or \
+                        n_cost >= cost[n_id]:
                     continue
 
-                if n_id not in open_set:
-                    open_set[n_id] = node  # Discover a new node
-                else:
-                    if open_set[n_id].cost >= node.cost:
-                        # This path is the best until now. record it!
-                        open_set[n_id] = node
+                # Discover a new node, or this path is the best until now.
+                # record it!
+                if state[n_id] == node_storage.UNVISITED:
+                    n_open += 1
+                    if n_open > peak_open:
+                        peak_open = n_open
+                cost[n_id] = n_cost
+                parent_index[n_id] = c_id
+                state[n_id] = node_storage.OPEN
+                n_generated += 1
+                heappush(open_heap, (n_cost, n_id))
+
+        stats.nodes_expanded, stats.nodes_generated = n_expanded, n_generated
+        stats.peak_open_set_size = peak_open
+        stats.collision_checks = n_checks
 
         rx, ry = self.calc_final_path(goal_node, closed_set)
 
         return rx, ry
 
-    def calc_final_path(self, goal_node, closed_set):
-        # generate final course
-        rx, ry = [self.calc_position(goal_node.x, self.min_x)], [
-            self.calc_position(goal_node.y, self.min_y)]
-        parent_index = goal_node.parent_index
-        while parent_index != -1:
-            n = closed_set[parent_index]
-            rx.append(self.calc_position(n.x, self.min_x))
-            ry.append(self.calc_position(n.y, self.min_y))
-            parent_index = n.parent_index
+    def plan_many(self, starts, goals, workers=None, timeout=None):
+        """
+        Plan paths for many start/goal pairs in a process pool
+
+        The obstacle map is shared with the worker processes through shared
+        memory instead of being rebuilt or copied for every query.
+
+        input:
+            starts: (N, 2) start positions [m]
+            goals: (N, 2) goal positions [m]
+            workers: number of worker processes, default is the CPU count
+            timeout: time limit of a single query [s]
+
+        output:
+            list of batch_planning.PlanningResult in input order
+        """
+        return batch_planning.plan_many(self, starts, goals, workers, timeout)
+
+    def planning_with_cost_to_go(self, sx, sy, gx, gy):
+        """
+        dijkstra path search with a cached cost-to-go field of the goal
+
+        The first query of a goal computes the cost-to-go field of the whole
+        map. Following queries to the same goal only descend the field from
+        the start, which costs O(path length).
 
+        input:
+            s_x: start x position [m]
+            s_y: start y position [m]
+            gx: goal x position [m]
+            gy: goal y position [m]
+
+        output:
+            rx: x position list of the final path, empty if the goal is not
+                reachable
+            ry: y position list of the final path
+        """
+        ix = self.calc_xy_index(sx, self.min_x)
+        iy = self.calc_xy_index(sy, self.min_y)
+        cost_to_go = self.calc_cost_to_go(gx, gy)
+        if not (0 <= ix < self.x_width and 0 <= iy < self.y_width) or \
+                math.isinf(cost_to_go[ix, iy]):
+            if self.verbose:
+                print("Goal is not reachable..")
+            return [], []
+
+        rx, ry = [self.calc_position(ix, self.min_x)], [
+            self.calc_position(iy, self.min_y)]
+        while cost_to_go[ix, iy] > 0.0:
+            # steepest descent: the optimal move keeps the total cost
+            best_cost, best_ix, best_iy = math.inf, ix, iy
+            for move_x, move_y, move_cost in self.motion:
+                nx, ny = ix + move_x, iy + move_y
+                if 0 <= nx < self.x_width and 0 <= ny < self.y_width and \
+                        not self.obstacle_map[nx][ny] and \
+                        move_cost + cost_to_go[nx, ny] < best_cost:
+                    best_cost = move_cost + cost_to_go[nx, ny]
+                    best_ix, best_iy = nx, ny
+            ix, iy = best_ix, best_iy
+            rx.append(self.calc_position(ix, self.min_x))
+            ry.append(self.calc_position(iy, self.min_y))
+
+        # goal first, the same order as planning
+        rx.reverse()
+        ry.reverse()
         return rx, ry
 
+    def calc_cost_to_go(self, gx, gy):
+        """
+        Cost-to-go field of a goal
+
+        The fields of the last cost_to_go_cache_size goals are cached. The
+        cache is dropped when the obstacle map changes, whether it is
+        replaced or edited in place.
+
+        input:
+            gx: goal x position [m]
+            gy: goal y position [m]
+
+        output:
+            (x_width, y_width) array of the path cost from each cell to the
+            goal, inf where the goal is not reachable
+        """
+        if self.cost_to_go_map_key != self.calc_obstacle_map_key():
+            self.clear_cost_to_go_cache()
+
+        ix = self.calc_xy_index(gx, self.min_x)
+        iy = self.calc_xy_index(gy, self.min_y)
+        if not (0 <= ix < self.x_width and 0 <= iy < self.y_width):
+            return np.full((self.x_width, self.y_width), np.inf)
+
+        goal_index = ix * self.y_width + iy  # node of calc_motion_graph
+        if goal_index in self.cost_to_go_cache:
+            self.cost_to_go_cache.move_to_end(goal_index)
+            return self.cost_to_go_cache[goal_index]
+
+        if self.cost_to_go_graph is None:
+            self.cost_to_go_graph = self.calc_cost_to_go_graph()
+        cost_to_go = csgraph_dijkstra(
+            self.cost_to_go_graph, indices=goal_index).reshape(
+            self.x_width, self.y_width)
+
+        self.cost_to_go_cache[goal_index] = cost_to_go
+        while len(self.cost_to_go_cache) > self.cost_to_go_cache_size:
+            self.cost_to_go_cache.popitem(last=False)
+        return cost_to_go
+
+    def clear_cost_to_go_cache(self):
+        self.cost_to_go_cache.clear()
+        self.cost_to_go_graph = None
+        self.cost_to_go_map_key = self.calc_obstacle_map_key()
+
+    def calc_obstacle_map_key(self):
+        # hashing the map bytes costs much less than a cost-to-go search
+        obstacle_map = np.asarray(self.obstacle_map)
+        return obstacle_map.shape, hash(obstacle_map.tobytes())
+
+    def calc_cost_to_go_graph(self):
+        # the cost-to-go search runs from the goal on the reversed moves
+        return occupancy_grid.calc_motion_graph(
+            self.obstacle_map, self.motion).T.tocsr()
+
+    def calc_final_path(self, goal_node, closed_set):
+        # generate final course by walking the parent indices of the
+        # closed nodes back to the start
+        ix, iy = closed_set.calc_path(goal_node.parent_index,
+                                      (goal_node.x, goal_node.y))
+        rx = self.calc_position(ix, self.min_x).tolist()
+        ry = self.calc_position(iy, self.min_y).tolist()
+        return rx, ry
+
+    def get_node_storage(self):
+        """Node arrays of a new search, see GridNodeStorage.for_grid"""
+        self.node_storage = node_storage.GridNodeStorage.for_grid(
+            self.node_storage, self.x_width, self.y_width)
+        return self.node_storage
+
     def calc_position(self, index, minp):
         pos = index * self.resolution + minp
         return pos
@@ -143,7 +370,7 @@ class Dijkstra:
         return round((position - minp) / self.resolution)
 
     def calc_index(self, node):
-        return (node.y - self.min_y) * self.x_width + (node.x - self.min_x)
+        return node.y * self.x_width + node.x
 
     def verify_node(self, node):
         px = self.calc_position(node.x, self.min_x)
@@ -163,35 +390,28 @@ class Dijkstra:
 
         return True
 
+    def is_free_cell(self, x, y):
+        # collision check of the search by grid index
+        return 0 <= x < self.x_width and 0 <= y < self.y_width and \
+            not self.obstacle_map[x][y]
+
     def calc_obstacle_map(self, ox, oy):
 
-        self.min_x = round(min(ox))
-        self.min_y = round(min(oy))
-        self.max_x = round(max(ox))
-        self.max_y = round(max(oy))
+        build_obstacle_map = occupancy_grid.calc_obstacle_map
+        if self.obstacle_map_cache is not None:
+            build_obstacle_map = self.obstacle_map_cache.calc_obstacle_map
+        (self.min_x, self.min_y, self.max_x, self.max_y,
+         self.obstacle_map) = build_obstacle_map(
+            ox, oy, self.resolution, self.robot_radius)
         print("min_x:", self.min_x)
         print("min_y:", self.min_y)
         print("max_x:", self.max_x)
         print("max_y:", self.max_y)
 
-        self.x_width = round((self.max_x - self.min_x) / self.resolution)
-        self.y_width = round((self.max_y - self.min_y) / self.resolution)
+        self.x_width, self.y_width = self.obstacle_map.shape
         print("x_width:", self.x_width)
         print("y_width:", self.y_width)
 
-        # obstacle map generation
-        self.obstacle_map = [[False for _ in range(self.y_width)]
-                             for _ in range(self.x_width)]
-        for ix in range(self.x_width):
-            x = self.calc_position(ix, self.min_x)
-            for iy in range(self.y_width):
-                y = self.calc_position(iy, self.min_y)
-                for iox, ioy in zip(ox, oy):
-                    d = math.hypot(iox - x, ioy - y)
-                    if d <= self.robot_radius:
-                        self.obstacle_map[ix][iy] = True
-                        break
-
     @staticmethod
     def get_motion_model():
         # dx, dy, cost
@@ -9,9 +9,15 @@ See Wikipedia article (https://en.wikipedia.org/wiki/Best-first_search)
 """
 
 import math
+import pathlib
+import sys
 
 import matplotlib.pyplot as plt
 
+sys.path.append(str(pathlib.Path(__file__).parent.parent.parent))
+from utils import occupancy_grid
+from utils.planning_stats import PlanningStats
+
 show_animation = True
 
 
@@ -32,6 +38,11 @@ class BestFirstSearchPlanner:
         self.calc_obstacle_map(ox, oy)
         self.motion = self.get_motion_model()
 
+        # search statistics of the last planning call and prints during
+        # planning on or off
+        self.stats = None
+        self.verbose = True
+
     class Node:
         def __init__(self, x, y, cost, pind, parent):
             self.x = x  # index of grid
@@ -57,8 +68,14 @@ class BestFirstSearchPlanner:
         output:
             rx: x position list of the final path
             ry: y position list of the final path
+
+        The search statistics are kept in self.stats.
         """
+        self.stats = PlanningStats()
+        with self.stats.measure():
+            return self.search(sx, sy, gx, gy)
 
+    def search(self, sx, sy, gx, gy):
         nstart = self.Node(self.calc_xyindex(sx, self.minx),
                            self.calc_xyindex(sy, self.miny), 0.0, -1, None)
         ngoal = self.Node(self.calc_xyindex(gx, self.minx),
@@ -66,10 +83,13 @@ class BestFirstSearchPlanner:
 
         open_set, closed_set = dict(), dict()
         open_set[self.calc_grid_index(nstart)] = nstart
+        stats = self.stats
+        stats.nodes_generated = stats.peak_open_set_size = 1
 
         while True:
             if len(open_set) == 0:
-                print("Open set is empty..")
+                if self.verbose:
+                    print("Open set is empty..")
                 break
 
             c_id = min(
@@ -96,9 +116,11 @@ class BestFirstSearchPlanner:
 
             # Add it to the closed set
             closed_set[c_id] = current
+            stats.nodes_expanded += 1
 
             if current.x == ngoal.x and current.y == ngoal.y:
-                print("Found goal")
+                if self.verbose:
+                    print("Found goal")
                 ngoal.pind = current.pind
                 ngoal.cost = current.cost
                 break
@@ -113,6 +135,7 @@ class BestFirstSearchPlanner:
                 n_id = self.calc_grid_index(node)
 
                 # If the node is not safe, do nothing
+                stats.collision_checks += 1
                 if not self.verify_node(node):
                     continue
 
@@ -121,6 +144,9 @@ class BestFirstSearchPlanner:
 
                 if n_id not in open_set:
                     open_set[n_id] = node
+                    stats.nodes_generated += 1
+                    stats.peak_open_set_size = max(stats.peak_open_set_size,
+                                                   len(open_set))
                 else:
                     if open_set[n_id].cost > node.cost:
                         open_set[n_id] = node
@@ -184,33 +210,18 @@ class BestFirstSearchPlanner:
 
     def calc_obstacle_map(self, ox, oy):
 
-        self.minx = round(min(ox))
-        self.miny = round(min(oy))
-        self.maxx = round(max(ox))
-        self.maxy = round(max(oy))
+        (self.minx, self.miny, self.maxx, self.maxy,
+         self.obmap) = occupancy_grid.calc_obstacle_map(
+            ox, oy, self.reso, self.rr)
         print("min_x:", self.minx)
         print("min_y:", self.miny)
         print("max_x:", self.maxx)
         print("max_y:", self.maxy)
 
-        self.xwidth = round((self.maxx - self.minx) / self.reso)
-        self.ywidth = round((self.maxy - self.miny) / self.reso)
+        self.xwidth, self.ywidth = self.obmap.shape
         print("x_width:", self.xwidth)
         print("y_width:", self.ywidth)
 
-        # obstacle map generation
-        self.obmap = [[False for _ in range(self.ywidth)]
-                      for _ in range(self.xwidth)]
-        for ix in range(self.xwidth):
-            x = self.calc_grid_position(ix, self.minx)
-            for iy in range(self.ywidth):
-                y = self.calc_grid_position(iy, self.miny)
-                for iox, ioy in zip(ox, oy):
-                    d = math.hypot(iox - x, ioy - y)
-                    if d <= self.rr:
-                        self.obmap[ix][iy] = True
-                        break
-
     @staticmethod
     def get_motion_model():
         # dx, dy, cost
@@ -0,0 +1,204 @@
+"""
+
+Grid planner benchmark on MovingAI maps and scenarios
+
+Runs the scenarios of MovingAI .scen files, or of random maps of growing
+size, with the grid planners and reports for every planner and map the
+expansion rate, the latency percentiles of the queries and the peak memory
+of a query. The results are written to a CSV file.
+
+Ref:
+
+- [Benchmarks for Grid-Based Pathfinding]
+(https://movingai.com/benchmarks/grids.html)
+
+"""
+
+import contextlib
+import csv
+import io
+import math
+import os
+import pathlib
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(str(pathlib.Path(__file__).parent.parent.parent))
+from utils import moving_ai
+from utils.planning_stats import PlanningStats
+from PathPlanning.AStar.a_star import AStarPlanner
+from PathPlanning.BidirectionalAStar import bidirectional_a_star
+from PathPlanning.BreadthFirstSearch import breadth_first_search
+from PathPlanning.Dijkstra import dijkstra
+from PathPlanning.GreedyBestFirstSearch import greedy_best_first_search
+
+CSV_FILENAME = "grid_planning_benchmark_results.csv"
+
+PLANNERS = {
+    "a_star": AStarPlanner,
+    "dijkstra": dijkstra.Dijkstra,
+    "bidirectional_a_star": bidirectional_a_star.BidirectionalAStarPlanner,
+    "breadth_first_search": breadth_first_search.BreadthFirstSearchPlanner,
+    "greedy_best_first_search":
+        greedy_best_first_search.BestFirstSearchPlanner,
+}
+
+# side lengths [cells] of the random benchmark maps
+MAP_SIZES = [32, 64, 128]
+
+# a robot radius below one cell keeps the free cells of the map
+ROBOT_RADIUS = 0.5
+
+
+def benchmark_planner(planner_class, moving_ai_map, scenarios,
+                      measure_memory=True):
+    """
+    Run the scenarios of a map with a planner
+
+    Parameters
+    ----------
+    planner_class :
+        grid planner class with a (ox, oy, resolution, robot_radius)
+        constructor, a planning(sx, sy, gx, gy) method and a stats attribute
+    moving_ai_map : moving_ai.MovingAIMap
+    scenarios : list of moving_ai.Scenario
+    measure_memory : bool
+        run every query a second time with tracemalloc to measure its peak
+        memory, which is too slow to be part of the latency measurement
+
+    Returns
+    -------
+    dict
+        the result row of the benchmark
+    """
+    module = sys.modules[planner_class.__module__]
+    if hasattr(module, "show_animation"):
+        module.show_animation = False
+
+    ox, oy = moving_ai.calc_obstacle_points(moving_ai_map)
+    # the planners print their map bounds and search results
+    with contextlib.redirect_stdout(io.StringIO()):
+        planner = planner_class(ox, oy, 1.0, ROBOT_RADIUS)
+    planner.verbose = False
+
+    latencies, expansions, suboptimality = [], 0, []
+    peak_memory, n_solved = 0, 0
+    for s in scenarios:
+        start_time = time.perf_counter()
+        rx, ry = planner.planning(s.start_x, s.start_y, s.goal_x, s.goal_y)
+        latencies.append(time.perf_counter() - start_time)
+        expansions += planner.stats.nodes_expanded
+
+        # the paths run from the goal to the start, except for the
+        # bidirectional search
+        if rx and {(rx[0], ry[0]), (rx[-1], ry[-1])} == {
+                (s.start_x, s.start_y), (s.goal_x, s.goal_y)}:
+            n_solved += 1
+            if s.optimal_length > 0.0:
+                suboptimality.append(calc_path_length(rx, ry) /
+                                     s.optimal_length)
+
+        if measure_memory:
+            stats = PlanningStats()
+            with stats.measure(profile=True):
+                planner.planning(s.start_x, s.start_y, s.goal_x, s.goal_y)
+            peak_memory = max(peak_memory, stats.peak_memory)
+
+    p50, p90, p99 = np.percentile(latencies, [50, 90, 99])
+    return {
+        "Planner": planner_class.__name__,
+        "Map": moving_ai_map.name,
+        "Cells": moving_ai_map.width * moving_ai_map.height,
+        "Queries": len(scenarios),
+        "Solved": n_solved,
+        "Expansions/s": expansions / sum(latencies),
+        "Latency p50 (s)": p50,
+        "Latency p90 (s)": p90,
+        "Latency p99 (s)": p99,
+        "Peak Memory (KiB)": peak_memory / 1024.0,
+        "Mean Suboptimality": np.mean(suboptimality) if suboptimality
+        else math.nan,
+    }
+
+
+def calc_path_length(rx, ry):
+    return float(np.sum(np.hypot(np.diff(rx), np.diff(ry))))
+
+
+def load_scenario_file(scen_path, max_scenarios=None):
+    """
+    Scenarios of a .scen file and the map they refer to
+
+    The map is looked up at its path relative to the scenario file, then by
+    its file name next to the scenario file.
+    """
+    scenarios = moving_ai.load_scenarios(scen_path)[:max_scenarios]
+    if not scenarios:
+        raise ValueError(f"{scen_path}: no scenarios")
+    scen_dir = os.path.dirname(scen_path)
+    map_path = os.path.join(scen_dir, scenarios[0].map_name)
+    if not os.path.exists(map_path):
+        map_path = os.path.join(scen_dir,
+                                os.path.basename(scenarios[0].map_name))
+    return moving_ai.load_map(map_path), scenarios
+
+
+def save_results_to_csv(results, csv_filename=CSV_FILENAME):
+    with open(csv_filename, mode="w", newline="") as file:
+        writer = csv.DictWriter(file, fieldnames=list(results[0]))
+        writer.writeheader()
+        writer.writerows(results)
+
+
+def main(scenario_files=None, sizes=None, n_scenarios=10, planners=None,
+         measure_memory=True, csv_filename=CSV_FILENAME):
+    """
+    Benchmark the grid planners
+
+    scenario_files: MovingAI .scen files to run, by default random maps of
+        the given sizes with n_scenarios random scenarios each
+    sizes: side lengths of the random maps [cells]
+    n_scenarios: number of scenarios per map
+    planners: names of PLANNERS to run, default all
+    measure_memory: measure the peak memory of the queries
+    csv_filename: CSV file of the results, None to not write it
+    """
+    print(__file__ + " start!!")
+
+    if scenario_files:
+        benchmarks = [load_scenario_file(path, n_scenarios)
+                      for path in scenario_files]
+    else:
+        benchmarks = []
+        for size in sizes or MAP_SIZES:
+            moving_ai_map = moving_ai.make_random_map(size, seed=size)
+            benchmarks.append((moving_ai_map, moving_ai.make_scenarios(
+                moving_ai_map, n_scenarios, seed=size)))
+
+    results = []
+    for name in planners or PLANNERS:
+        for moving_ai_map, scenarios in benchmarks:
+            results.append(benchmark_planner(PLANNERS[name], moving_ai_map,
+                                             scenarios, measure_memory))
+
+    print("planner, map, cells, solved, expansions/s, p50 [ms], p90 [ms], "
+          "p99 [ms], peak memory [KiB]")
+    for r in results:
+        print(f"{r['Planner']}, {r['Map']}, {r['Cells']}, "
+              f"{r['Solved']}/{r['Queries']}, {r['Expansions/s']:.0f}, "
+              f"{r['Latency p50 (s)'] * 1e3:.2f}, "
+              f"{r['Latency p90 (s)'] * 1e3:.2f}, "
+              f"{r['Latency p99 (s)'] * 1e3:.2f}, "
+              f"{r['Peak Memory (KiB)']:.0f}")
+
+    if csv_filename is not None:
+        save_results_to_csv(results, csv_filename)
+        print(f"Results saved to {csv_filename}")
+
+    return results
+
+
+if __name__ == '__main__':
+    main()
@@ -14,10 +14,12 @@ from scipy.spatial import cKDTree
 import sys
 import pathlib
 sys.path.append(str(pathlib.Path(__file__).parent.parent))
+sys.path.append(str(pathlib.Path(__file__).parent.parent.parent))
 
 from dynamic_programming_heuristic import calc_distance_heuristic
 from ReedsSheppPath import reeds_shepp_path_planning as rs
 from car import move, check_car_collision, MAX_STEER, WB, plot_car, BUBBLE_R
+from utils.planning_stats import PlanningStats
 
 XY_GRID_RESOLUTION = 2.0  # [m]
 YAW_GRID_RESOLUTION = np.deg2rad(15.0)  # [rad]
@@ -94,14 +96,17 @@ def calc_motion_inputs():
             yield [steer, d]
 
 
-def get_neighbors(current, config, ox, oy, kd_tree):
+def get_neighbors(current, config, ox, oy, kd_tree,
+                  collision_check=check_car_collision):
     for steer, d in calc_motion_inputs():
-        node = calc_next_node(current, steer, d, config, ox, oy, kd_tree)
+        node = calc_next_node(current, steer, d, config, ox, oy, kd_tree,
+                              collision_check)
         if node and verify_index(node, config):
             yield node
 
 
-def calc_next_node(current, steer, direction, config, ox, oy, kd_tree):
+def calc_next_node(current, steer, direction, config, ox, oy, kd_tree,
+                   collision_check=check_car_collision):
     x, y, yaw = current.x_list[-1], current.y_list[-1], current.yaw_list[-1]
 
     arc_l = XY_GRID_RESOLUTION * 1.5
@@ -113,7 +118,7 @@ def calc_next_node(current, steer, direction, config, ox, oy, kd_tree):
         yaw_list.append(yaw)
         direction_list.append(direction == 1)
 
-    if not check_car_collision(x_list, y_list, yaw_list, ox, oy, kd_tree):
+    if not collision_check(x_list, y_list, yaw_list, ox, oy, kd_tree):
         return None
 
     d = direction == 1
@@ -150,7 +155,8 @@ def is_same_grid(n1, n2):
     return False
 
 
-def analytic_expansion(current, goal, ox, oy, kd_tree):
+def analytic_expansion(current, goal, ox, oy, kd_tree,
+                       collision_check=check_car_collision):
     start_x = current.x_list[-1]
     start_y = current.y_list[-1]
     start_yaw = current.yaw_list[-1]
@@ -170,7 +176,7 @@ def analytic_expansion(current, goal, ox, oy, kd_tree):
     best_path, best = None, None
 
     for path in paths:
-        if check_car_collision(path.x, path.y, path.yaw, ox, oy, kd_tree):
+        if collision_check(path.x, path.y, path.yaw, ox, oy, kd_tree):
             cost = calc_rs_path_cost(path)
             if not best or best > cost:
                 best = cost
@@ -180,8 +186,10 @@ def analytic_expansion(current, goal, ox, oy, kd_tree):
 
 
 def update_node_with_analytic_expansion(current, goal,
-                                        c, ox, oy, kd_tree):
-    path = analytic_expansion(current, goal, ox, oy, kd_tree)
+                                        c, ox, oy, kd_tree,
+                                        collision_check=check_car_collision):
+    path = analytic_expansion(current, goal, ox, oy, kd_tree,
+                              collision_check)
 
     if path:
         if show_animation:
@@ -241,7 +249,9 @@ def calc_rs_path_cost(reed_shepp_path):
     return cost
 
 
-def hybrid_a_star_planning(start, goal, ox, oy, xy_resolution, yaw_resolution):
+def hybrid_a_star_planning(start, goal, ox, oy, xy_resolution, yaw_resolution,
+                           stats=None, expansion_callback=None, verbose=True,
+                           profile=False):
     """
     start: start node
     goal: goal node
@@ -249,77 +259,112 @@ def hybrid_a_star_planning(start, goal, ox, oy, xy_resolution, yaw_resolution):
     oy: y position list of Obstacles [m]
     xy_resolution: grid resolution [m]
     yaw_resolution: yaw angle resolution [rad]
+    stats: optional utils.planning_stats.PlanningStats filled with the
+        search statistics
+    expansion_callback: optional callback(x, y, cost) called with the
+        position [m] and cost of every expanded node
+    verbose: print the search result
+    profile: measure the time split and the peak memory into stats
     """
-
-    start[2], goal[2] = rs.pi_2_pi(start[2]), rs.pi_2_pi(goal[2])
-    tox, toy = ox[:], oy[:]
-
-    obstacle_kd_tree = cKDTree(np.vstack((tox, toy)).T)
-
-    config = Config(tox, toy, xy_resolution, yaw_resolution)
-
-    start_node = Node(round(start[0] / xy_resolution),
-                      round(start[1] / xy_resolution),
-                      round(start[2] / yaw_resolution), True,
-                      [start[0]], [start[1]], [start[2]], [True], cost=0)
-    goal_node = Node(round(goal[0] / xy_resolution),
-                     round(goal[1] / xy_resolution),
-                     round(goal[2] / yaw_resolution), True,
-                     [goal[0]], [goal[1]], [goal[2]], [True])
-
-    openList, closedList = {}, {}
-
-    h_dp = calc_distance_heuristic(
-        goal_node.x_list[-1], goal_node.y_list[-1],
-        ox, oy, xy_resolution, BUBBLE_R)
-
-    pq = []
-    openList[calc_index(start_node, config)] = start_node
-    heapq.heappush(pq, (calc_cost(start_node, h_dp, config),
-                        calc_index(start_node, config)))
-    final_path = None
-
-    while True:
-        if not openList:
-            print("Error: Cannot find path, No open set")
-            return Path([], [], [], [], 0)
-
-        cost, c_id = heapq.heappop(pq)
-        if c_id in openList:
-            current = openList.pop(c_id)
-            closedList[c_id] = current
-        else:
-            continue
-
-        if show_animation:  # pragma: no cover
-            plt.plot(current.x_list[-1], current.y_list[-1], "xc")
-            # for stopping simulation with the esc key.
-            plt.gcf().canvas.mpl_connect(
-                'key_release_event',
-                lambda event: [exit(0) if event.key == 'escape' else None])
-            if len(closedList.keys()) % 10 == 0:
-                plt.pause(0.001)
-
-        is_updated, final_path = update_node_with_analytic_expansion(
-            current, goal_node, config, ox, oy, obstacle_kd_tree)
-
-        if is_updated:
-            print("path found")
-            break
-
-        for neighbor in get_neighbors(current, config, ox, oy,
-                                      obstacle_kd_tree):
-            neighbor_index = calc_index(neighbor, config)
-            if neighbor_index in closedList:
+    if stats is None:
+        stats = PlanningStats()
+
+    def counted_collision_check(*args):
+        stats.collision_checks += 1
+        return check_car_collision(*args)
+
+    collision_check = counted_collision_check
+    heappush, heappop = heapq.heappush, heapq.heappop
+    heuristic_cost, distance_heuristic = calc_cost, calc_distance_heuristic
+    if profile:
+        collision_check = stats.timed("collision_check_time", collision_check)
+        heappush = stats.timed("queue_time", heappush)
+        heappop = stats.timed("queue_time", heappop)
+        heuristic_cost = stats.timed("heuristic_time", heuristic_cost)
+        distance_heuristic = stats.timed("heuristic_time", distance_heuristic)
+
+    with stats.measure(profile):
+        start[2], goal[2] = rs.pi_2_pi(start[2]), rs.pi_2_pi(goal[2])
+        tox, toy = ox[:], oy[:]
+
+        obstacle_kd_tree = cKDTree(np.vstack((tox, toy)).T)
+
+        config = Config(tox, toy, xy_resolution, yaw_resolution)
+
+        start_node = Node(round(start[0] / xy_resolution),
+                          round(start[1] / xy_resolution),
+                          round(start[2] / yaw_resolution), True,
+                          [start[0]], [start[1]], [start[2]], [True], cost=0)
+        goal_node = Node(round(goal[0] / xy_resolution),
+                         round(goal[1] / xy_resolution),
+                         round(goal[2] / yaw_resolution), True,
+                         [goal[0]], [goal[1]], [goal[2]], [True])
+
+        openList, closedList = {}, {}
+
+        h_dp = distance_heuristic(
+            goal_node.x_list[-1], goal_node.y_list[-1],
+            ox, oy, xy_resolution, BUBBLE_R)
+
+        pq = []
+        openList[calc_index(start_node, config)] = start_node
+        heappush(pq, (heuristic_cost(start_node, h_dp, config),
+                      calc_index(start_node, config)))
+        stats.nodes_generated += 1
+        stats.peak_open_set_size = max(stats.peak_open_set_size, 1)
+        final_path = None
+
+        while True:
+            if not openList:
+                if verbose:
+                    print("Error: Cannot find path, No open set")
+                return Path([], [], [], [], 0)
+
+            cost, c_id = heappop(pq)
+            if c_id in openList:
+                current = openList.pop(c_id)
+                closedList[c_id] = current
+            else:
                 continue
-            if neighbor_index not in openList \
-                    or openList[neighbor_index].cost > neighbor.cost:
-                heapq.heappush(
-                    pq, (calc_cost(neighbor, h_dp, config),
-                         neighbor_index))
-                openList[neighbor_index] = neighbor
-
-    path = get_final_path(closedList, final_path)
+            stats.nodes_expanded += 1
+            if expansion_callback is not None:
+                expansion_callback(current.x_list[-1], current.y_list[-1],
+                                   current.cost)
+
+            if show_animation:  # pragma: no cover
+                plt.plot(current.x_list[-1], current.y_list[-1], "xc")
+                # for stopping simulation with the esc key.
+                plt.gcf().canvas.mpl_connect(
+                    'key_release_event',
+                    lambda event: [exit(0) if event.key == 'escape' else None])
+                if len(closedList.keys()) % 10 == 0:
+                    plt.pause(0.001)
+
+            is_updated, final_path = update_node_with_analytic_expansion(
+                current, goal_node, config, ox, oy, obstacle_kd_tree,
+                collision_check)
+
+            if is_updated:
+                if verbose:
+                    print("path found")
+                break
+
+            for neighbor in get_neighbors(current, config, ox, oy,
+                                          obstacle_kd_tree, collision_check):
+                neighbor_index = calc_index(neighbor, config)
+                if neighbor_index in closedList:
+                    continue
+                if neighbor_index not in openList \
+                        or openList[neighbor_index].cost > neighbor.cost:
+                    heappush(
+                        pq, (heuristic_cost(neighbor, h_dp, config),
+                             neighbor_index))
+                    openList[neighbor_index] = neighbor
+                    stats.nodes_generated += 1
+                    stats.peak_open_set_size = max(stats.peak_open_set_size,
+                                                   len(openList))
+
+        path = get_final_path(closedList, final_path)
     return path
 
 
@@ -21,6 +21,7 @@ import random
 import matplotlib.pyplot as plt
 import numpy as np
 
+from utils import portfolio_planning
 from utils.angle import rot_mat_2d
 
 show_animation = True
@@ -107,6 +108,16 @@ class InformedRRTStar:
 
         return path
 
+    def plan_portfolio(self, seeds=4, workers=None, deadline=None,
+                       return_first=True):
+        """
+        Run independently seeded copies of informed_rrt_star_search in a
+        process pool, see RRT.plan_portfolio
+        """
+        return portfolio_planning.plan_portfolio(
+            self, seeds, workers, deadline, return_first,
+            method="informed_rrt_star_search")
+
     def choose_parent(self, new_node, near_inds):
         if len(near_inds) == 0:
             return new_node
@@ -7,11 +7,20 @@ author: AtsushiSakai(@Atsushi_twi)
 """
 
 import math
+import pathlib
 import random
+import sys
 
 import matplotlib.pyplot as plt
 import numpy as np
 
+sys.path.append(str(pathlib.Path(__file__).parent.parent.parent))
+from utils import portfolio_planning
+from utils.collision_checker import reuse_collision_checker
+from utils.nearest_neighbor import KDTreeIndex, NodeListIndex
+from utils.planning_stats import PlanningStats
+from utils.tree_storage import TreeStorage
+
 show_animation = True
 
 
@@ -20,6 +29,30 @@ class RRT:
     Class for RRT planning
     """
 
+    # search instrumentation: statistics of the last planning call, prints
+    # during planning on or off, a callback(x, y, cost) called with every
+    # node added to the tree, and profiling of the collision check time and
+    # peak memory. Class attributes, so that the subclasses with their own
+    # __init__ have them as well.
+    stats = None
+    verbose = True
+    expansion_callback = None
+    profile = False
+    # index class of the nearest node lookup, see utils.nearest_neighbor,
+    # and the index of the node list of the planner
+    nearest_neighbor_index = KDTreeIndex
+    node_index = None
+    # checker of the obstacle list, rebuilt when the obstacles change
+    collision_checker = None
+    # checker of the static check_collision
+    static_collision_checker = None
+    # keep the tree of search() in a utils.tree_storage.TreeStorage instead
+    # of a list of nodes
+    use_tree_storage = True
+    # source of the random samples with a sample() method returning x, y in
+    # the sampling area, like sobol.SobolSampler, uniform random if None
+    sampler = None
+
     class Node:
         """
         RRT Node
@@ -80,15 +113,54 @@ class RRT:
         self.node_list = []
         self.robot_radius = robot_radius
 
+    def __getstate__(self):
+        """
+        Pickled state: the configuration and the tree, without the search
+        caches, the statistics and the expansion callback, which fall back
+        to the class defaults. A copy rebuilds its caches on first use.
+        """
+        state = self.__dict__.copy()
+        for name in ("node_index", "collision_checker", "children",
+                     "children_node_list", "children_node_count", "stats",
+                     "expansion_callback"):
+            state.pop(name, None)
+        return state
+
     def planning(self, animation=True):
         """
         rrt path planning
 
         animation: flag for animation on or off
+
+        The search statistics are kept in self.stats.
+        """
+        self.stats = PlanningStats()
+        with self.stats.measure(self.profile):
+            return self.search(animation)
+
+    def plan_portfolio(self, seeds=4, workers=None, deadline=None,
+                       return_first=True):
         """
+        Run independently seeded copies of the planner in a process pool
+
+        input:
+            seeds: seeds of the runs, or their number
+            workers: number of worker processes, default is the CPU count
+            deadline: time limit [s], the unfinished runs are cancelled
+            return_first: return the first path found, otherwise the
+                shortest path of the runs finished by the deadline
 
-        self.node_list = [self.start]
+        output:
+            portfolio_planning.PortfolioResult
+        """
+        return portfolio_planning.plan_portfolio(self, seeds, workers,
+                                                 deadline, return_first)
+
+    def search(self, animation):
+        self.node_list = self.new_tree()
+        self.stats.nodes_generated = self.stats.peak_open_set_size = 1
         for i in range(self.max_iter):
+            self.stats.nodes_expanded += 1
             rnd_node = self.get_random_node()
             nearest_ind = self.get_nearest_node_index(self.node_list, rnd_node)
             nearest_node = self.node_list[nearest_ind]
@@ -96,9 +168,8 @@ class RRT:
             new_node = self.steer(nearest_node, rnd_node, self.expand_dis)
 
             if self.check_if_outside_play_area(new_node, self.play_area) and \
-               self.check_collision(
-                   new_node, self.obstacle_list, self.robot_radius):
-                self.node_list.append(new_node)
+               self.check_node_collision(new_node):
+                self.add_node(new_node)
 
             if animation and i % 5 == 0:
                 self.draw_graph(rnd_node)
@@ -107,8 +178,7 @@ class RRT:
                                       self.node_list[-1].y) <= self.expand_dis:
                 final_node = self.steer(self.node_list[-1], self.end,
                                         self.expand_dis)
-                if self.check_collision(
-                        final_node, self.obstacle_list, self.robot_radius):
+                if self.check_node_collision(final_node):
                     return self.generate_final_course(len(self.node_list) - 1)
 
             if animation and i % 5:
@@ -116,6 +186,83 @@ class RRT:
 
         return None  # cannot find path
 
+    def new_tree(self):
+        """
+        Node list of a tree of the start node, a TreeStorage or a list
+        """
+        if self.use_tree_storage:
+            return TreeStorage(self.start)
+        return [self.start]
+
+    def get_node_coordinates(self):
+        """
+        Arrays of the x and y coordinates of the nodes of the tree
+        """
+        if isinstance(self.node_list, TreeStorage):
+            return self.node_list.coordinates()
+        return (np.array([node.x for node in self.node_list], dtype=float),
+                np.array([node.y for node in self.node_list], dtype=float))
+
+    def add_node(self, node):
+        """
+        Append a node to the tree, counted in self.stats
+        """
+        self.node_list.append(node)
+        stats = self.stats
+        if stats is not None:
+            stats.nodes_generated += 1
+            stats.peak_open_set_size = max(stats.peak_open_set_size,
+                                           len(self.node_list))
+        if self.expansion_callback is not None:
+            self.expansion_callback(node.x, node.y,
+                                    getattr(node, "cost", None))
+
+    def get_collision_checker(self):
+        """
+        Collision checker of the obstacle list and the robot radius of the
+        planner, built again when either of them changes
+        """
+        self.collision_checker = reuse_collision_checker(
+            self.collision_checker, self.obstacle_list, self.robot_radius)
+        return self.collision_checker
+
+    def check_node_collision(self, node):
+        """
+        check_collision of a node with the obstacle list and the robot
+        radius of the planner, counted and timed in self.stats
+        """
+        if node is None:
+            return False
+        checker = self.get_collision_checker()
+        stats = self.stats
+        if stats is None:
+            return checker.check_path(node.path_x, node.path_y)
+        stats.collision_checks += 1
+        with stats.timer("collision_check_time", self.profile):
+            return checker.check_path(node.path_x, node.path_y)
+
+    def check_nodes_collision(self, nodes):
+        """
+        check_node_collision of several nodes in one batch, returns a list
+        of booleans
+        """
+        safe = [False] * len(nodes)
+        inds = [i for i, node in enumerate(nodes) if node is not None]
+        if not inds:
+            return safe
+        checker = self.get_collision_checker()
+        paths = [(nodes[i].path_x, nodes[i].path_y) for i in inds]
+        stats = self.stats
+        if stats is None:
+            result = checker.check_paths(paths)
+        else:
+            stats.collision_checks += len(inds)
+            with stats.timer("collision_check_time", self.profile):
+                result = checker.check_paths(paths)
+        for i, ok in zip(inds, result.tolist()):
+            safe[i] = ok
+        return safe
+
     def steer(self, from_node, to_node, extend_length=float("inf")):
 
         new_node = self.Node(from_node.x, from_node.y)
@@ -163,9 +310,12 @@ class RRT:
 
     def get_random_node(self):
         if random.randint(0, 100) > self.goal_sample_rate:
-            rnd = self.Node(
-                random.uniform(self.min_rand, self.max_rand),
-                random.uniform(self.min_rand, self.max_rand))
+            if self.sampler is None:
+                rnd = self.Node(
+                    random.uniform(self.min_rand, self.max_rand),
+                    random.uniform(self.min_rand, self.max_rand))
+            else:
+                rnd = self.Node(*self.sampler.sample())
         else:  # goal point sampling
             rnd = self.Node(self.end.x, self.end.y)
         return rnd
@@ -211,13 +361,14 @@ class RRT:
         yl = [y + size * math.sin(np.deg2rad(d)) for d in deg]
         plt.plot(xl, yl, color)
 
-    @staticmethod
-    def get_nearest_node_index(node_list, rnd_node):
-        dlist = [(node.x - rnd_node.x)**2 + (node.y - rnd_node.y)**2
-                 for node in node_list]
-        minind = dlist.index(min(dlist))
+    def get_node_index(self):
+        if self.node_index is None:
+            self.node_index = NodeListIndex(lambda node: (node.x, node.y),
+                                            self.nearest_neighbor_index)
+        return self.node_index
 
-        return minind
+    def get_nearest_node_index(self, node_list, rnd_node):
+        return self.get_node_index().nearest(node_list, rnd_node)
 
     @staticmethod
     def check_if_outside_play_area(node, play_area):
@@ -237,15 +388,10 @@ class RRT:
         if node is None:
             return False
 
-        for (ox, oy, size) in obstacleList:
-            dx_list = [ox - x for x in node.path_x]
-            dy_list = [oy - y for y in node.path_y]
-            d_list = [dx * dx + dy * dy for (dx, dy) in zip(dx_list, dy_list)]
-
-            if min(d_list) <= (size+robot_radius)**2:
-                return False  # collision
-
-        return True  # safe
+        # the checker of the last obstacle list is kept for the next calls
+        checker = RRT.static_collision_checker = reuse_collision_checker(
+            RRT.static_collision_checker, obstacleList, robot_radius)
+        return checker.check_path(node.path_x, node.path_y)
 
     @staticmethod
     def calc_distance_and_angle(from_node, to_node):
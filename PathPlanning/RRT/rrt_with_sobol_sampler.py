@@ -27,12 +27,17 @@ Rojas (rafaelrojasmiliani@gmail.com)
 """
 
 import math
+import pathlib
 import random
 import sys
 import matplotlib.pyplot as plt
 import numpy as np
 
-from sobol import sobol_quasirand
+sys.path.append(str(pathlib.Path(__file__).parent))
+sys.path.append(str(pathlib.Path(__file__).parent.parent.parent))
+from sobol import SobolSampler
+from utils.collision_checker import reuse_collision_checker
+from utils.nearest_neighbor import NodeListIndex
 
 show_animation = True
 
@@ -42,6 +47,11 @@ class RRTSobol:
     Class for RRTSobol planning
     """
 
+    # checker of the obstacle list, rebuilt when the obstacles change
+    collision_checker = None
+    # checker of the static check_collision
+    static_collision_checker = None
+
     class Node:
         """
         RRTSobol Node
@@ -84,8 +94,9 @@ class RRTSobol:
         self.max_iter = max_iter
         self.obstacle_list = obstacle_list
         self.node_list = []
-        self.sobol_inter_ = 0
+        self.sampler = SobolSampler(2, self.min_rand, self.max_rand)
         self.robot_radius = robot_radius
+        self.node_index = NodeListIndex(lambda node: (node.x, node.y))
 
     def planning(self, animation=True):
         """
@@ -102,8 +113,7 @@ class RRTSobol:
 
             new_node = self.steer(nearest_node, rnd_node, self.expand_dis)
 
-            if self.check_collision(
-                    new_node, self.obstacle_list, self.robot_radius):
+            if self.check_node_collision(new_node):
                 self.node_list.append(new_node)
 
             if animation and i % 5 == 0:
@@ -113,8 +123,7 @@ class RRTSobol:
                                       self.node_list[-1].y) <= self.expand_dis:
                 final_node = self.steer(self.node_list[-1], self.end,
                                         self.expand_dis)
-                if self.check_collision(
-                        final_node, self.obstacle_list, self.robot_radius):
+                if self.check_node_collision(final_node):
                     return self.generate_final_course(len(self.node_list) - 1)
 
             if animation and i % 5:
@@ -169,12 +178,7 @@ class RRTSobol:
 
     def get_random_node(self):
         if random.randint(0, 100) > self.goal_sample_rate:
-            rand_coordinates, n = sobol_quasirand(2, self.sobol_inter_)
-
-            rand_coordinates = self.min_rand + \
-                rand_coordinates*(self.max_rand - self.min_rand)
-            self.sobol_inter_ = n
-            rnd = self.Node(*rand_coordinates)
+            rnd = self.Node(*self.sampler.sample())
 
         else:  # goal point sampling
             rnd = self.Node(self.end.x, self.end.y)
@@ -212,13 +216,27 @@ class RRTSobol:
         yl = [y + size * math.sin(np.deg2rad(d)) for d in deg]
         plt.plot(xl, yl, color)
 
-    @staticmethod
-    def get_nearest_node_index(node_list, rnd_node):
-        dlist = [(node.x - rnd_node.x)**2 + (node.y - rnd_node.y)**2
-                 for node in node_list]
-        minind = dlist.index(min(dlist))
+    def get_nearest_node_index(self, node_list, rnd_node):
+        return self.node_index.nearest(node_list, rnd_node)
+
+    def get_collision_checker(self):
+        """
+        Collision checker of the obstacle list and the robot radius of the
+        planner, built again when either of them changes
+        """
+        self.collision_checker = reuse_collision_checker(
+            self.collision_checker, self.obstacle_list, self.robot_radius)
+        return self.collision_checker
 
-        return minind
+    def check_node_collision(self, node):
+        """
+        check_collision of a node with the obstacle list and the robot
+        radius of the planner
+        """
+        if node is None:
+            return False
+        return self.get_collision_checker().check_path(node.path_x,
+                                                       node.path_y)
 
     @staticmethod
     def check_collision(node, obstacle_list, robot_radius):
@@ -226,15 +244,10 @@ class RRTSobol:
         if node is None:
             return False
 
-        for (ox, oy, size) in obstacle_list:
-            dx_list = [ox - x for x in node.path_x]
-            dy_list = [oy - y for y in node.path_y]
-            d_list = [dx * dx + dy * dy for (dx, dy) in zip(dx_list, dy_list)]
-
-            if min(d_list) <= (size+robot_radius)**2:
-                return False  # collision
-
-        return True  # safe
+        # the checker of the last obstacle list is kept for the next calls
+        checker = RRTSobol.static_collision_checker = reuse_collision_checker(
+            RRTSobol.static_collision_checker, obstacle_list, robot_radius)
+        return checker.check_path(node.path_x, node.path_y)
 
     @staticmethod
     def calc_distance_and_angle(from_node, to_node):
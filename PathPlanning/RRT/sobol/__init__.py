@@ -1 +1,5 @@
 from .sobol import i4_sobol as sobol_quasirand
+from .sobol import i4_sobol_block as sobol_quasirand_block
+from .sobol import SobolSampler
+
+__all__ = ["sobol_quasirand", "sobol_quasirand_block", "SobolSampler"]
@@ -22,6 +22,7 @@
           returns a number which is interpreted inside the function as a 4
           byte float
 """
+import functools
 import math
 import sys
 import numpy as np
@@ -33,7 +34,6 @@ initialized = None
 lastq = None
 log_max = None
 maxcol = None
-poly = None
 recipd = None
 seed_save = None
 v = None
@@ -215,6 +215,146 @@ def i4_sobol_generate(m, n, skip):
     return r
 
 
+@functools.cache
+def sobol_direction_numbers(dim_num):
+    """
+
+
+     SOBOL_DIRECTION_NUMBERS computes the direction numbers of I4_SOBOL.
+
+      Discussion:
+
+        The table is built once per dimension and cached, the arrays are
+        read only.
+
+      Parameters:
+
+        Input, integer DIM_NUM, the number of spatial dimensions.
+        DIM_NUM must satisfy 1 <= DIM_NUM <= 40.
+
+        Output, integer V(DIM_NUM, MAXCOL), the direction numbers,
+        multiplied by the powers of 2 that give them a common denominator.
+
+        Output, real RECIPD, 1 / the common denominator.
+
+    """
+    dim_max = 40
+    log_max = 30
+    if dim_num < 1 or dim_max < dim_num:
+        raise ValueError(
+            f"the spatial dimension should be in [1, {dim_max}]: {dim_num}")
+
+    #
+    #    Initialize (part of) V.
+    #
+    v = np.zeros((dim_max, log_max), dtype=np.int64)
+    v[0:40, 0] = np.transpose([
+        1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1,
+        1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1
+    ])
+
+    v[2:40, 1] = np.transpose([
+        1, 3, 1, 3, 1, 3, 3, 1, 3, 1, 3, 1, 3, 1, 1, 3, 1, 3, 1, 3, 1, 3,
+        3, 1, 3, 1, 3, 1, 3, 1, 1, 3, 1, 3, 1, 3, 1, 3
+    ])
+
+    v[3:40, 2] = np.transpose([
+        7, 5, 1, 3, 3, 7, 5, 5, 7, 7, 1, 3, 3, 7, 5, 1, 1, 5, 3, 3, 1, 7,
+        5, 1, 3, 3, 7, 5, 1, 1, 5, 7, 7, 5, 1, 3, 3
+    ])
+
+    v[5:40, 3] = np.transpose([
+        1, 7, 9, 13, 11, 1, 3, 7, 9, 5, 13, 13, 11, 3, 15, 5, 3, 15, 7, 9,
+        13, 9, 1, 11, 7, 5, 15, 1, 15, 11, 5, 3, 1, 7, 9
+    ])
+
+    v[7:40, 4] = np.transpose([
+        9, 3, 27, 15, 29, 21, 23, 19, 11, 25, 7, 13, 17, 1, 25, 29, 3, 31,
+        11, 5, 23, 27, 19, 21, 5, 1, 17, 13, 7, 15, 9, 31, 9
+    ])
+
+    v[13:40, 5] = np.transpose([
+        37, 33, 7, 5, 11, 39, 63, 27, 17, 15, 23, 29, 3, 21, 13, 31, 25, 9,
+        49, 33, 19, 29, 11, 19, 27, 15, 25
+    ])
+
+    v[19:40, 6] = np.transpose([
+        13, 33, 115, 41, 79, 17, 29, 119, 75, 73, 105, 7, 59, 65, 21, 3,
+        113, 61, 89, 45, 107
+    ])
+
+    v[37:40, 7] = np.transpose([7, 23, 39])
+    #
+    #    Set POLY.
+    #
+    poly = [
+        1, 3, 7, 11, 13, 19, 25, 37, 59, 47, 61, 55, 41, 67, 97, 91, 109,
+        103, 115, 131, 193, 137, 145, 143, 241, 157, 185, 167, 229, 171,
+        213, 191, 253, 203, 211, 239, 247, 285, 369, 299
+    ]
+
+    maxcol = i4_bit_hi1(2**log_max - 1)
+    #
+    #    Initialize row 1 of V.
+    #
+    v[0, 0:maxcol] = 1
+
+    #
+    #    Initialize the remaining rows of V.
+    #
+    for i in range(2, dim_num + 1):
+        #
+        #    The bits of the integer POLY(I) gives the form of polynomial
+        #    I.
+        #
+        #    Find the degree of polynomial I from binary encoding.
+        #
+        j = poly[i - 1]
+        m = 0
+        while True:
+            j = math.floor(j / 2.)
+            if (j <= 0):
+                break
+            m = m + 1
+        #
+        #    Expand this bit pattern to separate components of the logical
+        #    array INCLUD.
+        #
+        j = poly[i - 1]
+        includ = np.zeros(m)
+        for k in range(m, 0, -1):
+            j2 = math.floor(j / 2.)
+            includ[k - 1] = (j != 2 * j2)
+            j = j2
+        #
+        #    Calculate the remaining elements of row I as explained
+        #    in Bratley and Fox, section 2.
+        #
+        for j in range(m + 1, maxcol + 1):
+            newv = v[i - 1, j - m - 1]
+            l_var = 1
+            for k in range(1, m + 1):
+                l_var = 2 * l_var
+                if (includ[k - 1]):
+                    newv = newv ^ l_var * v[i - 1, j - k - 1]
+            v[i - 1, j - 1] = newv
+    #
+    #    Multiply columns of V by appropriate power of 2.
+    #
+    l_var = 1
+    for j in range(maxcol - 1, 0, -1):
+        l_var = 2 * l_var
+        v[0:dim_num, j - 1] = v[0:dim_num, j - 1] * l_var
+    #
+    #    RECIPD is 1/(common denominator of the elements in V).
+    #
+    recipd = 1.0 / (2 * l_var)
+
+    v = v[0:dim_num, 0:maxcol]
+    v.setflags(write=False)
+    return v, recipd
+
+
 def i4_sobol(dim_num, seed):
     """
 
@@ -291,7 +431,6 @@ def i4_sobol(dim_num, seed):
     global lastq
     global log_max
     global maxcol
-    global poly
     global recipd
     global seed_save
     global v
@@ -302,64 +441,11 @@ def i4_sobol(dim_num, seed):
         dim_num_save = -1
         log_max = 30
         seed_save = -1
-        #
-        #    Initialize (part of) V.
-        #
-        v = np.zeros((dim_max, log_max))
-        v[0:40, 0] = np.transpose([
-            1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1,
-            1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1
-        ])
-
-        v[2:40, 1] = np.transpose([
-            1, 3, 1, 3, 1, 3, 3, 1, 3, 1, 3, 1, 3, 1, 1, 3, 1, 3, 1, 3, 1, 3,
-            3, 1, 3, 1, 3, 1, 3, 1, 1, 3, 1, 3, 1, 3, 1, 3
-        ])
-
-        v[3:40, 2] = np.transpose([
-            7, 5, 1, 3, 3, 7, 5, 5, 7, 7, 1, 3, 3, 7, 5, 1, 1, 5, 3, 3, 1, 7,
-            5, 1, 3, 3, 7, 5, 1, 1, 5, 7, 7, 5, 1, 3, 3
-        ])
-
-        v[5:40, 3] = np.transpose([
-            1, 7, 9, 13, 11, 1, 3, 7, 9, 5, 13, 13, 11, 3, 15, 5, 3, 15, 7, 9,
-            13, 9, 1, 11, 7, 5, 15, 1, 15, 11, 5, 3, 1, 7, 9
-        ])
-
-        v[7:40, 4] = np.transpose([
-            9, 3, 27, 15, 29, 21, 23, 19, 11, 25, 7, 13, 17, 1, 25, 29, 3, 31,
-            11, 5, 23, 27, 19, 21, 5, 1, 17, 13, 7, 15, 9, 31, 9
-        ])
-
-        v[13:40, 5] = np.transpose([
-            37, 33, 7, 5, 11, 39, 63, 27, 17, 15, 23, 29, 3, 21, 13, 31, 25, 9,
-            49, 33, 19, 29, 11, 19, 27, 15, 25
-        ])
-
-        v[19:40, 6] = np.transpose([
-            13, 33, 115, 41, 79, 17, 29, 119, 75, 73, 105, 7, 59, 65, 21, 3,
-            113, 61, 89, 45, 107
-        ])
-
-        v[37:40, 7] = np.transpose([7, 23, 39])
-        #
-        #    Set POLY.
-        #
-        poly = [
-            1, 3, 7, 11, 13, 19, 25, 37, 59, 47, 61, 55, 41, 67, 97, 91, 109,
-            103, 115, 131, 193, 137, 145, 143, 241, 157, 185, 167, 229, 171,
-            213, 191, 253, 203, 211, 239, 247, 285, 369, 299
-        ]
-
         atmost = 2**log_max - 1
         #
         #    Find the number of bits in ATMOST.
         #
         maxcol = i4_bit_hi1(atmost)
-        #
-        #    Initialize row 1 of V.
-        #
-        v[0, 0:maxcol] = 1
 
         # Things to do only if the dimension changed.
 
@@ -375,57 +461,7 @@ def i4_sobol(dim_num, seed):
             return None
 
         dim_num_save = dim_num
-        #
-        #    Initialize the remaining rows of V.
-        #
-        for i in range(2, dim_num + 1):
-            #
-            #    The bits of the integer POLY(I) gives the form of polynomial
-            #    I.
-            #
-            #    Find the degree of polynomial I from binary encoding.
-            #
-            j = poly[i - 1]
-            m = 0
-            while True:
-                j = math.floor(j / 2.)
-                if (j <= 0):
-                    break
-                m = m + 1
-            #
-            #    Expand this bit pattern to separate components of the logical
-            #    array INCLUD.
-            #
-            j = poly[i - 1]
-            includ = np.zeros(m)
-            for k in range(m, 0, -1):
-                j2 = math.floor(j / 2.)
-                includ[k - 1] = (j != 2 * j2)
-                j = j2
-            #
-            #    Calculate the remaining elements of row I as explained
-            #    in Bratley and Fox, section 2.
-            #
-            for j in range(m + 1, maxcol + 1):
-                newv = v[i - 1, j - m - 1]
-                l_var = 1
-                for k in range(1, m + 1):
-                    l_var = 2 * l_var
-                    if (includ[k - 1]):
-                        newv = np.bitwise_xor(
-                            int(newv), int(l_var * v[i - 1, j - k - 1]))
-                v[i - 1, j - 1] = newv
-#
-#    Multiply columns of V by appropriate power of 2.
-#
-        l_var = 1
-        for j in range(maxcol - 1, 0, -1):
-            l_var = 2 * l_var
-            v[0:dim_num, j - 1] = v[0:dim_num, j - 1] * l_var
-#
-#    RECIPD is 1/(common denominator of the elements in V).
-#
-        recipd = 1.0 / (2 * l_var)
+        v, recipd = sobol_direction_numbers(dim_num)
         lastq = np.zeros(dim_num)
 
     seed = int(math.floor(seed))
@@ -491,6 +527,110 @@ def i4_sobol(dim_num, seed):
     return [quasi, seed]
 
 
+def i4_sobol_block(dim_num, seed, n):
+    """
+
+
+     I4_SOBOL_BLOCK generates N consecutive quasirandom Sobol vectors at once.
+
+      Discussion:
+
+        The vectors are the ones of N calls of I4_SOBOL from SEED on, but
+        computed with array operations. The vector of SEED is the XOR of
+        the direction numbers of the bits of the Gray code of SEED, and
+        every next vector XORs in one direction number, the one of the
+        lowest zero bit of the seed before it.
+
+      Parameters:
+
+        Input, integer DIM_NUM, the number of spatial dimensions.
+        DIM_NUM must satisfy 1 <= DIM_NUM <= 40.
+
+        Input, integer SEED, the index of the first vector, treated as 0 if
+        it is negative.
+
+        Input, integer N, the number of vectors.
+
+        Output, real QUASI(N, DIM_NUM), the quasirandom vectors.
+
+        Output, integer SEED, the seed of the vector after them, SEED + N.
+
+    """
+    v, recipd = sobol_direction_numbers(dim_num)
+    maxcol = v.shape[1]
+    seed = max(int(math.floor(seed)), 0)
+    if seed + n >= 2**maxcol:
+        raise ValueError(f"the Sobol sequence has only {2**maxcol - 1} "
+                         f"vectors: seed {seed} and {n} vectors")
+    if n <= 0:
+        return [np.zeros((0, dim_num)), seed]
+
+    gray = seed ^ (seed >> 1)
+    bits = [k for k in range(maxcol) if gray >> k & 1]
+    first = np.bitwise_xor.reduce(v[:, bits], axis=1) if bits \
+        else np.zeros(dim_num, dtype=np.int64)
+
+    seeds = np.arange(seed, seed + n - 1, dtype=np.int64)
+    # the lowest zero bit of the seeds as a power of 2, then its position
+    lo0 = np.log2(~seeds & (seeds + 1)).astype(np.int64)
+    lastq = np.bitwise_xor.accumulate(
+        np.vstack([first, v[:, lo0].T]), axis=0)
+
+    return [lastq * recipd, seed + n]
+
+
+class SobolSampler:
+    """
+    Stream of Sobol points in the box [low, high]
+
+    The points are generated in blocks of block_size by i4_sobol_block and
+    handed out one at a time by sample or in bulk by sample_block, in the
+    order of the sequence either way. Any planner that draws its samples
+    from a sampler object can use it.
+
+    Parameters
+    ----------
+    dim_num : int
+        number of coordinates of a point
+    low, high : float or array
+        bounds of the box, per coordinate or for all coordinates
+    block_size : int
+        number of points generated at once by sample
+    seed : int
+        index of the first point of the sequence
+    """
+
+    def __init__(self, dim_num, low=0.0, high=1.0, block_size=256, seed=0):
+        self.dim_num = dim_num
+        self.low = np.asarray(low, dtype=float)
+        self.high = np.asarray(high, dtype=float)
+        self.block_size = block_size
+        self.seed = seed
+        self.block = np.zeros((0, dim_num))
+        self.block_index = 0
+
+    def sample(self):
+        """Next point of the sequence"""
+        if self.block_index == len(self.block):
+            self.block = self.generate(self.block_size)
+            self.block_index = 0
+        point = self.block[self.block_index]
+        self.block_index += 1
+        return point
+
+    def sample_block(self, n):
+        """Next n points of the sequence, one per row"""
+        points = self.block[self.block_index:self.block_index + n]
+        self.block_index += len(points)
+        if len(points) < n:
+            points = np.vstack([points, self.generate(n - len(points))])
+        return points
+
+    def generate(self, n):
+        quasi, self.seed = i4_sobol_block(self.dim_num, self.seed, n)
+        return self.low + quasi * (self.high - self.low)
+
+
 def i4_uniform_ab(a, b, seed):
     """
 
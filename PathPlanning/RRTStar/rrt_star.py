@@ -8,11 +8,15 @@ author: Atsushi Sakai(@Atsushi_twi)
 
 import math
 import sys
+import time
 import matplotlib.pyplot as plt
+import numpy as np
 import pathlib
 sys.path.append(str(pathlib.Path(__file__).parent.parent))
 
 from RRT.rrt import RRT
+from utils.planning_stats import PlanningStats
+from utils.tree_storage import TreeStorage
 
 show_animation = True
 
@@ -27,6 +31,12 @@ class RRTStar(RRT):
             super().__init__(x, y)
             self.cost = 0.0
 
+    # children of the tree nodes by parent node and the node list they
+    # were collected from, see get_children
+    children = None
+    children_node_list = None
+    children_node_count = 0
+
     def __init__(self,
                  start,
                  goal,
@@ -61,30 +71,22 @@ class RRTStar(RRT):
         rrt star path planning
 
         animation: flag for animation on or off .
+
+        The search statistics are kept in self.stats.
         """
+        self.stats = PlanningStats()
+        with self.stats.measure(self.profile):
+            return self.search(animation)
 
-        self.node_list = [self.start]
+    def search(self, animation):
+        self.node_list = self.new_tree()
+        self.stats.nodes_generated = self.stats.peak_open_set_size = 1
         for i in range(self.max_iter):
-            print("Iter:", i, ", number of nodes:", len(self.node_list))
+            self.stats.nodes_expanded += 1
+            if self.verbose:
+                print("Iter:", i, ", number of nodes:", len(self.node_list))
             rnd = self.get_random_node()
-            nearest_ind = self.get_nearest_node_index(self.node_list, rnd)
-            new_node = self.steer(self.node_list[nearest_ind], rnd,
-                                  self.expand_dis)
-            near_node = self.node_list[nearest_ind]
-            new_node.cost = near_node.cost + \
-                math.hypot(new_node.x-near_node.x,
-                           new_node.y-near_node.y)
-
-            if self.check_collision(
-                    new_node, self.obstacle_list, self.robot_radius):
-                near_inds = self.find_near_nodes(new_node)
-                node_with_updated_parent = self.choose_parent(
-                    new_node, near_inds)
-                if node_with_updated_parent:
-                    self.rewire(node_with_updated_parent, near_inds)
-                    self.node_list.append(node_with_updated_parent)
-                else:
-                    self.node_list.append(new_node)
+            new_node = self.extend(rnd)
 
             if animation:
                 self.draw_graph(rnd)
@@ -95,7 +97,8 @@ class RRTStar(RRT):
                 if last_index is not None:
                     return self.generate_final_course(last_index)
 
-        print("reached max iteration")
+        if self.verbose:
+            print("reached max iteration")
 
         last_index = self.search_best_goal_node()
         if last_index is not None:
@@ -103,6 +106,105 @@ class RRTStar(RRT):
 
         return None
 
+    def anytime_planning(self, time_budget, node_list=None, animation=False):
+        """
+        anytime rrt star path planning
+
+        Grows the tree until time_budget has passed and yields (cost, path)
+        every time a cheaper path to the goal is found, so the best path so
+        far can be used while the search goes on. max_iter is not used.
+
+        time_budget: wall clock time of the search [s], including the time
+            the caller spends between the paths
+        node_list: tree of an earlier call to grow further, like the
+            node_list of the planner after the last call. A new tree is
+            grown if None. When the tree already reaches the goal, its best
+            path is yielded first.
+        animation: flag for animation on or off .
+
+        The search statistics are kept in self.stats. Planners that steer
+        with a heading, like RRTStarDubins, raise a TypeError.
+        """
+        # the search steers in straight lines of at most expand_dis and keeps
+        # x, y and cost in the tree, the heading of the nodes would be lost
+        if not hasattr(self, "expand_dis") or \
+                type(self).steer is not RRT.steer:
+            raise TypeError(
+                "anytime_planning needs a point-robot RRTStar, "
+                f"{type(self).__name__} steers with a different model")
+        return self.anytime_search(time_budget, node_list, animation)
+
+    def anytime_search(self, time_budget, node_list, animation):
+        start_time = time.perf_counter()
+        deadline = start_time + time_budget
+        self.stats = PlanningStats()
+        self.node_list = self.new_tree() if node_list is None else node_list
+        self.stats.nodes_generated = self.stats.peak_open_set_size = \
+            len(self.node_list)
+
+        # nodes with a collision free edge to the goal, their costs change
+        # when the tree is rewired
+        goal_inds = self.find_goal_inds()
+        goal_dists = [self.calc_dist_to_goal(self.node_list[i].x,
+                                             self.node_list[i].y)
+                      for i in goal_inds]
+        best_cost = float("inf")
+        tree_changed = True
+        while time.perf_counter() < deadline:
+            if tree_changed and goal_inds:
+                costs = np.array([self.node_list[i].cost
+                                  for i in goal_inds]) + goal_dists
+                i = int(np.argmin(costs))
+                if costs[i] < best_cost:
+                    best_cost = float(costs[i])
+                    self.stats.planning_time = \
+                        time.perf_counter() - start_time
+                    yield best_cost, self.generate_final_course(goal_inds[i])
+
+            self.stats.nodes_expanded += 1
+            rnd = self.get_random_node()
+            new_ind = len(self.node_list)
+            self.extend(rnd)
+            # only a new node can lower the costs or reach the goal
+            tree_changed = len(self.node_list) > new_ind
+            if tree_changed and self.find_goal_inds([new_ind]):
+                goal_inds.append(new_ind)
+                goal_dists.append(self.calc_dist_to_goal(
+                    self.node_list[new_ind].x, self.node_list[new_ind].y))
+
+            if animation:
+                self.draw_graph(rnd)
+
+        self.stats.planning_time = time.perf_counter() - start_time
+
+    def extend(self, rnd):
+        """
+        Steer from the nearest tree node towards rnd and add the new node
+        with its cheapest collision free parent, then rewire around it
+
+        Returns the new node, which is not added if it collides.
+        """
+        nearest_ind = self.get_nearest_node_index(self.node_list, rnd)
+        new_node = self.steer(self.node_list[nearest_ind], rnd,
+                              self.expand_dis)
+        near_node = self.node_list[nearest_ind]
+        new_node.cost = near_node.cost + \
+            math.hypot(new_node.x-near_node.x,
+                       new_node.y-near_node.y)
+
+        if self.check_node_collision(new_node):
+            near_inds = self.find_near_nodes(new_node)
+            node_with_updated_parent = self.choose_parent(
+                new_node, near_inds)
+            if node_with_updated_parent:
+                self.add_node(node_with_updated_parent)
+                # rewire around the node as it is stored in the tree
+                self.rewire(self.node_list[-1], near_inds)
+            else:
+                self.add_node(new_node)
+
+        return new_node
+
     def choose_parent(self, new_node, near_inds):
         """
         Computes the cheapest point to new_node contained in the list
@@ -122,20 +224,21 @@ class RRTStar(RRT):
         if not near_inds:
             return None
 
-        # search nearest cost in near_inds
+        # search nearest cost in near_inds, the edges are checked together
+        near_nodes = [self.node_list[i] for i in near_inds]
+        t_nodes = [self.steer(near_node, new_node) for near_node in near_nodes]
         costs = []
-        for i in near_inds:
-            near_node = self.node_list[i]
-            t_node = self.steer(near_node, new_node)
-            if t_node and self.check_collision(
-                    t_node, self.obstacle_list, self.robot_radius):
+        for near_node, safe in zip(near_nodes,
+                                   self.check_nodes_collision(t_nodes)):
+            if safe:
                 costs.append(self.calc_new_cost(near_node, new_node))
             else:
                 costs.append(float("inf"))  # the cost of collision node
         min_cost = min(costs)
 
         if min_cost == float("inf"):
-            print("There is no good path.(min_cost is inf)")
+            if self.verbose:
+                print("There is no good path.(min_cost is inf)")
             return None
 
         min_ind = near_inds[costs.index(min_cost)]
@@ -144,27 +247,36 @@ class RRTStar(RRT):
 
         return new_node
 
+    def find_goal_inds(self, inds=None):
+        """
+        Indices of the tree nodes within expand_dis of the goal with a
+        collision free edge to it, out of inds or all nodes
+        """
+        if inds is None:
+            x, y = self.get_node_coordinates()
+            dist_to_goal = np.hypot(x - self.end.x, y - self.end.y)
+            goal_inds = np.flatnonzero(
+                dist_to_goal <= self.expand_dis).tolist()
+        else:
+            goal_inds = [
+                i for i in inds if self.calc_dist_to_goal(
+                    self.node_list[i].x, self.node_list[i].y)
+                <= self.expand_dis]
+
+        t_nodes = [self.steer(self.node_list[goal_ind], self.goal_node)
+                   for goal_ind in goal_inds]
+        return [goal_ind for goal_ind, safe in
+                zip(goal_inds, self.check_nodes_collision(t_nodes)) if safe]
+
     def search_best_goal_node(self):
-        dist_to_goal_list = [
-            self.calc_dist_to_goal(n.x, n.y) for n in self.node_list
-        ]
-        goal_inds = [
-            dist_to_goal_list.index(i) for i in dist_to_goal_list
-            if i <= self.expand_dis
-        ]
-
-        safe_goal_inds = []
-        for goal_ind in goal_inds:
-            t_node = self.steer(self.node_list[goal_ind], self.goal_node)
-            if self.check_collision(
-                    t_node, self.obstacle_list, self.robot_radius):
-                safe_goal_inds.append(goal_ind)
+        safe_goal_inds = self.find_goal_inds()
 
         if not safe_goal_inds:
             return None
 
         safe_goal_costs = [self.node_list[i].cost +
-                           self.calc_dist_to_goal(self.node_list[i].x, self.node_list[i].y)
+                           self.calc_dist_to_goal(self.node_list[i].x,
+                                                  self.node_list[i].y)
                            for i in safe_goal_inds]
 
         min_cost = min(safe_goal_costs)
@@ -195,10 +307,7 @@ class RRTStar(RRT):
         # expand_dist
         if hasattr(self, 'expand_dis'):
             r = min(r, self.expand_dis)
-        dist_list = [(node.x - new_node.x)**2 + (node.y - new_node.y)**2
-                     for node in self.node_list]
-        near_inds = [dist_list.index(i) for i in dist_list if i <= r**2]
-        return near_inds
+        return self.get_node_index().within(self.node_list, new_node, r)
 
     def rewire(self, new_node, near_inds):
         """
@@ -217,21 +326,33 @@ class RRTStar(RRT):
             Remark: parent is designated in choose_parent.
 
         """
-        for i in near_inds:
-            near_node = self.node_list[i]
-            edge_node = self.steer(new_node, near_node)
+        # the edges only depend on the positions of the near nodes, which the
+        # rewiring keeps, so they are checked together beforehand
+        near_nodes = [self.node_list[i] for i in near_inds]
+        edge_nodes = [self.steer(new_node, near_node)
+                      for near_node in near_nodes]
+        no_collisions = self.check_nodes_collision(edge_nodes)
+        for i, near_node, edge_node, no_collision in zip(
+                near_inds, near_nodes, edge_nodes, no_collisions):
             if not edge_node:
                 continue
             edge_node.cost = self.calc_new_cost(new_node, near_node)
 
-            no_collision = self.check_collision(
-                edge_node, self.obstacle_list, self.robot_radius)
             improved_cost = near_node.cost > edge_node.cost
 
-            if no_collision and improved_cost:
-                for node in self.node_list:
-                    if node.parent == self.node_list[i]:
-                        node.parent = edge_node
+            if no_collision and improved_cost and \
+                    isinstance(self.node_list, TreeStorage):
+                # the children stay at the index of the replaced node
+                self.node_list[i] = edge_node
+                self.propagate_cost_to_leaves(self.node_list[i])
+            elif no_collision and improved_cost:
+                children = self.get_children()
+                children[near_node.parent].remove(near_node)
+                children.setdefault(new_node, []).append(edge_node)
+                moved = children.pop(near_node, [])
+                for node in moved:
+                    node.parent = edge_node
+                children[edge_node] = moved
                 self.node_list[i] = edge_node
                 self.propagate_cost_to_leaves(self.node_list[i])
 
@@ -239,12 +360,50 @@ class RRTStar(RRT):
         d, _ = self.calc_distance_and_angle(from_node, to_node)
         return from_node.cost + d
 
-    def propagate_cost_to_leaves(self, parent_node):
+    def calc_edge_costs(self, from_inds, to_inds):
+        """
+        Costs of the edges between the tree nodes from_inds and to_inds of a
+        TreeStorage, calc_new_cost without the cost of the from nodes
+        """
+        x, y = self.node_list.coordinates()
+        return np.hypot(x[to_inds] - x[from_inds], y[to_inds] - y[from_inds])
+
+    def get_children(self):
+        """
+        Children of the tree nodes by parent node
+
+        The nodes appended to node_list since the last call are added, and a
+        new node list starts over, so the planners can keep appending to
+        node_list. rewire keeps the children up to date when it replaces a
+        node.
+        """
+        if self.children is None or \
+                self.children_node_list is not self.node_list:
+            self.children = {}
+            self.children_node_list = self.node_list
+            self.children_node_count = 0
+        for i in range(self.children_node_count, len(self.node_list)):
+            node = self.node_list[i]
+            if node.parent is not None:
+                self.children.setdefault(node.parent, []).append(node)
+        self.children_node_count = len(self.node_list)
+        return self.children
 
-        for node in self.node_list:
-            if node.parent == parent_node:
-                node.cost = self.calc_new_cost(parent_node, node)
-                self.propagate_cost_to_leaves(node)
+    def propagate_cost_to_leaves(self, parent_node):
+        """
+        Update the costs of the subtree of parent_node
+        """
+        if isinstance(self.node_list, TreeStorage):
+            self.node_list.propagate_cost(parent_node.index,
+                                          self.calc_edge_costs)
+            return
+        children = self.get_children()
+        stack = [parent_node]
+        while stack:
+            node = stack.pop()
+            for child in children.get(node, []):
+                child.cost = self.calc_new_cost(node, child)
+                stack.append(child)
 
 
 def main():
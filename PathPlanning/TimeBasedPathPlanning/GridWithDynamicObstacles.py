@@ -1,12 +1,21 @@
 """
-This file implements a grid with a 3d reservation matrix with dimensions for x, y, and time. There
+This file implements a grid with a bit-packed occupancy index over time, x, and y. There
 is also infrastructure to generate dynamic obstacles that move around the grid. The obstacles' paths
-are stored in the reservation matrix on creation.
+are stored in the occupancy index on creation, and obstacle paths can be added or removed later.
+The index can keep a rolling window of time steps only, which bounds its memory for long time horizons.
+The safe intervals of a cell are computed when they are first needed and cached until an obstacle
+path through the cell changes. Cells that are reserved at every time step are static obstacles, and the distance
+fields around them are cached for the most recent goals for the planners' heuristics.
 """
 import numpy as np
 import matplotlib.pyplot as plt
+from collections import OrderedDict
 from enum import Enum
 from dataclasses import dataclass
+from typing import TYPE_CHECKING, cast
+
+if TYPE_CHECKING:
+    from PathPlanning.TimeBasedPathPlanning.ReservationTable import ReservationTable
 
 @dataclass(order=True)
 class Position:
@@ -38,6 +47,15 @@ class Interval:
     start_time: int
     end_time: int
 
+# Moves of the agents in one time step: wait, and one cell in +x, -x, +y, -y
+MOVES = [
+    Position(0, 0),
+    Position(1, 0),
+    Position(-1, 0),
+    Position(0, 1),
+    Position(0, -1),
+]
+
 class ObstacleArrangement(Enum):
     # Random obstacle positions and movements
     RANDOM = 0
@@ -53,10 +71,59 @@ def empty_2d_array_of_lists(x: int, y: int) -> np.ndarray:
     arr[:] = [[[] for _ in range(y)] for _ in range(x)]
     return arr
 
+"""
+Safe intervals of the cells of a grid, indexed by [x, y]. The intervals of a cell are an (n, 2) int array of
+(start_time, end_time) rows in order of start time, computed on first access. With a reservation table, the
+time steps reserved by other agents are excluded as well; those intervals are cached by this view only, since
+they depend on the table.
+"""
+class SafeIntervals:
+    def __init__(self, grid: "Grid", reservation_table: "ReservationTable | None" = None):
+        self.grid = grid
+        self.reservation_table = reservation_table
+        self.reserved_cache: dict[tuple[int, int], np.ndarray] = {}
+
+    def __getitem__(self, cell: tuple[int, int]) -> np.ndarray:
+        x, y = cell
+        if self.reservation_table is None:
+            return self.grid.get_safe_interval_array(x, y)
+        intervals = self.reserved_cache.get((x, y))
+        if intervals is None:
+            reserved_times = self.reservation_table.reserved_times(x, y, self.grid.time_limit)
+            if not reserved_times:
+                return self.grid.get_safe_interval_array(x, y)
+            occupied = np.zeros(self.grid.time_limit, dtype=bool)
+            occupied[self.grid.get_reservation_times_at_cell(x, y)] = True
+            occupied[reserved_times] = True
+            intervals = calc_safe_intervals(occupied)
+            self.reserved_cache[(x, y)] = intervals
+        return intervals
+
+    """
+    Safe interval of a cell that contains time step 0, None if the cell is occupied at time step 0. Unlike the
+    intervals of `self[cell]`, it can be a single time step: an agent that starts in the cell only has to leave it.
+    """
+    def start_interval(self, cell: tuple[int, int]) -> Interval | None:
+        intervals = self[cell]
+        if len(intervals) > 0 and intervals[0, 0] == 0:
+            return Interval(*intervals[0].tolist())
+        x, y = cell
+        occupied = bool((self.grid.get_reservation_times_at_cell(x, y) == 0).any())
+        if self.reservation_table is not None:
+            occupied = occupied or 0 in self.reservation_table.reserved_times(x, y, 1)
+        return None if occupied else Interval(0, 0)
+
 class Grid:
     # Set in constructor
     grid_size: np.ndarray
-    reservation_matrix: np.ndarray
+    # Bit-packed occupancy, one int per x for each slot: (x, y) is occupied at the time step of slot s if
+    # bit y + 1 of occupancy[s][x + 1] is set. The cells around the grid are set, so that moves out of the grid
+    # are invalid without bounds checks. The slots are filled from the obstacle paths on first use.
+    occupancy: list[list[int]]
+    # Time step held by each slot of `occupancy`, -1 for slots that have to be filled
+    occupancy_times: list[int]
+    # Number of time steps kept in `occupancy`, None to keep all of them
+    occupancy_window: int | None
     obstacle_paths: list[list[Position]] = []
     # Obstacles will never occupy these points. Useful to avoid impossible scenarios
     obstacle_avoid_points: list[Position] = []
@@ -67,6 +134,9 @@ class Grid:
     # Logging control
     verbose = False
 
+    # Number of goals whose distance field is kept, least recently used ones are dropped first
+    distance_field_cache_size = 64
+
     def __init__(
         self,
         grid_size: np.ndarray,
@@ -74,27 +144,141 @@ class Grid:
         obstacle_avoid_points: list[Position] = [],
         obstacle_arrangement: ObstacleArrangement = ObstacleArrangement.RANDOM,
         time_limit: int = 100,
+        occupancy_window: int | None = None,
     ):
         self.obstacle_avoid_points = obstacle_avoid_points
         self.time_limit = time_limit
         self.grid_size = grid_size
-        self.reservation_matrix = np.zeros((grid_size[0], grid_size[1], self.time_limit))
+        self.occupancy_window = occupancy_window
+        n_slots = self.time_limit if occupancy_window is None else min(occupancy_window, self.time_limit)
+        self.occupancy = [[] for _ in range(n_slots)]
+        self.occupancy_times = [-1] * n_slots
+        self.obstacle_paths = []
+        # (n, 2) array of the positions of each obstacle path
+        self.obstacle_positions: list[np.ndarray] = []
+        # Built when needed: the positions of all obstacles as an (obstacles, time steps, 2) array, -1 after the
+        # end of a path, and the cells and time steps of all reservations sorted by cell
+        self.stacked_obstacle_positions: np.ndarray | None = None
+        self.reservations_by_cell: tuple[np.ndarray, np.ndarray] | None = None
+        # (x, y) -> safe intervals of the cell, see get_safe_interval_array
+        self.safe_interval_cache: dict[tuple[int, int], np.ndarray] = {}
+        # Built when needed: the cells that are reserved at every time step, and the distance fields around them,
+        # see get_distance_field
+        self.static_obstacle_map: np.ndarray | None = None
+        self.distance_field_cache: OrderedDict[tuple[int, int], np.ndarray] = OrderedDict()
+        # static obstacles the cached distance fields were computed for
+        self.distance_field_static_map: np.ndarray | None = None
 
         if num_obstacles > self.grid_size[0] * self.grid_size[1]:
             raise Exception("Number of obstacles is greater than grid size!")
 
+        obstacle_paths = []
         if obstacle_arrangement == ObstacleArrangement.RANDOM:
-            self.obstacle_paths = self.generate_dynamic_obstacles(num_obstacles)
+            obstacle_paths = self.generate_dynamic_obstacles(num_obstacles)
         elif obstacle_arrangement == ObstacleArrangement.ARRANGEMENT1:
-            self.obstacle_paths = self.obstacle_arrangement_1(num_obstacles)
+            obstacle_paths = self.obstacle_arrangement_1(num_obstacles)
+
+        for path in obstacle_paths:
+            self.add_obstacle_path(path)
+
+    """
+    Add the path of a dynamic obstacle and reserve the cells along it. Returns the index of the path in
+    `obstacle_paths`.
+    """
+    def add_obstacle_path(self, path: list[Position]) -> int:
+        positions = np.array([[position.x, position.y] for position in path], dtype=np.int64).reshape(-1, 2)
+        self.obstacle_paths.append(path)
+        self.obstacle_positions.append(positions)
+        self.obstacle_path_changed(positions)
+        return len(self.obstacle_paths) - 1
+
+    """
+    Remove the path of a dynamic obstacle by its index in `obstacle_paths` and free the cells along it,
+    except for those that other obstacles reserve at the same time. Returns the removed path.
+    """
+    def remove_obstacle_path(self, index: int) -> list[Position]:
+        path = self.obstacle_paths.pop(index)
+        self.obstacle_path_changed(self.obstacle_positions.pop(index))
+        return path
+
+    """
+    Drop what was derived from the reservations of an added or removed obstacle path: the cached safe
+    intervals of the cells along it, the occupancy slots of its time steps, the stacked positions and the static
+    obstacles. The distance fields are kept until the static obstacles turn out to be different.
+    """
+    def obstacle_path_changed(self, positions: np.ndarray):
+        for cell in {(x, y) for x, y in cast(list[list[int]], positions.tolist())}:
+            self.safe_interval_cache.pop(cell, None)
+        self.occupancy_times = [-1 if t < len(positions) else t for t in self.occupancy_times]
+        self.stacked_obstacle_positions = None
+        self.reservations_by_cell = None
+        self.static_obstacle_map = None
+
+    """
+    Positions of all obstacles as an (obstacles, time steps, 2) array, -1 after the end of a path
+    """
+    def get_stacked_obstacle_positions(self) -> np.ndarray:
+        if self.stacked_obstacle_positions is None:
+            stacked = np.full((len(self.obstacle_positions), self.time_limit, 2), -1, dtype=np.int32)
+            for i, positions in enumerate(self.obstacle_positions):
+                positions = positions[:self.time_limit]
+                stacked[i, :len(positions)] = positions
+            self.stacked_obstacle_positions = stacked
+        return self.stacked_obstacle_positions
+
+    """
+    (x, y) positions reserved at time step t. An obstacle reserves its old and new position at every time step.
+    """
+    def get_reservations_at_time(self, t: int) -> np.ndarray:
+        stacked = self.get_stacked_obstacle_positions()
+        present = stacked[:, t, 0] >= 0
+        if t == 0:
+            return stacked[present, 0]
+        return np.concatenate((stacked[present, t], stacked[present, t - 1]))
+
+    """
+    Cells and time steps of all reservations as (keys, times) arrays sorted by the key x * grid_size[1] + y of
+    the cell
+    """
+    def get_reservations_by_cell(self) -> tuple[np.ndarray, np.ndarray]:
+        if self.reservations_by_cell is None:
+            stacked = self.get_stacked_obstacle_positions()
+            t = np.broadcast_to(np.arange(self.time_limit, dtype=np.int32), stacked.shape[:2])
+            present = stacked[:, :, 0] >= 0
+            # new positions, and old positions from the second time step on
+            cells = np.concatenate((stacked[present], stacked[:, :-1][present[:, 1:]]))
+            times = np.concatenate((t[present], t[:, 1:][present[:, 1:]]))
+            keys = cells[:, 0] * int(self.grid_size[1]) + cells[:, 1]
+            order = np.argsort(keys, kind="stable")
+            self.reservations_by_cell = (keys[order], times[order])
+        return self.reservations_by_cell
+
+    """
+    Time steps at which a cell is reserved, possibly repeated
+    """
+    def get_reservation_times_at_cell(self, x: int, y: int) -> np.ndarray:
+        keys, times = self.get_reservations_by_cell()
+        key = x * int(self.grid_size[1]) + y
+        # search with the dtype of the keys, other dtypes would convert the whole array
+        start, end = np.searchsorted(keys, np.array([key, key + 1], dtype=keys.dtype))
+        return times[start:end]
 
-        for i, path in enumerate(self.obstacle_paths):
-            obs_idx = i + 1  # avoid using 0 - that indicates free space in the grid
-            for t, position in enumerate(path):
-                # Reserve old & new position at this time step
-                if t > 0:
-                    self.reservation_matrix[path[t - 1].x, path[t - 1].y, t] = obs_idx
-                self.reservation_matrix[position.x, position.y, t] = obs_idx
+    """
+    Slot of `occupancy` holding time step t. With a rolling window, time step t is held by slot
+    t % occupancy_window. The slot is filled from the obstacle paths if it holds another time step.
+    """
+    def occupancy_slot(self, t: int) -> int:
+        slot = t if self.occupancy_window is None else t % len(self.occupancy)
+        if self.occupancy_times[slot] != t:
+            size_y = int(self.grid_size[1])
+            border = (1 << (size_y + 2)) - 1
+            sides = 1 | (1 << (size_y + 1))
+            rows = [border] + [sides] * int(self.grid_size[0]) + [border]
+            for x, y in cast(list[list[int]], self.get_reservations_at_time(t).tolist()):
+                rows[x + 1] |= 1 << (y + 1)
+            self.occupancy[slot] = rows
+            self.occupancy_times[slot] = t
+        return slot
 
     """
     Generate dynamic obstacles that move around the grid. Initial positions and movements are random
@@ -201,7 +385,31 @@ class Grid:
             return False
 
         # Check if new position is not occupied at time t
-        return self.reservation_matrix[position.x, position.y, t] == 0
+        return not self.occupancy[self.occupancy_slot(t)][position.x + 1] >> (position.y + 1) & 1
+
+    """
+    Check which of the MOVES from the given position are valid at time t. The stay, +y and -y moves are
+    answered from the same word of the bit-packed occupancy.
+
+    input:
+        position (Position): (x, y) position inside the grid
+        t (int): time step
+
+    output:
+        tuple[bool, ...]: True for the moves to positions that are inside the grid and free at time t
+    """
+    def valid_moves(self, position: Position, t: int) -> tuple[bool, ...]:
+        rows = self.occupancy[self.occupancy_slot(t)]
+        x, y = position.x + 1, position.y
+        # bits 0, 1, 2: occupancy of (x, y - 1), (x, y), (x, y + 1)
+        column = rows[x] >> y
+        return (
+            not column & 2,
+            not rows[x + 1] >> (y + 1) & 1,
+            not rows[x - 1] >> (y + 1) & 1,
+            not column & 4,
+            not column & 1,
+        )
 
     """
     Returns True if the given position is valid at time t and is not in the set of obstacle_avoid_points
@@ -247,48 +455,116 @@ class Grid:
         return (x_positions, y_positions)
 
     """
-    Returns safe intervals for each cell.
+    Returns the safe intervals of the cells, indexed by [x, y]. The intervals are computed lazily, see
+    `get_safe_interval_array`. Time steps reserved in `reservation_table` are not safe either.
     """
-    def get_safe_intervals(self) -> np.ndarray:
-        intervals = empty_2d_array_of_lists(self.grid_size[0], self.grid_size[1])
-        for x in range(intervals.shape[0]):
-            for y in range(intervals.shape[1]):
-                intervals[x, y] = self.get_safe_intervals_at_cell(Position(x, y))
+    def get_safe_intervals(self, reservation_table: "ReservationTable | None" = None) -> SafeIntervals:
+        return SafeIntervals(self, reservation_table)
 
-        return intervals
+    """
+    Cells that are reserved at every time step, as an (x, y) bool array
+    """
+    def get_static_obstacle_map(self) -> np.ndarray:
+        if self.static_obstacle_map is None:
+            keys, times = self.get_reservations_by_cell()
+            reserved = np.unique(keys.astype(np.int64) * self.time_limit + times)
+            cells, counts = np.unique(reserved // self.time_limit, return_counts=True)
+            static = np.zeros(int(self.grid_size[0]) * int(self.grid_size[1]), dtype=bool)
+            static[cells[counts == self.time_limit]] = True
+            self.static_obstacle_map = static.reshape(int(self.grid_size[0]), int(self.grid_size[1]))
+        return self.static_obstacle_map
+
+    """
+    Number of moves from every cell to `goal` around the static obstacles, as an (x, y) int32 array that is -1
+    for the cells that can not reach the goal. It is a lower bound of the arrival time at the goal that accounts
+    for walls, unlike the Manhattan distance. The fields of the last `distance_field_cache_size` goals are cached
+    until the static obstacles change.
+    """
+    def get_distance_field(self, goal: Position) -> np.ndarray:
+        static = self.get_static_obstacle_map()
+        if static is not self.distance_field_static_map:
+            if self.distance_field_static_map is None or not np.array_equal(static, self.distance_field_static_map):
+                self.distance_field_cache.clear()
+            self.distance_field_static_map = static
+
+        key = (goal.x, goal.y)
+        field = self.distance_field_cache.get(key)
+        if field is not None:
+            self.distance_field_cache.move_to_end(key)
+            return field
+
+        field = calc_distance_field(static, goal)
+        self.distance_field_cache[key] = field
+        while len(self.distance_field_cache) > self.distance_field_cache_size:
+            self.distance_field_cache.popitem(last=False)
+        return field
 
     """
     Generate the safe intervals for a given cell. The intervals will be in order of start time.
     ex: Interval (2, 3) will be before Interval (4, 5)
     """
     def get_safe_intervals_at_cell(self, cell: Position) -> list[Interval]:
-        vals = self.reservation_matrix[cell.x, cell.y, :]
-        # Find where the array is zero
-        zero_mask = (vals == 0)
+        return [
+            Interval(start, end)
+            for start, end in cast(list[list[int]], self.get_safe_interval_array(cell.x, cell.y).tolist())
+        ]
 
-        # Identify transitions between zero and nonzero elements
-        diff = np.diff(zero_mask.astype(int))
-
-        # Start indices: where zeros begin (1 after a nonzero)
-        start_indices = np.where(diff == 1)[0] + 1
-
-        # End indices: where zeros stop (just before a nonzero)
-        end_indices = np.where(diff == -1)[0]
-
-        # Handle edge cases if the array starts or ends with zeros
-        if zero_mask[0]:  # If the first element is zero, add index 0 to start_indices
-            start_indices = np.insert(start_indices, 0, 0)
-        if zero_mask[-1]:  # If the last element is zero, add the last index to end_indices
-            end_indices = np.append(end_indices, len(vals) - 1)
+    """
+    Safe intervals of a cell as an (n, 2) int array of (start_time, end_time) rows in order of start time.
+    The intervals are computed on the first call for a cell and cached until an obstacle path through the cell
+    is added or removed.
+    """
+    def get_safe_interval_array(self, x: int, y: int) -> np.ndarray:
+        intervals = self.safe_interval_cache.get((x, y))
+        if intervals is None:
+            occupied = np.zeros(self.time_limit, dtype=bool)
+            occupied[self.get_reservation_times_at_cell(x, y)] = True
+            intervals = calc_safe_intervals(occupied)
+            self.safe_interval_cache[(x, y)] = intervals
+        return intervals
 
-        # Create pairs of (first zero, last zero)
-        intervals = [Interval(int(start), int(end)) for start, end in zip(start_indices, end_indices)]
+"""
+Safe intervals of the occupancy of a cell over time, as an (n, 2) int array of (first free time step, last
+free time step) rows.
+"""
+def calc_safe_intervals(occupied: np.ndarray) -> np.ndarray:
+    # pad with occupied steps so that every run of free steps has a start and an end transition
+    free = np.concatenate(([False], occupied == 0, [False]))
+    transitions = np.flatnonzero(free[1:] != free[:-1])
+    start_times = transitions[0::2]
+    end_times = transitions[1::2] - 1
+
+    # Remove intervals where a cell is only free for one time step. Those intervals not provide enough time to
+    # move into and out of the cell each take 1 time step, and the cell is considered occupied during
+    # both the time step when it is entering the cell,  and the time step when it is leaving the cell.
+    keep = start_times != end_times
+    return np.column_stack((start_times[keep], end_times[keep])).astype(np.int32)
 
-        # Remove intervals where a cell is only free for one time step. Those intervals not provide enough time to
-        # move into and out of the cell each take 1 time step, and the cell is considered occupied during
-        # both the time step when it is entering the cell,  and the time step when it is leaving the cell.
-        intervals = [interval for interval in intervals if interval.start_time != interval.end_time]
-        return intervals
+"""
+Breadth first search from the goal over the free cells of `blocked`, an (x, y) bool array. Returns the number of
+moves to the goal of every cell as an int32 array, -1 for the cells that can not reach it.
+"""
+def calc_distance_field(blocked: np.ndarray, goal: Position) -> np.ndarray:
+    size_x, size_y = blocked.shape
+    distances = np.full(blocked.shape, -1, dtype=np.int32)
+    if blocked[goal.x, goal.y]:
+        return distances
+
+    free = cast(list[list[bool]], (~blocked).tolist())
+    distance = [[-1] * size_y for _ in range(size_x)]
+    distance[goal.x][goal.y] = 0
+    frontier = [(goal.x, goal.y)]
+    d = 0
+    while frontier:
+        d += 1
+        next_frontier = []
+        for x, y in frontier:
+            for nx, ny in ((x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)):
+                if 0 <= nx < size_x and 0 <= ny < size_y and free[nx][ny] and distance[nx][ny] < 0:
+                    distance[nx][ny] = d
+                    next_frontier.append((nx, ny))
+        frontier = next_frontier
+    return np.array(distance, dtype=np.int32)
 
 show_animation = True
 
@@ -0,0 +1,411 @@
+"""
+Multi-agent path planning
+    Plans paths for many agents that share a grid with dynamic obstacles, using the single agent planners
+    (SpaceTimeAStar or SafeIntervalPathPlanner) as the low level. Two agents must never be in the same cell at the
+    same time step (vertex conflict) or swap cells in one time step (edge conflict). An agent stays at its goal
+    after it arrived there.
+
+    PrioritizedPlanner plans the agents one after another, and each agent avoids the paths of the agents before it
+    through a reservation table. It is fast, but it can fail on problems that have a solution.
+
+    ConflictBasedSearch searches a tree of constraints. The root plans every agent on its own. A node with a
+    conflict between two agents gets two children, each of which forbids the conflicting cell or move to one of the
+    agents and replans that agent. These replans are independent, so they run in parallel worker processes.
+    The first conflict free node found minimizes the sum of the arrival times of the agents, given that the low
+    level finds the earliest arrival. SafeIntervalPathPlanner ignores safe intervals of a single time step, so it can
+    arrive later than SpaceTimeAStar.
+
+    References:
+        - https://www.davidsilver.uk/wp-content/uploads/2020/03/coop-path-AIWisdom.pdf
+        - https://www.sciencedirect.com/science/article/pii/S0004370214001386
+"""
+
+import contextlib
+import functools
+import heapq
+import io
+import itertools
+import multiprocessing
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
+from typing import Any
+
+import numpy as np
+import matplotlib.pyplot as plt
+from PathPlanning.TimeBasedPathPlanning.GridWithDynamicObstacles import Grid, Position
+from PathPlanning.TimeBasedPathPlanning.ReservationTable import Conflict, ReservationTable
+from PathPlanning.TimeBasedPathPlanning.SafeInterval import SafeIntervalPathPlanner
+from PathPlanning.TimeBasedPathPlanning.SpaceTimeAStar import SpaceTimeAStar
+
+# Constraint of an agent in the conflict tree: (x, y, t) forbids a cell at time step t, and
+# (x_from, y_from, x_to, y_to, t) forbids a move that ends at time step t
+Constraint = tuple[int, ...]
+
+# Single agent planner class, SpaceTimeAStar or SafeIntervalPathPlanner, or a partial of it with options. It is
+# called with (grid, start, goal, reservation_table).
+LowLevelPlanner = Callable[..., Any]
+
+LOW_LEVEL_PLANNERS = {
+    "space_time_astar": SpaceTimeAStar,
+    "safe_interval": SafeIntervalPathPlanner,
+}
+
+"""
+Plan the path of a single agent with a low level planner, as its position at every time step from the start until
+it reaches its goal, and return it with the number of nodes the planner expanded. The path is None if there is no
+path within the time limit of the grid.
+"""
+def plan_agent(
+    grid: Grid, low_level: LowLevelPlanner, start: Position, goal: Position, reservation_table: ReservationTable | None = None
+) -> tuple[list[Position] | None, int]:
+    planner = low_level(grid, start, goal, reservation_table)
+    # the planners print the number of expansions of every search
+    with contextlib.redirect_stdout(io.StringIO()):
+        try:
+            path = planner.plan()
+        except Exception as e:
+            if str(e) != "No path found":
+                raise
+            return None, planner.expanded_node_count
+    return [path.get_position(t) for t in range(path.goal_reached_time() + 1)], planner.expanded_node_count
+
+"""
+Reservation table that makes the low level planners respect the constraints of an agent
+"""
+def constraint_table(constraints: tuple[Constraint, ...]) -> ReservationTable:
+    table = ReservationTable()
+    for constraint in constraints:
+        if len(constraint) == 3:
+            x, y, t = constraint
+            table.reserve_vertex(-1, Position(x, y), t)
+        else:
+            x_from, y_from, x_to, y_to, t = constraint
+            # a move is not free if it swaps cells with a reserved move, so reserve the opposite move
+            table.reserve_edge(-1, Position(x_to, y_to), Position(x_from, y_from), t)
+    return table
+
+"""
+First conflict of every agent with the agents before it, ordered by agent
+"""
+def find_conflicts(paths: list[list[Position]]) -> list[Conflict]:
+    table = ReservationTable()
+    conflicts = []
+    for agent, positions in enumerate(paths):
+        conflict = table.find_conflict(agent, positions)
+        if conflict is not None:
+            conflicts.append(conflict)
+        table.reserve_path(agent, positions)
+    return conflicts
+
+"""
+Sum of the arrival times of the agents
+"""
+def sum_of_costs(paths: list[list[Position]]) -> int:
+    return sum(len(positions) - 1 for positions in paths)
+
+class PrioritizedPlanner:
+    grid: Grid
+    starts: list[Position]
+    goals: list[Position]
+    low_level: LowLevelPlanner
+    # Used to evaluate solutions
+    low_level_expanded_node_count: int = 0
+
+    def __init__(self, grid: Grid, starts: list[Position], goals: list[Position], low_level: LowLevelPlanner = SpaceTimeAStar):
+        self.grid = grid
+        self.starts = starts
+        self.goals = goals
+        self.low_level = low_level
+
+    """
+    Plan the agents in the order of `starts`, which is their priority. Returns the position of every agent at every
+    time step until it reaches its goal. Raises an exception if an agent finds no path around the agents before it.
+    """
+    def plan(self) -> list[list[Position]]:
+        reservation_table = ReservationTable()
+        paths = []
+        self.low_level_expanded_node_count = 0
+        for agent, (start, goal) in enumerate(zip(self.starts, self.goals)):
+            positions, expanded_node_count = plan_agent(self.grid, self.low_level, start, goal, reservation_table)
+            self.low_level_expanded_node_count += expanded_node_count
+            if positions is None:
+                raise Exception(f"No path found for agent {agent}")
+            reservation_table.reserve_path(agent, positions)
+            paths.append(positions)
+        return paths
+
+@dataclass
+class ConstraintTreeNode:
+    # Constraints of every agent
+    constraints: list[tuple[Constraint, ...]]
+    # Position of every agent at every time step until it reaches its goal
+    paths: list[list[Position]]
+    cost: int
+    conflicts: list[Conflict]
+
+# state of a worker process, set by _init_worker
+_worker_grid: Grid | None = None
+_worker_low_level: LowLevelPlanner | None = None
+
+def _init_worker(grid: Grid, low_level: LowLevelPlanner):
+    global _worker_grid, _worker_low_level
+    _worker_grid = grid
+    _worker_low_level = low_level
+
+def _plan_task(task: tuple[Position, Position, tuple[Constraint, ...]]) -> tuple[list[Position] | None, int]:
+    start, goal, constraints = task
+    assert _worker_grid is not None and _worker_low_level is not None, "worker is not initialized"
+    return plan_agent(_worker_grid, _worker_low_level, start, goal, constraint_table(constraints))
+
+class ConflictBasedSearch:
+    grid: Grid
+    starts: list[Position]
+    goals: list[Position]
+    low_level: LowLevelPlanner
+    # Number of worker processes for the low level replans, 1 to plan in this process. Workers pay off when a
+    # single low level search takes longer than sending it to a process, i.e. on large grids and time horizons.
+    workers: int
+    # Number of conflict tree nodes to expand before giving up
+    max_nodes: int
+    # Used to evaluate solutions
+    expanded_node_count: int = 0
+    low_level_count: int = 0
+    low_level_expanded_node_count: int = 0
+
+    def __init__(
+        self,
+        grid: Grid,
+        starts: list[Position],
+        goals: list[Position],
+        low_level: LowLevelPlanner = SpaceTimeAStar,
+        workers: int = 1,
+        max_nodes: int = 10000,
+    ):
+        self.grid = grid
+        self.starts = starts
+        self.goals = goals
+        self.low_level = low_level
+        self.workers = workers
+        self.max_nodes = max_nodes
+
+    """
+    Find conflict free paths with the smallest sum of arrival times. Returns the position of every agent at every
+    time step until it reaches its goal. Raises an exception if there is no solution within `max_nodes` nodes.
+    """
+    def plan(self) -> list[list[Position]]:
+        self.expanded_node_count = 0
+        self.low_level_count = 0
+        self.low_level_expanded_node_count = 0
+        if self.workers <= 1:
+            return self.search(None)
+        with multiprocessing.Pool(self.workers, initializer=_init_worker, initargs=(self.grid, self.low_level)) as pool:
+            return self.search(pool)
+
+    def search(self, pool) -> list[list[Position]]:
+        constraints: list[tuple[Constraint, ...]] = [() for _ in self.starts]
+        paths = []
+        for agent, positions in enumerate(
+            self.replan(pool, [(start, goal, ()) for start, goal in zip(self.starts, self.goals)])
+        ):
+            if positions is None:
+                raise Exception(f"No path found for agent {agent}")
+            paths.append(positions)
+
+        counter = itertools.count()
+        open_set: list[tuple[int, int, int, ConstraintTreeNode]] = []
+
+        def push(node: ConstraintTreeNode):
+            # prefer nodes with fewer conflicts among nodes of equal cost
+            heapq.heappush(open_set, (node.cost, len(node.conflicts), next(counter), node))
+
+        push(ConstraintTreeNode(constraints, paths, sum_of_costs(paths), find_conflicts(paths)))
+        while open_set and self.expanded_node_count < self.max_nodes:
+            node = heapq.heappop(open_set)[-1]
+            self.expanded_node_count += 1
+            if not node.conflicts:
+                return node.paths
+
+            conflict = min(node.conflicts, key=lambda c: c.time)
+            agents = list(conflict.agents)
+            children_constraints = []
+            for agent, constraint in zip(agents, self.split_conflict(conflict)):
+                constraints = list(node.constraints)
+                constraints[agent] = constraints[agent] + (constraint,)
+                children_constraints.append(constraints)
+
+            # the two replans only differ in the constrained agent and are planned at the same time
+            new_paths = self.replan(pool, [
+                (self.starts[agent], self.goals[agent], constraints[agent])
+                for agent, constraints in zip(agents, children_constraints)
+            ])
+            for agent, constraints, positions in zip(agents, children_constraints, new_paths):
+                if positions is None:
+                    continue
+                paths = list(node.paths)
+                paths[agent] = positions
+                push(ConstraintTreeNode(constraints, paths, sum_of_costs(paths), find_conflicts(paths)))
+
+        raise Exception("No solution found")
+
+    """
+    Constraints that resolve a conflict, one for each of the two agents
+    """
+    @staticmethod
+    def split_conflict(conflict: Conflict) -> tuple[Constraint, Constraint]:
+        position = conflict.position
+        previous = conflict.previous_position
+        if previous is not None:
+            return (
+                (previous.x, previous.y, position.x, position.y, conflict.time),
+                (position.x, position.y, previous.x, previous.y, conflict.time),
+            )
+        vertex = (position.x, position.y, conflict.time)
+        return vertex, vertex
+
+    """
+    Plan agents given as (start, goal, constraints) tasks. The plans are independent of each other and run in the
+    worker processes if there is a pool.
+    """
+    def replan(
+        self, pool, tasks: list[tuple[Position, Position, tuple[Constraint, ...]]]
+    ) -> list[list[Position] | None]:
+        self.low_level_count += len(tasks)
+        if pool is None:
+            results = [plan_agent(self.grid, self.low_level, s, g, constraint_table(c)) for s, g, c in tasks]
+        else:
+            results = pool.map(_plan_task, tasks)
+        self.low_level_expanded_node_count += sum(expanded_node_count for _, expanded_node_count in results)
+        return [positions for positions, _ in results]
+
+"""
+Grid with rows of shelves that are two cells apart, crossed by an aisle every `cross_aisle_spacing` cells.
+The shelves are static obstacles, i.e. obstacle paths that stay in place.
+"""
+def make_warehouse_grid(side_length: int, time_limit: int = 200, cross_aisle_spacing: int = 6) -> Grid:
+    grid = Grid(np.array([side_length, side_length]), num_obstacles=0, time_limit=time_limit)
+    for y in range(2, side_length - 2, 3):
+        for x in range(1, side_length - 1):
+            if x % cross_aisle_spacing != 0:
+                grid.add_obstacle_path([Position(x, y)] * time_limit)
+    return grid
+
+"""
+Random distinct start and goal cells of agents in the free cells of a grid without moving obstacles
+"""
+def make_agents(grid: Grid, num_agents: int, seed: int = 0) -> tuple[list[Position], list[Position]]:
+    rng = np.random.default_rng(seed)
+    free = [Position(x, y) for x in range(grid.grid_size[0]) for y in range(grid.grid_size[1])
+            if grid.valid_position(Position(x, y), 0)]
+    starts = rng.choice(len(free), num_agents, replace=False)
+    goals = rng.choice(len(free), num_agents, replace=False)
+    return [free[i] for i in starts], [free[i] for i in goals]
+
+PLANNERS = ["prioritized", "conflict_based_search"]
+# Manhattan distance, or the distance around the static obstacles (Grid.get_distance_field)
+HEURISTICS = ["manhattan", "distance_field"]
+AGENT_COUNTS = [5, 10, 20, 50]
+
+"""
+Plan random agents on a warehouse grid with growing agent counts, and report for every planner, heuristic and count
+whether it succeeded, its runtime, the sum of the arrival times of the agents and the number of (position, time)
+nodes the low level expanded. Rows with the distance field heuristic also report the fraction of expanded nodes
+it saved compared to the Manhattan distance.
+"""
+def benchmark(
+    agent_counts: list[int] = AGENT_COUNTS,
+    planners: list[str] = PLANNERS,
+    low_level: str = "space_time_astar",
+    heuristics: list[str] = HEURISTICS,
+    side_length: int = 32,
+    time_limit: int = 200,
+    cross_aisle_spacing: int = 6,
+    workers: int = 1,
+    max_nodes: int = 1000,
+    seed: int = 0,
+) -> list[dict]:
+    grid = make_warehouse_grid(side_length, time_limit, cross_aisle_spacing)
+    results = []
+    for num_agents in agent_counts:
+        starts, goals = make_agents(grid, num_agents, seed)
+        for name in planners:
+            manhattan_expanded_node_count = None
+            for heuristic in heuristics:
+                low_level_planner = functools.partial(
+                    LOW_LEVEL_PLANNERS[low_level], use_distance_field=heuristic == "distance_field")
+                planner: PrioritizedPlanner | ConflictBasedSearch
+                if name == "prioritized":
+                    planner = PrioritizedPlanner(grid, starts, goals, low_level_planner)
+                else:
+                    planner = ConflictBasedSearch(grid, starts, goals, low_level_planner, workers, max_nodes)
+
+                start_time = time.perf_counter()
+                try:
+                    paths = planner.plan()
+                except Exception as e:
+                    if not str(e).startswith("No "):
+                        raise
+                    paths = None
+
+                reduction = None
+                if heuristic == "manhattan":
+                    manhattan_expanded_node_count = planner.low_level_expanded_node_count
+                elif manhattan_expanded_node_count:
+                    reduction = 1.0 - planner.low_level_expanded_node_count / manhattan_expanded_node_count
+                results.append({
+                    "Planner": name,
+                    "Heuristic": heuristic,
+                    "Agents": num_agents,
+                    "Solved": paths is not None and not find_conflicts(paths),
+                    "Time (s)": time.perf_counter() - start_time,
+                    "Sum of Costs": sum_of_costs(paths) if paths is not None else None,
+                    "Conflict Tree Nodes": getattr(planner, "expanded_node_count", None),
+                    "Expanded Nodes": planner.low_level_expanded_node_count,
+                    "Expanded Node Reduction": reduction,
+                })
+
+    print("planner, heuristic, agents, solved, time [s], sum of costs, conflict tree nodes, expanded nodes, "
+          "reduction")
+    for r in results:
+        reduction_text = "" if r["Expanded Node Reduction"] is None else f"{r['Expanded Node Reduction']:.1%}"
+        print(f"{r['Planner']}, {r['Heuristic']}, {r['Agents']}, {r['Solved']}, {r['Time (s)']:.3f}, "
+              f"{r['Sum of Costs']}, {r['Conflict Tree Nodes']}, {r['Expanded Nodes']}, {reduction_text}")
+    return results
+
+
+show_animation = True
+
+def main():
+    benchmark()
+
+    grid = make_warehouse_grid(21, 100)
+    starts, goals = make_agents(grid, 10)
+    paths = ConflictBasedSearch(grid, starts, goals).plan()
+
+    if not show_animation:
+        return
+
+    fig = plt.figure(figsize=(10, 7))
+    ax = fig.add_subplot(autoscale_on=False, xlim=(0, grid.grid_size[0] - 1), ylim=(0, grid.grid_size[1] - 1))
+    ax.set_aspect("equal")
+    ax.grid()
+    obstacles = grid.get_obstacle_positions_at_time(0)
+    ax.plot(obstacles[0], obstacles[1], "ks", ms=10, label="Shelves")
+    ax.plot([g.x for g in goals], [g.y for g in goals], "mD", ms=10, label="Goals")
+    (agent_points,) = ax.plot([], [], "bo", ms=10, label="Agents")
+    ax.legend(bbox_to_anchor=(1.05, 1))
+
+    # for stopping simulation with the esc key.
+    plt.gcf().canvas.mpl_connect(
+        "key_release_event", lambda event: [exit(0) if event.key == "escape" else None]
+    )
+
+    for t in range(max(len(positions) for positions in paths)):
+        positions = [p[min(t, len(p) - 1)] for p in paths]
+        agent_points.set_data([p.x for p in positions], [p.y for p in positions])
+        plt.pause(0.2)
+    plt.show()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Reservation table of agent paths in space and time
+    A hash table of the (x, y, t) cells and the moves that agents reserved. It answers in constant time whether a
+    cell is free at a time step (vertex conflicts) and whether a move swaps cells with another agent (edge
+    conflicts). An agent stays at the last position of its path after reaching it, like a robot parked at its goal.
+"""
+
+import math
+from dataclasses import dataclass
+from PathPlanning.TimeBasedPathPlanning.GridWithDynamicObstacles import Position
+
+"""
+Conflict between two agents at time step `time`. In a vertex conflict both agents are at `position`. In an edge
+conflict the first agent moves from `previous_position` to `position` while the second agent moves the other way.
+"""
+@dataclass
+class Conflict:
+    agents: tuple[int, int]
+    time: int
+    position: Position
+    previous_position: Position | None = None
+
+    def is_edge_conflict(self) -> bool:
+        return self.previous_position is not None
+
+class ReservationTable:
+    def __init__(self):
+        # (x, y, t) -> agent
+        self.vertices: dict[tuple[int, int, int], int] = {}
+        # (x_from, y_from, x_to, y_to, t) -> agent, for a move that ends at time step t
+        self.edges: dict[tuple[int, int, int, int, int], int] = {}
+        # (x, y) -> (agent, t) of an agent that stays in the cell from time step t on
+        self.parked: dict[tuple[int, int], tuple[int, int]] = {}
+        # (x, y) -> time steps at which the cell is reserved in `vertices`
+        self.cell_times: dict[tuple[int, int], list[int]] = {}
+
+    def reserve_vertex(self, agent: int, position: Position, t: int):
+        self.vertices[(position.x, position.y, t)] = agent
+        self.cell_times.setdefault((position.x, position.y), []).append(t)
+
+    def reserve_edge(self, agent: int, from_position: Position, to_position: Position, t: int):
+        self.edges[(from_position.x, from_position.y, to_position.x, to_position.y, t)] = agent
+
+    """
+    Reserve the path of an agent, given as its position at every time step. If `park` is set, the agent stays at
+    the last position of the path afterwards.
+    """
+    def reserve_path(self, agent: int, positions: list[Position], park: bool = True):
+        for t, position in enumerate(positions):
+            self.reserve_vertex(agent, position, t)
+            if t > 0 and positions[t - 1] != position:
+                self.reserve_edge(agent, positions[t - 1], position, t)
+        if park:
+            goal = positions[-1]
+            self.parked[(goal.x, goal.y)] = (agent, len(positions) - 1)
+
+    """
+    Agent that occupies the position at time step t, None if it is free
+    """
+    def vertex_owner(self, position: Position, t: int) -> int | None:
+        agent = self.vertices.get((position.x, position.y, t))
+        if agent is not None:
+            return agent
+        parked = self.parked.get((position.x, position.y))
+        if parked is not None and parked[1] <= t:
+            return parked[0]
+        return None
+
+    """
+    Returns True if a move that ends at `to_position` at time step t has neither a vertex conflict nor an edge
+    conflict with the reserved agents
+    """
+    def is_move_free(self, from_position: Position, to_position: Position, t: int) -> bool:
+        if self.vertex_owner(to_position, t) is not None:
+            return False
+        return (to_position.x, to_position.y, from_position.x, from_position.y, t) not in self.edges
+
+    """
+    Last time step at which the position is reserved, -1 if it never is and infinity if an agent is parked there.
+    An agent can only stop at its goal after this time.
+    """
+    def latest_time_at(self, position: Position) -> float:
+        if (position.x, position.y) in self.parked:
+            return math.inf
+        return max(self.cell_times.get((position.x, position.y), [-1]))
+
+    """
+    Time steps below `time_limit` at which the cell (x, y) is reserved
+    """
+    def reserved_times(self, x: int, y: int, time_limit: int) -> list[int]:
+        times = [t for t in self.cell_times.get((x, y), []) if t < time_limit]
+        parked = self.parked.get((x, y))
+        if parked is not None:
+            times.extend(range(parked[1], time_limit))
+        return times
+
+    """
+    Earliest conflict of the path of an agent with the reserved agents, including agents that pass its goal after
+    it arrived there. Returns None if there is no conflict.
+    """
+    def find_conflict(self, agent: int, positions: list[Position]) -> Conflict | None:
+        conflicts = []
+        for t, position in enumerate(positions):
+            other = self.vertex_owner(position, t)
+            if other is not None:
+                conflicts.append(Conflict((agent, other), t, position))
+                break
+            if t > 0 and positions[t - 1] != position:
+                previous = positions[t - 1]
+                other = self.edges.get((position.x, position.y, previous.x, previous.y, t))
+                if other is not None:
+                    conflicts.append(Conflict((agent, other), t, position, previous))
+                    break
+
+        goal = positions[-1]
+        arrival = len(positions) - 1
+        later = [t for t in self.cell_times.get((goal.x, goal.y), []) if t > arrival]
+        parked = self.parked.get((goal.x, goal.y))
+        if parked is not None:
+            later.append(max(parked[1], arrival + 1))
+        if later:
+            t = min(later)
+            other = self.vertex_owner(goal, t)
+            if other is not None:
+                conflicts.append(Conflict((agent, other), t, goal))
+
+        if not conflicts:
+            return None
+        return min(conflicts, key=lambda conflict: conflict.time)
@@ -15,13 +15,16 @@ from PathPlanning.TimeBasedPathPlanning.GridWithDynamicObstacles import (
     Interval,
     ObstacleArrangement,
     Position,
+    SafeIntervals,
     empty_2d_array_of_lists,
 )
+from PathPlanning.TimeBasedPathPlanning.ReservationTable import ReservationTable
 import heapq
 import random
 from dataclasses import dataclass
 from functools import total_ordering
 import time
+from typing import cast
 
 @dataclass()
 # Note: Total_ordering is used instead of adding `order=True` to the @dataclass decorator because
@@ -65,6 +68,7 @@ class NodePath:
 
     def __init__(self, path: list[Node]):
         self.path = path
+        self.positions_at_time = {}
         for (i, node) in enumerate(path):
             if i > 0:
                 # account for waiting in interval at previous node
@@ -97,11 +101,28 @@ class SafeIntervalPathPlanner:
     grid: Grid
     start: Position
     goal: Position
-
-    def __init__(self, grid: Grid, start: Position, goal: Position):
+    # Paths of other agents to avoid, in addition to the obstacles of the grid
+    reservation_table: ReservationTable | None
+    # Use the distance to the goal around static obstacles as the heuristic instead of the Manhattan distance
+    use_distance_field: bool
+    # Distance field of the goal while planning, see Grid.get_distance_field
+    distance_field: list[list[int]] | None = None
+    # Used to evaluate solutions
+    expanded_node_count: int = -1
+
+    def __init__(
+        self,
+        grid: Grid,
+        start: Position,
+        goal: Position,
+        reservation_table: ReservationTable | None = None,
+        use_distance_field: bool = False,
+    ):
         self.grid = grid
         self.start = start
         self.goal = goal
+        self.reservation_table = reservation_table
+        self.use_distance_field = use_distance_field
 
         # Seed randomness for reproducibility
         RANDOM_SEED = 50
@@ -114,11 +135,15 @@ class SafeIntervalPathPlanner:
         verbose (bool): set to True to print debug information
     """
     def plan(self, verbose: bool = False) -> NodePath:
+        if self.use_distance_field:
+            self.distance_field = cast(list[list[int]], self.grid.get_distance_field(self.goal).tolist())
 
-        safe_intervals = self.grid.get_safe_intervals()
+        safe_intervals = self.grid.get_safe_intervals(self.reservation_table)
 
         open_set: list[Node] = []
-        first_node_interval = safe_intervals[self.start.x, self.start.y][0]
+        first_node_interval = safe_intervals.start_interval((self.start.x, self.start.y))
+        if first_node_interval is None:
+            raise Exception("No path found")
         heapq.heappush(
             open_set, Node(self.start, 0, self.calculate_heuristic(self.start), -1, first_node_interval)
         )
@@ -135,7 +160,7 @@ class SafeIntervalPathPlanner:
                     print(f"\tSkipping node that is past time limit: {expanded_node}")
                 continue
 
-            if expanded_node.position == self.goal:
+            if expanded_node.position == self.goal and self.can_stay_at_goal(expanded_node.time):
                 print(f"Found path to goal after {len(expanded_list)} expansions")
                 path = []
                 path_walker: Node = expanded_node
@@ -147,6 +172,7 @@ class SafeIntervalPathPlanner:
 
                 # reverse path so it goes start -> goal
                 path.reverse()
+                self.expanded_node_count = len(expanded_list)
                 return NodePath(path)
 
             expanded_idx = len(expanded_list)
@@ -157,13 +183,21 @@ class SafeIntervalPathPlanner:
             for child in self.generate_successors(expanded_node, expanded_idx, safe_intervals, visited_intervals):
                 heapq.heappush(open_set, child)
 
+            if expanded_node.position == self.goal and self.reservation_table is not None:
+                # waiting is implicit within an interval, but the agent can only stop at the goal once the other
+                # agents have passed it
+                stop_time = self.reservation_table.latest_time_at(self.goal) + 1
+                if stop_time <= expanded_node.interval.end_time:
+                    heapq.heappush(open_set, Node(self.goal, int(stop_time), 0, expanded_idx, expanded_node.interval))
+
+        self.expanded_node_count = len(expanded_list)
         raise Exception("No path found")
 
     """
     Generate list of possible successors of the provided `parent_node` that are worth expanding
     """
     def generate_successors(
-        self, parent_node: Node, parent_node_idx: int, intervals: np.ndarray, visited_intervals: np.ndarray
+        self, parent_node: Node, parent_node_idx: int, intervals: SafeIntervals, visited_intervals: np.ndarray
     ) -> list[Node]:
         new_nodes = []
         diffs = [
@@ -177,14 +211,18 @@ class SafeIntervalPathPlanner:
             new_pos = parent_node.position + diff
             if not self.grid.inside_grid_bounds(new_pos):
                 continue
+            heuristic = self.calculate_heuristic(new_pos)
+            # the goal can not be reached from new_pos
+            if heuristic < 0:
+                continue
 
             current_interval = parent_node.interval
 
-            new_cell_intervals: list[Interval] = intervals[new_pos.x, new_pos.y]
-            for interval in new_cell_intervals:
-                # if interval starts after current ends, break
+            for start_time, end_time in cast(list[list[int]], intervals[new_pos.x, new_pos.y].tolist()):
+                interval = Interval(start_time, end_time)
+                # if interval starts after the last time step the current one can be left, break
                 # assumption: intervals are sorted by start time, so all future intervals will hit this condition as well
-                if interval.start_time > current_interval.end_time:
+                if interval.start_time > current_interval.end_time + 1:
                     break
 
                 # if interval ends before current starts, skip
@@ -201,14 +239,15 @@ class SafeIntervalPathPlanner:
                     continue
 
                 # We know there is a node worth expanding. Generate successor at the earliest possible time the
-                # new interval can be entered
-                for possible_t in range(max(parent_node.time + 1, interval.start_time), min(current_interval.end_time, interval.end_time)):
-                    if self.grid.valid_position(new_pos, possible_t):
+                # new interval can be entered. The agent can stay in the current cell until the end of its interval and
+                # arrive in the new cell one step later.
+                for possible_t in range(max(parent_node.time + 1, interval.start_time), min(current_interval.end_time + 1, interval.end_time) + 1):
+                    if self.grid.valid_position(new_pos, possible_t) and self.is_move_free(parent_node.position, new_pos, possible_t):
                         new_nodes.append(Node(
                             new_pos,
-                            # entry is max of interval start and parent node time + 1 (get there as soon as possible)
-                            max(interval.start_time, parent_node.time + 1),
-                            self.calculate_heuristic(new_pos),
+                            # entry is the earliest time the move is possible (get there as soon as possible)
+                            possible_t,
+                            heuristic,
                             parent_node_idx,
                             interval,
                         ))
@@ -218,9 +257,26 @@ class SafeIntervalPathPlanner:
         return new_nodes
 
     """
-    Calculate the heuristic for a given position - Manhattan distance to the goal
+    Check a move against the reservation table. Vertex conflicts are already excluded by the safe intervals, this
+    excludes swapping cells with another agent.
+    """
+    def is_move_free(self, from_position: Position, to_position: Position, time: int) -> bool:
+        return self.reservation_table is None or self.reservation_table.is_move_free(from_position, to_position, time)
+
+    """
+    An agent that reaches its goal stays there, so it may only stop after the last reservation of the goal by
+    another agent
+    """
+    def can_stay_at_goal(self, time: int) -> bool:
+        return self.reservation_table is None or time > self.reservation_table.latest_time_at(self.goal)
+
+    """
+    Calculate the heuristic for a given position - Manhattan distance to the goal, or the distance around the
+    static obstacles if `use_distance_field` is set. Returns -1 if the goal can not be reached from the position.
     """
     def calculate_heuristic(self, position) -> int:
+        if self.distance_field is not None:
+            return self.distance_field[position.x][position.y]
         diff = self.goal - position
         return abs(diff.x) + abs(diff.y)
 
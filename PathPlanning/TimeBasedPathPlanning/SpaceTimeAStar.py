@@ -12,15 +12,18 @@ import numpy as np
 import matplotlib.pyplot as plt
 from PathPlanning.TimeBasedPathPlanning.GridWithDynamicObstacles import (
     Grid,
+    MOVES,
     ObstacleArrangement,
     Position,
 )
+from PathPlanning.TimeBasedPathPlanning.ReservationTable import ReservationTable
 import heapq
 from collections.abc import Generator
 import random
 from dataclasses import dataclass
 from functools import total_ordering
 import time
+from typing import cast
 
 # Seed randomness for reproducibility
 RANDOM_SEED = 50
@@ -66,6 +69,7 @@ class NodePath:
 
     def __init__(self, path: list[Node]):
         self.path = path
+        self.positions_at_time = {}
         for node in path:
             self.positions_at_time[node.time] = node.position
 
@@ -92,15 +96,33 @@ class SpaceTimeAStar:
     grid: Grid
     start: Position
     goal: Position
+    # Paths of other agents to avoid, in addition to the obstacles of the grid
+    reservation_table: ReservationTable | None
+    # Use the distance to the goal around static obstacles as the heuristic instead of the Manhattan distance
+    use_distance_field: bool
+    # Distance field of the goal while planning, see Grid.get_distance_field
+    distance_field: list[list[int]] | None = None
     # Used to evaluate solutions
     expanded_node_count: int = -1
 
-    def __init__(self, grid: Grid, start: Position, goal: Position):
+    def __init__(
+        self,
+        grid: Grid,
+        start: Position,
+        goal: Position,
+        reservation_table: ReservationTable | None = None,
+        use_distance_field: bool = False,
+    ):
         self.grid = grid
         self.start = start
         self.goal = goal
+        self.reservation_table = reservation_table
+        self.use_distance_field = use_distance_field
 
     def plan(self, verbose: bool = False) -> NodePath:
+        if self.use_distance_field:
+            self.distance_field = cast(list[list[int]], self.grid.get_distance_field(self.goal).tolist())
+
         open_set: list[Node] = []
         heapq.heappush(
             open_set, Node(self.start, 0, self.calculate_heuristic(self.start), -1)
@@ -110,6 +132,9 @@ class SpaceTimeAStar:
         expanded_set: set[Node] = set()
         while open_set:
             expanded_node: Node = heapq.heappop(open_set)
+            # a node can be pushed once per parent before it is expanded
+            if expanded_node in expanded_set:
+                continue
             if verbose:
                 print("Expanded node:", expanded_node)
 
@@ -118,7 +143,7 @@ class SpaceTimeAStar:
                     print(f"\tSkipping node that is past time limit: {expanded_node}")
                 continue
 
-            if expanded_node.position == self.goal:
+            if expanded_node.position == self.goal and self.can_stay_at_goal(expanded_node.time):
                 print(f"Found path to goal after {len(expanded_list)} expansions")
                 path = []
                 path_walker: Node = expanded_node
@@ -140,6 +165,7 @@ class SpaceTimeAStar:
             for child in self.generate_successors(expanded_node, expanded_idx, verbose, expanded_set):
                 heapq.heappush(open_set, child)
 
+        self.expanded_node_count = len(expanded_set)
         raise Exception("No path found")
 
     """
@@ -148,31 +174,44 @@ class SpaceTimeAStar:
     def generate_successors(
         self, parent_node: Node, parent_node_idx: int, verbose: bool, expanded_set: set[Node]
     ) -> Generator[Node, None, None]:
-        diffs = [
-            Position(0, 0),
-            Position(1, 0),
-            Position(-1, 0),
-            Position(0, 1),
-            Position(0, -1),
-        ]
-        for diff in diffs:
+        # validity of all moves at once
+        valid_moves = self.grid.valid_moves(parent_node.position, parent_node.time + 1)
+        for diff, valid in zip(MOVES, valid_moves):
+            if not valid:
+                continue
             new_pos = parent_node.position + diff
+            heuristic = self.calculate_heuristic(new_pos)
+            # the goal can not be reached from new_pos
+            if heuristic < 0:
+                continue
             new_node = Node(
                 new_pos,
                 parent_node.time + 1,
-                self.calculate_heuristic(new_pos),
+                heuristic,
                 parent_node_idx,
             )
 
             if new_node in expanded_set:
                 continue
 
-            if self.grid.valid_position(new_pos, parent_node.time + 1):
+            if self.reservation_table is None or self.reservation_table.is_move_free(parent_node.position, new_pos, new_node.time):
                 if verbose:
                     print("\tNew successor node: ", new_node)
                 yield new_node
 
+    """
+    An agent that reaches its goal stays there, so it may only stop after the last reservation of the goal by
+    another agent
+    """
+    def can_stay_at_goal(self, time: int) -> bool:
+        return self.reservation_table is None or time > self.reservation_table.latest_time_at(self.goal)
+
+    """
+    Lower bound of the number of time steps from `position` to the goal, -1 if the goal can not be reached
+    """
     def calculate_heuristic(self, position) -> int:
+        if self.distance_field is not None:
+            return self.distance_field[position.x][position.y]
         diff = self.goal - position
         return abs(diff.x) + abs(diff.y)
 
@@ -1,5 +1,9 @@
 import conftest
+import math
+
+import pytest
 from PathPlanning.AStar import a_star as m
+from utils.occupancy_grid import ObstacleMapCache
 
 
 def test_1():
@@ -7,5 +11,41 @@ def test_1():
     m.main()
 
 
+def test_obstacle_map_cache(tmp_path):
+    ox, oy = [0.0, 20.0] + [10.0] * 15, [0.0, 20.0] + list(range(15))
+    cache = ObstacleMapCache(tmp_path)
+    planner = m.AStarPlanner(ox, oy, 1.0, 1.0, obstacle_map_cache=cache)
+    cached_planner = m.AStarPlanner(ox, oy, 1.0, 1.0,
+                                    obstacle_map_cache=cache)
+
+    assert (cached_planner.obstacle_map == planner.obstacle_map).all()
+    assert cached_planner.planning(2.0, 2.0, 18.0, 2.0) == \
+        planner.planning(2.0, 2.0, 18.0, 2.0)
+
+
+def path_cost(rx, ry):
+    return sum(math.hypot(rx[i] - rx[i - 1], ry[i] - ry[i - 1])
+               for i in range(1, len(rx)))
+
+
+@pytest.mark.parametrize("search_mode", ["jps", "jps_plus"])
+def test_jump_point_search(search_mode):
+    ox, oy = [-10.0, 60.0], [-10.0, 60.0]
+    for i in range(-10, 40):
+        ox.extend([20.0, 40.0])
+        oy.extend([float(i), 60.0 - i])
+
+    planner = m.AStarPlanner(ox, oy, 2.0, 1.0)
+    jps_planner = m.AStarPlanner(ox, oy, 2.0, 1.0, search_mode=search_mode)
+    rx, ry = planner.planning(10.0, 10.0, 50.0, 50.0)
+    jrx, jry = jps_planner.planning(10.0, 10.0, 50.0, 50.0)
+
+    assert (jrx[0], jry[0]) == (rx[0], ry[0])
+    assert (jrx[-1], jry[-1]) == (rx[-1], ry[-1])
+    assert math.isclose(path_cost(jrx, jry), path_cost(rx, ry))
+    for i in range(1, len(jrx)):  # one grid cell per step
+        assert max(abs(jrx[i] - jrx[i - 1]), abs(jry[i] - jry[i - 1])) == 2.0
+
+
 if __name__ == '__main__':
     conftest.run_this_test(__file__)
@@ -0,0 +1,14 @@
+import conftest
+from PathPlanning.AStar import a_star_benchmark as m
+
+
+def test_1():
+    results = m.main(sizes=[20, 40])
+    assert len(results) == 2 * len(m.AStarPlanner.SEARCH_MODES)
+    for _, _, planning_time, n_path in results:
+        assert planning_time > 0.0
+        assert n_path > 1
+
+
+if __name__ == '__main__':
+    conftest.run_this_test(__file__)
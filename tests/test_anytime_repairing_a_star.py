@@ -0,0 +1,77 @@
+import conftest
+import math
+
+import pytest
+from PathPlanning.AStar import a_star
+from PathPlanning.AStar import anytime_repairing_a_star as m
+
+
+def test_1():
+    m.show_animation = False
+    m.main()
+
+
+def path_cost(rx, ry):
+    return sum(math.hypot(rx[i] - rx[i - 1], ry[i] - ry[i - 1])
+               for i in range(1, len(rx)))
+
+
+def make_obstacles():
+    ox, oy = [-10.0, 60.0], [-10.0, 60.0]
+    for i in range(-10, 40):
+        ox.extend([20.0, 40.0])
+        oy.extend([float(i), 60.0 - i])
+    return ox, oy
+
+
+def test_suboptimality_bounds():
+    ox, oy = make_obstacles()
+    rx, ry = a_star.AStarPlanner(ox, oy, 1.0, 1.0).planning(
+        10.0, 10.0, 50.0, 50.0)
+    planner = m.AnytimeRepairingAStarPlanner(ox, oy, 1.0, 1.0,
+                                             initial_weight=5.0)
+    solutions = list(planner.planning_iter(10.0, 10.0, 50.0, 50.0))
+
+    optimal_cost = path_cost(rx, ry)
+    bounds = [bound for _, _, bound in solutions]
+    assert bounds == sorted(bounds, reverse=True)
+    assert bounds[-1] == 1.0
+    for srx, sry, bound in solutions:
+        assert (srx[0], sry[0]) == (rx[0], ry[0])
+        assert (srx[-1], sry[-1]) == (rx[-1], ry[-1])
+        assert path_cost(srx, sry) <= bound * optimal_cost + 1e-9
+    assert path_cost(*solutions[-1][:2]) == pytest.approx(optimal_cost)
+
+
+def test_time_limit():
+    ox, oy = make_obstacles()
+    planner = m.AnytimeRepairingAStarPlanner(ox, oy, 1.0, 1.0)
+    assert planner.planning(10.0, 10.0, 50.0, 50.0, time_limit=0.0) == \
+        ([], [])
+
+
+def test_stats_and_quiet_mode(capsys):
+    ox, oy = [-10.0, 60.0], [-10.0, 60.0]
+    for i in range(-10, 61):
+        ox.append(30.0)
+        oy.append(float(i))
+    planner = m.AnytimeRepairingAStarPlanner(ox, oy, 1.0, 1.0)
+    planner.verbose = False
+    capsys.readouterr()
+    assert planner.planning(10.0, 10.0, 50.0, 50.0) == ([], [])
+    assert capsys.readouterr().out == ""
+    assert planner.stats.nodes_expanded > 0
+    assert planner.stats.nodes_generated >= planner.stats.nodes_expanded
+    assert planner.stats.planning_time > 0.0
+
+    ox, oy = make_obstacles()
+    planner = m.AnytimeRepairingAStarPlanner(ox, oy, 1.0, 1.0)
+    planner.planning(10.0, 10.0, 50.0, 50.0)
+    expanded = planner.stats.nodes_expanded
+    assert expanded > 0
+    list(planner.planning_iter(10.0, 10.0, 50.0, 50.0))
+    assert planner.stats.nodes_expanded == expanded
+
+
+if __name__ == '__main__':
+    conftest.run_this_test(__file__)
@@ -1,5 +1,8 @@
+import math
 import random
 
+import numpy as np
+import pytest
 import conftest
 from PathPlanning.BatchInformedRRTStar import batch_informed_rrtstar as m
 
@@ -10,5 +13,88 @@ def test_1():
     m.main(maxIter=10)
 
 
+def test_queues():
+    bit_star = m.BITStar(start=[-1, 0], goal=[3, 8], obstacleList=[],
+                         randArea=[-2, 15])
+    bit_star.setup_planning()
+    sids = list(bit_star.samples)[:20]
+    for sid in sids:
+        bit_star.push_edge(bit_star.startId, sid)
+    # removed edges and outdated values turn stale
+    for sid in sids[:5]:
+        bit_star.remove_edge((bit_star.startId, sid))
+    bit_star.push_edge(bit_star.startId, sids[5], 0.0)
+
+    values = {(bit_star.startId, sid): bit_star.g_scores[bit_star.startId]
+              + bit_star.compute_distance_cost(bit_star.startId, sid)
+              + bit_star.compute_heuristic_cost(sid, bit_star.goalId)
+              for sid in sids[6:]}
+    assert bit_star.best_in_edge_queue() == (bit_star.startId, sids[5])
+    bit_star.remove_edge((bit_star.startId, sids[5]))
+    assert bit_star.best_in_edge_queue() == min(values, key=values.get)
+    assert bit_star.best_edge_queue_value() == min(values.values())
+
+    bit_star.push_vertex(bit_star.startId)
+    assert bit_star.best_in_vertex_queue() == bit_star.startId
+    bit_star.expand_vertex(bit_star.startId)
+    assert bit_star.best_vertex_queue_value() == float('inf')
+
+    bit_star.clear_queues()
+    assert bit_star.best_in_edge_queue() is None
+
+
+def test_informed_sample():
+    bit_star = m.BITStar(start=[-1, 0], goal=[3, 8], obstacleList=[],
+                         randArea=[-2, 15])
+    _, c_min, x_center, C, _ = bit_star.setup_planning()
+    samples = bit_star.informed_sample(10000, 12.0, c_min, x_center, C)
+
+    assert 9000 < len(samples) <= 10001
+    for sid, coord in list(samples.items())[:100]:
+        assert bit_star.tree.real_world_to_node_id(coord) == sid
+        assert np.allclose(bit_star.get_coord(sid),
+                           bit_star.tree.node_id_to_real_world_coord(sid))
+    # the samples fill the ellipse around the start and the goal
+    coords = np.array(list(samples.values()))
+    center = coords.mean(axis=0)
+    assert np.allclose(center, [1.0, 4.0], atol=0.1)
+    assert np.abs(coords - center).max() <= 6.0
+
+
+# the map of main
+OBSTACLE_LIST = [(5, 5, 0.5), (9, 6, 1), (7, 5, 1), (1, 5, 1), (3, 6, 1),
+                 (7, 9, 1)]
+
+
+def check_path(bit_star, path):
+    assert path[0] == [-1, 0] and path[-1] == [3, 8]
+    length = sum(math.dist(p, q) for p, q in zip(path, path[1:]))
+    assert math.isclose(length, bit_star.g_scores[bit_star.goalId])
+    for p, q in zip(path, path[1:]):
+        x = np.linspace(p[0], q[0], 100)
+        y = np.linspace(p[1], q[1], 100)
+        assert not bit_star._collision_check(x, y).any()
+    return length
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_main_map(seed):
+    random.seed(seed)
+    bit_star = m.BITStar(start=[-1, 0], goal=[3, 8],
+                         obstacleList=OBSTACLE_LIST, randArea=[-2, 15])
+    path = bit_star.plan(animation=False)
+    assert check_path(bit_star, path) < 1.25 * math.dist([-1, 0], [3, 8])
+
+
+def test_large_batch():
+    # the first batch is searched beyond maxIter until it finds a path
+    random.seed(1)
+    bit_star = m.BITStar(start=[-1, 0], goal=[3, 8],
+                         obstacleList=OBSTACLE_LIST, randArea=[-2, 15],
+                         maxIter=300, batchSize=10000)
+    path = bit_star.plan(animation=False)
+    assert check_path(bit_star, path) < 1.05 * math.dist([-1, 0], [3, 8])
+
+
 if __name__ == '__main__':
     conftest.run_this_test(__file__)
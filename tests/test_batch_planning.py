@@ -0,0 +1,73 @@
+import pickle
+
+import conftest
+import pytest
+from PathPlanning.AStar.a_star import AStarPlanner
+from PathPlanning.BidirectionalAStar import bidirectional_a_star
+from PathPlanning.Dijkstra import dijkstra
+from utils import batch_planning
+
+# a square map with a wall in the middle
+OX = [0.0, 40.0] + [20.0] * 30
+OY = [0.0, 40.0] + [float(i) for i in range(30)]
+
+
+@pytest.mark.parametrize("planner_class", [
+    AStarPlanner,
+    dijkstra.Dijkstra,
+    bidirectional_a_star.BidirectionalAStarPlanner,
+])
+def test_plan_many(planner_class, capsys):
+    dijkstra.show_animation = False
+    bidirectional_a_star.show_animation = False
+    planner = planner_class(OX, OY, 1.0, 1.0)
+    starts = [(2.0, 2.0), (35.0, 35.0), (2.0, 2.0)]
+    goals = [(35.0, 2.0), (5.0, 30.0), (20.0, 10.0)]  # last is in the wall
+
+    capsys.readouterr()
+    results = planner.plan_many(starts, goals, workers=2, timeout=10.0)
+    assert capsys.readouterr().out == ""
+
+    assert len(results) == 3
+    for result, (sx, sy), (gx, gy) in zip(results[:2], starts, goals):
+        assert result.success
+        rx, ry = planner.planning(sx, sy, gx, gy)
+        assert sorted(zip(result.rx, result.ry)) == sorted(zip(rx, ry))
+    assert not results[2].success
+    assert results[2].rx is None
+
+
+@pytest.mark.parametrize("planner_class, kwargs", [
+    (AStarPlanner, {"search_mode": "jps_plus"}),
+    (dijkstra.Dijkstra, {}),
+    (bidirectional_a_star.BidirectionalAStarPlanner, {}),
+])
+def test_worker_state(planner_class, kwargs):
+    planner = planner_class(OX, OY, 1.0, 1.0, **kwargs)
+    if hasattr(planner, "expansion_callback"):
+        planner.expansion_callback = lambda x, y, cost: None
+    planner.planning(2.0, 2.0, 35.0, 2.0)
+    if isinstance(planner, dijkstra.Dijkstra):
+        planner.calc_cost_to_go(35.0, 2.0)
+
+    planner.new_option = 3
+
+    state = batch_planning._worker_state(planner)
+    # every attribute but the shared obstacle map reaches the workers
+    assert set(state) | {"obstacle_map"} == set(planner.__dict__)
+    assert state["new_option"] == 3
+    assert state["stats"] is None
+    # only the configuration is pickled, not the search caches
+    assert len(pickle.dumps(state)) < 4096
+
+
+def test_plan_many_timeout():
+    planner = AStarPlanner(OX, OY, 1.0, 1.0)
+    results = batch_planning.plan_many(planner, [(2.0, 2.0)], [(35.0, 2.0)],
+                                       workers=1, timeout=1e-6)
+    assert not results[0].success
+    assert "timeout" in results[0].error
+
+
+if __name__ == '__main__':
+    conftest.run_this_test(__file__)
@@ -1,4 +1,7 @@
 import conftest
+import math
+import random
+
 from PathPlanning.DStarLite import d_star_lite as m
 
 
@@ -7,5 +10,77 @@ def test_1():
     m.main()
 
 
+def border_obstacles(size):
+    ox, oy = [], []
+    for i in range(-1, size + 1):
+        ox.extend([i, i, -1, size])
+        oy.extend([-1, size, i, i])
+    return ox, oy
+
+
+def calc_start_cost(ox, oy, start, goal):
+    planner = m.DStarLite(ox, oy)
+    planner.verbose = False
+    planner.initialize(start, goal)
+    planner.compute_shortest_path()
+    return planner.g[planner.calc_index(planner.start)]
+
+
+def test_update_obstacles_matches_new_search():
+    m.show_animation = False
+    random.seed(1)
+    size = 30
+    ox, oy = border_obstacles(size)
+    start, goal = m.Node(2, 2), m.Node(27, 27)
+    obstacles = set()
+    planner = m.DStarLite(ox, oy)
+    planner.verbose = False
+    planner.initialize(start, goal)
+    planner.compute_shortest_path()
+    for _ in range(10):
+        added = [(random.randrange(size), random.randrange(size))
+                 for _ in range(20)]
+        added = [p for p in added if p not in [(2, 2), (27, 27)]]
+        removed = random.sample(sorted(obstacles), min(5, len(obstacles)))
+        obstacles = (obstacles - set(removed)) | set(added)
+        found = planner.update_obstacles(added, removed)
+
+        cost = calc_start_cost(ox + [x for x, _ in obstacles],
+                               oy + [y for _, y in obstacles], start, goal)
+        assert found == (cost != math.inf)
+        assert planner.g[planner.calc_index(planner.start)] == cost
+
+
+def test_update_obstacles_expands_less_than_new_search():
+    m.show_animation = False
+    size = 100
+    ox, oy = border_obstacles(size)
+    start, goal = m.Node(5, 5), m.Node(95, 95)
+    planner = m.DStarLite(ox, oy)
+    planner.verbose = False
+    planner.initialize(start, goal)
+    planner.compute_shortest_path()
+
+    # an obstacle away from the path does not change the g values
+    n_expanded = planner.stats.nodes_expanded
+    assert planner.update_obstacles([(80, 10), (81, 10)])
+    assert planner.stats.nodes_expanded == n_expanded
+
+    # a wall across the path near the start
+    wall = [(20, 20), (21, 20), (22, 20)]
+    assert planner.update_obstacles(wall)
+    n_replan = planner.stats.nodes_expanded - n_expanded
+    new_planner = m.DStarLite(ox + [x for x, _ in wall],
+                              oy + [y for _, y in wall])
+    new_planner.verbose = False
+    new_planner.initialize(start, goal)
+    new_planner.compute_shortest_path()
+    assert 0 < n_replan < new_planner.stats.nodes_expanded
+
+    path = planner.compute_current_path()
+    assert path[-1].x + planner.x_min_world == 95
+    assert not any(planner.is_obstacle(node) for node in path)
+
+
 if __name__ == '__main__':
     conftest.run_this_test(__file__)
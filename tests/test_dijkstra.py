@@ -1,4 +1,7 @@
 import conftest
+import math
+
+import numpy as np
 from PathPlanning.Dijkstra import dijkstra as m
 
 
@@ -7,5 +10,53 @@ def test_1():
     m.main()
 
 
+def path_cost(rx, ry):
+    return sum(math.hypot(rx[i] - rx[i - 1], ry[i] - ry[i - 1])
+               for i in range(1, len(rx)))
+
+
+def test_planning_with_cost_to_go():
+    m.show_animation = False
+    ox, oy = [0.0, 40.0], [0.0, 40.0]
+    for i in range(30):
+        ox.extend([15.0, 30.0])
+        oy.extend([float(i), 40.0 - i])
+    planner = m.Dijkstra(ox, oy, 1.0, 1.0, cost_to_go_cache_size=2)
+
+    gx, gy = 35.0, 35.0
+    for sx, sy in [(5.0, 5.0), (20.0, 2.0), (5.0, 35.0)]:
+        rx, ry = planner.planning(sx, sy, gx, gy)
+        crx, cry = planner.planning_with_cost_to_go(sx, sy, gx, gy)
+        assert (crx[0], cry[0]) == (rx[0], ry[0])
+        assert (crx[-1], cry[-1]) == (rx[-1], ry[-1])
+        assert math.isclose(path_cost(crx, cry), path_cost(rx, ry))
+    assert len(planner.cost_to_go_cache) == 1
+
+    # least recently used goal is evicted
+    for goal in [(2.0, 38.0), (20.0, 20.0)]:
+        planner.calc_cost_to_go(*goal)
+    assert len(planner.cost_to_go_cache) == 2
+    assert not np.isinf(planner.calc_cost_to_go(20.0, 20.0)[5, 5])
+
+    # blocking a cell in place drops the cached fields as well
+    rx, ry = planner.planning_with_cost_to_go(20.0, 2.0, gx, gy)
+    ix = planner.calc_xy_index(rx[len(rx) // 2], planner.min_x)
+    iy = planner.calc_xy_index(ry[len(ry) // 2], planner.min_y)
+    field = planner.calc_cost_to_go(gx, gy)
+    planner.obstacle_map[ix][iy] = True
+    blocked_field = planner.calc_cost_to_go(gx, gy)
+    assert not np.array_equal(blocked_field, field)
+    planner.clear_cost_to_go_cache()
+    assert np.array_equal(blocked_field, planner.calc_cost_to_go(gx, gy))
+    crx, cry = planner.planning_with_cost_to_go(20.0, 2.0, gx, gy)
+    assert math.isclose(path_cost(crx, cry),
+                        path_cost(*planner.planning(20.0, 2.0, gx, gy)))
+
+    # a new obstacle map drops the cached fields
+    planner.obstacle_map = np.ones_like(planner.obstacle_map)
+    assert planner.planning_with_cost_to_go(5.0, 5.0, gx, gy) == ([], [])
+    assert len(planner.cost_to_go_cache) == 1
+
+
 if __name__ == '__main__':
     conftest.run_this_test(__file__)
@@ -7,5 +7,80 @@ def test_1():
     m.main()
 
 
+def test_state_views():
+    maps = m.Map(10, 20)
+    maps.set_obstacle([(3, 4), (-1, 2), (10, 0)])
+    state = maps.get_state(2, 5)
+    assert state == maps.get_state(2, 5) != maps.get_state(5, 2)
+    assert (state.t, state.state, state.parent) == ("new", ".", None)
+    assert maps.get_state(3, 4).state == "#"
+
+    state.parent = maps.get_state(2, 6)
+    state.h = 3.0
+    assert maps.get_state(2, 5).parent == maps.get_state(2, 6)
+    assert maps.h[2 * 20 + 5] == 3.0
+    assert state.cost(maps.get_state(3, 6)) == \
+        maps.get_state(3, 6).cost(state) == 2 ** 0.5
+    assert state.cost(maps.get_state(3, 4)) == m.maxsize
+    # h, k, tag, parent and state arrays
+    assert maps.nbytes / (10 * 20) <= 24
+
+
+def test_state_api():
+    maps = m.Map(10, 20)
+    assert len(maps.map) == 10 and len(maps.map[-1]) == 20
+    state = maps.map[2][5]
+    assert state == maps.get_state(2, 5)
+    assert sorted((s.x, s.y) for s in maps.get_neighbors(maps.map[0][0])) \
+        == [(0, 1), (1, 0), (1, 1)]
+
+    dstar = m.Dstar(maps)
+    dstar.insert(state, 2.0)
+    assert (state.t, state.h, state.k) == ("open", 2.0, 2.0)
+    assert dstar.min_state() == state
+    dstar.remove(state)
+    assert state.t == "close" and dstar.min_state() is None
+
+    state.parent = maps.map[2][6]
+    dstar.modify_cost(state)
+    assert state.t == "open" and state.h == 1.0
+
+
+def test_state_values():
+    # a state without a map keeps its own values
+    state, other = m.State(1, 2), m.State(2, 3)
+    assert (state.x, state.y, state.t, state.state, state.h, state.k,
+            state.parent) == (1, 2, "new", ".", 0.0, 0.0, None)
+    state.t, state.h, state.parent = "open", 4.0, other
+    assert (state.t, state.h, state.parent) == ("open", 4.0, other)
+    assert other.parent is None and state != m.State(1, 2)
+    assert state.cost(other) == 2 ** 0.5
+    other.set_state("#")
+    assert state.cost(other) == m.maxsize
+
+    # assignments to a state of a map write into its arrays
+    maps = m.Map(10, 20)
+    state = maps.map[2][5]
+    state.state, state.t = "#", "close"
+    assert maps.state[2 * 20 + 5] == m.OBSTACLE
+    assert maps.tag[2 * 20 + 5] == m.CLOSE
+    assert maps.map[2][5].t == "close" and maps.map[-8][-15].state == "#"
+
+
+def test_replanning_on_large_map():
+    m.show_animation = False
+    maps = m.Map(200, 200)
+    maps.set_obstacle([(x, 100) for x in range(0, 150)])
+    dstar = m.Dstar(maps)
+    rx, ry = dstar.run(maps.get_state(10, 10), maps.get_state(180, 180))
+    # the start goes around the wall and the new obstacle of the run
+    assert (rx[0], ry[0]) == (10, 10)
+    assert (rx[-1], ry[-1]) in [(x, y) for x in range(179, 182)
+                                for y in range(179, 182)]
+    assert max(rx[ry.index(100):ry.index(100) + 1]) >= 150
+    assert not any(maps.get_state(x, y).state == "#"
+                   for x, y in zip(rx, ry))
+
+
 if __name__ == '__main__':
     conftest.run_this_test(__file__)
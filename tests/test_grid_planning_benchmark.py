@@ -0,0 +1,102 @@
+import conftest
+import csv
+import math
+
+import numpy as np
+import pytest
+from PathPlanning.GridPlanningBenchmark import grid_planning_benchmark as m
+from utils import moving_ai
+
+MAP_FILE = """type octile
+height 4
+width 6
+map
+..@...
+.T..W.
+.G@S..
+......
+"""
+
+
+def test_load_map(tmp_path):
+    path = tmp_path / "test.map"
+    path.write_text(MAP_FILE)
+    moving_ai_map = moving_ai.load_map(str(path))
+    assert moving_ai_map.name == "test.map"
+    assert (moving_ai_map.width, moving_ai_map.height) == (6, 4)
+    assert np.argwhere(moving_ai_map.blocked).tolist() == [
+        [0, 2], [1, 1], [1, 4], [2, 2]]
+
+    moving_ai.save_map(str(tmp_path / "saved.map"), moving_ai_map)
+    saved = moving_ai.load_map(str(tmp_path / "saved.map"))
+    assert np.array_equal(saved.blocked, moving_ai_map.blocked)
+
+    (tmp_path / "bad.map").write_text("type octile\nheight 5\nwidth 6\nmap\n")
+    with pytest.raises(ValueError):
+        moving_ai.load_map(str(tmp_path / "bad.map"))
+
+
+def test_obstacle_points_keep_free_cells():
+    moving_ai_map = moving_ai.make_random_map(20, seed=1)
+    ox, oy = moving_ai.calc_obstacle_points(moving_ai_map)
+    planner = m.AStarPlanner(ox, oy, 1.0, m.ROBOT_RADIUS)
+    # the grid has the border cells at index 0
+    assert np.array_equal(
+        np.asarray(planner.obstacle_map)[1:21, 1:21],
+        moving_ai_map.blocked.T)
+
+
+def test_scenarios(tmp_path):
+    moving_ai_map = moving_ai.make_random_map(30, seed=2)
+    scenarios = moving_ai.make_scenarios(moving_ai_map, 5, seed=2)
+    assert len(scenarios) == 5
+    for s in scenarios:
+        assert not moving_ai_map.blocked[s.start_y, s.start_x]
+        assert not moving_ai_map.blocked[s.goal_y, s.goal_x]
+        assert math.isfinite(s.optimal_length)
+        assert s.bucket == int(s.optimal_length // 4)
+
+    path = tmp_path / "test.map.scen"
+    moving_ai.save_scenarios(str(path), scenarios)
+    loaded = moving_ai.load_scenarios(str(path))
+    assert [s.goal_x for s in loaded] == [s.goal_x for s in scenarios]
+    assert [s.optimal_length for s in loaded] == pytest.approx(
+        [s.optimal_length for s in scenarios])
+
+
+def test_main(tmp_path):
+    moving_ai_map = moving_ai.make_random_map(16, seed=3)
+    moving_ai.save_map(str(tmp_path / moving_ai_map.name), moving_ai_map)
+    scen_path = str(tmp_path / "random.map.scen")
+    moving_ai.save_scenarios(
+        scen_path, moving_ai.make_scenarios(moving_ai_map, 4, seed=3))
+
+    csv_filename = str(tmp_path / "results.csv")
+    results = m.main(scenario_files=[scen_path], n_scenarios=3,
+                     csv_filename=csv_filename)
+    assert len(results) == len(m.PLANNERS)
+    for r in results:
+        assert r["Queries"] == r["Solved"] == 3
+        assert r["Expansions/s"] > 0.0
+        assert 0.0 < r["Latency p50 (s)"] <= r["Latency p99 (s)"]
+        assert r["Peak Memory (KiB)"] > 0.0
+        assert r["Mean Suboptimality"] >= 1.0 - 1e-9
+
+    with open(csv_filename, newline="") as f:
+        rows = list(csv.DictReader(f))
+    assert len(rows) == len(results)
+    assert rows[0]["Planner"] == "AStarPlanner"
+    # A* and Dijkstra find optimal paths
+    for r in results[:2]:
+        assert r["Mean Suboptimality"] == pytest.approx(1.0)
+
+
+def test_random_maps():
+    results = m.main(sizes=[16, 32], n_scenarios=2,
+                     planners=["a_star", "breadth_first_search"],
+                     measure_memory=False, csv_filename=None)
+    assert [r["Cells"] for r in results] == [256, 1024, 256, 1024]
+
+
+if __name__ == '__main__':
+    conftest.run_this_test(__file__)
@@ -0,0 +1,159 @@
+import conftest
+import math
+
+import numpy as np
+from PathPlanning.AStar import a_star
+from PathPlanning.AStar import hierarchical_a_star as m
+
+
+def test_1():
+    m.show_animation = False
+    m.main()
+
+
+def make_planner():
+    ox, oy = [-10.0, 60.0], [-10.0, 60.0]
+    for i in range(-10, 40):
+        ox.extend([20.0, 40.0])
+        oy.extend([float(i), 60.0 - i])
+    return a_star.AStarPlanner(ox, oy, 2.0, 1.0)
+
+
+def path_cost(rx, ry):
+    return sum(math.hypot(rx[i] - rx[i - 1], ry[i] - ry[i - 1])
+               for i in range(1, len(rx)))
+
+
+def test_planning():
+    planner = make_planner()
+    hpa_star = m.HierarchicalAStarPlanner(planner, cluster_size=5)
+    rx, ry = planner.planning(10.0, 10.0, 50.0, 50.0)
+    hrx, hry = hpa_star.planning(10.0, 10.0, 50.0, 50.0)
+
+    assert (hrx[0], hry[0]) == (rx[0], ry[0])
+    assert (hrx[-1], hry[-1]) == (rx[-1], ry[-1])
+    # near-optimal
+    assert path_cost(rx, ry) <= path_cost(hrx, hry) \
+        <= 1.3 * path_cost(rx, ry)
+    for x0, y0, x1, y1 in zip(hrx, hry, hrx[1:], hry[1:]):
+        assert max(abs(x1 - x0), abs(y1 - y0)) == 2.0
+        assert not hpa_star.obstacle_map[planner.calc_xy_index(x1, planner.min_x),
+                                         planner.calc_xy_index(y1, planner.min_y)]
+
+
+def make_grid_planner(obstacle_map):
+    # obstacle points on the occupied cells of a 1 m grid, and one past the
+    # upper corner to set the grid size
+    ox, oy = np.nonzero(obstacle_map)
+    x_width, y_width = obstacle_map.shape
+    return a_star.AStarPlanner(ox.tolist() + [x_width],
+                               oy.tolist() + [y_width], 1.0, 0.5)
+
+
+def test_diagonal_transitions(capsys):
+    # the only way between the clusters is a diagonal move across a border
+    obstacle_map = np.ones((12, 4), dtype=bool)
+    obstacle_map[0:4, 0] = False
+    obstacle_map[4:12, 1] = False
+    planner = make_grid_planner(obstacle_map)
+    assert (planner.obstacle_map == obstacle_map).all()
+    hpa_star = m.HierarchicalAStarPlanner(planner, cluster_size=4)
+    hpa_star.verbose = False
+
+    capsys.readouterr()
+    rx, ry = hpa_star.planning(0.0, 0.0, 11.0, 1.0)
+    assert capsys.readouterr().out == ""
+    assert (rx, ry) == planner.planning(0.0, 0.0, 11.0, 1.0)
+    assert all(type(v) is float for v in rx + ry)
+
+    # the same through a cluster corner
+    obstacle_map = np.ones((8, 8), dtype=bool)
+    obstacle_map[np.arange(8), np.arange(8)] = False
+    planner = make_grid_planner(obstacle_map)
+    hpa_star = m.HierarchicalAStarPlanner(planner, cluster_size=4)
+    rx, ry = hpa_star.planning(0.0, 0.0, 7.0, 7.0)
+    assert (rx, ry) == planner.planning(0.0, 0.0, 7.0, 7.0)
+
+
+def test_random_maps():
+    rng = np.random.default_rng(0)
+    for _ in range(20):
+        obstacle_map = rng.random((24, 24)) < 0.35
+        obstacle_map[[0, 23], [0, 23]] = False
+        planner = make_grid_planner(obstacle_map)
+        planner.verbose = False
+        rx, ry = planner.planning(0.0, 0.0, 23.0, 23.0)
+        for cluster_size in (3, 4, 5):
+            hpa_star = m.HierarchicalAStarPlanner(planner, cluster_size)
+            hpa_star.verbose = False
+            hrx, hry = hpa_star.planning(0.0, 0.0, 23.0, 23.0)
+            # a path is found exactly when A* finds one
+            assert bool(hrx) == (len(rx) > 1)
+            if hrx:
+                assert path_cost(rx, ry) - 1e-9 <= path_cost(hrx, hry) \
+                    <= 1.3 * path_cost(rx, ry)
+
+
+def test_update_cells():
+    planner = make_planner()
+    hpa_star = m.HierarchicalAStarPlanner(planner, cluster_size=5)
+
+    # close the gap above the first wall
+    ix = planner.calc_xy_index(20.0, planner.min_x)
+    iy = np.arange(planner.calc_xy_index(40.0, planner.min_y),
+                   hpa_star.y_width)
+    rebuilt = hpa_star.update_cells(np.full(len(iy), ix), iy)
+    assert len(rebuilt) < hpa_star.n_clusters_x * hpa_star.n_clusters_y
+    assert hpa_star.planning(10.0, 10.0, 50.0, 50.0) == ([], [])
+
+    # the incremental update matches a full rebuild
+    planner.obstacle_map = hpa_star.obstacle_map.copy()
+    rebuilt_hpa_star = m.HierarchicalAStarPlanner(planner, cluster_size=5)
+    assert rebuilt_hpa_star.transitions == hpa_star.transitions
+    assert rebuilt_hpa_star.intra_edges == hpa_star.intra_edges
+
+    hpa_star.update_cells(np.full(len(iy), ix), iy, occupied=False)
+    rx, _ = hpa_star.planning(10.0, 10.0, 50.0, 50.0)
+    assert len(rx) > 0
+
+
+def test_update_cells_corners():
+    # blocking the cell of cluster (2, 1) next to the corner between
+    # clusters (1, 1) and (2, 2) makes a diagonal transition there necessary
+    obstacle_map = np.ones((12, 12), dtype=bool)
+    obstacle_map[np.arange(12), np.arange(12)] = False
+    obstacle_map[8, 7] = False
+    planner = make_grid_planner(obstacle_map)
+    planner.verbose = False
+    hpa_star = m.HierarchicalAStarPlanner(planner, cluster_size=4)
+    hpa_star.verbose = False
+    assert len(hpa_star.planning(0.0, 0.0, 11.0, 11.0)[0]) == 13
+
+    hpa_star.update_cells([8], [7], occupied=True)
+    planner.obstacle_map = hpa_star.obstacle_map.copy()
+    rx, ry = hpa_star.planning(0.0, 0.0, 11.0, 11.0)
+    assert (rx, ry) == planner.planning(0.0, 0.0, 11.0, 11.0)
+    assert len(rx) == 12
+
+    # random edits give the same abstract graph and paths as a full rebuild
+    rng = np.random.default_rng(0)
+    obstacle_map = rng.random((24, 24)) < 0.3
+    planner = make_grid_planner(obstacle_map)
+    planner.verbose = False
+    hpa_star = m.HierarchicalAStarPlanner(planner, cluster_size=4)
+    hpa_star.verbose = False
+    for _ in range(20):
+        ix, iy = rng.integers(0, 24, size=(2, 3))
+        hpa_star.update_cells(ix, iy, occupied=bool(rng.random() < 0.5))
+        hpa_star.update_cells([0, 23], [0, 23], occupied=False)
+        planner.obstacle_map = hpa_star.obstacle_map.copy()
+        rebuilt_hpa_star = m.HierarchicalAStarPlanner(planner, cluster_size=4)
+        rebuilt_hpa_star.verbose = False
+        assert rebuilt_hpa_star.transitions == hpa_star.transitions
+        assert rebuilt_hpa_star.intra_edges == hpa_star.intra_edges
+        assert hpa_star.planning(0.0, 0.0, 23.0, 23.0) == \
+            rebuilt_hpa_star.planning(0.0, 0.0, 23.0, 23.0)
+
+
+if __name__ == '__main__':
+    conftest.run_this_test(__file__)
@@ -0,0 +1,153 @@
+from PathPlanning.TimeBasedPathPlanning.GridWithDynamicObstacles import (
+    Grid,
+    Position,
+)
+from PathPlanning.TimeBasedPathPlanning.ReservationTable import ReservationTable
+from PathPlanning.TimeBasedPathPlanning.SafeInterval import SafeIntervalPathPlanner
+from PathPlanning.TimeBasedPathPlanning import MultiAgentPlanner as m
+import numpy as np
+import pytest
+import conftest
+
+
+def corridor_grid(time_limit: int = 30) -> Grid:
+    # 7 cells long corridor at y = 1 with a passing bay at (3, 2)
+    grid = Grid(np.array([7, 3]), num_obstacles=0, time_limit=time_limit)
+    for x in range(7):
+        grid.add_obstacle_path([Position(x, 0)] * time_limit)
+        if x != 3:
+            grid.add_obstacle_path([Position(x, 2)] * time_limit)
+    return grid
+
+
+def test_reservation_table():
+    table = ReservationTable()
+    table.reserve_path(0, [Position(0, 0), Position(1, 0), Position(2, 0)])
+
+    assert table.vertex_owner(Position(1, 0), 1) == 0
+    assert table.vertex_owner(Position(1, 0), 2) is None
+    # the agent stays at its goal
+    assert table.vertex_owner(Position(2, 0), 50) == 0
+    assert table.latest_time_at(Position(1, 0)) == 1
+    assert table.latest_time_at(Position(5, 5)) == -1
+    assert sorted(set(table.reserved_times(2, 0, 5))) == [2, 3, 4]
+
+    # vertex conflict
+    assert not table.is_move_free(Position(1, 1), Position(1, 0), 1)
+    conflict = table.find_conflict(1, [Position(1, 1), Position(1, 0)])
+    assert conflict.agents == (1, 0) and conflict.time == 1 and not conflict.is_edge_conflict()
+    # edge conflict: swapping cells with agent 0 between time steps 0 and 1
+    assert not table.is_move_free(Position(1, 0), Position(0, 0), 1)
+    conflict = table.find_conflict(1, [Position(1, 0), Position(0, 0)])
+    assert conflict.is_edge_conflict()
+    assert (conflict.time, conflict.position, conflict.previous_position) == (1, Position(0, 0), Position(1, 0))
+    # following agent 0 is free, entering its goal after it arrived is not
+    assert table.find_conflict(1, [Position(0, 1), Position(0, 0), Position(1, 0)]) is None
+    conflict = table.find_conflict(1, [Position(3, 1), Position(3, 0), Position(2, 0)])
+    assert (conflict.time, conflict.position) == (2, Position(2, 0))
+    # staying at a goal that agent 0 passes later
+    conflict = table.find_conflict(1, [Position(1, 0)])
+    assert (conflict.agents, conflict.time, conflict.position) == ((1, 0), 1, Position(1, 0))
+    assert table.find_conflict(1, [Position(0, 1), Position(1, 1), Position(1, 0)]) is None
+
+
+@pytest.mark.parametrize("low_level", ["space_time_astar", "safe_interval"])
+def test_prioritized_planner(low_level):
+    grid = m.make_warehouse_grid(21, 100)
+    starts, goals = m.make_agents(grid, 15, seed=1)
+    paths = m.PrioritizedPlanner(grid, starts, goals, m.LOW_LEVEL_PLANNERS[low_level]).plan()
+
+    assert not m.find_conflicts(paths)
+    for start, goal, positions in zip(starts, goals, paths):
+        assert positions[0] == start and positions[-1] == goal
+        for t in range(1, len(positions)):
+            assert grid.valid_position(positions[t], t)
+            assert abs(positions[t].x - positions[t - 1].x) + abs(positions[t].y - positions[t - 1].y) <= 1
+
+
+@pytest.mark.parametrize("low_level", [m.SpaceTimeAStar, SafeIntervalPathPlanner])
+def test_conflict_based_search_passing_bay(low_level):
+    grid = corridor_grid()
+    starts = [Position(0, 1), Position(6, 1)]
+    goals = [Position(6, 1), Position(0, 1)]
+
+    # the second agent can not reach the bay before it meets the first one
+    with pytest.raises(Exception, match="No path found for agent 1"):
+        m.PrioritizedPlanner(grid, starts, goals, low_level).plan()
+
+    planner = m.ConflictBasedSearch(grid, starts, goals, low_level)
+    paths = planner.plan()
+    assert not m.find_conflicts(paths)
+    assert [positions[-1] for positions in paths] == goals
+    assert Position(3, 2) in paths[0] + paths[1]
+    # one agent steps into the bay and back while the other one passes
+    assert m.sum_of_costs(paths) == 8 + 7
+    assert planner.expanded_node_count > 1
+
+
+@pytest.mark.parametrize("low_level", [m.SpaceTimeAStar, SafeIntervalPathPlanner])
+def test_higher_priority_agent_crosses_start(low_level):
+    # agent 0 passes the start of agent 1 at time step 1, so agent 1 has to step aside first
+    grid = Grid(np.array([5, 5]), num_obstacles=0, time_limit=20)
+    table = ReservationTable()
+    table.reserve_path(0, [Position(0, 2), Position(1, 2), Position(2, 2), Position(3, 2)])
+    positions, _ = m.plan_agent(grid, low_level, Position(1, 2), Position(1, 2), table)
+    assert positions is not None and len(positions) == 3
+    assert table.find_conflict(1, positions) is None
+
+    starts, goals = [Position(0, 2), Position(1, 2)], [Position(3, 2), Position(1, 2)]
+    paths = m.PrioritizedPlanner(grid, starts, goals, low_level).plan()
+    assert not m.find_conflicts(paths)
+    paths = m.ConflictBasedSearch(grid, starts, goals, low_level).plan()
+    assert not m.find_conflicts(paths)
+    assert m.sum_of_costs(paths) == 3 + 2
+
+
+def test_safe_interval_start_is_reserved():
+    grid = Grid(np.array([5, 5]), num_obstacles=0, time_limit=20)
+    table = ReservationTable()
+    table.reserve_path(0, [Position(4, 4)])
+    assert m.plan_agent(grid, SafeIntervalPathPlanner, Position(4, 4), Position(0, 0), table)[0] is None
+
+
+def test_conflict_based_search_is_optimal():
+    grid = m.make_warehouse_grid(21, 100)
+    starts, goals = m.make_agents(grid, 10, seed=4)
+    paths = m.ConflictBasedSearch(grid, starts, goals).plan()
+    prioritized_paths = m.PrioritizedPlanner(grid, starts, goals).plan()
+
+    assert not m.find_conflicts(paths)
+    assert m.sum_of_costs(paths) < m.sum_of_costs(prioritized_paths)
+    # no agent is faster than on its own
+    for start, goal, positions in zip(starts, goals, paths):
+        assert len(positions) >= len(m.plan_agent(grid, m.SpaceTimeAStar, start, goal)[0])
+
+
+def test_parallel_replans_match_serial():
+    grid = m.make_warehouse_grid(21, 100)
+    starts, goals = m.make_agents(grid, 10, seed=4)
+    serial = m.ConflictBasedSearch(grid, starts, goals)
+    parallel = m.ConflictBasedSearch(grid, starts, goals, workers=2)
+
+    assert parallel.plan() == serial.plan()
+    assert parallel.expanded_node_count == serial.expanded_node_count
+    assert parallel.low_level_count == serial.low_level_count
+
+
+def test_benchmark():
+    m.show_animation = False
+    results = m.benchmark([2, 4], side_length=16, time_limit=60, cross_aisle_spacing=15, max_nodes=100)
+    assert [(r["Planner"], r["Heuristic"], r["Agents"]) for r in results] == [
+        (planner, heuristic, agents)
+        for agents in [2, 4] for planner in m.PLANNERS for heuristic in m.HEURISTICS]
+    for r in results:
+        assert r["Solved"]
+        assert r["Time (s)"] > 0.0
+        assert r["Expanded Nodes"] > 0
+    for manhattan, distance_field in zip(results[::2], results[1::2]):
+        assert manhattan["Sum of Costs"] == distance_field["Sum of Costs"]
+        assert distance_field["Expanded Node Reduction"] > 0.0
+
+
+if __name__ == '__main__':
+    conftest.run_this_test(__file__)
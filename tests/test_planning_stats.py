@@ -0,0 +1,147 @@
+import conftest
+import random
+
+import numpy as np
+from PathPlanning.AStar import a_star
+from PathPlanning.Dijkstra import dijkstra
+from PathPlanning.DStarLite import d_star_lite
+from PathPlanning.HybridAStar import hybrid_a_star
+from PathPlanning.RRT import rrt
+from PathPlanning.RRTStar import rrt_star
+from utils.planning_stats import PlanningStats
+
+
+def grid_obstacles():
+    ox, oy = [], []
+    for i in range(-10, 61):
+        ox.extend([float(i), float(i), -10.0, 60.0])
+        oy.extend([-10.0, 60.0, float(i), float(i)])
+    for i in range(-10, 40):
+        ox.append(20.0)
+        oy.append(float(i))
+    return ox, oy
+
+
+def check_counts(stats):
+    assert stats.nodes_expanded > 0
+    assert stats.nodes_generated >= stats.peak_open_set_size > 0
+    assert stats.collision_checks > 0
+    assert stats.planning_time > 0.0
+
+
+def test_grid_planner_stats(capsys):
+    dijkstra.show_animation = False
+    ox, oy = grid_obstacles()
+    for planner_class in [a_star.AStarPlanner, dijkstra.Dijkstra]:
+        planner = planner_class(ox, oy, 2.0, 1.0)
+        planner.verbose = False
+        expanded = []
+        planner.expansion_callback = lambda x, y, cost: expanded.append(
+            (x, y, cost))
+        capsys.readouterr()
+        rx, ry = planner.planning(10.0, 10.0, 50.0, 50.0)
+        assert capsys.readouterr().out == ""
+        assert (rx[0], ry[0]) == (50.0, 50.0)
+
+        stats = planner.stats
+        check_counts(stats)
+        assert len(expanded) == stats.nodes_expanded
+        assert expanded[0] == (10.0, 10.0, 0.0)
+        assert expanded[-1][:2] == (50.0, 50.0)
+        # every expansion checks the 8 moves
+        assert stats.collision_checks == 8 * (stats.nodes_expanded - 1)
+        assert stats.queue_time == 0.0 and stats.peak_memory == 0
+
+        planner.profile = True
+        assert planner.planning(10.0, 10.0, 50.0, 50.0) == (rx, ry)
+        assert planner.stats.nodes_expanded == stats.nodes_expanded
+        assert planner.stats.queue_time > 0.0
+        assert planner.stats.collision_check_time > 0.0
+        assert planner.stats.peak_memory > 0
+    assert planner.stats.heuristic_time == 0.0  # no heuristic in Dijkstra
+
+
+def test_a_star_expands_less_than_dijkstra():
+    dijkstra.show_animation = False
+    ox, oy = grid_obstacles()
+    planners = [a_star.AStarPlanner(ox, oy, 2.0, 1.0),
+                dijkstra.Dijkstra(ox, oy, 2.0, 1.0)]
+    for planner in planners:
+        planner.verbose = False
+        planner.planning(10.0, 10.0, 50.0, 50.0)
+    assert planners[0].stats.nodes_expanded < \
+        planners[1].stats.nodes_expanded
+
+
+def test_rrt_stats(capsys):
+    obstacle_list = [(5, 5, 1), (3, 6, 2), (3, 8, 2), (7, 5, 2)]
+    for planner_class in [rrt.RRT, rrt_star.RRTStar]:
+        random.seed(3)
+        planner = planner_class(start=[0, 0], goal=[6, 10],
+                                rand_area=[-2, 15],
+                                obstacle_list=obstacle_list,
+                                expand_dis=1.0, max_iter=200)
+        planner.verbose = False
+        planner.profile = True
+        added = []
+        planner.expansion_callback = lambda x, y, cost: added.append(cost)
+        capsys.readouterr()
+        path = planner.planning(animation=False)
+        assert capsys.readouterr().out == ""
+        assert path is not None
+
+        stats = planner.stats
+        check_counts(stats)
+        assert stats.nodes_generated == len(added) + 1 == \
+            len(planner.node_list)
+        assert stats.peak_open_set_size == len(planner.node_list)
+        assert stats.collision_check_time > 0.0
+    assert all(cost > 0.0 for cost in added)
+
+
+def test_hybrid_a_star_stats(capsys):
+    hybrid_a_star.show_animation = False
+    ox, oy = [], []
+    for i in range(41):
+        ox.extend([float(i), float(i), 0.0, 40.0])
+        oy.extend([0.0, 40.0, float(i), float(i)])
+    stats = PlanningStats()
+    expanded = []
+    path = hybrid_a_star.hybrid_a_star_planning(
+        [10.0, 10.0, np.deg2rad(90.0)], [30.0, 30.0, np.deg2rad(0.0)],
+        ox, oy, hybrid_a_star.XY_GRID_RESOLUTION,
+        hybrid_a_star.YAW_GRID_RESOLUTION, stats=stats,
+        expansion_callback=lambda x, y, cost: expanded.append(cost),
+        verbose=False, profile=True)
+    assert capsys.readouterr().out == ""
+    assert path.x_list
+
+    check_counts(stats)
+    assert len(expanded) == stats.nodes_expanded
+    assert stats.heuristic_time > 0.0 and stats.queue_time > 0.0
+    assert stats.peak_memory > 0
+
+
+def test_d_star_lite_stats(capsys):
+    d_star_lite.show_animation = False
+    ox, oy = [], []
+    for i in range(-5, 21):
+        ox.extend([float(i), float(i), -5.0, 20.0])
+        oy.extend([-5.0, 20.0, float(i), float(i)])
+    planner = d_star_lite.DStarLite(ox, oy)
+    planner.verbose = False
+    expanded = []
+    planner.expansion_callback = lambda x, y, cost: expanded.append((x, y))
+    capsys.readouterr()
+    found, _, _ = planner.main(d_star_lite.Node(0, 0),
+                               d_star_lite.Node(10, 10), [], [])
+    assert found
+    assert capsys.readouterr().out == ""
+
+    check_counts(planner.stats)
+    assert len(expanded) == planner.stats.nodes_expanded
+    assert expanded[0] == (10, 10)
+
+
+if __name__ == '__main__':
+    conftest.run_this_test(__file__)
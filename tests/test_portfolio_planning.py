@@ -0,0 +1,100 @@
+import math
+import pickle
+import random
+import time
+
+import numpy as np
+import conftest
+from PathPlanning.RRTStar import rrt_star
+from PathPlanning.InformedRRTStar import informed_rrt_star
+from utils import portfolio_planning
+
+OBSTACLES = [(5, 5, 1), (3, 6, 2), (3, 8, 2), (3, 10, 2), (7, 5, 2),
+             (9, 5, 2), (8, 10, 1), (6, 12, 1)]
+
+
+def make_planner(max_iter=300):
+    return rrt_star.RRTStar(start=[0, 0], goal=[10, 10], rand_area=[-2, 15],
+                            obstacle_list=OBSTACLES, expand_dis=1,
+                            robot_radius=0.8, max_iter=max_iter)
+
+
+def test_portfolio_matches_single_run():
+    rrt_star.show_animation = False
+    result = make_planner().plan_portfolio(seeds=[3, 4, 5], workers=2)
+
+    assert result.success
+    assert len(result.runs) == 3
+    random.seed(result.seed)
+    np.random.seed(result.seed)
+    path = make_planner().planning(animation=False)
+    assert result.path == [[float(x), float(y)] for x, y in path]
+    assert math.isclose(result.cost, portfolio_planning.path_length(path))
+
+
+def test_portfolio_returns_best_path():
+    result = make_planner().plan_portfolio(seeds=4, workers=2,
+                                           return_first=False)
+
+    assert [run.seed for run in result.runs] == [0, 1, 2, 3]
+    assert all(run.success for run in result.runs)
+    assert result.cost == min(run.cost for run in result.runs)
+
+
+def test_portfolio_deadline_cancels_runs():
+    planner = make_planner(max_iter=10 ** 7)
+    # the goal is never reached, so every run would go on for a long time
+    planner.obstacle_list = OBSTACLES + [(10, 10, 3)]
+
+    start_time = time.perf_counter()
+    result = planner.plan_portfolio(seeds=2, workers=2, deadline=1.0)
+
+    assert time.perf_counter() - start_time < 10.0
+    assert not result.success
+    assert [run.error for run in result.runs] == ["cancelled", "cancelled"]
+
+
+def test_informed_rrt_star_portfolio():
+    planner = informed_rrt_star.InformedRRTStar(
+        start=[0, 0], goal=[5, 10], rand_area=[-2, 15],
+        obstacle_list=[(5, 5, 0.5), (9, 6, 1), (7, 5, 1), (1, 5, 1),
+                       (3, 6, 1), (7, 9, 1)], max_iter=100)
+    result = planner.plan_portfolio(seeds=2, workers=2, return_first=False)
+
+    assert result.success
+    assert result.path[-1] == [0.0, 0.0]
+
+
+def test_worker_state():
+    planner = make_planner()
+    planner.expansion_callback = lambda x, y, cost: None
+    planner.verbose = False
+    assert planner.planning(animation=False) is not None
+    assert planner.node_index is not None and planner.stats is not None
+
+    state = planner.__getstate__()
+    assert {"node_index", "collision_checker", "children",
+            "children_node_list", "stats",
+            "expansion_callback"}.isdisjoint(state)
+    assert state["obstacle_list"] == OBSTACLES
+    # the state reaches spawned workers, which pickle it
+    copy = pickle.loads(pickle.dumps(state))
+    assert copy["max_iter"] == planner.max_iter
+
+    result = portfolio_planning.plan_portfolio(planner, 2, workers=2)
+    assert result.success
+
+
+def test_tail_latency_report():
+    rows = portfolio_planning.tail_latency_report(
+        make_planner(max_iter=200), trials=2, portfolio_size=2, workers=2)
+
+    assert [row["Runs"] for row in rows] == [
+        "single run", "portfolio of 2", "ideal portfolio of 2"]
+    single, _, ideal = rows
+    assert ideal["Success Rate"] >= single["Success Rate"]
+    assert ideal["p90 (s)"] <= single["p90 (s)"]
+
+
+if __name__ == '__main__':
+    conftest.run_this_test(__file__)
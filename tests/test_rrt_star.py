@@ -1,4 +1,10 @@
 import conftest  # Add root path to sys.path
+import math
+import random
+import time
+
+import pytest
+
 from PathPlanning.RRTStar import rrt_star as m
 
 
@@ -32,5 +38,87 @@ def test_no_obstacle_and_robot_radius():
     assert path is not None
 
 
+def plan_rewired_tree(use_tree_storage):
+    random.seed(1)
+    obstacle_list = [(5, 5, 1), (3, 6, 2), (3, 8, 2), (7, 5, 2)]
+    rrt_star = m.RRTStar(start=[0, 0],
+                         goal=[6, 10],
+                         rand_area=[-2, 15],
+                         obstacle_list=obstacle_list,
+                         expand_dis=3.0,
+                         max_iter=500,
+                         connect_circle_dist=20.0,
+                         search_until_max_iter=True)
+    rrt_star.verbose = False
+    rrt_star.use_tree_storage = use_tree_storage
+    return rrt_star, rrt_star.planning(animation=False)
+
+
+@pytest.mark.parametrize("use_tree_storage", [False, True])
+def test_rewired_tree(use_tree_storage):
+    rrt_star, path = plan_rewired_tree(use_tree_storage)
+    assert path is not None
+
+    # the children index matches the parents and the propagated costs match
+    # the edge lengths
+    if use_tree_storage:
+        tree = rrt_star.node_list
+        children = {node: [tree[i] for i in tree.children(node.index)]
+                    for node in tree}
+    else:
+        children = rrt_star.get_children()
+    for node in rrt_star.node_list[1:]:
+        assert any(child == node for child in children[node.parent])
+        assert math.isclose(node.cost, rrt_star.calc_new_cost(node.parent, node))
+    assert sum(map(len, children.values())) == len(rrt_star.node_list) - 1
+
+    new_node = m.RRTStar.Node(4.0, 2.0)
+    near_inds = rrt_star.find_near_nodes(new_node)
+    r = min(rrt_star.expand_dis, 20.0 * math.sqrt(
+        math.log(len(rrt_star.node_list) + 1) / (len(rrt_star.node_list) + 1)))
+    assert near_inds == [i for i, node in enumerate(rrt_star.node_list)
+                         if math.hypot(node.x - 4.0, node.y - 2.0) <= r]
+
+
+def test_tree_storage_matches_node_list():
+    node_list_planner, node_list_path = plan_rewired_tree(False)
+    storage_planner, storage_path = plan_rewired_tree(True)
+    assert storage_path == node_list_path
+    assert [(node.x, node.y, node.cost) for node in storage_planner.node_list] \
+        == [(node.x, node.y, node.cost)
+            for node in node_list_planner.node_list]
+
+
+@pytest.mark.parametrize("use_tree_storage", [False, True])
+def test_anytime_planning(use_tree_storage):
+    random.seed(2)
+    obstacle_list = [(5, 5, 1), (3, 6, 2), (3, 8, 2), (7, 5, 2)]
+    rrt_star = m.RRTStar(start=[0, 0],
+                         goal=[6, 10],
+                         rand_area=[-2, 15],
+                         obstacle_list=obstacle_list,
+                         expand_dis=3.0,
+                         connect_circle_dist=20.0)
+    rrt_star.use_tree_storage = use_tree_storage
+
+    start = time.perf_counter()
+    solutions = list(rrt_star.anytime_planning(0.5))
+    assert time.perf_counter() - start < 1.5
+    assert solutions
+    costs = [cost for cost, _ in solutions]
+    assert costs == sorted(set(costs), reverse=True)
+    for cost, path in solutions:
+        assert path[0] == [6, 10] and path[-1] == [0, 0]
+        assert cost >= math.dist(path[0], path[-1])
+
+    # the search resumes from the grown tree with its best path
+    n_nodes = len(rrt_star.node_list)
+    resumed = rrt_star.anytime_planning(0.5, rrt_star.node_list)
+    assert next(resumed)[0] == costs[-1]
+    assert all(cost < costs[-1] for cost, _ in resumed)
+    assert len(rrt_star.node_list) > n_nodes
+    assert rrt_star.stats.nodes_expanded > 0
+
+
 if __name__ == '__main__':
     conftest.run_this_test(__file__)
@@ -1,4 +1,5 @@
 import conftest  # Add root path to sys.path
+import pytest
 from PathPlanning.RRTStarDubins import rrt_star_dubins as m
 
 
@@ -7,5 +8,12 @@ def test1():
     m.main()
 
 
+def test_anytime_planning_is_not_supported():
+    rrt_star_dubins = m.RRTStarDubins([0.0, 0.0, 0.0], [10.0, 10.0, 0.0],
+                                      [(5, 5, 1)], [-2.0, 15.0])
+    with pytest.raises(TypeError):
+        rrt_star_dubins.anytime_planning(0.5)
+
+
 if __name__ == '__main__':
     conftest.run_this_test(__file__)
@@ -1,5 +1,8 @@
 import conftest  # Add root path to sys.path
-from PathPlanning.RRT import rrt_with_sobol_sampler as m
+from PathPlanning.RRT import rrt, rrt_with_sobol_sampler as m
+from PathPlanning.RRT.sobol import sobol
+import numpy as np
+import pytest
 import random
 
 random.seed(12345)
@@ -10,5 +13,89 @@ def test1():
     m.main(gx=1.0, gy=1.0)
 
 
+@pytest.mark.parametrize("dim_num", [1, 2, 7, 40])
+def test_sobol_block_matches_i4_sobol(dim_num):
+    points = []
+    seed = 0
+    for _ in range(200):
+        point, seed = sobol.i4_sobol(dim_num, seed)
+        points.append(point)
+
+    block, next_seed = sobol.i4_sobol_block(dim_num, 0, 200)
+    assert next_seed == 200
+    assert np.array_equal(block, points)
+    # blocks can start anywhere in the sequence
+    block, _ = sobol.i4_sobol_block(dim_num, 77, 123)
+    assert np.array_equal(block, points[77:])
+    # the direction numbers are built once per dimension
+    assert sobol.sobol_direction_numbers(dim_num) is \
+        sobol.sobol_direction_numbers(dim_num)
+
+    with pytest.raises(ValueError):
+        sobol.i4_sobol_block(dim_num, 2**30 - 10, 20)
+
+
+def test_sobol_sampler():
+    sampler = sobol.SobolSampler(2, [-2.0, 0.0], [15.0, 1.0], block_size=16)
+    points = [sampler.sample() for _ in range(5)]
+    points.extend(sampler.sample_block(20))
+    points.append(sampler.sample())
+
+    quasi, _ = sobol.i4_sobol_block(2, 0, 26)
+    expected = [-2.0, 0.0] + quasi * [17.0, 1.0]
+    assert np.array_equal(np.array(points), expected)
+    # two blocks of 16 and the 9 points missing from the first block
+    assert sampler.seed == 41
+
+
+def test_rrt_with_sampler():
+    obstacle_list = [(5, 5, 1), (3, 6, 2), (3, 8, 2), (7, 5, 2)]
+    rrt_planner = rrt.RRT(start=[0, 0], goal=[6, 10], rand_area=[-2, 15],
+                          obstacle_list=obstacle_list)
+    rrt_planner.verbose = False
+    rrt_planner.sampler = sobol.SobolSampler(2, -2, 15)
+    path = rrt_planner.planning(animation=False)
+
+    assert path is not None
+    assert rrt_planner.sampler.seed > 0
+
+
+def test_collision_checker_is_reused():
+    obstacle_list = [(5, 5, 1), (3, 6, 2), (3, 8, 2), (7, 5, 2)]
+    planner = m.RRTSobol(start=[0, 0], goal=[6, 10], rand_area=[-2, 15],
+                         obstacle_list=obstacle_list, robot_radius=0.8)
+    assert planner.planning(animation=False) is not None
+    checker = planner.collision_checker
+    assert checker is planner.get_collision_checker()
+    planner.obstacle_list = [(5, 5, 1)]
+    assert planner.get_collision_checker() is not checker
+
+    node = m.RRTSobol.Node(5.0, 5.0)
+    node.path_x, node.path_y = [0.0, 5.0], [0.0, 5.0]
+    assert not m.RRTSobol.check_collision(node, obstacle_list, 0.0)
+    checker = m.RRTSobol.static_collision_checker
+    assert not m.RRTSobol.check_collision(node, obstacle_list, 0.0)
+    assert m.RRTSobol.static_collision_checker is checker
+    assert m.RRTSobol.check_collision(node, [], 0.0)
+
+
+@pytest.mark.parametrize("planner_type", [rrt.RRT, m.RRTSobol])
+def test_collision_checker_sees_obstacle_list_edits(planner_type):
+    obstacle_list = [(3, 8, 1)]
+    node = planner_type.Node(10.0, 10.0)
+    node.path_x, node.path_y = [0.0, 5.0, 10.0], [0.0, 5.0, 10.0]
+    assert planner_type.check_collision(node, obstacle_list, 0.0)
+    obstacle_list.append((5, 5, 1))
+    assert not planner_type.check_collision(node, obstacle_list, 0.0)
+
+    planner = planner_type(start=[0, 0], goal=[10, 10], rand_area=[-2, 15],
+                           obstacle_list=obstacle_list)
+    assert not planner.check_node_collision(node)
+    obstacle_list.clear()
+    assert planner.check_node_collision(node)
+    obstacle_list.append((5, 5, 1))
+    assert not planner.check_node_collision(node)
+
+
 if __name__ == '__main__':
     conftest.run_this_test(__file__)
@@ -1,5 +1,6 @@
 from PathPlanning.TimeBasedPathPlanning.GridWithDynamicObstacles import (
     Grid,
+    Interval,
     ObstacleArrangement,
     Position,
 )
@@ -29,5 +30,64 @@ def test_1():
     assert path.path[-1].position == goal
 
 
+def test_safe_intervals_are_computed_lazily():
+    grid = Grid(
+        np.array([21, 21]),
+        obstacle_arrangement=ObstacleArrangement.ARRANGEMENT1,
+        time_limit=1000,
+    )
+    assert not grid.safe_interval_cache
+
+    m.show_animation = False
+    planner = m.SafeIntervalPathPlanner(grid, Position(1, 11), Position(19, 19))
+    planner.plan(False)
+    assert 0 < len(grid.safe_interval_cache) < 21 * 21
+
+    intervals = grid.get_safe_interval_array(10, 5)
+    assert intervals.shape[1] == 2
+    assert (intervals[:, 0] < intervals[:, 1]).all()
+    assert grid.get_safe_intervals_at_cell(Position(10, 5)) == [
+        Interval(start, end) for start, end in intervals.tolist()
+    ]
+    # the obstacle paths end before the time limit
+    assert grid.get_safe_interval_array(0, 20)[-1, 1] == 999
+
+
+def test_obstacle_path_changes_update_safe_intervals():
+    grid = Grid(np.array([5, 5]), num_obstacles=0, time_limit=10)
+    assert grid.get_safe_interval_array(2, 2).tolist() == [[0, 9]]
+
+    path = [Position(2, 2)] * 3 + [Position(2, 3)] * 4 + [Position(2, 2)] * 3
+    index = grid.add_obstacle_path(path)
+    # the obstacle also reserves its old position when it moves
+    assert grid.get_safe_interval_array(2, 2).tolist() == [[4, 6]]
+    assert grid.get_safe_interval_array(2, 3).tolist() == [[0, 2], [8, 9]]
+    assert grid.get_safe_interval_array(0, 0).tolist() == [[0, 9]]
+
+    other_index = grid.add_obstacle_path([Position(2, 3)] * 2)
+    assert grid.get_safe_interval_array(2, 3).tolist() == [[8, 9]]
+
+    assert grid.remove_obstacle_path(index) is path
+    assert grid.get_safe_interval_array(2, 2).tolist() == [[0, 9]]
+    assert grid.get_safe_interval_array(2, 3).tolist() == [[2, 9]]
+    grid.remove_obstacle_path(other_index - 1)
+    assert grid.occupancy == Grid(np.array([5, 5]), num_obstacles=0, time_limit=10).occupancy
+    assert grid.get_safe_interval_array(2, 3).tolist() == [[0, 9]]
+
+
+def test_distance_field_heuristic():
+    time_limit = 100
+    grid = Grid(np.array([21, 21]), num_obstacles=0, time_limit=time_limit)
+    for y in range(20):
+        grid.add_obstacle_path([Position(10, y)] * time_limit)
+    start = Position(1, 1)
+    goal = Position(19, 1)
+    manhattan = m.SafeIntervalPathPlanner(grid, start, goal)
+    distance_field = m.SafeIntervalPathPlanner(grid, start, goal, use_distance_field=True)
+
+    assert distance_field.plan(False).goal_reached_time() == manhattan.plan(False).goal_reached_time() == 56
+    assert distance_field.expanded_node_count * 3 < manhattan.expanded_node_count
+
+
 if __name__ == "__main__":
     conftest.run_this_test(__file__)
@@ -1,10 +1,12 @@
 from PathPlanning.TimeBasedPathPlanning.GridWithDynamicObstacles import (
     Grid,
+    MOVES,
     ObstacleArrangement,
     Position,
 )
 from PathPlanning.TimeBasedPathPlanning import SpaceTimeAStar as m
 import numpy as np
+import pytest
 import conftest
 
 
@@ -30,5 +32,107 @@ def test_1():
 
     assert planner.expanded_node_count < 1000
 
+
+def test_occupancy_index():
+    np.random.seed(7)
+    grid = Grid(np.array([12, 9]), num_obstacles=20, time_limit=30)
+    windowed = Grid(np.array([12, 9]), num_obstacles=0, time_limit=30, occupancy_window=4)
+    for path in grid.obstacle_paths:
+        windowed.add_obstacle_path(path)
+    assert len(windowed.occupancy) == 4
+
+    for t in range(grid.time_limit):
+        # an obstacle reserves its old and new position at every time step
+        reserved = {(path[t].x, path[t].y) for path in grid.obstacle_paths if t < len(path)}
+        reserved |= {(path[t - 1].x, path[t - 1].y) for path in grid.obstacle_paths if 0 < t < len(path)}
+        for x in range(-1, 13):
+            for y in range(-1, 10):
+                position = Position(x, y)
+                inside = 0 <= x < 12 and 0 <= y < 9
+                expected = inside and (x, y) not in reserved
+                assert grid.valid_position(position, t) == expected
+                assert windowed.valid_position(position, t) == expected
+                if inside:
+                    assert grid.valid_moves(position, t) == tuple(
+                        grid.valid_position(position + move, t) for move in MOVES
+                    )
+
+
+def test_occupancy_window_plan():
+    start = Position(1, 11)
+    goal = Position(19, 19)
+    paths = []
+    for occupancy_window in [None, 8]:
+        grid = Grid(
+            np.array([21, 21]),
+            obstacle_arrangement=ObstacleArrangement.ARRANGEMENT1,
+            occupancy_window=occupancy_window,
+        )
+        paths.append(m.SpaceTimeAStar(grid, start, goal).plan(False).path)
+    assert paths[0] == paths[1]
+
+    # removing the obstacles frees the cells
+    grid.remove_obstacle_path(0)
+    assert grid.valid_position(Position(10, 0), 0)
+    assert not grid.valid_position(Position(10, 1), 0)
+
+def wall_grid(time_limit: int = 100) -> Grid:
+    # wall at x = 10 with a gap at the top, and one moving obstacle
+    grid = Grid(np.array([21, 21]), num_obstacles=0, time_limit=time_limit)
+    for y in range(20):
+        grid.add_obstacle_path([Position(10, y)] * time_limit)
+    grid.add_obstacle_path([Position(11, 20 - min(t, 5)) for t in range(20)])
+    return grid
+
+
+def test_distance_field():
+    grid = wall_grid()
+    static = grid.get_static_obstacle_map()
+    assert static[10, :20].all() and static.sum() == 20
+
+    field = grid.get_distance_field(Position(19, 1))
+    assert field[19, 1] == 0
+    assert field[1, 1] == 9 + 19 + 9 + 19
+    assert field[10, 5] == -1
+    assert grid.get_distance_field(Position(19, 1)) is field
+
+    # a moving obstacle does not change the static obstacles
+    grid.add_obstacle_path([Position(5, 5), Position(5, 6)])
+    assert grid.get_distance_field(Position(19, 1)) is field
+    # closing the gap does
+    grid.add_obstacle_path([Position(10, 20)] * grid.time_limit)
+    assert (grid.get_distance_field(Position(19, 1))[:10] == -1).all()
+
+
+def test_distance_field_cache_size():
+    grid = wall_grid()
+    grid.distance_field_cache_size = 3
+    field = grid.get_distance_field(Position(19, 1))
+    for y in range(2, 6):
+        grid.get_distance_field(Position(19, y))
+        # the most recently used field is kept
+        assert grid.get_distance_field(Position(19, 1)) is field
+    assert list(grid.distance_field_cache) == [(19, 4), (19, 5), (19, 1)]
+
+
+def test_distance_field_heuristic():
+    grid = wall_grid()
+    start = Position(1, 1)
+    goal = Position(19, 1)
+    manhattan = m.SpaceTimeAStar(grid, start, goal)
+    distance_field = m.SpaceTimeAStar(grid, start, goal, use_distance_field=True)
+
+    path = manhattan.plan(False)
+    assert distance_field.plan(False).goal_reached_time() == path.goal_reached_time()
+    assert distance_field.expanded_node_count * 4 < manhattan.expanded_node_count
+
+    # goals behind a closed wall fail without searching the time steps
+    grid.add_obstacle_path([Position(10, 20)] * grid.time_limit)
+    planner = m.SpaceTimeAStar(grid, start, goal, use_distance_field=True)
+    with pytest.raises(Exception, match="No path found"):
+        planner.plan(False)
+    assert planner.expanded_node_count == 1
+
+
 if __name__ == "__main__":
     conftest.run_this_test(__file__)
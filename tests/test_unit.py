@@ -260,7 +260,7 @@ def test_calc_obstacle_map():
   assert planner.y_width == 1
   assert len(planner.obstacle_map) == planner.x_width
   assert len(planner.obstacle_map[0]) == planner.y_width
-  assert planner.obstacle_map[0][0] is True
+  assert planner.obstacle_map[0][0]
 
 
 def test_obstacle_map_specific_case():
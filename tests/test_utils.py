@@ -1,5 +1,14 @@
 import conftest  # Add root path to sys.path
+import math
+
+import pytest
 from utils import angle
+from utils import collision_checker
+from utils import nearest_neighbor
+from utils import node_storage
+from utils import occupancy_grid
+from utils import tree_storage
+from utils.priority_queue import IndexedPriorityQueue
 from numpy.testing import assert_allclose
 import numpy as np
 
@@ -23,5 +32,213 @@ def test_angle_mod():
                     [300.])
 
 
+def test_calc_obstacle_map():
+    rng = np.random.default_rng(0)
+    ox = list(rng.uniform(-10.0, 30.0, 30)) + [-10.0, 30.0]
+    oy = list(rng.uniform(-5.0, 25.0, 30)) + [-5.0, 25.0]
+    resolution, robot_radius = 0.5, 1.5
+
+    min_x, min_y, max_x, max_y, obstacle_map = \
+        occupancy_grid.calc_obstacle_map(ox, oy, resolution, robot_radius)
+    assert (min_x, min_y, max_x, max_y) == (-10, -5, 30, 25)
+    assert obstacle_map.shape == (80, 60)
+    assert obstacle_map.dtype == bool
+
+    for ix in range(obstacle_map.shape[0]):
+        x = ix * resolution + min_x
+        for iy in range(obstacle_map.shape[1]):
+            y = iy * resolution + min_y
+            occupied = any(math.hypot(iox - x, ioy - y) <= robot_radius
+                           for iox, ioy in zip(ox, oy))
+            assert obstacle_map[ix, iy] == occupied
+
+
+def test_obstacle_map_cache(tmp_path):
+    ox, oy = [0.0, 10.0, 5.0, 5.0], [0.0, 10.0, 4.0, 5.0]
+    expected = occupancy_grid.calc_obstacle_map(ox, oy, 0.5, 1.0)
+
+    cache = occupancy_grid.ObstacleMapCache(tmp_path)
+    for _ in range(2):
+        cached = cache.calc_obstacle_map(ox, oy, 0.5, 1.0)
+        assert cached[:4] == expected[:4]
+        assert isinstance(cached[4], np.memmap)
+        assert np.array_equal(cached[4], expected[4])
+    assert len(list(tmp_path.glob("*.npy"))) == 1
+
+    # another process reuses the stored map
+    other = occupancy_grid.ObstacleMapCache(tmp_path)
+    key = other.calc_key(ox, oy, 0.5, 1.0)
+    assert np.array_equal(other.load(key), expected[4])
+    assert other.load(other.calc_key(ox, oy, 0.5, 2.0)) is None
+
+
+def test_obstacle_map_cache_eviction(tmp_path):
+    ox, oy = [0.0, 10.0], [0.0, 10.0]
+    maps = [(ox, oy, 0.5, r) for r in (0.5, 1.0, 1.5)]
+    cache = occupancy_grid.ObstacleMapCache(tmp_path)
+    keys = cache.warm(maps[:2])
+    cache.max_bytes = 2 * cache.get_path(keys[0]).stat().st_size
+
+    cache.load(keys[0])  # keys[1] becomes the least recently used map
+    keys.extend(cache.warm(maps[2:]))
+
+    assert cache.load(keys[0]) is not None
+    assert cache.load(keys[1]) is None
+    assert cache.load(keys[2]) is not None
+
+
+def test_grid_node_storage_calc_path():
+    storage = node_storage.GridNodeStorage(4, 3)
+    rng = np.random.default_rng(0)
+    # random tree rooted at a start outside of the grid
+    nodes = np.concatenate(([storage.calc_index(-1, 5)],
+                            rng.permutation(12)[:9]))
+    storage.state[nodes] = node_storage.CLOSED
+    for i in range(1, len(nodes)):
+        storage.parent_index[nodes[i]] = nodes[rng.integers(0, i)]
+
+    for index in nodes:
+        expected = [int(index)]
+        while storage.parent_index[expected[-1]] != -1:
+            expected.append(int(storage.parent_index[expected[-1]]))
+        x, y = storage.calc_path(index)
+        assert list(zip(x, y)) == [storage.calc_xy(i) for i in expected]
+        x, y = storage.calc_path(index, (3, 2))
+        assert list(zip(x, y)) == [(3, 2)] + [storage.calc_xy(i)
+                                             for i in expected]
+    x, y = storage.calc_path(-1, (3, 2))
+    assert list(zip(x, y)) == [(3, 2)]
+
+    assert node_storage.GridNodeStorage.for_grid(storage, 4, 3) is storage
+    assert not storage.state.any()
+    assert (storage.parent_index == -1).all()
+    other = node_storage.GridNodeStorage.for_grid(storage, 5, 3)
+    assert other is not storage and other.x_width == 5
+
+
+def test_indexed_priority_queue():
+    queue = IndexedPriorityQueue()
+    for item, key in [("a", 3.0), ("b", 1.0), ("c", 2.0), ("d", 2.0)]:
+        queue.push(item, key)
+    queue.push("a", 0.5)
+    queue.remove("b")
+    queue.remove("x")
+    assert len(queue) == 3 and "b" not in queue
+    assert queue.key("c") == 2.0
+    assert queue.top() == ("a", 0.5)
+    # equal keys pop in insertion order
+    assert [queue.pop() for _ in range(3)] == [("a", 0.5), ("c", 2.0),
+                                               ("d", 2.0)]
+    assert queue.top_key() is None and not queue
+    with pytest.raises(IndexError):
+        queue.pop()
+
+    for i in range(1000):
+        queue.push(i, (i % 7, i))
+    for i in range(1000):
+        if i % 4 != 3:
+            queue.remove(i)
+    # the removed entries are dropped from the heap
+    assert len(queue.heap) < 1000
+    assert queue.pop() == (7, (0, 7))
+
+
+def test_circle_collision_checker():
+    rng = np.random.default_rng(0)
+    obstacle_list = [(x, y, r) for x, y, r in zip(rng.uniform(0.0, 50.0, 300),
+                                                  rng.uniform(0.0, 50.0, 300),
+                                                  rng.uniform(0.2, 1.0, 300))]
+    checker = collision_checker.CircleCollisionChecker(obstacle_list, 0.5)
+    paths = []
+    for _ in range(200):
+        start = rng.uniform(0.0, 50.0, 2)
+        points = start + np.outer(np.linspace(0.0, 1.0, rng.integers(0, 8)),
+                                  rng.uniform(-3.0, 3.0, 2))
+        paths.append((list(points[:, 0]), list(points[:, 1])))
+
+    expected = [not any(math.hypot(x - ox, y - oy) <= r + 0.5
+                        for x, y in zip(path_x, path_y)
+                        for ox, oy, r in obstacle_list)
+                for path_x, path_y in paths]
+    assert 0 < sum(expected) < len(paths)
+    assert [checker.check_path(*path) for path in paths] == expected
+    assert checker.check_paths(paths).tolist() == expected
+
+    empty = collision_checker.CircleCollisionChecker([])
+    assert empty.check_paths(paths).all()
+
+
+@pytest.mark.parametrize("index_type", [nearest_neighbor.LinearIndex,
+                                        nearest_neighbor.KDTreeIndex])
+@pytest.mark.parametrize("dimension", [2, 7])
+def test_nearest_neighbor_index(index_type, dimension):
+    rng = np.random.default_rng(0)
+    points = rng.uniform(-1.0, 1.0, (3000, dimension))
+    index = index_type(dimension)
+    for i, point in enumerate(points):
+        assert index.add(point) == i
+        query = rng.uniform(-1.0, 1.0, dimension)
+        d = np.linalg.norm(points[:i + 1] - query, axis=1)
+        assert index.nearest(query) == np.argmin(d)
+        assert index.within(query, 0.3) == np.flatnonzero(d <= 0.3).tolist()
+    assert len(index) == len(points)
+    if index_type is nearest_neighbor.KDTreeIndex:
+        # the tree was rebuilt, the recent points are fewer than 4 sqrt(n)
+        assert 0 < len(points) - index.tree_size <= 4 * math.sqrt(len(points))
+
+
+def test_node_list_index():
+    index = nearest_neighbor.NodeListIndex(lambda node: node)
+    node_list = [(0.0, 0.0)]
+    assert index.nearest(node_list, (5.0, 5.0)) == 0
+    node_list += [(4.0, 4.0), (9.0, 9.0)]
+    assert index.nearest(node_list, (5.0, 5.0)) == 1
+    # a node replaced at the same position keeps its index
+    node_list[1] = (4.0, 4.0)
+    assert index.nearest(node_list, (8.0, 8.0)) == 2
+    # a new list starts over
+    assert index.nearest([(9.0, 9.0), (6.0, 6.0)], (5.0, 5.0)) == 1
+    assert len(index.index) == 2
+
+
+class TreeTestNode:
+    def __init__(self, x, y, parent=None, cost=0.0):
+        self.x, self.y, self.parent, self.cost = x, y, parent, cost
+        self.path_x = [] if parent is None else [parent.x, x]
+        self.path_y = [] if parent is None else [parent.y, y]
+
+
+def test_tree_storage():
+    tree = tree_storage.TreeStorage(TreeTestNode(0.0, 0.0), capacity=2)
+    # a chain 0 - 1 - 2 - ... - 9 and a node 10 next to 0
+    for i in range(1, 10):
+        assert tree.append(TreeTestNode(i, 0.0, tree[-1], float(i))) == i
+    tree.append(TreeTestNode(9.0, 1.0, tree[0], math.hypot(9.0, 1.0)))
+    assert len(tree) == 11 and len(tree[2:5]) == 3
+    assert tree[3].parent == tree[2] and tree[0].parent is None
+    assert (tree[3].path_x, tree[3].path_y) == ([2.0, 3.0], [0.0, 0.0])
+    assert tree.children(0) == [10, 1]
+
+    # node 9 is rewired to node 10, then node 5 to node 0 with a cost of 2
+    tree[9] = TreeTestNode(9.0, 0.0, tree[10], tree[10].cost + 1.0)
+    tree[5] = TreeTestNode(5.0, 0.0, tree[0], 2.0)
+    tree.propagate_cost(5)
+    assert tree.children(4) == [] and tree.children(0) == [5, 10, 1]
+    assert tree.children(10) == [9]
+    assert tree.costs().tolist() == [0, 1, 2, 3, 4, 2, 3, 4, 5,
+                                     math.hypot(9.0, 1.0) + 1.0,
+                                     math.hypot(9.0, 1.0)]
+    assert tree[9].path_x == [9.0, 9.0] and tree[5].path_x == [0.0, 5.0]
+
+    # the replaced edges are dropped when the path buffers grow
+    for _ in range(20):
+        tree[9] = TreeTestNode(9.0, 0.0, tree[8], 9.0)
+    tree.compact_paths()
+    assert tree.path_size == 2 * (len(tree) - 1)
+    assert [node.path_x for node in tree][1:4] == [[0.0, 1.0], [1.0, 2.0],
+                                                   [2.0, 3.0]]
+    assert tree[9].path_x == [8.0, 9.0]
+
+
 if __name__ == '__main__':
     conftest.run_this_test(__file__)
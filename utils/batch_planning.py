@@ -0,0 +1,186 @@
+"""
+
+Batch planning of many start/goal queries against one grid map
+
+The planner's obstacle map is copied once into shared memory. Worker
+processes map it without copying and answer the queries with their own
+planner instance. The planner is sent to the workers without its obstacle
+map, in the state its __getstate__ method returns. The grid planners leave
+out their search caches, which start empty and are rebuilt on first use,
+and their expansion callback, which is not called in the workers.
+
+"""
+import contextlib
+import io
+import math
+import multiprocessing
+import os
+import signal
+import sys
+import time
+from dataclasses import dataclass
+from multiprocessing import shared_memory
+
+import numpy as np
+
+
+@dataclass
+class PlanningResult:
+    # x and y position lists of the path, None if the query failed
+    rx: list[float] | None
+    ry: list[float] | None
+    # reason of the failure, None if a path was found
+    error: str | None = None
+    # wall clock time spent on the query [s]
+    planning_time: float = 0.0
+
+    @property
+    def success(self) -> bool:
+        return self.error is None
+
+
+class PlanningTimeout(Exception):
+    pass
+
+
+# state of a worker process, set by _init_worker
+_worker_planner = None
+_worker_shm = None
+
+
+def plan_many(planner, starts, goals, workers=None, timeout=None):
+    """
+    Plan paths for many start/goal pairs in a process pool
+
+    Parameters
+    ----------
+    planner :
+        Grid planner with a planning(sx, sy, gx, gy) method, a resolution
+        attribute and an obstacle_map attribute, e.g. AStarPlanner.
+    starts : array_like
+        (N, 2) start positions [m]
+    goals : array_like
+        (N, 2) goal positions [m]
+    workers : int, optional
+        Number of worker processes. Default is os.cpu_count().
+    timeout : float, optional
+        Time limit of a single query [s]. On platforms without
+        signal.setitimer, a query is not interrupted, but it is reported as
+        failed when it exceeds the limit.
+
+    Returns
+    -------
+    results : list of PlanningResult
+        One result per query, in input order. Nothing is printed to stdout;
+        failed queries report the reason in PlanningResult.error.
+    """
+    starts = np.asarray(starts, dtype=float).reshape(-1, 2)
+    goals = np.asarray(goals, dtype=float).reshape(-1, 2)
+    if len(starts) != len(goals):
+        raise ValueError("starts and goals must have the same length")
+    if len(starts) == 0:
+        return []
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    obstacle_map = np.ascontiguousarray(planner.obstacle_map, dtype=bool)
+    shm = shared_memory.SharedMemory(create=True,
+                                     size=max(obstacle_map.nbytes, 1))
+    try:
+        np.ndarray(obstacle_map.shape, dtype=bool,
+                   buffer=shm.buf)[...] = obstacle_map
+
+        init_args = (type(planner), _worker_state(planner), shm.name,
+                     obstacle_map.shape)
+        queries = [(tuple(s), tuple(g), timeout)
+                   for s, g in zip(starts, goals)]
+
+        with multiprocessing.Pool(min(workers, len(queries)),
+                                  initializer=_init_worker,
+                                  initargs=init_args) as pool:
+            results = pool.map(_plan_query, queries)
+    finally:
+        shm.close()
+        shm.unlink()
+
+    return results
+
+
+def _worker_state(planner):
+    """Planner state sent to the workers, without the shared obstacle map"""
+    state = dict(planner.__getstate__())
+    state.pop("obstacle_map", None)
+    return state
+
+
+def _init_worker(planner_class, state, shm_name, shape):
+    global _worker_planner, _worker_shm
+
+    if sys.version_info >= (3, 13):
+        # the parent process owns and unlinks the shared memory
+        _worker_shm = shared_memory.SharedMemory(name=shm_name, track=False)
+    else:
+        _worker_shm = shared_memory.SharedMemory(name=shm_name)
+
+    _worker_planner = planner_class.__new__(planner_class)
+    _worker_planner.__dict__.update(state)
+    _worker_planner.obstacle_map = np.ndarray(shape, dtype=bool,
+                                              buffer=_worker_shm.buf)
+
+    # workers never draw
+    module = sys.modules[planner_class.__module__]
+    if hasattr(module, "show_animation"):
+        module.show_animation = False
+
+
+def _raise_timeout(signum, frame):
+    raise PlanningTimeout()
+
+
+def _plan_query(query):
+    (sx, sy), (gx, gy), timeout = query
+    use_timer = timeout is not None and hasattr(signal, "setitimer")
+    if use_timer:
+        signal.signal(signal.SIGALRM, _raise_timeout)
+
+    start_time = time.perf_counter()
+    rx, ry, error = None, None, None
+    try:
+        if use_timer:
+            signal.setitimer(signal.ITIMER_REAL, timeout)
+        with contextlib.redirect_stdout(io.StringIO()):
+            rx, ry = _worker_planner.planning(sx, sy, gx, gy)
+        if use_timer:
+            signal.setitimer(signal.ITIMER_REAL, 0.0)
+    except PlanningTimeout:
+        error = f"timeout after {timeout} s"
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    finally:
+        if use_timer:
+            signal.setitimer(signal.ITIMER_REAL, 0.0)
+    planning_time = time.perf_counter() - start_time
+
+    if error is None and timeout is not None and planning_time > timeout:
+        error = f"timeout after {timeout} s"
+    elif error is None and not _connects(
+            rx, ry, (sx, sy), (gx, gy), _worker_planner.resolution):
+        error = "no path found"
+    if error is not None:
+        rx, ry = None, None
+
+    return PlanningResult(rx, ry, error, planning_time)
+
+
+def _connects(rx, ry, start, goal, resolution):
+    """Check if the path ends are the grid cells of start and goal"""
+    if not rx:
+        return False
+
+    def is_near(x, y, position):
+        return math.hypot(x - position[0], y - position[1]) \
+            <= resolution * math.sqrt(2.0) / 2.0 + 1e-9
+
+    first, last = (rx[0], ry[0]), (rx[-1], ry[-1])
+    return (is_near(*first, start) and is_near(*last, goal)) or \
+        (is_near(*first, goal) and is_near(*last, start))
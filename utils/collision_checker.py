@@ -0,0 +1,101 @@
+"""
+
+Vectorized collision checking of paths against circle obstacles
+
+The obstacles are kept in NumPy arrays, so the points of a path are checked
+against all obstacles in one broadcast instead of Python loops over the
+obstacles and the points. Only the obstacles that reach into the bounding
+box of the path take part in the broadcast, so hundreds of obstacles cost
+little more than a few. check_paths checks a batch of paths, like the
+candidate edges of a rewiring step, in a single broadcast as well.
+
+"""
+import numpy as np
+
+
+class CircleCollisionChecker:
+    """
+    Collision checker of a robot with circle obstacles
+
+    Parameters
+    ----------
+    obstacle_list : list
+        obstacles [(x, y, radius), ...]
+    robot_radius : float
+        the robot body is a circle with this radius
+    """
+
+    def __init__(self, obstacle_list, robot_radius=0.0):
+        self.obstacle_list = obstacle_list
+        self.robot_radius = robot_radius
+        obstacles = as_obstacle_array(obstacle_list)
+        # copy of the obstacles the checker was built for
+        self.obstacles = obstacles
+        self.ox = obstacles[:, 0]
+        self.oy = obstacles[:, 1]
+        # a point collides within this distance of an obstacle center
+        self.reach = obstacles[:, 2] + robot_radius
+        self.collision_d2 = self.reach ** 2
+
+    def near_obstacles(self, x, y):
+        """Indices of the obstacles that reach into the bounding box of x, y"""
+        return np.flatnonzero((self.ox + self.reach >= x.min())
+                              & (self.ox - self.reach <= x.max())
+                              & (self.oy + self.reach >= y.min())
+                              & (self.oy - self.reach <= y.max()))
+
+    def collides(self, x, y):
+        """Boolean array, True for the points x, y that hit an obstacle"""
+        near = self.near_obstacles(x, y)
+        if len(near) == 0:
+            return np.zeros(len(x), dtype=bool)
+        dx = np.subtract.outer(x, self.ox[near])
+        dy = np.subtract.outer(y, self.oy[near])
+        return (dx * dx + dy * dy <= self.collision_d2[near]).any(axis=1)
+
+    def check_path(self, path_x, path_y):
+        """True if no point of the path collides with an obstacle"""
+        if len(self.ox) == 0 or len(path_x) == 0:
+            return True
+        return not self.collides(np.asarray(path_x, dtype=float),
+                                 np.asarray(path_y, dtype=float)).any()
+
+    def check_paths(self, paths):
+        """
+        Check a batch of paths [(path_x, path_y), ...]
+
+        Returns a boolean array, True for the paths without collision.
+        """
+        safe = np.ones(len(paths), dtype=bool)
+        lengths = np.array([len(path_x) for path_x, _ in paths], dtype=int)
+        if len(self.ox) == 0 or not lengths.any():
+            return safe
+        x = np.concatenate([path_x for path_x, _ in paths]).astype(float)
+        y = np.concatenate([path_y for _, path_y in paths]).astype(float)
+        collides = self.collides(x, y)
+        # reduceat needs the start of every non-empty path
+        nonempty = lengths > 0
+        starts = np.cumsum(lengths) - lengths
+        safe[nonempty] = ~np.logical_or.reduceat(collides, starts[nonempty])
+        return safe
+
+
+def as_obstacle_array(obstacle_list):
+    """Obstacles [(x, y, radius), ...] as an (n, 3) float array"""
+    return np.array(obstacle_list, dtype=float).reshape(-1, 3)
+
+
+def reuse_collision_checker(checker, obstacle_list, robot_radius=0.0):
+    """
+    Return checker if it was built for the obstacles of obstacle_list and
+    robot_radius, a new CircleCollisionChecker otherwise
+
+    The obstacles are compared by value, so a list edited in place since the
+    checker was built gets a new checker as well.
+    """
+    if checker is None or checker.robot_radius != robot_radius \
+            or len(obstacle_list) != len(checker.obstacles) \
+            or not np.array_equal(as_obstacle_array(obstacle_list),
+                                  checker.obstacles):
+        checker = CircleCollisionChecker(obstacle_list, robot_radius)
+    return checker
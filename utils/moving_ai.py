@@ -0,0 +1,235 @@
+"""
+
+MovingAI grid benchmark maps and scenarios
+
+Reads and writes the .map and .scen files of the MovingAI pathfinding
+benchmarks and converts the maps to the obstacle point lists of the grid
+planners.
+
+Ref:
+
+- [Benchmarks for Grid-Based Pathfinding]
+(https://movingai.com/benchmarks/formats.html)
+
+"""
+import math
+import os
+from dataclasses import dataclass
+
+import numpy as np
+from scipy.ndimage import label
+from scipy.sparse.csgraph import dijkstra as csgraph_dijkstra
+
+from utils import occupancy_grid
+
+# terrain characters a ground agent can move on; out of bounds (@, O),
+# trees (T) and water (W) are blocked
+PASSABLE_TERRAIN = ".GS"
+
+# 8-connected moves (dx, dy, cost) of the grid planners
+MOTION = [(1, 0, 1.0), (0, 1, 1.0), (-1, 0, 1.0), (0, -1, 1.0),
+          (-1, -1, math.sqrt(2)), (-1, 1, math.sqrt(2)),
+          (1, -1, math.sqrt(2)), (1, 1, math.sqrt(2))]
+
+
+@dataclass
+class MovingAIMap:
+    name: str
+    # (height, width) boolean array, True for blocked cells. It is indexed
+    # as blocked[y][x] like the rows of the map file.
+    blocked: np.ndarray
+
+    @property
+    def width(self) -> int:
+        return self.blocked.shape[1]
+
+    @property
+    def height(self) -> int:
+        return self.blocked.shape[0]
+
+
+@dataclass
+class Scenario:
+    bucket: int
+    map_name: str
+    map_width: int
+    map_height: int
+    start_x: int
+    start_y: int
+    goal_x: int
+    goal_y: int
+    # length of the optimal path of the benchmark [cells]
+    optimal_length: float
+
+
+def load_map(path):
+    """
+    Read a MovingAI .map file
+
+    Parameters
+    ----------
+    path : str
+        path of the map file
+
+    Returns
+    -------
+    MovingAIMap
+
+    Raises
+    ------
+    ValueError
+        If the file is not a valid map file.
+    """
+    with open(path) as f:
+        lines = f.read().splitlines()
+
+    header = {}
+    for i, line in enumerate(lines):
+        if line.strip() == "map":
+            rows = lines[i + 1:]
+            break
+        key, _, value = line.partition(" ")
+        header[key] = value.strip()
+    else:
+        raise ValueError(f"{path}: no map section")
+
+    try:
+        height, width = int(header["height"]), int(header["width"])
+    except (KeyError, ValueError) as e:
+        raise ValueError(f"{path}: invalid map size") from e
+    rows = rows[:height]
+    if len(rows) != height or any(len(row) < width for row in rows):
+        raise ValueError(f"{path}: map has not {height} rows of {width} "
+                         f"cells")
+
+    terrain = np.array([list(row[:width]) for row in rows])
+    blocked = ~np.isin(terrain, list(PASSABLE_TERRAIN))
+    return MovingAIMap(os.path.basename(path), blocked)
+
+
+def save_map(path, moving_ai_map):
+    """Write a MovingAI .map file, blocked cells as @"""
+    rows = ["".join("@" if cell else "." for cell in row)
+            for row in moving_ai_map.blocked]
+    with open(path, "w") as f:
+        f.write(f"type octile\nheight {moving_ai_map.height}\n"
+                f"width {moving_ai_map.width}\nmap\n")
+        f.write("\n".join(rows) + "\n")
+
+
+def load_scenarios(path):
+    """
+    Read a MovingAI .scen file
+
+    Parameters
+    ----------
+    path : str
+        path of the scenario file
+
+    Returns
+    -------
+    list of Scenario
+    """
+    scenarios = []
+    with open(path) as f:
+        for line in f:
+            fields = line.split()
+            if not fields or fields[0] == "version":
+                continue
+            if len(fields) != 9:
+                raise ValueError(f"{path}: invalid scenario: {line!r}")
+            scenarios.append(Scenario(
+                int(fields[0]), fields[1],
+                *(int(field) for field in fields[2:8]),
+                float(fields[8])))
+    return scenarios
+
+
+def save_scenarios(path, scenarios):
+    """Write a MovingAI .scen file"""
+    with open(path, "w") as f:
+        f.write("version 1\n")
+        for s in scenarios:
+            f.write(f"{s.bucket}\t{s.map_name}\t{s.map_width}\t"
+                    f"{s.map_height}\t{s.start_x}\t{s.start_y}\t{s.goal_x}\t"
+                    f"{s.goal_y}\t{s.optimal_length:.8f}\n")
+
+
+def calc_obstacle_points(moving_ai_map):
+    """
+    Obstacle point lists of a map for the grid planners
+
+    The blocked cells and a border around the map become obstacle points at
+    their cell coordinates, so a planner built from them with a resolution
+    of 1.0 and a robot radius below 1.0 has the same free cells as the map.
+
+    Returns
+    -------
+    ox, oy : list of float
+        x and y position lists of the obstacles [m]
+    """
+    height, width = moving_ai_map.blocked.shape
+    border = np.ones((height + 2, width + 2), dtype=bool)
+    border[1:-1, 1:-1] = moving_ai_map.blocked
+    y, x = np.nonzero(border)
+    return (x - 1).astype(float).tolist(), (y - 1).astype(float).tolist()
+
+
+def make_random_map(size, obstacle_ratio=0.2, seed=0):
+    """
+    Square map with randomly blocked cells
+
+    Parameters
+    ----------
+    size : int
+        width and height of the map [cells]
+    obstacle_ratio : float
+        probability of a cell to be blocked
+    seed : int
+        random seed
+
+    Returns
+    -------
+    MovingAIMap
+    """
+    rng = np.random.default_rng(seed)
+    blocked = rng.random((size, size)) < obstacle_ratio
+    return MovingAIMap(f"random{size}-{seed}.map", blocked)
+
+
+def make_scenarios(moving_ai_map, n_scenarios, seed=0):
+    """
+    Random scenarios between connected free cells of a map
+
+    The optimal lengths are those of the 8-connected moves of the grid
+    planners, which may cut the corners of blocked cells unlike the
+    MovingAI benchmarks. The bucket of a scenario is its optimal length
+    divided by 4, as in the benchmark files.
+
+    Returns
+    -------
+    list of Scenario
+    """
+    rng = np.random.default_rng(seed)
+    blocked = moving_ai_map.blocked
+    # free cells of the largest 8-connected region
+    regions, _ = label(~blocked, structure=np.ones((3, 3)))
+    counts = np.bincount(regions.ravel())
+    counts[0] = 0
+    cells = np.argwhere(regions == counts.argmax())
+    if len(cells) < 2:
+        return []
+
+    # the motion graph is indexed by x * height + y of obstacle_map[x][y]
+    graph = occupancy_grid.calc_motion_graph(blocked.T, MOTION)
+    scenarios = []
+    for _ in range(n_scenarios):
+        (sy, sx), (gy, gx) = cells[rng.choice(len(cells), 2, replace=False)]
+        costs = csgraph_dijkstra(graph,
+                                 indices=sx * moving_ai_map.height + sy)
+        length = costs[gx * moving_ai_map.height + gy]
+        scenarios.append(Scenario(
+            int(length // 4), moving_ai_map.name, moving_ai_map.width,
+            moving_ai_map.height, int(sx), int(sy), int(gx), int(gy),
+            float(length)))
+    return scenarios
@@ -0,0 +1,175 @@
+"""
+
+Incremental nearest neighbour indexes of the RRT family
+
+The tree planners look up the tree node nearest to a sample on every
+iteration. A scan over all nodes makes the growth of a tree of n nodes
+O(n^2); KDTreeIndex keeps the nodes in a KD-tree that is rebuilt from
+scratch once the points added since the last build outnumber a multiple of
+the square root of the tree size, and scans only those recent points. Both
+kinds of index take points of any dimension, number them in insertion order
+and also find all points within a radius, like the near nodes of a rewiring
+step.
+
+NodeListIndex follows the node list of a planner, so the planners can keep
+appending to their lists.
+
+"""
+import math
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+
+class LinearIndex:
+    """
+    Nearest neighbour by a vectorized scan over all points
+
+    Parameters
+    ----------
+    dimension : int
+        number of coordinates of a point
+    """
+
+    def __init__(self, dimension):
+        self.dimension = dimension
+        self.points = np.empty((16, dimension))
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def add(self, point):
+        """Add a point, returns its index"""
+        if self.size == len(self.points):
+            self.points = np.resize(self.points,
+                                    (2 * len(self.points), self.dimension))
+        self.points[self.size] = point
+        self.size += 1
+        return self.size - 1
+
+    def nearest(self, point):
+        """Index of the point nearest to point, the first one on a tie"""
+        return self.scan(point, 0)[1]
+
+    def within(self, point, r):
+        """Sorted indices of the points at a distance of at most r"""
+        return self.scan_within(point, r, 0)
+
+    def squared_distances(self, point, begin):
+        d = self.points[begin:self.size] - point
+        return np.einsum("ij,ij->i", d, d)
+
+    def scan(self, point, begin):
+        """
+        Squared distance and index of the nearest of the points from begin
+        """
+        d2 = self.squared_distances(point, begin)
+        i = int(np.argmin(d2))
+        return float(d2[i]), begin + i
+
+    def scan_within(self, point, r, begin):
+        """Sorted indices of the points from begin within the radius r"""
+        d2 = self.squared_distances(point, begin)
+        return (begin + np.flatnonzero(d2 <= r * r)).tolist()
+
+
+class KDTreeIndex(LinearIndex):
+    """
+    Nearest neighbour by a periodically rebuilt KD-tree
+
+    The points added since the last build are scanned like in LinearIndex.
+    Rebuilding after O(sqrt(n)) insertions costs O(sqrt(n) log(n)) per
+    insertion, the same order as the scan of the recent points. The tree is
+    built with sliding midpoint splits, which is several times faster than
+    median splits and hardly slows down the queries.
+
+    Parameters
+    ----------
+    dimension : int
+        number of coordinates of a point
+    rebuild_factor : float
+        the tree is rebuilt when the recent points outnumber
+        rebuild_factor * sqrt(n)
+    min_rebuild_size : int
+        number of recent points below which the tree is not rebuilt
+    """
+
+    def __init__(self, dimension, rebuild_factor=4.0, min_rebuild_size=64):
+        super().__init__(dimension)
+        self.rebuild_factor = rebuild_factor
+        self.min_rebuild_size = min_rebuild_size
+        self.tree = None
+        self.tree_size = 0
+
+    def update_tree(self):
+        """Rebuild the tree when there are too many recent points"""
+        if self.size - self.tree_size > max(
+                self.min_rebuild_size,
+                self.rebuild_factor * math.sqrt(self.size)):
+            self.tree = cKDTree(self.points[:self.size], balanced_tree=False,
+                                compact_nodes=False)
+            self.tree_size = self.size
+
+    def nearest(self, point):
+        self.update_tree()
+        if self.tree is None:
+            return self.scan(point, 0)[1]
+
+        d, i = self.tree.query(point)
+        if self.tree_size == self.size:
+            return int(i)
+        d2, j = self.scan(point, self.tree_size)
+        return int(i) if d * d <= d2 else j
+
+    def within(self, point, r):
+        self.update_tree()
+        if self.tree is None:
+            return self.scan_within(point, r, 0)
+        inds = sorted(self.tree.query_ball_point(point, r))
+        return inds + self.scan_within(point, r, self.tree_size)
+
+
+class NodeListIndex:
+    """
+    Nearest neighbour index of the node list of a tree planner
+
+    The planners only append nodes to their node list and replace nodes by
+    nodes at the same position when rewiring, so the index adds the nodes
+    appended since the last query. It starts over when it is given another
+    list, like the new list of the next planning call.
+
+    Parameters
+    ----------
+    point_of : function
+        coordinates of a node
+    index_type : class
+        LinearIndex, KDTreeIndex or a class with the same interface, called
+        with the dimension of the points
+    """
+
+    def __init__(self, point_of, index_type=KDTreeIndex):
+        self.point_of = point_of
+        self.index_type = index_type
+        self.node_list = None
+        self.index = None
+
+    def update(self, node_list, point):
+        """Add the nodes appended to node_list since the last call"""
+        if node_list is not self.node_list or len(self.index) > len(node_list):
+            self.node_list = node_list
+            self.index = self.index_type(len(point))
+        for i in range(len(self.index), len(node_list)):
+            self.index.add(self.point_of(node_list[i]))
+
+    def nearest(self, node_list, node):
+        """Index of the node of node_list nearest to node"""
+        point = self.point_of(node)
+        self.update(node_list, point)
+        return self.index.nearest(point)
+
+    def within(self, node_list, node, r):
+        """Sorted indices of the nodes of node_list within r of node"""
+        point = self.point_of(node)
+        self.update(node_list, point)
+        return self.index.within(point, r)
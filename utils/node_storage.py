@@ -0,0 +1,133 @@
+"""
+
+Struct-of-arrays node storage of the grid searches
+
+Instead of a Node object per visited cell in open and closed set dicts, the
+g-cost, the parent index and the state of every grid cell are kept in
+preallocated NumPy arrays indexed by the grid index y * x_width + x. The
+storage is reused by the following searches of a planner.
+
+"""
+import numpy as np
+
+# node states
+UNVISITED, OPEN, CLOSED = 0, 1, 2
+
+
+class GridNodeStorage:
+    """
+    Node arrays of the grid searches of one grid
+
+    The arrays have one slot more than the grid for a start cell outside of
+    the grid, whose position is kept in outside_x and outside_y.
+
+    Parameters
+    ----------
+    x_width : int
+        number of grid cells in x
+    y_width : int
+        number of grid cells in y
+    """
+
+    def __init__(self, x_width, y_width):
+        self.x_width = x_width
+        self.y_width = y_width
+        self.outside_index = x_width * y_width
+        self.outside_x, self.outside_y = None, None
+
+        self.cost = np.full(self.outside_index + 1, np.inf)
+        self.parent_index = np.full(self.outside_index + 1, -1, dtype=np.int64)
+        self.state = np.zeros(self.outside_index + 1, dtype=np.uint8)
+
+    @classmethod
+    def for_grid(cls, storage, x_width, y_width):
+        """
+        Node arrays of a new search on a grid
+
+        storage, the arrays of the previous search or None, is reset if it
+        has the grid size, and new arrays are allocated otherwise.
+        """
+        if storage is None or (storage.x_width, storage.y_width) != (
+                x_width, y_width):
+            return cls(x_width, y_width)
+        storage.reset()
+        return storage
+
+    def reset(self):
+        """Clear the nodes of the previous search"""
+        visited = np.flatnonzero(self.state)
+        self.cost[visited] = np.inf
+        self.parent_index[visited] = -1
+        self.state[visited] = UNVISITED
+        self.outside_x, self.outside_y = None, None
+
+    def scalar_views(self):
+        """
+        Memoryviews of cost, parent_index and state
+
+        Item access on them returns Python scalars, which is several times
+        faster than indexing the arrays in the search loops.
+        """
+        return (memoryview(self.cost), memoryview(self.parent_index),
+                memoryview(self.state))
+
+    def calc_index(self, x, y):
+        """
+        Storage index of a cell
+
+        A cell outside of the grid gets the extra slot; only the start cell
+        of a search may be outside of the grid.
+        """
+        if 0 <= x < self.x_width and 0 <= y < self.y_width:
+            return y * self.x_width + x
+        self.outside_x, self.outside_y = x, y
+        return self.outside_index
+
+    def calc_xy(self, index):
+        """Grid x and y index of a storage index"""
+        if index == self.outside_index:
+            return self.outside_x, self.outside_y
+        y, x = divmod(index, self.x_width)
+        return x, y
+
+    def __contains__(self, index):
+        # closed set membership, like the closed set dicts
+        return 0 <= index <= self.outside_index and \
+            self.state[index] == CLOSED
+
+    def calc_path(self, index, goal=None):
+        """
+        Walk the parent indices from a node back to the start
+
+        Parameters
+        ----------
+        index : int
+            storage index of a visited node
+        goal : tuple, optional
+            grid x and y index of a goal node whose parent is the node, put
+            first in the path. index is -1 if the goal is the start.
+
+        Returns
+        -------
+        x, y : numpy.ndarray
+            grid indices of the path from the node, or the goal, to the
+            start
+        """
+        path = []
+        if goal is None or index != -1:
+            if not 0 <= index <= self.outside_index or \
+                    self.state[index] == UNVISITED:
+                raise KeyError(index)
+            parent_index = memoryview(self.parent_index)
+            path.append(int(index))
+            while parent_index[path[-1]] != -1:
+                path.append(parent_index[path[-1]])
+        path = np.array(path, dtype=np.int64)
+
+        x, y = path % self.x_width, path // self.x_width
+        if len(path) > 0 and path[-1] == self.outside_index:
+            x[-1], y[-1] = self.outside_x, self.outside_y
+        if goal is not None:
+            x = np.concatenate(([goal[0]], x)).astype(np.int64)
+            y = np.concatenate(([goal[1]], y)).astype(np.int64)
+        return x, y
@@ -0,0 +1,304 @@
+"""
+
+Occupancy grid construction shared by the grid based planners
+
+"""
+import hashlib
+import math
+import os
+import pathlib
+import time
+
+import numpy as np
+from scipy.ndimage import distance_transform_edt
+from scipy.sparse import csr_matrix
+from scipy.spatial import cKDTree
+
+
+def calc_grid_bounds(ox, oy, resolution):
+    """
+    Calculate the grid bounds which cover the given obstacle points
+
+    Parameters
+    ----------
+    ox : array_like
+        x position list of obstacles [m]
+    oy : array_like
+        y position list of obstacles [m]
+    resolution : float
+        grid resolution [m]
+
+    Returns
+    -------
+    min_x, min_y, max_x, max_y : int
+        grid bounds [m]
+    x_width, y_width : int
+        number of grid cells in x and y
+
+    Raises
+    ------
+    ValueError
+        If no obstacle points are given.
+    """
+    min_x = round(min(ox))
+    min_y = round(min(oy))
+    max_x = round(max(ox))
+    max_y = round(max(oy))
+    x_width = round((max_x - min_x) / resolution)
+    y_width = round((max_y - min_y) / resolution)
+    return min_x, min_y, max_x, max_y, x_width, y_width
+
+
+def calc_obstacle_map(ox, oy, resolution, robot_radius):
+    """
+    Build an obstacle map inflated by the robot radius
+
+    A cell is occupied when an obstacle point is within robot_radius of the
+    cell's grid position. A distance transform of the rasterized obstacles
+    bounds the distance of every cell to its closest obstacle, so only cells
+    on the border of the inflated area need an exact KD-tree query.
+
+    Parameters
+    ----------
+    ox : array_like
+        x position list of obstacles [m]
+    oy : array_like
+        y position list of obstacles [m]
+    resolution : float
+        grid resolution [m]
+    robot_radius : float
+        robot radius [m]
+
+    Returns
+    -------
+    min_x, min_y, max_x, max_y : int
+        grid bounds [m]
+    obstacle_map : ndarray
+        (x_width, y_width) boolean array, True for occupied cells.
+        It is indexed as obstacle_map[ix][iy].
+
+    Examples
+    --------
+    >>> _, _, _, _, obstacle_map = calc_obstacle_map(
+    ...     [0.0, 2.0, 4.0], [0.0, 2.0, 4.0], 1.0, 0.5)
+    >>> obstacle_map.shape
+    (4, 4)
+    """
+    min_x, min_y, max_x, max_y, x_width, y_width = calc_grid_bounds(
+        ox, oy, resolution)
+    obstacle_map = np.zeros((x_width, y_width), dtype=bool)
+    if obstacle_map.size == 0:
+        return min_x, min_y, max_x, max_y, obstacle_map
+
+    ox = np.asarray(ox, dtype=float)
+    oy = np.asarray(oy, dtype=float)
+
+    # Rasterize the obstacles on a padded grid, so obstacles just outside
+    # the map still inflate the cells on its border. Obstacles beyond the
+    # padding are too far away to inflate any cell and are clipped.
+    radius = robot_radius / resolution  # [cell]
+    pad = math.ceil(radius) + 2
+    ix = np.clip(np.rint((ox - min_x) / resolution).astype(int) + pad,
+                 0, x_width + 2 * pad - 1)
+    iy = np.clip(np.rint((oy - min_y) / resolution).astype(int) + pad,
+                 0, y_width + 2 * pad - 1)
+    free = np.ones((x_width + 2 * pad, y_width + 2 * pad), dtype=bool)
+    free[ix, iy] = False
+    d_raster = distance_transform_edt(free)[pad:-pad, pad:-pad]  # [cell]
+
+    # An obstacle is at most half a cell diagonal (< 0.75 cell) away from
+    # its rasterized cell.
+    obstacle_map[d_raster + 0.75 <= radius] = True
+    border_x, border_y = np.nonzero(np.abs(d_raster - radius) < 0.75)
+    if border_x.size > 0:
+        tree = cKDTree(np.column_stack((ox, oy)))
+        d, _ = tree.query(np.column_stack(
+            (border_x * resolution + min_x, border_y * resolution + min_y)),
+            workers=-1)
+        hit = d <= robot_radius
+        obstacle_map[border_x[hit], border_y[hit]] = True
+
+    return min_x, min_y, max_x, max_y, obstacle_map
+
+
+def calc_motion_graph(obstacle_map, motion):
+    """
+    Sparse graph of the moves between the cells of an obstacle map
+
+    Cell (ix, iy) is node ix * y_width + iy. Each move of the motion model
+    is an edge weighted by the move cost, if its target cell is free and
+    inside the map, the same rule as the verify_node check of the planners.
+
+    Parameters
+    ----------
+    obstacle_map : array_like
+        (x_width, y_width) boolean array, True for occupied cells
+    motion : list
+        [dx, dy, cost] moves of the motion model
+
+    Returns
+    -------
+    graph : scipy.sparse.csr_matrix
+        (x_width * y_width, x_width * y_width) adjacency matrix, usable with
+        scipy.sparse.csgraph
+    """
+    free = ~np.asarray(obstacle_map, dtype=bool)
+    x_width, y_width = free.shape
+    index = np.arange(free.size).reshape(free.shape)
+    rows, cols, costs = [], [], []
+    for dx, dy, cost in motion:
+        # source cells u whose target cells u + (dx, dy) are inside the map
+        u = index[max(0, -dx):x_width - max(0, dx),
+                  max(0, -dy):y_width - max(0, dy)]
+        v_free = free[max(0, dx):x_width - max(0, -dx),
+                      max(0, dy):y_width - max(0, -dy)]
+        u = u[v_free]
+        rows.append(u)
+        cols.append(u + dx * y_width + dy)
+        costs.append(np.full(u.size, float(cost)))
+
+    return csr_matrix(
+        (np.concatenate(costs), (np.concatenate(rows), np.concatenate(cols))),
+        shape=(free.size, free.size))
+
+
+class ObstacleMapCache:
+    """
+    Persistent on-disk cache of inflated obstacle maps
+
+    Obstacle maps are stored as .npy files in cache_dir, keyed by a hash of
+    the obstacle points, the grid resolution and the robot radius. Cached
+    maps are returned as read-only memory-mapped arrays, so processes
+    sharing cache_dir share the map pages of the OS file cache instead of
+    each holding a copy. The least recently used maps are evicted when the
+    cache grows beyond max_bytes.
+
+    Parameters
+    ----------
+    cache_dir : str or os.PathLike
+        Directory of the cache files. It is created when missing.
+    max_bytes : int, optional
+        Size limit of all cached maps [byte]. Default is 1 GiB.
+
+    Examples
+    --------
+    >>> cache = ObstacleMapCache(tempfile.mkdtemp())  # doctest: +SKIP
+    >>> planner = AStarPlanner(ox, oy, 1.0, 0.5,
+    ...                        obstacle_map_cache=cache)  # doctest: +SKIP
+    """
+    FILE_SUFFIX = ".npy"
+    FORMAT_VERSION = 1
+
+    def __init__(self, cache_dir, max_bytes=1 << 30):
+        self.cache_dir = pathlib.Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    @classmethod
+    def calc_key(cls, ox, oy, resolution, robot_radius):
+        """Hash of the obstacle map parameters used as the cache key"""
+        h = hashlib.sha256()
+        h.update(repr((cls.FORMAT_VERSION, float(resolution),
+                       float(robot_radius))).encode())
+        h.update(np.ascontiguousarray(ox, dtype=float).tobytes())
+        h.update(b"|")
+        h.update(np.ascontiguousarray(oy, dtype=float).tobytes())
+        return h.hexdigest()
+
+    def calc_obstacle_map(self, ox, oy, resolution, robot_radius):
+        """
+        Cached version of calc_obstacle_map
+
+        The returned obstacle map is a read-only memory-mapped array.
+        """
+        min_x, min_y, max_x, max_y, _, _ = calc_grid_bounds(
+            ox, oy, resolution)
+        key = self.calc_key(ox, oy, resolution, robot_radius)
+        obstacle_map = self.load(key)
+        if obstacle_map is None:
+            obstacle_map = calc_obstacle_map(
+                ox, oy, resolution, robot_radius)[4]
+            self.store(key, obstacle_map)
+            obstacle_map = self.load(key)
+        return min_x, min_y, max_x, max_y, obstacle_map
+
+    def warm(self, maps):
+        """
+        Build and store obstacle maps ahead of time
+
+        Parameters
+        ----------
+        maps : iterable
+            (ox, oy, resolution, robot_radius) tuples of the maps to cache.
+
+        Returns
+        -------
+        keys : list
+            Cache keys of the given maps.
+        """
+        keys = []
+        for ox, oy, resolution, robot_radius in maps:
+            key = self.calc_key(ox, oy, resolution, robot_radius)
+            if not self.get_path(key).exists():
+                self.store(key, calc_obstacle_map(
+                    ox, oy, resolution, robot_radius)[4])
+            keys.append(key)
+        return keys
+
+    def get_path(self, key):
+        return self.cache_dir / (key + self.FILE_SUFFIX)
+
+    def load(self, key):
+        """Memory-map the cached obstacle map, None when it is not cached"""
+        path = self.get_path(key)
+        try:
+            obstacle_map = np.load(path, mmap_mode="r")
+            self.touch(path)
+        except (FileNotFoundError, ValueError):
+            return None
+        return obstacle_map
+
+    def store(self, key, obstacle_map):
+        # write to a temporary file first, so other processes never see a
+        # partially written map
+        path = self.get_path(key)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, "wb") as f:
+            np.save(f, np.asarray(obstacle_map, dtype=bool))
+        os.replace(tmp_path, path)
+        self.touch(path)
+        self.evict(keep=path)
+
+    @staticmethod
+    def touch(path):
+        # The modification time records the last use of a map. It is set
+        # explicitly, because the file system clock is too coarse to order
+        # accesses in quick succession.
+        now = time.time_ns()
+        os.utime(path, ns=(now, now))
+
+    def evict(self, keep=None):
+        """Remove the least recently used maps until max_bytes is met"""
+        entries = []
+        for path in self.cache_dir.glob("*" + self.FILE_SUFFIX):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:  # removed by another process
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, path))
+
+        total_bytes = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries, key=lambda e: e[0]):
+            if total_bytes <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                path.unlink()
+            except OSError:  # still mapped or already removed
+                continue
+            total_bytes -= size
+
+    def clear(self):
+        for path in self.cache_dir.glob("*" + self.FILE_SUFFIX):
+            path.unlink(missing_ok=True)
@@ -0,0 +1,114 @@
+"""
+
+Search statistics of the planners
+
+A planner fills a PlanningStats object during every planning call: how many
+nodes it expanded and generated, the peak size of its open set, how many
+collision checks it performed and, when profiling is enabled, the time spent
+in the collision checker, the priority queue and the heuristic and the peak
+memory of the search.
+
+"""
+import contextlib
+import functools
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+
+
+@dataclass
+class PlanningStats:
+    # nodes taken out of the open set and expanded, for the sampling based
+    # planners the number of iterations
+    nodes_expanded: int = 0
+    # nodes pushed to the open set or added to the tree
+    nodes_generated: int = 0
+    # largest number of nodes in the open set at once, for the sampling
+    # based planners the final tree size
+    peak_open_set_size: int = 0
+    collision_checks: int = 0
+    # time spent in the collision checker, in the priority queue operations
+    # and in the heuristic [s], only measured when profiling
+    collision_check_time: float = 0.0
+    queue_time: float = 0.0
+    heuristic_time: float = 0.0
+    # wall clock time of the planning call [s]
+    planning_time: float = 0.0
+    # peak memory allocated during the planning call [bytes], only
+    # measured when profiling
+    peak_memory: int = 0
+
+    def as_dict(self):
+        return asdict(self)
+
+    def timed(self, field, func):
+        """
+        Wrap func so that its run time is added to a time field
+
+        Parameters
+        ----------
+        field : str
+            name of the time field, e.g. "queue_time"
+        func : callable
+            function to time
+
+        Returns
+        -------
+        callable
+            func with the same arguments and return value
+        """
+
+        @functools.wraps(func)
+        def timed_func(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                setattr(self, field, getattr(self, field) +
+                        time.perf_counter() - start)
+
+        return timed_func
+
+    @contextlib.contextmanager
+    def timer(self, field, enabled=True):
+        """
+        Add the run time of a block to a time field, if enabled
+        """
+        if not enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            setattr(self, field, getattr(self, field) +
+                    time.perf_counter() - start)
+
+    @contextlib.contextmanager
+    def measure(self, profile=False):
+        """
+        Record the planning time of a block, and its peak memory with
+        tracemalloc when profile is True
+
+        Tracing memory allocations slows Python code down considerably, so
+        the time fields of a profiled run are only comparable with each
+        other.
+        """
+        started_tracing = False
+        if profile:
+            if tracemalloc.is_tracing():
+                tracemalloc.reset_peak()
+            else:
+                tracemalloc.start()
+                started_tracing = True
+            base_memory = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            yield self
+        finally:
+            self.planning_time += time.perf_counter() - start
+            if profile:
+                peak = tracemalloc.get_traced_memory()[1] - base_memory
+                self.peak_memory = max(self.peak_memory, peak)
+                if started_tracing:
+                    tracemalloc.stop()
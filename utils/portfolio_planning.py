@@ -0,0 +1,230 @@
+"""
+
+Portfolio of independently seeded runs of a sampling planner
+
+The time a sampling planner like RRT* needs to find a path varies a lot
+from run to run, and its tail is long. A portfolio runs copies of the
+planner with different random seeds in a process pool and takes the first
+path found, or the shortest path of the runs that finished by a deadline.
+The runs that are still going are cancelled by terminating the pool.
+
+The workers get the planner in the state its __getstate__ method returns,
+so the planners can leave out their search caches and their expansion
+callback, which is not called in the workers.
+
+"""
+import contextlib
+import copy
+import io
+import math
+import multiprocessing
+import os
+import random
+import sys
+import time
+from dataclasses import dataclass, field
+
+import numpy as np
+
+@dataclass
+class RunResult:
+    seed: int
+    # path [[x, y], ...], None if the run found no path or was cancelled
+    path: list | None
+    # length of the path, infinity without a path
+    cost: float = math.inf
+    # reason of the failure, None if a path was found
+    error: str | None = None
+    # wall clock time spent on the run [s]
+    planning_time: float = 0.0
+
+    @property
+    def success(self) -> bool:
+        return self.path is not None
+
+
+@dataclass
+class PortfolioResult:
+    # the chosen path, None if no run found one in time
+    path: list | None
+    cost: float = math.inf
+    # seed of the run of the path
+    seed: int | None = None
+    # wall clock time until the portfolio returned [s]
+    planning_time: float = 0.0
+    # results of all runs in seed order, the cancelled runs with the error
+    # "cancelled"
+    runs: list[RunResult] = field(default_factory=list)
+
+    @property
+    def success(self) -> bool:
+        return self.path is not None
+
+
+# state of a worker process, set by _init_worker
+_worker_planner = None
+
+
+def plan_portfolio(planner, seeds=4, workers=None, deadline=None,
+                   return_first=True, method="planning", **kwargs):
+    """
+    Run independently seeded copies of a planner in a process pool
+
+    Parameters
+    ----------
+    planner :
+        Sampling planner whose planning method returns a path [[x, y], ...]
+        or None, e.g. RRTStar.
+    seeds : int or list of int
+        Seeds of random and numpy.random of the runs, or their number for
+        the seeds 0, 1, ...
+    workers : int, optional
+        Number of worker processes. Default is os.cpu_count().
+    deadline : float, optional
+        Time limit of the portfolio [s]. The runs that have not finished by
+        then are cancelled.
+    return_first : bool
+        Return the first path found and cancel the other runs, otherwise
+        wait for all runs up to the deadline and return the shortest path.
+    method : str
+        Name of the planning method, called with kwargs and
+        animation=False unless given.
+
+    Returns
+    -------
+    result : PortfolioResult
+        Nothing is printed to stdout.
+    """
+    if isinstance(seeds, int):
+        seeds = list(range(seeds))
+    if not seeds:
+        raise ValueError("the portfolio needs at least one seed")
+    if workers is None:
+        workers = os.cpu_count() or 1
+    kwargs.setdefault("animation", False)
+
+    state = dict(planner.__getstate__())
+    runs = {seed: RunResult(seed, None, error="cancelled") for seed in seeds}
+
+    start_time = time.perf_counter()
+    with multiprocessing.Pool(min(workers, len(seeds)),
+                              initializer=_init_worker,
+                              initargs=(type(planner), state)) as pool:
+        results = pool.imap_unordered(
+            _plan_run, [(seed, method, kwargs) for seed in seeds])
+        for _ in seeds:
+            try:
+                if deadline is None:
+                    run = results.next()
+                else:
+                    run = results.next(max(
+                        deadline - (time.perf_counter() - start_time), 0.0))
+            except multiprocessing.TimeoutError:
+                break
+            runs[run.seed] = run
+            if return_first and run.success:
+                break
+        # leaving the pool terminates the workers of the unfinished runs
+    planning_time = time.perf_counter() - start_time
+
+    runs = [runs[seed] for seed in seeds]
+    found = [run for run in runs if run.success]
+    if not found:
+        return PortfolioResult(None, planning_time=planning_time, runs=runs)
+    if return_first:
+        # the only successful run
+        best = found[0]
+    else:
+        best = min(found, key=lambda run: run.cost)
+    return PortfolioResult(best.path, best.cost, best.seed, planning_time,
+                           runs)
+
+
+def path_length(path):
+    return sum(math.hypot(x1 - x0, y1 - y0)
+               for (x0, y0), (x1, y1) in zip(path, path[1:]))
+
+
+def tail_latency_report(planner, trials=20, portfolio_size=4, workers=None,
+                        percentiles=(50, 90, 99), method="planning",
+                        **kwargs):
+    """
+    Compare the time to the first path of single runs and of portfolios
+
+    The single runs are timed one after another in one worker. The
+    portfolios of portfolio_size runs are timed with their process pool
+    start up, and the "ideal" row is the shortest of portfolio_size single
+    run times, i.e. a portfolio on as many idle cores without overhead.
+    Failed runs count with an infinite time.
+
+    Returns
+    -------
+    rows : list of dict
+        One row per kind of run with "Runs", "Success Rate", "Mean (s)"
+        over the successful runs and a "p<percentile> (s)" column per
+        percentile.
+    """
+    single = plan_portfolio(planner, trials * portfolio_size, workers=1,
+                            return_first=False, method=method, **kwargs)
+    single_times = np.array([run.planning_time if run.success else math.inf
+                             for run in single.runs])
+    portfolio_times = []
+    for trial in range(trials):
+        seeds = list(range(trial * portfolio_size,
+                           (trial + 1) * portfolio_size))
+        result = plan_portfolio(planner, seeds, workers=workers,
+                                method=method, **kwargs)
+        portfolio_times.append(result.planning_time if result.success
+                               else math.inf)
+
+    rows = []
+    for name, times in [
+            ("single run", single_times),
+            (f"portfolio of {portfolio_size}", np.array(portfolio_times)),
+            (f"ideal portfolio of {portfolio_size}",
+             single_times.reshape(trials, portfolio_size).min(axis=1))]:
+        finite = times[np.isfinite(times)]
+        row = {"Runs": name,
+               "Success Rate": len(finite) / len(times),
+               "Mean (s)": float(finite.mean()) if len(finite) else math.inf}
+        for p in percentiles:
+            # nearest rank, a failed run in the tail gives infinity
+            row[f"p{p} (s)"] = float(np.percentile(times, p,
+                                                   method="inverted_cdf"))
+        rows.append(row)
+    return rows
+
+
+def _init_worker(planner_class, state):
+    global _worker_planner
+
+    _worker_planner = planner_class.__new__(planner_class)
+    _worker_planner.__dict__.update(state)
+    _worker_planner.verbose = False
+
+    # workers never draw
+    module = sys.modules[planner_class.__module__]
+    if hasattr(module, "show_animation"):
+        module.show_animation = False
+
+
+def _plan_run(task):
+    seed, method, kwargs = task
+    planner = copy.deepcopy(_worker_planner)
+    random.seed(seed)
+    np.random.seed(seed)
+
+    start_time = time.perf_counter()
+    path, error = None, None
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            path = getattr(planner, method)(**kwargs)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    planning_time = time.perf_counter() - start_time
+
+    if path is None:
+        return RunResult(seed, None, error=error or "no path found",
+                         planning_time=planning_time)
+    path = [[float(x), float(y)] for x, y in path]
+    return RunResult(seed, path, path_length(path), None, planning_time)
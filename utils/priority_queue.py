@@ -0,0 +1,98 @@
+"""
+
+Indexed priority queue with key update and removal
+
+A binary heap of (key, item) entries with a dict from every item to its
+entry, so the key of an item can be looked up, changed or the item removed
+without searching the heap. Changed and removed entries are marked invalid
+and skipped when they reach the top of the heap, which keeps every operation
+on the C implementation of heapq; the heap is rebuilt when the invalid
+entries outnumber the valid ones.
+
+"""
+import heapq
+import itertools
+
+# index of the item in a heap entry [key, count, item]
+_ITEM = 2
+_REMOVED = object()
+
+
+class IndexedPriorityQueue:
+    """
+    Priority queue of hashable items with comparable keys
+
+    Items with equal keys are popped in insertion order.
+    """
+
+    def __init__(self):
+        self.heap = []
+        self.entries = {}
+        self.counter = itertools.count()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, item):
+        return item in self.entries
+
+    def push(self, item, key):
+        """Insert an item, or change its key if it is queued"""
+        entry = self.entries.get(item)
+        if entry is not None:
+            if entry[0] == key:
+                return
+            entry[_ITEM] = _REMOVED
+        entry = [key, next(self.counter), item]
+        self.entries[item] = entry
+        heapq.heappush(self.heap, entry)
+
+    def remove(self, item):
+        """Remove an item if it is queued"""
+        entry = self.entries.pop(item, None)
+        if entry is not None:
+            entry[_ITEM] = _REMOVED
+            if len(self.heap) > 2 * len(self.entries) + 64:
+                self.compact()
+
+    def key(self, item):
+        """Key of a queued item, raises KeyError otherwise"""
+        return self.entries[item][0]
+
+    def top(self):
+        """
+        Item with the smallest key and its key, without removing it
+
+        Raises
+        ------
+        IndexError
+            If the queue is empty.
+        """
+        heap = self.heap
+        while heap and heap[0][_ITEM] is _REMOVED:
+            heapq.heappop(heap)
+        if not heap:
+            raise IndexError("top from an empty priority queue")
+        return heap[0][_ITEM], heap[0][0]
+
+    def top_key(self, default=None):
+        """Smallest key, or default if the queue is empty"""
+        if not self.entries:
+            return default
+        return self.top()[1]
+
+    def pop(self):
+        """Remove and return the item with the smallest key and its key"""
+        item, key = self.top()
+        heapq.heappop(self.heap)
+        del self.entries[item]
+        return item, key
+
+    def clear(self):
+        self.heap.clear()
+        self.entries.clear()
+
+    def compact(self):
+        """Rebuild the heap from its valid entries"""
+        self.heap = list(self.entries.values())
+        heapq.heapify(self.heap)
@@ -0,0 +1,282 @@
+"""
+
+Struct-of-arrays tree storage of the sampling planners
+
+Instead of a Node object per tree node with its own path lists and a parent
+reference, the coordinates, the cost, the parent index and the edge of every
+node are kept in growable NumPy arrays, and the points of all edges in one
+flat buffer. The children of every node are kept as linked lists in the
+first_child and next_sibling arrays.
+
+TreeStorage can stand in for the node list of a planner: indexing returns a
+TreeNode view with the attributes of a planner node, append adds a node
+whose parent is a view, and assigning a node to an index replaces the edge
+of that node while its children stay in place.
+
+"""
+import numpy as np
+
+
+class TreeNode:
+    """
+    View of a node of a TreeStorage
+
+    The position is read when the view is made, as the nodes do not move,
+    the other attributes are read from the tree. Views of the same node
+    compare equal.
+    """
+
+    __slots__ = ("tree", "index", "x", "y")
+
+    def __init__(self, tree, index):
+        self.tree = tree
+        self.index = index
+        self.x = tree.x_view[index]
+        self.y = tree.y_view[index]
+
+    @property
+    def cost(self):
+        return self.tree.cost_view[self.index]
+
+    @property
+    def parent(self):
+        parent = self.tree.parent_view[self.index]
+        return None if parent < 0 else TreeNode(self.tree, parent)
+
+    @property
+    def path_x(self):
+        return self.tree.edge_path(self.index)[0].tolist()
+
+    @property
+    def path_y(self):
+        return self.tree.edge_path(self.index)[1].tolist()
+
+    def __eq__(self, other):
+        return isinstance(other, TreeNode) and other.tree is self.tree \
+            and other.index == self.index
+
+    def __hash__(self):
+        return hash((id(self.tree), self.index))
+
+    def __repr__(self):
+        return f"TreeNode({self.index}, x={self.x}, y={self.y})"
+
+
+class TreeStorage:
+    """
+    Tree of 2D nodes with a cost and an edge path from their parent
+
+    Parameters
+    ----------
+    root : Node
+        root node with x and y, and optionally cost, path_x and path_y
+    capacity : int
+        initial number of nodes the arrays have room for
+    """
+
+    def __init__(self, root, capacity=1024):
+        self.x = np.empty(capacity)
+        self.y = np.empty(capacity)
+        self.cost = np.empty(capacity)
+        # cost of the edge from the parent, kept when the parent is rewired
+        self.edge_cost = np.empty(capacity)
+        self.parent = np.empty(capacity, dtype=np.int64)
+        self.first_child = np.empty(capacity, dtype=np.int64)
+        self.next_sibling = np.empty(capacity, dtype=np.int64)
+        # edge path of node i:
+        # path_x[path_start[i]:path_start[i] + path_len[i]]
+        self.path_start = np.empty(capacity, dtype=np.int64)
+        self.path_len = np.empty(capacity, dtype=np.int64)
+        self.path_x = np.empty(8 * capacity)
+        self.path_y = np.empty(8 * capacity)
+        self.update_views()
+        self.size = 0
+        self.path_size = 0
+        # points of replaced edges in the path buffers
+        self.path_garbage = 0
+        self.append(root)
+
+    def update_views(self):
+        """
+        Memoryviews of x, y, cost and parent for the TreeNode attributes,
+        item access on them returns Python scalars, which is several times
+        faster than indexing the arrays
+        """
+        self.x_view = memoryview(self.x)
+        self.y_view = memoryview(self.y)
+        self.cost_view = memoryview(self.cost)
+        self.parent_view = memoryview(self.parent)
+
+    def __getstate__(self):
+        """Pickled state: the arrays, without their memoryviews"""
+        state = self.__dict__.copy()
+        for name in ("x_view", "y_view", "cost_view", "parent_view"):
+            del state[name]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.update_views()
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [TreeNode(self, j) for j in range(*i.indices(self.size))]
+        if i < 0:
+            i += self.size
+        if not 0 <= i < self.size:
+            raise IndexError("tree node index out of range")
+        return TreeNode(self, i)
+
+    def __iter__(self):
+        for i in range(self.size):
+            yield TreeNode(self, i)
+
+    def append(self, node):
+        """
+        Add a node whose parent is a TreeNode of this tree or None, returns
+        its index
+        """
+        if self.size == len(self.x):
+            self.grow_nodes()
+        i = self.size
+        self.size += 1
+        self.x[i] = node.x
+        self.y[i] = node.y
+        self.first_child[i] = -1
+        self.path_len[i] = 0
+        self.set_edge(i, node)
+        return i
+
+    def __setitem__(self, i, node):
+        """
+        Replace node i by node, at the same position but with another parent
+        and edge. The children of node i stay its children, their costs are
+        updated by propagate_cost.
+        """
+        self.unlink(i)
+        self.path_garbage += int(self.path_len[i])
+        self.path_len[i] = 0
+        self.x[i] = node.x
+        self.y[i] = node.y
+        self.set_edge(i, node)
+
+    def set_edge(self, i, node):
+        parent = node.parent
+        p = -1 if parent is None else parent.index
+        self.parent[i] = p
+        cost = getattr(node, "cost", 0.0)
+        self.cost[i] = cost
+        self.edge_cost[i] = 0.0 if p < 0 else cost - self.cost[p]
+        if p >= 0:
+            self.next_sibling[i] = self.first_child[p]
+            self.first_child[p] = i
+        else:
+            self.next_sibling[i] = -1
+
+        path_x = getattr(node, "path_x", [])
+        n = len(path_x)
+        if self.path_size + n > len(self.path_x):
+            self.grow_paths(n)
+        start = self.path_size
+        self.path_x[start:start + n] = path_x
+        self.path_y[start:start + n] = node.path_y
+        self.path_start[i] = start
+        self.path_len[i] = n
+        self.path_size += n
+
+    def unlink(self, i):
+        """Remove node i from the children of its parent"""
+        p = int(self.parent[i])
+        if p < 0:
+            return
+        child = int(self.first_child[p])
+        if child == i:
+            self.first_child[p] = self.next_sibling[i]
+            return
+        while child >= 0:
+            sibling = int(self.next_sibling[child])
+            if sibling == i:
+                self.next_sibling[child] = self.next_sibling[i]
+                return
+            child = sibling
+
+    def children(self, i):
+        """Indices of the children of node i"""
+        inds = []
+        child = int(self.first_child[i])
+        while child >= 0:
+            inds.append(child)
+            child = int(self.next_sibling[child])
+        return inds
+
+    def propagate_cost(self, i, calc_edge_costs=None):
+        """
+        Update the costs of the subtree of node i from the cost of node i,
+        one level of the subtree at a time
+
+        calc_edge_costs(parent_inds, inds) returns the costs of the edges
+        of the nodes inds as an array, by default the edges keep the costs
+        they were added with.
+        """
+        level = self.children(i)
+        while level:
+            inds = np.array(level)
+            parent_inds = self.parent[inds]
+            if calc_edge_costs is not None:
+                self.edge_cost[inds] = calc_edge_costs(parent_inds, inds)
+            self.cost[inds] = self.cost[parent_inds] + self.edge_cost[inds]
+            level = [child for j in level for child in self.children(j)]
+
+    def edge_path(self, i):
+        """Views of path_x and path_y of the edge of node i"""
+        start = int(self.path_start[i])
+        end = start + int(self.path_len[i])
+        return self.path_x[start:end], self.path_y[start:end]
+
+    def coordinates(self):
+        """Views of the x and y coordinates of all nodes"""
+        return self.x[:self.size], self.y[:self.size]
+
+    def costs(self):
+        """View of the costs of all nodes"""
+        return self.cost[:self.size]
+
+    def grow_nodes(self):
+        capacity = 2 * len(self.x)
+        for name in ("x", "y", "cost", "edge_cost", "parent", "first_child",
+                     "next_sibling", "path_start", "path_len"):
+            array = getattr(self, name)
+            grown = np.empty(capacity, dtype=array.dtype)
+            grown[:self.size] = array[:self.size]
+            setattr(self, name, grown)
+        self.update_views()
+
+    def grow_paths(self, n):
+        """
+        Make room for n more path points, first by dropping replaced edges
+        """
+        if self.path_garbage > self.path_size // 2:
+            self.compact_paths()
+        if self.path_size + n <= len(self.path_x):
+            return
+        capacity = max(2 * len(self.path_x), self.path_size + n)
+        for name in ("path_x", "path_y"):
+            grown = np.empty(capacity)
+            grown[:self.path_size] = getattr(self, name)[:self.path_size]
+            setattr(self, name, grown)
+
+    def compact_paths(self):
+        """Move the edge paths of the nodes together, in node order"""
+        lens = self.path_len[:self.size]
+        starts = np.cumsum(lens) - lens
+        total = int(lens.sum())
+        src = np.arange(total) + np.repeat(
+            self.path_start[:self.size] - starts, lens)
+        self.path_x[:total] = self.path_x[src]
+        self.path_y[:total] = self.path_y[src]
+        self.path_start[:self.size] = starts
+        self.path_size = total
+        self.path_garbage = 0